@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cost of archiving reports as they stream in, and of reading one section
+back out of the archive.
+
+A synthetic report is streamed into the parser alone, then into the
+parser and an archive. The archive then holds REPORTS copies of it, and
+`monmap` and `osdmap` are read from the latest one, compared with
+scanning a gzip copy of the report for them.
+
+    python benchmarks/bench_archive.py [pg_count ...]
+"""
+
+from __future__ import print_function
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ceph_check import synthetic  # noqa: E402
+from ceph_check.report import ReportSnapshot  # noqa: E402
+
+REPORTS = 10
+CHUNK = 1 << 16
+SECTIONS = ('monmap', 'osdmap')
+
+
+def chunks(raw):
+    return (raw[start:start + CHUNK] for start in range(0, len(raw), CHUNK))
+
+
+def timed(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+
+def main(pg_counts):
+    print("{0:>8} {1:>9} {2:>9} {3:>10} {4:>11} {5:>10} {6:>10}".format(
+        "PGs", "size MB", "stream", "+archive", "archive MB", "gz read",
+        "ccr read"))
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for pg_count in pg_counts:
+            path = os.path.join(tmpdir, "report.json")
+            synthetic.write_report(path, synthetic.SyntheticCluster(
+                osds=max(pg_count // 100, 10), pgs=pg_count))
+            with open(path, 'rb') as obj:
+                raw = obj.read()
+            with gzip.open(path + ".gz", 'wb') as obj:
+                obj.write(raw)
+            ccr = os.path.join(tmpdir, "reports.ccr")
+            stream = timed(lambda: ReportSnapshot.from_stream(
+                chunks(raw), SECTIONS, save_path=os.devnull))
+            archived = timed(lambda: ReportSnapshot.from_stream(
+                chunks(raw), SECTIONS, archive_path=ccr))
+            for _ in range(REPORTS - 1):
+                ReportSnapshot.from_stream(chunks(raw), (), archive_path=ccr)
+            gz_read = timed(lambda: ReportSnapshot.from_file(
+                path + ".gz", SECTIONS))
+            ccr_read = timed(lambda: ReportSnapshot.from_file(ccr, SECTIONS))
+            print("{0:>8} {1:>9.1f} {2:>8.2f}s {3:>9.2f}s {4:>11.1f} "
+                  "{5:>9.3f}s {6:>9.3f}s".format(
+                      pg_count, len(raw) / 1048576.0, stream, archived,
+                      os.path.getsize(ccr) / 1048576.0, gz_read, ccr_read))
+            for name in (path, path + ".gz", ccr):
+                os.unlink(name)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Fork-per-command `ceph` CLI against one persistent connection.
+
+Every CLI call pays CLI_STARTUP for interpreter start, cephx and the mon
+hunt, then MON_RTT for the command itself. The librados side pays the
+handshake once, through a `ReplayCluster` with the same latencies, and
+then only MON_RTT per command. Both answer the same recorded responses.
+
+    python benchmarks/bench_backends.py [rounds]
+"""
+
+from __future__ import print_function
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+from ceph_check import backends  # noqa: E402
+from ceph_check import ceph_check  # noqa: E402
+from ceph_check import fetch  # noqa: E402
+from ceph_check import synthetic  # noqa: E402
+import fake_ceph  # noqa: E402
+
+CLI_STARTUP = 0.25
+MON_RTT = 0.005
+
+FAKE = r"""#!{python}
+import os, sys, time
+args = [a for a in sys.argv[1:] if a not in ('-f', 'json')]
+time.sleep({startup} + {rtt})
+sys.stdout.buffer.write(open(os.path.join({answers!r}, '_'.join(args))
+                             + '.json', 'rb').read())
+"""
+
+
+def main(rounds):
+    tmpdir = tempfile.mkdtemp()
+    report = synthetic.SyntheticCluster(osds=30).report()
+    for command in fetch.SECTION_COMMANDS.values():
+        args = fetch.command_argv(command)[:-2]
+        with open(os.path.join(tmpdir, backends.command_key(command)
+                               + ".json"), "w") as obj:
+            json.dump(fake_ceph.narrow(report, " ".join(args)), obj)
+    ceph_bin = os.path.join(tmpdir, "ceph")
+    with open(ceph_bin, "w") as obj:
+        obj.write(FAKE.format(python=sys.executable, answers=tmpdir,
+                              startup=CLI_STARTUP, rtt=MON_RTT))
+    os.chmod(ceph_bin, 0o755)
+
+    cli = backends.SubprocessBackend(ceph_bin)
+    rados = backends.RadosBackend(
+        cluster=backends.ReplayCluster.from_directory(
+            tmpdir, latency=MON_RTT, connect_latency=CLI_STARTUP))
+    print("{0} rounds of {1} commands, 4 at a time".format(
+        rounds, len(fetch.SECTION_COMMANDS)))
+    print("{0:<8} {1:>10} {2:>12}".format("backend", "total", "per round"))
+    for label, backend in (("cli", cli), ("rados", rados)):
+        checker = ceph_check.CephCheck("/nonexistent", "/nonexistent",
+                                       backend=backend)
+        start = time.time()
+        for _ in range(rounds):
+            checker.fetch_snapshot()
+        elapsed = time.time() - start
+        backend.close()
+        print("{0:<8} {1:>9.2f}s {2:>11.3f}s".format(
+            label, elapsed, elapsed / rounds))
+    shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Offline batch throughput as worker processes are added.
+
+Writes `count` synthetic reports of `pg_count` PGs, then audits all of
+them with 1, 2, 4, ... processes up to the number of cores.
+
+    python benchmarks/bench_batch.py [count] [pg_count]
+"""
+
+from __future__ import print_function
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from ceph_check import batch  # noqa: E402
+from ceph_check import synthetic  # noqa: E402
+
+
+def main(count, pg_count):
+    tmpdir = tempfile.mkdtemp()
+    for number in range(count):
+        synthetic.write_report(
+            os.path.join(tmpdir, "report-{0}.json".format(number)),
+            synthetic.SyntheticCluster(osds=50, pools=1, pgs=pg_count,
+                                       seed=number))
+    paths = batch.find_reports([tmpdir])
+    cores = multiprocessing.cpu_count()
+    print("{0} reports of {1} PGs, {2} cores".format(count, pg_count, cores))
+    print("{0:>9} {1:>10} {2:>14} {3:>8}".format(
+        "processes", "time", "reports/s", "speedup"))
+    processes = 1
+    base = None
+    while processes <= cores:
+        start = time.time()
+        audits = list(batch.audit_reports(paths, processes=processes))
+        elapsed = time.time() - start
+        assert len(audits) == count
+        base = base or elapsed
+        print("{0:>9} {1:>9.2f}s {2:>14.1f} {3:>7.2f}x".format(
+            processes, elapsed, count / elapsed, base / elapsed))
+        processes *= 2
+    shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 32,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 20000)
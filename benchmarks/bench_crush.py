@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Time of the CRUSH placement simulation of `ceph_check.crush`.
+
+Maps PGS PGs of one 3 replica pool on synthetic clusters (see
+`ceph_check.synthetic`) of several sizes and CRUSH tree depths, and
+shows how far the busiest and idlest OSDs are from their fair share.
+The time grows with the number of items in the buckets a PG goes
+through: straw2 draws once per item, for each replica.
+
+    python benchmarks/bench_crush.py [pgs]
+"""
+
+from __future__ import print_function
+import os
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from ceph_check import crush  # noqa: E402
+from ceph_check import synthetic  # noqa: E402
+
+# (OSDs, bucket levels above the OSDs)
+LAYOUTS = [(100, 2), (1000, 2), (1000, 3), (10000, 3), (10000, 4)]
+
+
+def main(pgs):
+    print("{0} PGs, 3 replicas".format(pgs))
+    print("{0:>6} {1:>6} {2:>8} {3:>9} {4:>9} {5:>9}".format(
+        "OSDs", "depth", "buckets", "seconds", "min/fair", "max/fair"))
+    for osds, depth in LAYOUTS:
+        cluster = synthetic.SyntheticCluster(osds=osds, crush_depth=depth,
+                                             pools=1, pgs=pgs)
+        crushmap = crush.CrushMap(cluster.crushmap())
+        pool = cluster.osdmap()['pools'][0]
+        inputs = crush.pg_inputs(pool)
+        start = time.time()
+        up = crushmap.map_pgs(pool['crush_rule'], inputs, pool['size'],
+                              np.ones(osds))
+        elapsed = time.time() - start
+        devices, share = crush.fair_share(crushmap, pool['crush_rule'],
+                                          up.size, np.ones(osds))
+        ratio = crush.pg_counts(up, osds)[devices] / share
+        print("{0:>6} {1:>6} {2:>8} {3:>8.2f}s {4:>9.2f} {5:>9.2f}".format(
+            osds, depth, len(crushmap.buckets), elapsed, ratio.min(),
+            ratio.max()))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1 << 20)
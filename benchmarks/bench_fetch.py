@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Full `ceph report` against per-section commands for a few check sets.
+
+A fake `ceph` answers from a synthetic report, with each command's
+answer worked out beforehand by `tests/fake_ceph.py`. Every command takes
+a fixed 0.2 s for the mon round trip plus transfer time at MON_RATE bytes
+per second.
+
+    python benchmarks/bench_fetch.py [pg_count]
+"""
+
+from __future__ import print_function
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+from ceph_check import ceph_check  # noqa: E402
+from ceph_check import fetch  # noqa: E402
+import fake_ceph  # noqa: E402
+
+MON_RATE = 50 * 1024 * 1024
+
+FAKE = r"""#!{python}
+import os, sys, time
+args = [a for a in sys.argv[1:] if a not in ('-f', 'json')]
+path = os.path.join({answers!r}, '_'.join(args))
+out = open(path, 'rb').read()
+time.sleep(0.2 + len(out) / {rate}.0)
+sys.stdout.buffer.write(out)
+"""
+
+CASES = [
+    ("mon,pool", ["mon", "pool"]),
+    ("health,mon,osd", ["health", "mon", "osd"]),
+    ("all", None),
+]
+
+
+def main(pg_count):
+    tmpdir = tempfile.mkdtemp()
+    report = os.path.join(tmpdir, "report.json")
+    subprocess.check_call([sys.executable, "-m", "ceph_check.synthetic",
+                           "--osds", "50", "--pools", "1",
+                           "--pgs", str(pg_count), report], cwd=ROOT)
+    with open(report) as obj:
+        parsed = json.load(obj)
+    shutil.copy(report, os.path.join(tmpdir, "report"))
+    for command in fetch.SECTION_COMMANDS.values():
+        args = fetch.command_argv(command)[:-2]
+        with open(os.path.join(tmpdir, "_".join(args)), "w") as obj:
+            json.dump(fake_ceph.narrow(parsed, " ".join(args)), obj)
+    del parsed
+    ceph_bin = os.path.join(tmpdir, "ceph")
+    with open(ceph_bin, "w") as obj:
+        obj.write(FAKE.format(python=sys.executable, answers=tmpdir,
+                              rate=MON_RATE))
+    os.chmod(ceph_bin, 0o755)
+    print("report: {0} PGs, {1:.1f} MB".format(
+        pg_count, os.path.getsize(report) / 1048576.0))
+    print("{0:<16} {1:>12} {2:>12}".format("checks", "full report",
+                                           "per-section"))
+    for label, names in CASES:
+        row = [label]
+        for full in (True, False):
+            checker = ceph_check.CephCheck("/nonexistent", "/nonexistent",
+                                           ceph_bin=ceph_bin, checks=names,
+                                           full_report=full)
+            start = time.time()
+            checker.fetch_snapshot()
+            row.append(time.time() - start)
+        print("{0:<16} {1:>11.2f}s {2:>11.2f}s".format(*row))
+    shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
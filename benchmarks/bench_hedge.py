@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Command latency with one of three monitors dead.
+
+`tests/fake_ceph.py` plays three monitors, answering after MON_RTT
+seconds, with the first one hanging. The single-monitor client sends each
+command to a random monitor, as the `ceph` CLI's hunt does, and retries
+after a TIMEOUT with a backoff. The hedged one sends it to two monitors
+at once through `HedgedBackend`, and takes the first answer.
+
+    python benchmarks/bench_hedge.py [commands]
+"""
+
+from __future__ import print_function
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from ceph_check import backends  # noqa: E402
+from ceph_check import monitors  # noqa: E402
+from ceph_check import synthetic  # noqa: E402
+
+FAKE_CEPH = os.path.join(ROOT, "tests", "fake_ceph.py")
+MONS = ["10.1.0.1:6789", "10.1.0.2:6789", "10.1.0.3:6789"]
+MON_RTT = 0.02
+TIMEOUT = 1.0
+COMMAND = {'prefix': 'mon dump'}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def single(ceph_bin, rng):
+    """Each try goes to one random monitor, like the CLI's hunt."""
+    def runner(command, timeout):
+        backend = backends.SubprocessBackend(ceph_bin,
+                                             ['-m', rng.choice(MONS)])
+        return backend.command(command, timeout)
+    return monitors.retrying(runner, monitors.Backoff(base=0.1, rng=rng))
+
+
+def main(count):
+    tmpdir = tempfile.mkdtemp()
+    report = os.path.join(tmpdir, "report.json")
+    synthetic.write_report(report, synthetic.SyntheticCluster(osds=30))
+    ceph_bin = os.path.join(tmpdir, "ceph")
+    with open(ceph_bin, "w") as obj:
+        obj.write('#!/bin/sh\nexec "{0}" "{1}" "$@"\n'.format(
+            sys.executable, FAKE_CEPH))
+    os.chmod(ceph_bin, 0o755)
+    os.environ.update({
+        "FAKE_CEPH_REPORT": report,
+        "FAKE_CEPH_DELAY": str(MON_RTT),
+        "FAKE_CEPH_MONS": json.dumps({MONS[0]: {"dead": 1}}),
+    })
+
+    rng = random.Random(0)
+    clients = [
+        ("single", single(ceph_bin, rng)),
+        ("hedged", backends.HedgedBackend(ceph_bin, MONS).command),
+    ]
+    print("{0} '{1}' commands, {2} of {3} monitors dead".format(
+        count, COMMAND['prefix'], 1, len(MONS)))
+    print("{0:<8} {1:>8} {2:>8} {3:>8} {4:>8}".format(
+        "client", "p50", "p90", "p99", "max"))
+    for label, runner in clients:
+        latencies = []
+        for _ in range(count):
+            start = time.time()
+            runner(COMMAND, TIMEOUT)
+            latencies.append(time.time() - start)
+        print("{0:<8} {1:>7.3f}s {2:>7.3f}s {3:>7.3f}s {4:>7.3f}s".format(
+            label, percentile(latencies, 0.5), percentile(latencies, 0.9),
+            percentile(latencies, 0.99), max(latencies)))
+    shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
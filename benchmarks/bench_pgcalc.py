@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Time `pgcalc.pool_sizing` over synthetic pool sets.
+
+    python benchmarks/bench_pgcalc.py [pools osds ...]
+"""
+
+from __future__ import print_function
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ceph_check import pgcalc  # noqa: E402
+from ceph_check import synthetic  # noqa: E402
+from ceph_check.report import ReportSnapshot  # noqa: E402
+
+
+def synthetic_report(pool_count, osd_count):
+    # `pool_sizing` does not read the PGs, leave them out.
+    cluster = synthetic.SyntheticCluster(osds=osd_count, pools=pool_count,
+                                         hosts=osd_count // 20)
+    return {"osdmap": cluster.osdmap(),
+            "pgmap": cluster.pgmap(with_pgs=False),
+            "crushmap": cluster.crushmap()}
+
+
+def main(cases):
+    print("{0:>6} {1:>7} {2:>10}".format("pools", "OSDs", "seconds"))
+    for pool_count, osd_count in cases:
+        snapshot = ReportSnapshot(synthetic_report(pool_count, osd_count))
+        snapshot.osd_table
+        start = time.time()
+        pgcalc.pool_sizing(snapshot)
+        print("{0:>6} {1:>7} {2:>10.3f}".format(
+            pool_count, osd_count, time.time() - start))
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(list(zip(args[::2], args[1::2])) or
+         [(10, 100), (100, 2000), (500, 20000), (1000, 50000)])
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Time the `stuck` check's PG analysis over synthetic pgmaps.
+
+For each PG count, the PG table is built from the `pg_stats` dicts, with
+their timestamps, then `pgstates.PGStates` groups them by pool, primary
+OSD and host. A million PGs should take no more than a couple of seconds
+for both.
+
+    python benchmarks/bench_pgstates.py [pgs ...]
+"""
+
+from __future__ import print_function
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ceph_check import pgstates  # noqa: E402
+from ceph_check import synthetic  # noqa: E402
+from ceph_check.tables import PGTable, parse_stamps  # noqa: E402
+
+
+def synthetic_pgmap(pg_count):
+    osds = max(pg_count // 100, 10)
+    cluster = synthetic.SyntheticCluster(osds=osds, hosts=max(osds // 20, 3),
+                                         pgs=pg_count, unclean=0.05, down=2)
+    hosts = dict((meta['id'], meta['hostname'])
+                 for meta in cluster.osd_metadata())
+    return cluster.pgmap(), hosts
+
+
+def main(pg_counts):
+    print("{0:>9} {1:>10} {2:>10}".format("PGs", "table", "analysis"))
+    for pg_count in pg_counts:
+        pgmap, hosts = synthetic_pgmap(pg_count)
+        start = time.time()
+        table = PGTable.from_pgmap(pgmap)
+        built = time.time()
+        pgstates.PGStates(table, hosts, parse_stamps([pgmap['stamp']])[0])
+        print("{0:>9} {1:>10.3f} {2:>10.3f}".format(
+            len(table), built - start, time.time() - built))
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or
+         [1000, 10000, 100000, 1000000])
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Peak RSS and wall time of report parsing as the PG count grows.
+
+Compares a plain `json.load` of the whole report with the section
+selective scanner reading only `health`, `monmap` and `osdmap`. Each
+measurement runs in a fresh interpreter so `ru_maxrss` is not shared.
+
+    python benchmarks/bench_report_parse.py [pg_count ...]
+"""
+
+from __future__ import print_function
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ceph_check import synthetic  # noqa: E402
+
+MEASURE = r"""
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+from ceph_check.report import ReportSnapshot
+start = time.time()
+if {mode!r} == "json.load":
+    with open({path!r}) as obj:
+        json.load(obj)
+else:
+    ReportSnapshot.from_file({path!r}, ("health", "monmap", "osdmap"))
+print(time.time() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def write_report(path, pg_count):
+    # `pgmap` comes first so the scanner has to step over all of it.
+    order = ['pgmap'] + [name for name in synthetic.SECTION_ORDER
+                         if name != 'pgmap']
+    synthetic.write_report(path, synthetic.SyntheticCluster(
+        osds=50, pools=1, pgs=pg_count), order)
+
+
+def measure(path, mode):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = MEASURE.format(root=root, mode=mode, path=path)
+    out = subprocess.check_output([sys.executable, "-c", code])
+    seconds, rss_kb = out.split()
+    return float(seconds), int(rss_kb)
+
+
+def main(pg_counts):
+    print("{0:>8} {1:>9} {2:>11} {3:>9} {4:>11} {5:>9}".format(
+        "PGs", "size MB", "json.load", "RSS MB", "scanner", "RSS MB"))
+    tmpdir = tempfile.mkdtemp()
+    for pg_count in pg_counts:
+        path = os.path.join(tmpdir, "report-{0}.json".format(pg_count))
+        # Written from a child, a large parent would inflate the
+        # `ru_maxrss` its measuring children inherit across exec.
+        subprocess.check_call([sys.executable, __file__, "--write",
+                               path, str(pg_count)])
+        row = [pg_count, os.path.getsize(path) / 1048576.0]
+        for mode in ("json.load", "scanner"):
+            seconds, rss_kb = measure(path, mode)
+            row.extend([seconds, rss_kb / 1024.0])
+        os.unlink(path)
+        print("{0:>8} {1:>9.1f} {2:>10.2f}s {3:>9.1f} {4:>10.2f}s {5:>9.1f}"
+              .format(*row))
+    os.rmdir(tmpdir)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--write"]:
+        sys.exit(write_report(sys.argv[2], int(sys.argv[3])))
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 50000, 200000])
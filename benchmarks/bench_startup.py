@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Time taken to start `ceph_check`, up to the command line being parsed.
+
+Each run is a fresh interpreter importing `ceph_check.cli` under
+`python -X importtime`, the median of the cumulative import time of the
+package is compared with BUDGET and makes the exit status 1 when over
+it. The slowest imports of the last run are listed, with the heavy
+modules which should only be imported once a check needs them.
+
+    python benchmarks/bench_startup.py [runs]
+"""
+
+from __future__ import print_function
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+MODULE = "ceph_check.cli"
+# Seconds, for cron runs and daemon restarts.
+BUDGET = 0.2
+# Imported on demand only.
+DEFERRED = ("numpy", "asyncio", "http.server", "multiprocessing", "ansible",
+            "sqlite3", "ceph_check.batch", "ceph_check.daemon",
+            "ceph_check.hostfacts", "ceph_check.trends")
+
+
+def import_times(module):
+    """{module: (self, cumulative) seconds} of a fresh `import module`."""
+    code = "import sys, {0}; print(' '.join(sorted(sys.modules)))".format(
+        module)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=ROOT, stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE, check=True,
+                          universal_newlines=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(own) / 1e6, int(cumulative) / 1e6)
+    return times, proc.stdout.split()
+
+
+def main(runs):
+    totals = []
+    for _ in range(runs):
+        times, modules = import_times(MODULE)
+        totals.append(times[MODULE][1])
+    median = sorted(totals)[len(totals) // 2]
+    print("import {0} : median {1:.3f}s over {2} runs, budget {3:.3f}s".format(
+        MODULE, median, runs, BUDGET))
+    print("\nslowest imports (cumulative) :")
+    for name, (own, cumulative) in sorted(
+            times.items(), key=lambda item: -item[1][1])[:15]:
+        print("  {0:<40} {1:>7.3f}s {2:>7.3f}s".format(name, own, cumulative))
+    loaded = [name for name in DEFERRED if name in modules]
+    if loaded:
+        print("\nimported at startup : {0}".format(", ".join(loaded)))
+    return 1 if median > BUDGET or loaded else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5))
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Time and peak allocations of report parsing and of each check.
+
+Synthetic reports (see `ceph_check.synthetic`) from 10 to 10,000 OSDs
+are parsed into a compacted snapshot, then every report-only check is run
+on it. Each step is timed on its own, then run again under `tracemalloc`
+for its peak allocation.
+
+The results are compared with `benchmarks/baseline.json`, steps more
+than TIME_SLACK times slower or MEMORY_SLACK times larger than their
+baseline are flagged and make the exit status 1. `--save` writes the
+results as the new baseline.
+
+    python benchmarks/bench_suite.py [--save] [--osds 10,100,1000,10000]
+"""
+
+from __future__ import print_function
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from ceph_check import checks  # noqa: E402
+from ceph_check import fetch  # noqa: E402
+from ceph_check import scheduler  # noqa: E402
+from ceph_check import synthetic  # noqa: E402
+from ceph_check.report import ReportSnapshot  # noqa: E402
+
+BASELINE = os.path.join(HERE, "baseline.json")
+OSD_COUNTS = [10, 100, 1000, 10000]
+CHECKS = ["health", "mon", "osd", "pool", "pg"]
+TIME_SLACK = 1.5
+MEMORY_SLACK = 1.25
+# Steps faster than this are too noisy to compare.
+MIN_SECONDS = 0.005
+
+
+def measure(func):
+    """Seconds taken by `func()`, and its peak allocation in KiB."""
+    start = time.time()
+    func()
+    seconds = time.time() - start
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": round(seconds, 4), "peak_kib": peak // 1024}
+
+
+def bench_osds(osd_count, tmpdir):
+    cluster = synthetic.SyntheticCluster(osds=osd_count, down=osd_count // 50,
+                                         unclean=0.02)
+    path = os.path.join(tmpdir, "report-{0}.json".format(osd_count))
+    synthetic.write_report(path, cluster)
+    selected = checks.select(CHECKS)
+    sections = fetch.report_sections(checks.sections_for(selected))
+    results = {}
+
+    def parse():
+        return ReportSnapshot.from_file(path, sections).compact()
+    results["report_parse"] = measure(parse)
+    snapshot = parse()
+    for check in selected:
+        results[check.name] = measure(
+            lambda: scheduler.run_check(check, snapshot))
+    os.unlink(path)
+    return results
+
+
+def compare(step, result, baseline):
+    """Notes on `result` against its `baseline`, and if it regressed."""
+    if baseline is None:
+        return "new", False
+    ratio = result["seconds"] / max(baseline["seconds"], 1e-9)
+    memory = result["peak_kib"] / float(max(baseline["peak_kib"], 1))
+    slower = (ratio > TIME_SLACK and
+              result["seconds"] - baseline["seconds"] > MIN_SECONDS)
+    larger = memory > MEMORY_SLACK and result["peak_kib"] > 64
+    note = "{0:.2f}x time, {1:.2f}x memory".format(ratio, memory)
+    if slower or larger:
+        note += "  <-- REGRESSION"
+    return note, slower or larger
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--save", action="store_true",
+                        help="write the results as the new baseline")
+    parser.add_argument("--osds", default=",".join(map(str, OSD_COUNTS)),
+                        help="comma separated OSD counts")
+    args = parser.parse_args(argv)
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as obj:
+            baseline = json.load(obj)["results"]
+
+    tmpdir = tempfile.mkdtemp()
+    results = {}
+    regressed = False
+    print("{0:>6} {1:<14} {2:>10} {3:>12}  {4}".format(
+        "OSDs", "step", "seconds", "peak KiB", "vs baseline"))
+    try:
+        for osd_count in [int(n) for n in args.osds.split(",")]:
+            key = str(osd_count)
+            results[key] = bench_osds(osd_count, tmpdir)
+            for step in ["report_parse"] + CHECKS:
+                result = results[key][step]
+                note, worse = compare(step, result,
+                                      baseline.get(key, {}).get(step))
+                regressed = regressed or worse
+                print("{0:>6} {1:<14} {2:>10.4f} {3:>12}  {4}".format(
+                    osd_count, step, result["seconds"], result["peak_kib"],
+                    note))
+    finally:
+        shutil.rmtree(tmpdir)
+
+    if args.save:
+        with open(BASELINE, "w") as obj:
+            json.dump({"python": platform.python_version(),
+                       "machine": platform.machine(),
+                       "results": results}, obj, indent=2, sort_keys=True)
+            obj.write("\n")
+        print("Baseline written to {0}".format(BASELINE))
+    return 1 if regressed and not args.save else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cost of recording a run in the trend store, and of projecting when the
+OSDs and pools fill up from months of history.
+
+The store is filled with DAYS of samples every 5 minutes for a cluster
+of OSDS OSDs, 20 pools and 10 PG states, each OSD growing at its own
+rate. The time of one more run's record and of the projections over a
+week and over DAYS are then printed, with the size of the database.
+
+    python benchmarks/bench_trends.py [osds [days]]
+"""
+
+from __future__ import print_function
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ceph_check import trends  # noqa: E402
+
+STEP = 300
+POOLS = 20
+STATES = 10
+TIB = 1024.0 ** 4
+
+
+def samples(osds, rates, elapsed):
+    days = elapsed / float(trends.DAY)
+    rows = [('osd', "osd.{0}".format(osd), TIB * (0.3 + rates[osd] * days),
+             0.85 * 4 * TIB, 0.95 * 4 * TIB) for osd in range(osds)]
+    total = sum(row[2] for row in rows)
+    rows.append(('cluster', 'usage', total, 0.85 * 4 * TIB * osds,
+                 0.95 * 4 * TIB * osds))
+    rows.extend(('pool', "pool-{0}".format(pool), total / POOLS / 3,
+                 total / POOLS, total / POOLS * 1.2) for pool in range(POOLS))
+    rows.extend(('pg_state', "state-{0}".format(state), 100.0, None, None)
+                for state in range(STATES))
+    return rows
+
+
+def main(osds, days):
+    rng = random.Random(1)
+    rates = [rng.uniform(0, 0.02) for _ in range(osds)]
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, "trends.db")
+        start = int(time.time()) - days * trends.DAY
+        store = trends.TrendStore(path)
+        began = time.time()
+        for now in range(start, start + days * trends.DAY, STEP):
+            store.record("fsid", samples(osds, rates, now - start), now)
+        filled = time.time() - began
+        now = start + days * trends.DAY
+        began = time.time()
+        store.record("fsid", samples(osds, rates, now - start), now)
+        record = time.time() - began
+        timings = []
+        for window in (trends.WINDOW, days * trends.DAY):
+            began = time.time()
+            projections = store.projections("fsid", now=now, window=window)
+            timings.append(time.time() - began)
+        store.close()
+        print("{0} OSDs, {1} days every {2}s : {3} series, filled in "
+              "{4:.0f}s, {5:.1f} MB".format(
+                  osds, days, STEP, len(projections), filled,
+                  os.path.getsize(path) / 1048576.0))
+        print("record {0:.3f}s, 7 day projection {1:.3f}s, {2} day "
+              "projection {3:.3f}s".format(record, timings[0], days,
+                                           timings[1]))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [100, 90][len(args):]))
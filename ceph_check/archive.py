@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+
+"""
+Append-only archive of `ceph report`s, with random access to sections.
+
+Each report is stored section by section: the raw JSON text of every
+top-level member is cut into blocks of BLOCK_SIZE bytes, each
+compressed on its own with zlib. After the blocks of a report comes its
+index, the offset and size of each block by section, then a fixed-size
+trailer pointing at the index. The index also points at the previous
+report's trailer, so the reports form a chain from the end of the file.
+
+    header | blocks | index | trailer | blocks | index | trailer | ...
+
+A reader maps the file into memory, follows the last trailer and only
+decompresses the blocks of the sections it asks for: the `monmap` of a
+report can be read out of a history of multi-GB reports without going
+through their pgmaps.
+
+`ArchiveWriter` is fed the report text as it streams in, see
+`ceph_check.report.ReportSnapshot.from_stream`. A report which is not
+closed (the stream failed, the process died) leaves no trailer, and the
+next writer cuts the file back to the end of the last complete report.
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+cc_logger = logging.getLogger("ceph_check")
+
+# Archive files found by `--offline` in a directory.
+SUFFIX = '.ccr'
+HEADER = b"CCARCH01"
+# Magic, index offset and index size.
+TRAILER = struct.Struct('<8sQQ')
+TRAILER_MAGIC = b"CCINDEX1"
+# Raw bytes compressed together, the unit of random access.
+BLOCK_SIZE = 1 << 20
+# zlib level, fast enough to keep up with the monitor.
+LEVEL = 1
+
+
+class ArchiveError(Exception):
+    """Raised when an archive is unreadable or lacks a report."""
+
+
+def _last_trailer(buf, size):
+    """
+    (end, index) of the last complete report in the mapped `buf`, or
+    (len(HEADER), None) without any.
+    """
+    pos = size - TRAILER.size
+    while pos >= len(HEADER):
+        pos = buf.rfind(TRAILER_MAGIC, len(HEADER), pos + len(TRAILER_MAGIC))
+        if pos < 0:
+            break
+        _, offset, length = TRAILER.unpack_from(buf, pos)
+        if len(HEADER) <= offset and offset + length == pos:
+            try:
+                index = json.loads(zlib.decompress(
+                    buf[offset:pos]).decode('utf-8'))
+            except (ValueError, zlib.error):
+                index = None
+            if isinstance(index, dict):
+                return pos + TRAILER.size, index
+        pos -= 1
+    return len(HEADER), None
+
+
+class ArchiveWriter(object):
+    """
+    Appends one report to the archive at `path`, created if missing.
+
+    `write(name, text)` takes the value text of the top-level member
+    `name` in pieces, as `jsonstream.SectionScanner` hands them out.
+    `close()` writes the index and makes the report part of the archive,
+    `abort()` drops what was written of it. The file is locked meanwhile,
+    writers of the same archive take turns.
+    """
+
+    def __init__(self, path, block_size=BLOCK_SIZE, level=LEVEL):
+        self.path = path
+        self.block_size = block_size
+        self.level = level
+        self._file = open(path, 'a+b')
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        try:
+            self._start, self._previous = self._recover()
+        except Exception:
+            self._release()
+            raise
+        self._file.seek(self._start)
+        self._file.truncate()
+        self._offset = self._start
+        self._sections = OrderedDict()
+        self._name = None
+        self._pending = []
+        self._pending_size = 0
+        self.raw_bytes = 0
+
+    def _recover(self):
+        """Where the report goes, and the trailer of the last one."""
+        self._file.seek(0, os.SEEK_END)
+        size = self._file.tell()
+        if size < len(HEADER):
+            self._file.seek(0)
+            self._file.truncate()
+            self._file.write(HEADER)
+            return len(HEADER), None
+        buf = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+        try:
+            if buf[:len(HEADER)] != HEADER:
+                raise ArchiveError("{0} is not a report archive".format(
+                    self.path))
+            end, index = _last_trailer(buf, size)
+        finally:
+            buf.close()
+        if end != size:
+            cc_logger.info("Dropping {0} bytes of an unfinished report "
+                           "from {1}".format(size - end, self.path))
+        return end, (end - TRAILER.size if index is not None else None)
+
+    def write(self, name, text):
+        if not text:
+            return
+        if name != self._name:
+            self._flush()
+            self._name = name
+            self._sections.setdefault(name, [])
+        data = text.encode('utf-8')
+        self._pending.append(data)
+        self._pending_size += len(data)
+        if self._pending_size >= self.block_size:
+            self._flush(whole=False)
+
+    def _flush(self, whole=True):
+        """Write the pending text out in blocks, all of it if `whole`."""
+        if not self._pending:
+            return
+        raw = b"".join(self._pending)
+        end = len(raw) if whole else len(raw) - len(raw) % self.block_size
+        for start in range(0, end, self.block_size):
+            self._write_block(raw[start:start + self.block_size])
+        rest = raw[end:]
+        self._pending = [rest] if rest else []
+        self._pending_size = len(rest)
+
+    def _write_block(self, raw):
+        block = zlib.compress(raw, self.level)
+        self._file.write(block)
+        self._sections[self._name].append([self._offset, len(block),
+                                           len(raw)])
+        self._offset += len(block)
+        self.raw_bytes += len(raw)
+
+    def close(self, **meta):
+        """Write the index and trailer, `meta` is kept in the index."""
+        try:
+            self._flush()
+            index = zlib.compress(json.dumps({
+                'time': time.time(),
+                'previous': self._previous,
+                'sections': self._sections,
+                'meta': meta,
+            }).encode('utf-8'), self.level)
+            self._file.write(index)
+            self._file.write(TRAILER.pack(TRAILER_MAGIC, self._offset,
+                                          len(index)))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        finally:
+            self._release()
+
+    def abort(self):
+        """Drop the report being written."""
+        try:
+            self._file.seek(self._start)
+            self._file.truncate()
+        finally:
+            self._release()
+
+    def _release(self):
+        if self._file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+
+class ArchivedReport(object):
+    """Where the sections of one archived report are."""
+
+    def __init__(self, archive, index):
+        self.archive = archive
+        self.time = index['time']
+        self.meta = index.get('meta', {})
+        self.blocks = index['sections']
+
+    @property
+    def section_names(self):
+        return list(self.blocks)
+
+    @property
+    def raw_bytes(self):
+        return sum(block[2] for blocks in self.blocks.values()
+                   for block in blocks)
+
+    def text(self, name):
+        """The raw JSON text of section `name`."""
+        try:
+            blocks = self.blocks[name]
+        except KeyError:
+            raise ArchiveError("Archived report has no '{0}' section".format(
+                name))
+        buf = self.archive.buf
+        try:
+            return b"".join(zlib.decompress(buf[offset:offset + size])
+                            for offset, size, _ in blocks).decode('utf-8')
+        except zlib.error as err:
+            raise ArchiveError("Section '{0}' of {1} is damaged: {2}".format(
+                name, self.archive.path, err))
+
+    def section(self, name):
+        """Section `name`, decoded."""
+        return json.loads(self.text(name))
+
+    def sections(self, names=None):
+        """The sections called `names` it has, all by default, by name."""
+        if names is None:
+            names = self.section_names
+        return dict((name, self.section(name)) for name in names
+                    if name in self.blocks)
+
+
+class ReportArchive(object):
+    """
+    The reports of the archive at `path`, oldest first.
+
+    The file is mapped into memory, only the indexes are read up front.
+    Reports being written meanwhile are not seen.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < len(HEADER):
+                raise ArchiveError("{0} is not a report archive".format(path))
+            self.buf = mmap.mmap(self._file.fileno(), size,
+                                 access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        if self.buf[:len(HEADER)] != HEADER:
+            self.close()
+            raise ArchiveError("{0} is not a report archive".format(path))
+        self.reports = self._read_indexes(size)
+
+    def _read_indexes(self, size):
+        reports = []
+        end, index = _last_trailer(self.buf, size)
+        while index is not None:
+            reports.append(ArchivedReport(self, index))
+            trailer = index.get('previous')
+            if trailer is None:
+                break
+            _, offset, length = TRAILER.unpack_from(self.buf, trailer)
+            index = json.loads(zlib.decompress(
+                self.buf[offset:offset + length]).decode('utf-8'))
+        reports.reverse()
+        return reports
+
+    def __len__(self):
+        return len(self.reports)
+
+    def __getitem__(self, number):
+        try:
+            return self.reports[number]
+        except IndexError:
+            raise ArchiveError("{0} has no report {1}, it holds {2}".format(
+                self.path, number, len(self.reports)))
+
+    def close(self):
+        self.buf.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
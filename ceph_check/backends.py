@@ -0,0 +1,457 @@
+# -*- coding: utf-8 -*-
+
+"""
+Ways of sending commands to the monitors.
+
+`SubprocessBackend` forks `/usr/bin/ceph` for every command, paying for
+interpreter startup, the cephx handshake and the mon hunt each time.
+`RadosBackend` keeps one librados connection open and sends every
+command over it with `mon_command`. Both take `mon_command` style dicts
+and return the JSON output as bytes.
+
+`HedgedBackend` runs the CLI against several monitors at once, and
+takes the first answer, so a dead or slow monitor costs little.
+
+`ReplayCluster` stands in for `rados.Rados` and answers from recorded
+responses, so the librados path can be exercised without a cluster.
+`RecordingBackend` writes those responses out from a live run.
+"""
+
+import errno
+import json
+import logging
+import os
+import select
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    import subprocess32 as subprocess
+except ImportError:
+    import subprocess
+
+from ceph_check.fetch import DEFAULT_TIMEOUT, FetchError, command_argv
+
+cc_logger = logging.getLogger("ceph_check")
+
+# Bytes read from the `ceph` CLI per chunk when streaming.
+READ_SIZE = 1 << 16
+
+# Monitors a hedged command is first sent to, and the seconds to wait
+# for an answer before sending it to one more.
+DEFAULT_HEDGE = 2
+DEFAULT_HEDGE_DELAY = 1.0
+
+
+class CommandTimeout(FetchError):
+    """Raised when the monitors do not answer in time."""
+
+
+def command_key(command):
+    """A file-name friendly key for a command, e.g. `pg_dump_pgs_brief`."""
+    return "_".join(command_argv(command)[:-2])
+
+
+class Backend(object):
+    """Sends `mon_command` style dicts to the cluster."""
+
+    def command(self, command, timeout=DEFAULT_TIMEOUT):
+        """Run `command` and return its JSON output."""
+        raise NotImplementedError
+
+    def stream(self, command, timeout=DEFAULT_TIMEOUT):
+        """
+        Yield the output of `command` in chunks as it arrives.
+
+        Backends that cannot stream yield the whole output at once.
+        """
+        yield self.command(command, timeout)
+
+    def set_monitors(self, addresses):
+        """Learn the monitor addresses, e.g. from a fetched monmap."""
+
+    def close(self):
+        pass
+
+
+class SubprocessBackend(Backend):
+    """Runs every command through the `ceph` CLI."""
+
+    def __init__(self, ceph_bin, extra_args=()):
+        self.ceph_bin = ceph_bin
+        self.extra_args = list(extra_args)
+
+    def argv(self, command, extra_args=()):
+        return ([self.ceph_bin] + self.extra_args + list(extra_args) +
+                command_argv(command))
+
+    def start(self, command, extra_args=()):
+        """Start the `ceph` CLI running `command`, returns the process."""
+        return subprocess.Popen(self.argv(command, extra_args),
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+
+    def finish(self, proc, command, timeout=DEFAULT_TIMEOUT):
+        """Wait for `proc` running `command` and return its output."""
+        try:
+            out, err = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            raise CommandTimeout("'{0}' timed out after {1} seconds".format(
+                command['prefix'], timeout))
+        if proc.returncode != 0:
+            raise FetchError("'{0}' failed: {1}".format(
+                command['prefix'], err.decode('utf-8', 'replace').strip()))
+        return out
+
+    def command(self, command, timeout=DEFAULT_TIMEOUT):
+        return self.finish(self.start(command), command, timeout)
+
+    def stream(self, command, timeout=DEFAULT_TIMEOUT):
+        """
+        Yield the command output as it arrives.
+
+        `timeout` applies to the gaps between chunks, so a large but
+        steady transfer is not cut short while a stuck monitor is.
+        """
+        return self.follow(self.start(command), command, timeout)
+
+    def follow(self, proc, command, timeout=DEFAULT_TIMEOUT):
+        """Yield the output of `proc` as `stream()` does."""
+        try:
+            fd = proc.stdout.fileno()
+            while True:
+                ready, _, _ = select.select([fd], [], [], timeout)
+                if not ready:
+                    raise CommandTimeout(
+                        "'{0}' sent nothing for {1} seconds".format(
+                            command['prefix'], timeout))
+                chunk = os.read(fd, READ_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+            if proc.wait() != 0:
+                raise FetchError("'{0}' failed: {1}".format(
+                    command['prefix'],
+                    proc.stderr.read().decode('utf-8', 'replace').strip()))
+        finally:
+            _reap(proc)
+
+
+def _reap(proc):
+    if proc.poll() is None:
+        proc.kill()
+    proc.wait()
+    proc.stdout.close()
+    proc.stderr.close()
+
+
+class HedgedBackend(SubprocessBackend):
+    """
+    Runs every command through the `ceph` CLI, on several monitors.
+
+    A command goes to `hedge` monitors at once with `-m`, then to one
+    more every `hedge_delay` seconds, or as soon as one fails, until one
+    answers. The first answer is used and the other commands are killed.
+    Monitors that answered recently are asked first, monitors that
+    failed last. Without `addresses` commands go to any monitor, as
+    with `SubprocessBackend`.
+    """
+
+    def __init__(self, ceph_bin, addresses=(), hedge=DEFAULT_HEDGE,
+                 hedge_delay=DEFAULT_HEDGE_DELAY, extra_args=()):
+        super(HedgedBackend, self).__init__(ceph_bin, extra_args)
+        self.hedge = max(1, hedge)
+        self.hedge_delay = hedge_delay
+        self._lock = threading.Lock()
+        # Failures since the last answer, by address.
+        self._failures = {}
+        self._order = []
+        self.set_monitors(addresses)
+
+    def set_monitors(self, addresses):
+        with self._lock:
+            known = [address for address in self._order
+                     if address in addresses]
+            self._order = known + [address for address in addresses
+                                   if address not in known]
+
+    def monitors(self):
+        """The monitor addresses, in the order they are tried."""
+        with self._lock:
+            return sorted(self._order,
+                          key=lambda address: self._failures.get(address, 0))
+
+    def _answered(self, address):
+        with self._lock:
+            self._failures.pop(address, None)
+            if address in self._order:
+                self._order.remove(address)
+                self._order.insert(0, address)
+
+    def _failed(self, address, err):
+        cc_logger.info("Monitor {0} failed : {1}".format(address, err))
+        with self._lock:
+            self._failures[address] = self._failures.get(address, 0) + 1
+
+    def command(self, command, timeout=DEFAULT_TIMEOUT):
+        addresses = self.monitors()
+        if not addresses:
+            return super(HedgedBackend, self).command(command, timeout)
+        answers = queue.Queue()
+        procs = []
+        errors = []
+
+        def launch():
+            address = addresses[len(procs)]
+            proc = self.start(command, ['-m', address])
+            procs.append(proc)
+
+            def wait():
+                try:
+                    answers.put((address, self.finish(proc, command, timeout),
+                                 None))
+                except FetchError as err:
+                    answers.put((address, None, err))
+            thread = threading.Thread(target=wait)
+            thread.daemon = True
+            thread.start()
+
+        deadline = time.time() + timeout
+        try:
+            while len(procs) < min(self.hedge, len(addresses)):
+                launch()
+            while len(errors) < len(procs):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                if len(procs) < len(addresses):
+                    remaining = min(remaining, self.hedge_delay)
+                try:
+                    address, out, err = answers.get(timeout=remaining)
+                except queue.Empty:
+                    if len(procs) < len(addresses):
+                        launch()
+                    continue
+                if err is None:
+                    self._answered(address)
+                    return out
+                self._failed(address, err)
+                errors.append(err)
+                if len(procs) < len(addresses):
+                    launch()
+        finally:
+            for proc in procs:
+                if proc.poll() is None:
+                    proc.kill()
+        if not errors or all(isinstance(err, CommandTimeout)
+                             for err in errors):
+            raise CommandTimeout("'{0}' got no answer from {1} monitors in "
+                                 "{2} seconds".format(command['prefix'],
+                                                      len(procs), timeout))
+        raise errors[-1]
+
+    def stream(self, command, timeout=DEFAULT_TIMEOUT):
+        """
+        Yield the command output as it arrives, from the first monitor
+        to send any.
+
+        `timeout` applies to the gaps between chunks, as with
+        `SubprocessBackend.stream()`.
+        """
+        addresses = self.monitors()
+        if not addresses:
+            for chunk in super(HedgedBackend, self).stream(command, timeout):
+                yield chunk
+            return
+        running = {}
+        errors = []
+        winner = None
+        first = None
+        launched = [0]
+
+        def launch():
+            address = addresses[launched[0]]
+            launched[0] += 1
+            proc = self.start(command, ['-m', address])
+            running[proc.stdout.fileno()] = (address, proc)
+
+        deadline = time.time() + timeout
+        try:
+            while launched[0] < min(self.hedge, len(addresses)):
+                launch()
+            while running:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                more = launched[0] < len(addresses)
+                ready, _, _ = select.select(
+                    list(running), [], [],
+                    min(remaining, self.hedge_delay) if more else remaining)
+                if not ready:
+                    if more:
+                        launch()
+                    continue
+                address, proc = running.pop(ready[0])
+                chunk = os.read(ready[0], READ_SIZE)
+                if chunk:
+                    winner, first = (address, proc), chunk
+                    break
+                proc.wait()
+                err = FetchError("'{0}' failed: {1}".format(
+                    command['prefix'],
+                    proc.stderr.read().decode('utf-8', 'replace').strip()))
+                _reap(proc)
+                self._failed(address, err)
+                errors.append(err)
+                if launched[0] < len(addresses):
+                    launch()
+        finally:
+            for _, proc in running.values():
+                _reap(proc)
+        if winner is None:
+            if errors and len(errors) == launched[0]:
+                raise errors[-1]
+            raise CommandTimeout("'{0}' got no answer from {1} monitors in "
+                                 "{2} seconds".format(command['prefix'],
+                                                      launched[0], timeout))
+        self._answered(winner[0])
+        try:
+            yield first
+            for chunk in self.follow(winner[1], command, timeout):
+                yield chunk
+        finally:
+            _reap(winner[1])
+
+
+class RadosBackend(Backend):
+    """
+    Sends every command over one long-lived librados connection.
+
+    The connection is made on first use. `cluster` replaces the
+    `rados.Rados` handle, e.g. with a `ReplayCluster`.
+    """
+
+    def __init__(self, conffile=None, keyring=None, name='client.admin',
+                 connect_timeout=DEFAULT_TIMEOUT, cluster=None):
+        self.conffile = conffile
+        self.keyring = keyring
+        self.name = name
+        self.connect_timeout = connect_timeout
+        self._cluster = cluster
+        # A handle made here cannot connect again once shut down.
+        self._owned = cluster is None
+        self._connected = False
+        self._lock = threading.Lock()
+
+    def connect(self):
+        with self._lock:
+            if self._connected:
+                return self._cluster
+            if self._cluster is None:
+                try:
+                    import rados
+                except ImportError:
+                    raise FetchError(
+                        "The `rados` Python binding is not installed, "
+                        "install python-rados or use the CLI backend")
+                conf = {'keyring': self.keyring} if self.keyring else {}
+                self._cluster = rados.Rados(conffile=self.conffile,
+                                            name=self.name, conf=conf)
+            cc_logger.info("Connecting to the cluster over librados")
+            try:
+                self._cluster.connect(timeout=self.connect_timeout)
+            except Exception as err:
+                raise FetchError("Cannot connect to the cluster: {0}".format(
+                    err))
+            self._connected = True
+            return self._cluster
+
+    def command(self, command, timeout=DEFAULT_TIMEOUT):
+        cluster = self.connect()
+        ret, out, status = cluster.mon_command(
+            json.dumps(dict(command, format='json')), b'', timeout=timeout)
+        if ret == -errno.ETIMEDOUT:
+            raise CommandTimeout("'{0}' timed out after {1} seconds".format(
+                command['prefix'], timeout))
+        if ret != 0:
+            raise FetchError("'{0}' failed ({1}): {2}".format(
+                command['prefix'], ret, status))
+        return out
+
+    def close(self):
+        with self._lock:
+            if self._connected:
+                self._cluster.shutdown()
+                self._connected = False
+                if self._owned:
+                    self._cluster = None
+
+
+class ReplayCluster(object):
+    """
+    A `rados.Rados` stand-in answering from recorded responses.
+
+    `responses` maps `command_key()`s to JSON bytes. `connect_latency`
+    and `latency` add the cost of the initial handshake and of each
+    command, to benchmark against the CLI backend.
+    """
+
+    def __init__(self, responses, latency=0.0, connect_latency=0.0):
+        self.responses = responses
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.commands = []
+
+    @classmethod
+    def from_directory(cls, path, **kwargs):
+        """Load responses saved as `<command_key>.json` by a recording."""
+        responses = {}
+        for name in os.listdir(path):
+            if name.endswith('.json'):
+                with open(os.path.join(path, name), 'rb') as obj:
+                    responses[name[:-len('.json')]] = obj.read()
+        return cls(responses, **kwargs)
+
+    def connect(self, timeout=0):
+        time.sleep(self.connect_latency)
+
+    def mon_command(self, cmd, inbuf, timeout=0, target=None):
+        key = command_key(json.loads(cmd))
+        self.commands.append(key)
+        time.sleep(self.latency)
+        if key not in self.responses:
+            return -errno.EINVAL, b'', "no recorded response for " + key
+        return 0, self.responses[key], ''
+
+    def shutdown(self):
+        pass
+
+
+class RecordingBackend(Backend):
+    """Passes commands on to `backend`, saving each response to `path`."""
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def command(self, command, timeout=DEFAULT_TIMEOUT):
+        out = self.backend.command(command, timeout)
+        with open(os.path.join(self.path, command_key(command) + '.json'),
+                  'wb') as obj:
+            obj.write(out)
+        return out
+
+    def set_monitors(self, addresses):
+        self.backend.set_monitors(addresses)
+
+    def close(self):
+        self.backend.close()
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+"""
+Run the checks over saved `ceph report` dumps, offline.
+
+Each report is decoded and checked in a worker process of its own, the
+reports are independent so throughput grows with the number of cores.
+The results come back in one stream, a report at a time as soon as its
+checks are done.
+
+Nothing talks to a cluster here, checks needing external data (host
+facts over SSH and the like) are left out.
+"""
+
+import glob
+import logging
+import os
+import sys
+import time
+
+from ceph_check import archive
+from ceph_check import checks as cc_checks
+from ceph_check import fetch
+from ceph_check import findings
+from ceph_check import logs
+from ceph_check import scheduler
+from ceph_check.report import ReportError, ReportSnapshot
+
+cc_logger = logging.getLogger("ceph_check")
+
+# Names saved reports are found by in a directory.
+REPORT_SUFFIXES = ('.json', '.json.gz', '.json.zst', '.json.zstd',
+                   archive.SUFFIX)
+
+
+def find_reports(inputs):
+    """The report files in `inputs`, directories or glob patterns."""
+    paths = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            found = [os.path.join(pattern, name)
+                     for name in os.listdir(pattern)
+                     if name.endswith(REPORT_SUFFIXES)]
+        else:
+            found = glob.glob(pattern)
+        paths.extend(path for path in sorted(found) if path not in paths)
+    return paths
+
+
+def offline_checks(names=None):
+    """The selected checks that only read the report."""
+    return [check for check in cc_checks.select(names) if not check.needs]
+
+
+class ReportAudit(object):
+    """The check results for one saved report."""
+
+    def __init__(self, path, results=(), error=None, elapsed=0.0):
+        self.path = path
+        self.results = list(results)
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None and all(
+            result.ok for result in self.results)
+
+
+def audit_report(path, names=None, options=None):
+    """Decode the report at `path` and run the offline checks on it."""
+    start = time.time()
+    checks = offline_checks(names)
+    sections = fetch.report_sections(cc_checks.sections_for(checks))
+    try:
+        snapshot = ReportSnapshot.from_file(path, sections).compact()
+    except (ReportError, IOError, OSError) as err:
+        return ReportAudit(path, error=str(err), elapsed=time.time() - start)
+    # The pool already keeps every core busy.
+    results = scheduler.run_checks(checks, snapshot, options=options,
+                                   max_workers=1)
+    return ReportAudit(path, results, elapsed=time.time() - start)
+
+
+def audit_reports(paths, names=None, processes=None, options=None):
+    """
+    Audit `paths` in `processes` worker processes, all cores by default.
+    `options` are the settings of the checks.
+
+    Yields a `ReportAudit` per report, in the order they finish.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    # The workers log to the same sinks, each through its own queue.
+    settings = logs.settings()
+    initializer = logs.configure_worker if settings else None
+    with ProcessPoolExecutor(max_workers=processes, initializer=initializer,
+                             initargs=settings or ()) as pool:
+        futures = [pool.submit(audit_report, path, names, options)
+                   for path in paths]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def print_audit(audit, out=None, output_format='text'):
+    """
+    Write one report's results to `out`, standard output by default.
+
+    In the JSON formats, the findings and documents carry the report's
+    path as `report`, an unreadable report is a failed `report` check.
+    """
+    out = out or sys.stdout
+    if output_format != 'text':
+        results = audit.results
+        if audit.error is not None:
+            results = [scheduler.CheckResult('report', u"", audit.error)]
+        findings.make_renderer(output_format, out,
+                               extra={'report': audit.path}).finish(results)
+        return
+    out.write("\n===== {0} ({1:.2f}s) =====\n".format(audit.path,
+                                                      audit.elapsed))
+    if audit.error is not None:
+        out.write("Unreadable report : {0}\n".format(audit.error))
+        return
+    findings.TextRenderer(out).finish(audit.results)
+
+
+def run(inputs, names=None, processes=None, options=None,
+        output_format='text'):
+    """
+    Audit the reports in `inputs` and print the results as they come, in
+    `output_format` (see `ceph_check.findings`).
+
+    Returns the exit status, 0 when every check passed on every report.
+    """
+    paths = find_reports(inputs)
+    if not paths:
+        print("No reports found in {0}".format(", ".join(inputs)))
+        return -1
+    cc_logger.info("Auditing {0} reports".format(len(paths)))
+    status = 0
+    for audit in audit_reports(paths, names, processes, options):
+        print_audit(audit, output_format=output_format)
+        sys.stdout.flush()
+        if not audit.ok:
+            status = 1
+    return status
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+"""
+On-disk cache of report sections, keyed by cluster map epochs.
+
+Every map the monitors hand out carries an epoch (the pgmap a version),
+and a given epoch of a map never changes. A `ceph status` is cheap and
+lists the current epochs, so running it first tells which cached
+sections are still current and which ones must be fetched again.
+
+Entries live under `<cache dir>/<fsid>/` as one JSON file per section
+and epoch. Sections without an epoch (health) are never cached, neither
+are pgmap sections on releases whose `status` omits the pgmap version.
+"""
+
+import json
+import logging
+import os
+import time
+
+cc_logger = logging.getLogger("ceph_check")
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+# The cheap command listing the current epochs.
+PROBE_COMMAND = {'prefix': 'status'}
+
+# The map whose epoch decides whether a cached section is current.
+SECTION_EPOCHS = {
+    'monmap': 'monmap',
+    'osdmap': 'osdmap',
+    'crushmap': 'osdmap',
+    'pgmap': 'pgmap',
+    'pg_dump': 'pgmap',
+    'pool_stats': 'pgmap',
+    'osd_df': 'pgmap',
+    # OSDs report new metadata when they boot, which is a new osdmap.
+    'osd_metadata': 'osdmap',
+    'fsmap': 'fsmap',
+    'servicemap': 'servicemap',
+}
+
+
+def default_path():
+    """`$XDG_CACHE_HOME/ceph_check`, or `~/.cache/ceph_check`."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'ceph_check')
+
+
+def epochs_from_status(status):
+    """
+    The fsid and map epochs in a `ceph status`.
+
+    Maps the release does not report are None.
+    """
+    osdmap = status.get('osdmap', {})
+    # Before Nautilus the osdmap summary is nested one level deeper.
+    osdmap = osdmap.get('osdmap', osdmap)
+    return {
+        'fsid': status.get('fsid'),
+        'monmap': status.get('monmap', {}).get('epoch'),
+        'osdmap': osdmap.get('epoch'),
+        'pgmap': status.get('pgmap', {}).get('version'),
+        'fsmap': status.get('fsmap', {}).get('epoch'),
+        'servicemap': status.get('servicemap', {}).get('epoch'),
+    }
+
+
+class ReportCache(object):
+    """
+    Report sections saved per fsid and map epoch.
+
+    Entries not used for `max_age` seconds are dropped, then the least
+    recently used ones until the cache fits in `max_bytes`.
+    """
+
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES,
+                 max_age=DEFAULT_MAX_AGE):
+        self.path = path or default_path()
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def _entry(self, section, epochs):
+        """Path of the cache file for `section`, None if not cacheable."""
+        epoch_map = SECTION_EPOCHS.get(section)
+        if epoch_map is None or not epochs.get('fsid'):
+            return None
+        epoch = epochs.get(epoch_map)
+        if epoch is None:
+            return None
+        return os.path.join(self.path, epochs['fsid'],
+                            "{0}.{1}-{2}.json".format(section, epoch_map,
+                                                      epoch))
+
+    def cacheable(self, section, epochs):
+        return self._entry(section, epochs) is not None
+
+    def get(self, section, epochs):
+        """The cached `section` at `epochs`, or None."""
+        path = self._entry(section, epochs)
+        if path is None:
+            return None
+        try:
+            with open(path) as obj:
+                value = json.load(obj)
+        except (IOError, OSError):
+            return None
+        except ValueError:
+            cc_logger.info("Dropping unreadable cache entry {0}".format(path))
+            self._remove(path)
+            return None
+        os.utime(path, None)
+        return value
+
+    def lookup(self, sections, epochs):
+        """The cached ones among `sections`, by name."""
+        found = {}
+        for section in sections:
+            value = self.get(section, epochs)
+            if value is not None:
+                found[section] = value
+        if found:
+            cc_logger.info("Cache hits : {0}".format(", ".join(sorted(found))))
+        return found
+
+    def put(self, section, epochs, value):
+        """Cache `section` at `epochs`, replacing its older epochs."""
+        path = self._entry(section, epochs)
+        if path is None:
+            return
+        directory, name = os.path.split(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        prefix = name.split('-', 1)[0] + '-'
+        for old in os.listdir(directory):
+            if old.startswith(prefix) and old != name:
+                self._remove(os.path.join(directory, old))
+        tmp = "{0}.{1}.tmp".format(path, os.getpid())
+        with open(tmp, 'w') as obj:
+            json.dump(value, obj)
+        os.rename(tmp, path)
+
+    def evict(self, now=None):
+        """Apply the age and size limits, returning the files removed."""
+        now = time.time() if now is None else now
+        entries = []
+        for root, _, names in os.walk(self.path):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = []
+        for mtime, size, path in entries:
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            self._remove(path)
+            removed.append(path)
+            total -= size
+        if removed:
+            cc_logger.info("Evicted {0} cache entries".format(len(removed)))
+        return removed
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -7,301 +7,419 @@
 from __future__ import print_function
 import time
 import os
-import sys
 import json
+import sys
 import getpass
 import logging
-import logging.handlers
-import tempfile
+from ceph_check import backends
+from ceph_check import cache as cc_cache
+from ceph_check import checks as cc_checks
+from ceph_check import fetch
+from ceph_check import findings
+from ceph_check import logs
+from ceph_check import metrics
+from ceph_check import monitors
+from ceph_check import scheduler
+from ceph_check.report import ReportError, ReportSnapshot
 try:
     import configparser
 except ImportError:
     import ConfigParser as configparser
-
-# We need the `timeout` feature in python3 subprocess module.
-# This will need a `pip install subprocess32`.
-try:
-    import subprocess32
-except ImportError:
-    print("`ceph_check` requires `subprocess32` to function properly")
-    print("`subprocess32` module required! Exiting.")
-    sys.exit(-1)
-"""
 try:
-    if os.name == 'posix' and sys.version_info[0] < 3:
-        import subprocess32 as subprocess
-    else:
-        import subprocess
+    from importlib.util import find_spec
 except ImportError:
-    print("\n`ceph_check` requires `subprocess32` to function properly.\n")
-    print("If you're on Python v2, use `pip` to install `subprocess32`.\n")
-    print("# pip install subprocess32\n")
-    print("Exiting!\n")
-    sys.exit(-1)
-"""
+    from pkgutil import find_loader as find_spec
+
 CONF_FILE = "/etc/ceph/ceph.conf"
 ADMIN_KEYRING = "/etc/ceph/ceph.client.admin.keyring"
+CEPH_BIN = "/usr/bin/ceph"
 
-# `logging` MODULE CONFIG to use rsyslog ###
-# 1. Set the application name (override the default `root` logger)
+# Set up at startup by `logs.configure()`, see ceph_check/logs.py.
 cc_logger = logging.getLogger("ceph_check")
-cc_logger.setLevel(logging.DEBUG)
-# 2. Set a Log handler to log to /var/log/messages
-# NOTE: rsyslog won't handle multiline properly (exceptions here)
-# Add `$EscapeControlCharactersOnReceive off` in /etc/rsyslog.conf to fix
-handler = logging.handlers.SysLogHandler(address='/dev/log')
-# 3. Set up a log format
-log_format = logging.Formatter('%(name)s: %(levelname)-2s: %(message)s')
-# 4. Pass the log format to the log handler
-handler.setFormatter(log_format)
-# 5. Add the log handler to the logger object `cc_logger`
-cc_logger.addHandler(handler)
-# LOGGING MODULE CONFIG END ###
 
 
 class CephCheck(object):
     """The main ceph-check class"""
 
-    def __init__(self, conffile, keyring):
+    def __init__(self, conffile, keyring, save_report=None, ceph_bin=CEPH_BIN,
+                 checks=None, workers=scheduler.DEFAULT_WORKERS,
+                 full_report=False, concurrency=fetch.DEFAULT_CONCURRENCY,
+                 timeout=fetch.DEFAULT_TIMEOUT, backend=None, cache=None,
+                 interval=None, ssh=None, recorder=None, metrics_json=None,
+                 metrics_prom=None, backoff=None, options=None,
+                 output_format='text', archive=None, trends=None):
         self.conffile = conffile
         self.keyring = keyring
+        self.save_report = save_report
+        # Archive the reports are appended to, see `ceph_check.archive`.
+        self.archive = archive
+        self.ceph_bin = ceph_bin
+        # How commands reach the monitors, see `ceph_check.backends`.
+        self.backend = backend or backends.SubprocessBackend(ceph_bin)
+        # When failed commands are retried, see `ceph_check.monitors`.
+        self.backoff = backoff or monitors.Backoff()
+        self.checks = cc_checks.select(checks)
+        # Settings of the checks, e.g. `journal_limits`.
+        self.options = options or {}
+        # How the results are written, see `ceph_check.findings`.
+        self.output_format = output_format
+        self.workers = workers
+        # Saving the report needs the whole of it.
+        self.full_report = full_report or bool(save_report or archive)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        # Sections read by the selected checks, only these are fetched.
+        self.sections = cc_checks.sections_for(self.checks)
+        # The same as top-level `ceph report` sections, everything else
+        # is skipped while a full report is parsed.
+        self.report_sections = fetch.report_sections(self.sections)
+        # A `ceph_check.cache.ReportCache`, or None to always fetch.
+        self.cache = cache
+        # A `ceph_check.trends.TrendStore` every snapshot is recorded in,
+        # or None.
+        self.trends = trends
+        # Seconds between rounds when polling, None for a single run.
+        self.interval = interval
+        # Gathers the host facts for the `ssh` check.
+        if ssh is None:
+            from ceph_check import hostfacts
+            ssh = hostfacts.SSHCollector()
+        self.ssh = ssh
+        # External data the checks `need`, see `ceph_check.scheduler`.
+        self.providers = {'host_facts': self.collect_host_facts,
+                          'trends': self.project_trends}
+        # Where the timings of each run are written, see
+        # `ceph_check.metrics`.
+        self.metrics_json = metrics_json
+        self.metrics_prom = metrics_prom
+        if recorder is None:
+            recorder = metrics.Recorder() if (
+                metrics_json or metrics_prom) else metrics.NullRecorder()
+        self.recorder = recorder
 
     def cc_condition(self):
         """
         Conditions for a successful execution of `ceph_check`
         1. Ansible installed.
         2. Read-only access to the admin keyring.
-        2. Password-less SSH to the cluster nodes.
+        2. Password-less SSH to the cluster nodes, see the `ssh` check.
+
+        Returns True when they are met.
         """
         cc_logger.info("#" * 20)
         cc_logger.info("Starting ceph_check")
         cc_logger.info("Calling check_ansible()")
-        self.check_ansible()
+        if not self.check_ansible():
+            return False
         cc_logger.info("Calling check_keyring()")
-        self.check_keyring()
+        keyring = self.check_keyring()
+        return keyring is not None and self.keyring_permission(keyring)
 
-    def check_ansible(self):
+    def run(self):
+        """
+        Check the conditions, fetch the report and run the checks.
+
+        Returns the process exit status.
+        """
+        if not self.cc_condition():
+            cc_logger.info("Exiting!")
+            print("\nExiting!\n")
+            return -1
+        if self.interval:
+            return self.watch()
         try:
-            cc_logger.info("Trying to load the Ansible module")
-            import ansible
-            cc_logger.info("`ansible` module loaded, package installed.")
-        except ImportError as err:
-            cc_logger.exception(err)
-            print("Exception - {0}".format(err))
-            print("\nAnsible not installed. Install and re-run `ceph_check`.")
-            sys.exit(-1)
+            try:
+                snapshot = self.fetch_snapshot()
+            finally:
+                self.backend.close()
+            if snapshot is None:
+                return -1
+            results = self.run_checks(snapshot)
+            return 0 if all(result.ok for result in results) else 1
+        finally:
+            self.export_metrics()
+            self.recorder.close()
+
+    def watch(self, rounds=None):
+        """
+        Fetch and check every `interval` seconds, until interrupted.
+
+        Only the checks reading a section that changed since the previous
+        round are run again, see `ceph_check.incremental`. `rounds` stops
+        after that many rounds. Returns the status of the last round.
+
+        The rounds are those of `ceph_check.daemon`, serving nothing.
+        """
+        from ceph_check import daemon
+        return daemon.Daemon(self, None, self.interval, self.interval,
+                             output_format=self.output_format).loop(rounds)
+
+    def run_checks(self, snapshot):
+        """
+        Run the selected checks and write their results out, in
+        `output_format`.
+        """
+        cc_logger.info("Running checks : {0}".format(
+            [check.name for check in self.checks]))
+        renderer = findings.make_renderer(self.output_format)
+        results = scheduler.run_checks(self.checks, snapshot, self.providers,
+                                       self.options, max_workers=self.workers,
+                                       on_result=renderer.result,
+                                       recorder=self.recorder,
+                                       on_finding=renderer.finding)
+        renderer.finish(results)
+        return results
+
+    def export_metrics(self):
+        """Write the timings of the run to the metrics files, if any."""
+        metrics.export(self.recorder, self.metrics_json, self.metrics_prom)
+
+    def collect_host_facts(self, snapshot):
+        """Facts from every MON and OSD host, see `ceph_check.hostfacts`."""
+        from ceph_check import hostfacts
+        return self.ssh.collect(hostfacts.cluster_hosts(snapshot))
+
+    def project_trends(self, snapshot):
+        """
+        When the cluster of `snapshot` fills up at its recorded rate, see
+        `ceph_check.trends`. None without a trend store, or when it
+        cannot be read.
+        """
+        if self.trends is None:
+            return None
+        from ceph_check import trends
+        try:
+            return self.trends.projections(
+                trends.snapshot_fsid(snapshot) or 'unknown')
+        except trends.TrendError as err:
+            cc_logger.info("Cannot project the trends : {0}".format(err))
+            return None
+
+    def check_ansible(self):
+        """Whether Ansible is installed, found without importing it."""
+        cc_logger.info("Looking for the Ansible module")
+        if find_spec("ansible") is not None:
+            cc_logger.info("`ansible` module found, package installed.")
+            return True
+        cc_logger.info("`ansible` module not found")
+        print("\nAnsible not installed. Install and re-run `ceph_check`.")
+        return False
 
     def check_keyring(self):
         """
         Check if a custom keyring exists
+
+        Returns the keyring to use, or None if there is none.
         """
-        config_file = ConfigParser.SafeConfigParser()
-        cc_logger.info("Reading '{0}'".format(CONF_FILE))
+        config_file = configparser.ConfigParser()
+        cc_logger.info("Reading '{0}'".format(self.conffile))
         config_file.read(self.conffile)
         cc_logger.info(
-            "Checking custom admin keyring in {0}".format(CONF_FILE))
+            "Checking custom admin keyring in {0}".format(self.conffile))
         try:
             keyring_custom = config_file.get('global', 'keyring')
             cc_logger.info(
                 "Found custom admin keyring at {0}".format(keyring_custom))
-            self.keyring_permission(keyring_custom)
-        except ConfigParser.NoOptionError:
+            return keyring_custom
+        except (configparser.NoSectionError, configparser.NoOptionError):
             cc_logger.info(
                 "No custom admin keyring specified in %s" % self.conffile)
-            # cc_logger.info("Falling back to %s" % self.keyring)
             cc_logger.info("Trying {0}".format(self.keyring))
             if os.path.isfile(self.keyring):
                 cc_logger.info("{0} exists".format(self.keyring))
-                cc_logger.info("Calling keyring_permission()")
-                self.keyring_permission(self.keyring)
-            else:
-                cc_logger.info(
-                    "Cannot find admin keyring at {0}".format(self.keyring))
-                print("Cannot find admin keyring at {0}".format(
-                    self.keyring))
-                print("\nThis is ideally hit when:\n")
-                print("a. The admin keyring {0} is missing.".format(
-                    self.keyring))
-                print(
-                    "b. A custom keyring exists but is not mentioned in {0}".format(CONF_FILE))
-                print("\nFix the problem and re-run!")
-                cc_logger.info("Exiting!")
-                print("\nExiting!\n")
-                sys.exit()
+                return self.keyring
+            cc_logger.info(
+                "Cannot find admin keyring at {0}".format(self.keyring))
+            print("Cannot find admin keyring at {0}".format(
+                self.keyring))
+            print("\nThis is ideally hit when:\n")
+            print("a. The admin keyring {0} is missing.".format(
+                self.keyring))
+            print("b. A custom keyring exists but is not mentioned in "
+                  "{0}".format(self.conffile))
+            print("\nFix the problem and re-run!")
+            return None
 
     def keyring_permission(self, keyring):
         """
         Check the existence and permission of the keyring
         """
-        if os.access(self.keyring, os.R_OK):
-            cc_logger.info("{0} has read permissions".format(self.keyring))
-            cc_logger.info("Calling ceph_report()")
-            self.ceph_report()
-        else:
-            cc_logger.info("User {0} does not have read permissions for {1}".format(
-                getpass.getuser(), self.keyring))
-            print("User {0} does not have read permissions for {1}".format(
-                getpass.getuser(), self.keyring))
-            cc_logger.info("Exiting!")
-            print("\nExiting!\n")
-            sys.exit(-1)
+        if os.access(keyring, os.R_OK):
+            cc_logger.info("{0} has read permissions".format(keyring))
+            return True
+        cc_logger.info(
+            "User {0} does not have read permissions for {1}".format(
+                getpass.getuser(), keyring))
+        print("User {0} does not have read permissions for {1}".format(
+            getpass.getuser(), keyring))
+        return False
 
-    def ceph_report(self):
+    def fetch_snapshot(self):
         """
-        Tries to generate a `ceph report`.
-        """
-        interval = [15, 10, 5]
-        tries = 3
-        temp_folder = tempfile.mkdtemp()
-        report = temp_folder + "/" + "report-" + time.strftime("%d%m%Y-%H%M%S")
-        cc_logger.info("Creating cluster report at {}".format(report))
-        # import pdb
-        # pdb.set_trace()
-        with open(report, "w") as output:
-            proc = subprocess32.Popen(["/usr/bin/ceph", "report"],
-                                      stdout=output, stderr=subprocess32.PIPE)
-            while tries:
-                try:
-                    # out/err gets populated if `communicate` succeeds
-                    # If success, `out` won't contain anything,
-                    # since `stdout` == report file,
-                    # and `err` = `report <report-number>`
-                    # In case of failure, `err` will contain :
-                    # ~~~
-                    # 7f3c38155700  0 monclient(hunting): authenticate timed
-                    # out after 300
-                    # 7f3c38155700  0 librados: client.admin authentication
-                    # error (110)
-                    # Connection timed out
-                    # Error connecting to cluster: TimedOut
-                    # ~~~
-                    out, err = proc.communicate(timeout=interval[-1])
-                    if "report" in err:
-                        self.report_parse_summary(report)
-                        # `report_parse_summary()` calls the helper funcs.
-                        # Once finished, the control returns back here.
-                        # It will un-necessarily logs failures.
-                        # Hence calling `sys.exit()
-                        sys.exit()
-                except (subprocess32.TimeoutExpired):
-                    cc_logger.info(
-                        "Connection timed out, monitor host not reachable!")
-                    print("\nConnection timed out, monitor host not reachable!")
-                    tries -= 1
-                    sleep_seconds = interval.pop()
-                    cc_logger.info(
-                        "Will retry after {0} seconds.".format(sleep_seconds))
-                    print("Will retry after {0} seconds".format(sleep_seconds))
-                    time.sleep(sleep_seconds)
-
-            cc_logger.info(
-                "Failing permanently. Not able to connect with the monitor")
-            cc_logger.info("Check the monitor status!")
-            print("\nFailing, not able to connect to the monitor!")
+        Fetch what the selected checks need into a report snapshot.
 
-    def report_parse_summary(self, report):
+        Uses one narrow command per section, run in parallel, unless a
+        full `ceph report` was asked for. With a cache, sections whose
+        map epoch did not change since they were cached are not fetched
+        again. Returns None on failure.
         """
-        Parse the ceph report and get cluster status
+        wanted = self.report_sections if self.full_report else self.sections
+        epochs = None
+        sections = {}
+        # A saved report has to be the real thing.
+        if (self.cache is not None and not self.save_report and
+                not self.archive):
+            epochs = self.probe_epochs()
+            if epochs is not None:
+                with self.recorder.span('fetch', 'cache'):
+                    sections = self.cache.lookup(wanted, epochs)
+        missing = [section for section in wanted if section not in sections]
+        if self.full_report and (epochs is None or any(
+                self.cache.cacheable(section, epochs) for section in missing)):
+            cc_logger.info("Calling ceph_report()")
+            snapshot = self.ceph_report()
+            if snapshot is None:
+                return None
+            if epochs is not None:
+                self.store(wanted, snapshot.sections, epochs)
+            return self.compact(snapshot)
+        if missing:
+            cc_logger.info("Fetching sections : {0}".format(missing))
+            try:
+                fetched = fetch.fetch_sections(
+                    missing, monitors.retrying(self.backend.command,
+                                               self.backoff),
+                    self.concurrency, self.timeout, self.recorder)
+            except fetch.FetchError as err:
+                cc_logger.info("Fetch failed : {0}".format(err))
+                print("\nFailing, not able to fetch the cluster maps : "
+                      "{0}".format(err))
+                return None
+            if epochs is not None:
+                self.store(missing, fetched, epochs)
+            sections.update(fetched)
+        return self.compact(ReportSnapshot(sections))
+
+    def compact(self, snapshot):
         """
-        with open(report) as obj:
-            json_obj = json.load(obj)
-            cluster_status = json_obj['health']['overall_status']
-            cc_logger.info("CLUSTER STATUS : {0}".format(cluster_status))
-            print("\n\t- CLUSTER STATUS -\t")
-            print("\n{0}".format(cluster_status))
-            if cluster_status != "HEALTH_OK":
-                cc_logger.info("Cluster **NOT** HEALTHY!!")
-                print("\n\t- SUMMARY -\n")
-                cc_logger.info("Cluster **NOT** HEALTHY!!")
-                for i in json_obj['health']['summary']:
-                    print(i['summary'])
-                    cc_logger.info(i['summary'])
-        cc_logger.info("Calling cluster_status()")
-        self.cluster_status(report)
-
-    def check_passwordless_ssh(self):
+        Build the tables of `snapshot`, see `ReportSnapshot.compact`, and
+        record its usage in the trend store.
         """
-        This is one of the three primary conditions for `ceph_check`.
+        snapshot.fetched = time.time()
+        addresses = []
+        if snapshot.has_section('monmap'):
+            addresses = monitors.monmap_addresses(snapshot.monmap)
+        if addresses:
+            # The monmap knows the monitors better than ceph.conf.
+            self.backend.set_monitors(addresses)
+        with self.recorder.span('parse', 'tables'):
+            snapshot.compact()
+        if self.trends is not None:
+            self.record_trends(snapshot)
+        return snapshot
 
-        Check password-less SSH access to the MON and OSD nodes
-        """
-        pass
+    def record_trends(self, snapshot):
+        """Add the usage in `snapshot` to the trend store."""
+        from ceph_check import trends
+        try:
+            with self.recorder.span('store', 'trends'):
+                count = self.trends.record_snapshot(snapshot)
+        except trends.TrendError as err:
+            cc_logger.info("Cannot record the trends : {0}".format(err))
+            return
+        cc_logger.info("Recorded {0} trend series".format(count))
 
-    def cluster_status(self, report):
+    def probe_epochs(self):
+        """The cluster fsid and map epochs, or None if the probe fails."""
+        try:
+            with self.recorder.span('fetch', 'status'):
+                status = json.loads(self.backend.command(
+                    cc_cache.PROBE_COMMAND, self.timeout))
+        except (fetch.FetchError, ValueError) as err:
+            cc_logger.info("Epoch probe failed, not using the cache : "
+                           "{0}".format(err))
+            return None
+        epochs = cc_cache.epochs_from_status(status)
+        cc_logger.info("Cluster epochs : {0}".format(epochs))
+        return epochs
+
+    def store(self, names, sections, epochs):
+        """Save `names` from `sections` in the cache, then trim it."""
+        try:
+            for name in names:
+                if name in sections:
+                    self.cache.put(name, epochs, sections[name])
+            self.cache.evict()
+        except (IOError, OSError) as err:
+            cc_logger.info("Cannot write the cache : {0}".format(err))
+
+    def ceph_report(self):
         """
-        Parse the report for further checks
+        Stream a `ceph report` straight into the report parser.
+
+        Parsing overlaps the transfer from the monitor and nothing is
+        written to disk, unless `save_report` asks for a copy or
+        `archive` for the report to be archived.
+        Failures are retried as `backoff` allows. Returns the report
+        snapshot, or None if the monitors stay unreachable. The snapshot
+        is not compacted yet.
         """
-        cc_logger.info("Calling helper functions")
-        # Calling all helper functions irrespective of cluster status
-        cc_logger.info("Calling mon_status_check()")
-        self.mon_status_check(report)
-        cc_logger.info("Calling osd_status_check()")
-        self.osd_status_check(report)
-        cc_logger.info("Calling pool_info()")
-        self.pool_info(report)
-        cc_logger.info("Calling pg_info()")
-        self.pg_info(report)
-        cc_logger.info("Calling ssh_check()")
-        self.check_passwordless_ssh()
-
-    def mon_status_check(self, report):
-        print("\n\t- MONITOR STATUS -\n")
-        mon_list = []
-        with open(report) as obj:
-            json_obj = json.load(obj)
-            print(
-                "mon-map epoch    : {0}\n".format(str(json_obj['monmap']['epoch'])))
-            print("-")
-            for mon in json_obj['monmap']['mons']:
-                print("Host name        : {0}".format(str(mon['name'])))
-                print("Rank             : {0}".format(str(mon['rank'])))
-                if str(mon['rank']) == "0":
-                    print("Role             : {0}".format("Leader"))
-                else:
-                    print("Role             : {0}".format("Peon"))
-                print("IP Address       : {0}".format(
-                    str(mon['addr']).split(":")[0]))
-                print("Port             : {0}".format(
-                    str(mon['addr']).split(":")[1].split("/")[0]))
-                print("-")
-                cc_logger.info("{0}/{1}/{2}/{3}".format(str(mon['name']), str(
-                    mon['rank']), str(mon['addr']), str(mon['addr']).split(":")[1].split("/")[0]))
-                mon_list.append(str(mon['name']))
-        cc_logger.info("MON List : {0}".format(mon_list))
-        self.get_osd_and_mon_list(report)
-
-    def get_osd_and_mon_list(self, report):
-        """Get the list of MONs and OSDs from the report"""
-        osds = {}
-        with open(report) as obj:
-            json_obj = json.load(obj)
-            for osd in json_obj['osdmap']['osds']:
-                osds[osd['osd']] = osd
-                pass
-        # return (mons, osds)
-
-    def osd_status_check(self, report):
-        print("\n\t- OSD STATUS -\n")
-        with open(report) as obj:
-            json_obj = json.load(obj)
-            for i in json_obj:
-                osd_id = "{0}".format(i['id'])
-                print(osd_id)
-
-    def pool_info(self, report):
-        print("\n\t- POOL STATUS -\n")
-
-    def pg_info(self, report):
-        print("\n\t- PG STATUS -\n")
+        delays = self.backoff.delays()
+        deadline = time.time() + self.backoff.deadline
+        if self.save_report:
+            cc_logger.info("Saving cluster report at {0}".format(
+                self.save_report))
+        if self.archive:
+            cc_logger.info("Archiving cluster report in {0}".format(
+                self.archive))
+        while True:
+            timeout = max(1, min(self.timeout, deadline - time.time()))
+            try:
+                # A stuck monitor shows up as no output at all, e.g. :
+                # ~~~
+                # 7f3c38155700  0 monclient(hunting): authenticate timed
+                # out after 300
+                # Error connecting to cluster: TimedOut
+                # ~~~
+                # so the timeout applies to the gaps between chunks.
+                # Waiting on the monitor is a fetch, the rest a parse.
+                return ReportSnapshot.from_stream(
+                    self.recorder.split('report', self.backend.stream(
+                        {'prefix': 'report'}, timeout)),
+                    self.report_sections, self.save_report, self.archive)
+            except backends.CommandTimeout:
+                cc_logger.info(
+                    "Connection timed out, monitor host not reachable!")
+                print("\nConnection timed out, monitor host not reachable!")
+            except (fetch.FetchError, ReportError) as err:
+                cc_logger.info("Unusable report: {0}".format(err))
+                print("\nUnusable report: {0}".format(err))
+            sleep_seconds = next(delays, None)
+            if sleep_seconds is None:
+                break
+            cc_logger.info(
+                "Will retry after {0:.1f} seconds.".format(sleep_seconds))
+            print("Will retry after {0:.1f} seconds".format(sleep_seconds))
+            time.sleep(sleep_seconds)
+
+        cc_logger.info(
+            "Failing permanently. Not able to connect with the monitor")
+        cc_logger.info("Check the monitor status!")
+        print("\nFailing, not able to connect to the monitor!")
+        return None
 
 
-if __name__ == "__main__":
-    checker = CephCheck(CONF_FILE, ADMIN_KEYRING)
+def run(checker):
     try:
-        checker.cc_condition()
+        sys.exit(checker.run())
     except Exception as err:
         cc_logger.info("<--BUG--><--Cut here-->")
         cc_logger.exception(err, exc_info=True)
         print("Exception : {0}".format(err))
-        print("Hit Exception. Check /var/log/messages for more detail.")
+        print("Hit Exception. Check the log for more detail.")
         sys.exit(-1)
+
+
+if __name__ == "__main__":
+    logs.configure()
+    run(CephCheck(CONF_FILE, ADMIN_KEYRING))
@@ -0,0 +1,584 @@
+# -*- coding: utf-8 -*-
+
+"""
+The `ceph_check` checks and their registry.
+
+Each check is registered with the report sections it reads and any
+external data it needs, so the scheduler can fetch just those and run
+independent checks side by side. A check is called with a
+`CheckContext` and writes its output through it.
+"""
+
+import logging
+from collections import OrderedDict
+
+from ceph_check import colocation
+from ceph_check import findings
+from ceph_check import journals
+
+cc_logger = logging.getLogger("ceph_check")
+
+CHECKS = OrderedDict()
+
+
+class Check(object):
+    """A registered check."""
+
+    def __init__(self, name, func, sections=(), needs=()):
+        self.name = name
+        self.func = func
+        self.sections = tuple(sections)
+        self.needs = tuple(needs)
+        self.description = (func.__doc__ or name).strip().splitlines()[0]
+
+    def __repr__(self):
+        return "<Check {0}>".format(self.name)
+
+
+def register(name, sections=(), needs=()):
+    """
+    Decorator adding a check to the registry.
+
+    `sections` are the `ceph report` sections the check reads, `needs`
+    the external data providers (see `ceph_check.scheduler`) it waits on.
+    """
+    def wrap(func):
+        CHECKS[name] = Check(name, func, sections, needs)
+        return func
+    return wrap
+
+
+def select(names=None):
+    """The registered checks called `names`, all of them by default."""
+    if names is None:
+        return list(CHECKS.values())
+    unknown = [name for name in names if name not in CHECKS]
+    if unknown:
+        raise KeyError("Unknown checks: {0}".format(", ".join(unknown)))
+    return [check for check in CHECKS.values() if check.name in names]
+
+
+def severity_of(status):
+    """The finding severity of a `ceph health` status, warning if unknown."""
+    return findings.HEALTH_SEVERITIES.get(status, findings.WARNING)
+
+
+def sections_for(checks):
+    """
+    The sections read by `checks`, in first-use order.
+
+    See `ceph_check.fetch` for how each one is fetched.
+    """
+    sections = []
+    for check in checks:
+        sections.extend(s for s in check.sections if s not in sections)
+    return tuple(sections)
+
+
+@register('health', sections=('health',))
+def cluster_status(ctx):
+    """Overall cluster status, with the health summary when unhealthy."""
+    health = ctx.snapshot.health
+    # Luminous and later report `status` and `checks`.
+    cluster_status = health.get('status', health.get('overall_status'))
+    cc_logger.info("CLUSTER STATUS : {0}".format(cluster_status))
+    ctx.write("\n\t- CLUSTER STATUS -\t")
+    ctx.write()
+    ctx.emit(cluster_status, severity_of(cluster_status), entity='cluster')
+    if cluster_status != "HEALTH_OK":
+        cc_logger.info("Cluster **NOT** HEALTHY!!")
+        ctx.write("\n\t- SUMMARY -\n")
+        summaries = []
+        for item in health.get('summary', []):
+            summaries.append(ctx.emit(item['summary'],
+                                      severity_of(item.get('severity')),
+                                      entity='cluster').message)
+        for code, check in health.get('checks', {}).items():
+            summaries.append(ctx.emit(check['summary']['message'],
+                                      severity_of(check.get('severity')),
+                                      entity=code).message)
+        cc_logger.info("Health summary : {0}".format("; ".join(summaries)))
+
+
+@register('mon', sections=('monmap',))
+def mon_status_check(ctx):
+    """Monitor ranks, roles and addresses."""
+    ctx.write("\n\t- MONITOR STATUS -\n")
+    mon_list = []
+    monmap = ctx.snapshot.monmap
+    ctx.field("mon-map epoch", monmap['epoch'], entity='monmap',
+              epoch=monmap['epoch'])
+    ctx.write()
+    ctx.write("-")
+    for mon in monmap['mons']:
+        name, rank = str(mon['name']), str(mon['rank'])
+        role = "Leader" if rank == "0" else "Peon"
+        address = str(mon['addr']).split(":")[0]
+        port = str(mon['addr']).split(":")[1].split("/")[0]
+        # One finding per monitor, its fields on their own lines.
+        ctx.emit("{0} rank {1} at {2}:{3}".format(role, rank, address, port),
+                 entity="mon.{0}".format(name), text="\n".join(
+                     "{0:<16} : {1}".format(label, value)
+                     for label, value in (("Host name", name), ("Rank", rank),
+                                          ("Role", role),
+                                          ("IP Address", address),
+                                          ("Port", port))),
+                 rank=mon['rank'], role=role.lower(), address=address,
+                 port=int(port))
+        ctx.write("-")
+        mon_list.append("{0}/{1}/{2}".format(mon['name'], mon['rank'],
+                                             mon['addr']))
+    # One line for all of them, not one per monitor.
+    cc_logger.info("MON List : {0}".format(", ".join(mon_list)))
+
+
+@register('osd', sections=('osdmap', 'osd_df'))
+def osd_status_check(ctx):
+    """OSD counts, and the OSDs that are down or out."""
+    ctx.write("\n\t- OSD STATUS -\n")
+    osds = ctx.snapshot.osd_table
+    ctx.field("Total OSDs", len(osds), count=len(osds))
+    ctx.field("OSDs up", int(osds.up.sum()), count=int(osds.up.sum()))
+    ctx.field("OSDs in", int(osds.in_.sum()), count=int(osds.in_.sum()))
+    state = ctx.state
+    changed = ctx.delta.osds if ctx.delta is not None else None
+    if changed is None or 'down' not in state:
+        state['down'] = set(osds.id[~osds.up].tolist())
+        state['out'] = set(osds.id[~osds.in_].tolist())
+    else:
+        # Only the OSDs that changed since the last run are looked at.
+        rows = osds.rows(changed)
+        present = rows >= 0
+        state['down'].difference_update(changed.tolist())
+        state['out'].difference_update(changed.tolist())
+        ids, rows = changed[present], rows[present]
+        state['down'].update(ids[~osds.up[rows]].tolist())
+        state['out'].update(ids[~osds.in_[rows]].tolist())
+    down = sorted(state['down'])
+    out = sorted(state['out'])
+    # A finding for all of them, the list of 10k OSDs is one line too.
+    if down:
+        ctx.emit(", ".join("osd.{0}".format(i) for i in down),
+                 findings.WARNING, 'cluster', "OSDs down", osds=down)
+        cc_logger.info("OSDs down : {0}".format(down))
+    if out:
+        ctx.emit(", ".join("osd.{0}".format(i) for i in out),
+                 findings.WARNING, 'cluster', "OSDs out", osds=out)
+        cc_logger.info("OSDs out : {0}".format(out))
+
+
+@register('pool', sections=('osdmap',))
+def pool_info(ctx):
+    """Pool replication settings."""
+    ctx.write("\n\t- POOL STATUS -\n")
+    for pool in ctx.snapshot.osdmap['pools']:
+        entity = "pool.{0}".format(pool['pool_name'])
+        ctx.emit("size {0}, min_size {1}".format(
+            pool['size'], pool['min_size']), entity=entity, text=(
+                "Pool             : {0} ({1})\n"
+                "Size / min_size  : {2} / {3}".format(
+                    pool['pool_name'], pool['pool'], pool['size'],
+                    pool['min_size'])),
+            pool=pool['pool'], size=pool['size'], min_size=pool['min_size'])
+        if pool['min_size'] >= pool['size'] > 1:
+            ctx.warn("min_size equals size, a single failure blocks I/O",
+                     entity)
+            cc_logger.info("Pool {0} min_size >= size".format(
+                pool['pool_name']))
+        elif pool['min_size'] < 2 < pool['size']:
+            ctx.warn("min_size 1 accepts writes with a single copy", entity)
+            cc_logger.info("Pool {0} min_size 1".format(pool['pool_name']))
+        ctx.write("-")
+
+
+@register('pg', sections=('pgmap', 'pool_stats', 'osdmap', 'crushmap'))
+def pg_info(ctx):
+    """PG states, and the recommended pg_num of each pool."""
+    ctx.write("\n\t- PG STATUS -\n")
+    snapshot = ctx.snapshot
+    pgs = snapshot.pg_table
+    ctx.field("Total PGs", len(pgs), count=len(pgs))
+    counts = pgs.state.counts()
+    for state in sorted(counts, key=counts.get, reverse=True):
+        ctx.field(state, counts[state], count=counts[state])
+    ctx.write("-")
+    from ceph_check import pgcalc
+    sizing = pgcalc.pool_sizing(snapshot)
+    ctx.write("{0:<24} {1:>6} {2:>8} {3:>12}".format(
+        "Pool", "OSDs", "pg_num", "Recommended"))
+    for row, name in enumerate(sizing['name']):
+        ctx.emit("pg_num {0}, {1} recommended".format(
+            sizing['pg_num'][row], sizing['target'][row]),
+            entity="pool.{0}".format(name),
+            text="{0:<24} {1:>6} {2:>8} {3:>12}".format(
+                name, sizing['osds'][row], sizing['pg_num'][row],
+                sizing['target'][row]),
+            osds=int(sizing['osds'][row]), pg_num=int(sizing['pg_num'][row]),
+            recommended=int(sizing['target'][row]))
+        osds = int(sizing['osds'][row])
+        if sizing['inactive'][row]:
+            ctx.warn("{0} in OSDs under the rule, min_size is {1}, PGs "
+                     "cannot go active".format(osds, sizing['min_size'][row]),
+                     "pool.{0}".format(name), osds=osds,
+                     min_size=int(sizing['min_size'][row]))
+        elif sizing['degraded'][row]:
+            ctx.warn("{0} in OSDs under the rule, size is {1}, PGs stay "
+                     "degraded".format(osds, sizing['size'][row]),
+                     "pool.{0}".format(name), osds=osds,
+                     size=int(sizing['size'][row]))
+    differs = sizing['pg_num'] != sizing['target']
+    cc_logger.info("Pools with a pg_num to revisit : {0}".format(
+        [name for name, flag in zip(sizing['name'], differs) if flag]))
+
+
+@register('stuck', sections=('pg_dump', 'osdmap', 'osd_metadata'))
+def stuck_pgs(ctx):
+    """PG problems by pool, primary OSD and host, and the stuck PGs."""
+    ctx.write("\n\t- PG PROBLEMS -\n")
+    from ceph_check import pgstates
+    snapshot = ctx.snapshot
+    now = snapshot.stats_stamp()
+    hosts = dict((meta['id'], meta['hostname'])
+                 for meta in snapshot.osd_metadata if 'hostname' in meta)
+    pool_names = dict((pool['pool'], pool['pool_name'])
+                      for pool in snapshot.osdmap.get('pools', []))
+    states = pgstates.PGStates(snapshot.pg_table, hosts, now,
+                               pool_names=pool_names)
+    ctx.field("PGs with issues", "{0} of {1}".format(
+        states.problems, states.total), count=states.problems,
+        total=states.total)
+    for problem in pgstates.PROBLEMS:
+        count = states.count(problem)
+        if count:
+            ctx.emit(count, findings.ERROR if problem == 'inactive'
+                     else findings.WARNING, 'cluster', problem, count=count)
+    if not states.timed:
+        ctx.field("Stuck", "unknown, the PG stats have no timestamps")
+    elif states.problems:
+        threshold = states.threshold
+        ctx.emit(states.count('stuck'), findings.WARNING if states.count(
+            'stuck') else findings.INFO, 'cluster',
+            "Stuck > {0}s".format(threshold),
+            count=states.count('stuck'), threshold=threshold)
+        for problem in pgstates.PROBLEMS:
+            stuck = states.stuck[problem]
+            oldest = stuck.oldest()
+            if oldest is None:
+                continue
+            row, age = oldest
+            histogram = stuck.histogram()
+            ctx.emit("{0} stuck, longest {1} ({2})".format(
+                stuck.count(threshold), pgstates.format_age(age),
+                states.table.pgid(row)), entity='cluster',
+                text="  {0:<14} : {1} stuck, longest {2} ({3})\n"
+                     "  {4:<14}   {5}".format(
+                         problem, stuck.count(threshold),
+                         pgstates.format_age(age), states.table.pgid(row),
+                         "", ", ".join("{0} {1}".format(label, count)
+                                       for label, count in zip(
+                                           pgstates.AGE_LABELS, histogram))),
+                problem=problem, count=stuck.count(threshold),
+                longest=age, pgid=states.table.pgid(row),
+                histogram=dict(zip(pgstates.AGE_LABELS, histogram.tolist())))
+    for title, groups, prefix in (("Pool", states.pools, "pool."),
+                                  ("Primary OSD", states.osds, ""),
+                                  ("Host", states.hosts, "")):
+        ranked = groups.ranked()
+        if not ranked:
+            continue
+        ctx.write("-")
+        ctx.write("{0:<16} {1:>8} ".format(title, "PGs") + " ".join(
+            "{0:>10}".format(column) for column in pgstates.COLUMNS))
+        for index in ranked:
+            name, row = groups.names[index], groups.row(index)
+            ctx.emit(", ".join("{0} {1}".format(row[column], column)
+                               for column in pgstates.COLUMNS
+                               if row[column]),
+                     entity=prefix + name,
+                     text="{0:<16} {1:>8} ".format(
+                         name, groups.totals[index]) + " ".join(
+                             "{0:>10}".format(row[column])
+                             for column in pgstates.COLUMNS),
+                     pgs=int(groups.totals[index]), **row)
+    cc_logger.info("PGs with issues : {0} of {1}".format(states.problems,
+                                                         states.total))
+
+
+@register('crush', sections=('crushmap', 'osdmap'))
+def crush_check(ctx):
+    """CRUSH weights, failure domain balance and simulated PG placement."""
+    ctx.write("\n\t- CRUSH MAP -\n")
+    from ceph_check import crush
+    crushmap = crush.CrushMap(ctx.snapshot.crushmap)
+    threshold = ctx.options.get('crush_imbalance', crush.IMBALANCE_THRESHOLD)
+    types = [crushmap.type_of(bucket) for bucket in crushmap.buckets]
+    ctx.field("Buckets", ", ".join(
+        "{0} {1}".format(types.count(name), name)
+        for name in sorted(set(types), key=types.index)), entity='crushmap')
+    ctx.field("Devices", len(crushmap.devices), entity='crushmap',
+              count=len(crushmap.devices))
+    for bucket in crushmap.empty_buckets():
+        ctx.warn("{0} {1} is empty".format(
+            crushmap.type_of(bucket), crushmap.name_of(bucket)),
+            crushmap.name_of(bucket))
+    for bucket, recorded, expected in crushmap.misweighted():
+        ctx.warn("{0} weighs {1:.3f}, expected {2:.3f}".format(
+            crushmap.name_of(bucket), recorded / float(crush.WEIGHT_ONE),
+            expected / float(crush.WEIGHT_ONE)), crushmap.name_of(bucket),
+            weight=recorded / float(crush.WEIGHT_ONE),
+            expected=expected / float(crush.WEIGHT_ONE))
+    zero = crushmap.zero_weight_devices()
+    if zero:
+        ctx.warn("zero CRUSH weight on {0}".format(
+            ", ".join(crushmap.name_of(device) for device in zero)),
+            'crushmap', devices=[crushmap.name_of(device) for device in zero])
+    cc_logger.info("CRUSH : {0} empty, {1} misweighted, {2} zero "
+                   "weight".format(len(crushmap.empty_buckets()),
+                                   len(crushmap.misweighted()), len(zero)))
+    ctx.write("-")
+    osds = ctx.snapshot.osd_table
+    reweight = crush.reweights(osds)
+    placed = crush.simulate(ctx.snapshot)
+    for pool in ctx.snapshot.osdmap['pools']:
+        entity = "pool.{0}".format(pool['pool_name'])
+        rule_id = pool.get('crush_rule', pool.get('crush_ruleset'))
+        ctx.write("Pool             : {0} ({1})".format(
+            pool['pool_name'], pool['pool']))
+        if rule_id not in crushmap.rules:
+            ctx.warn("unknown CRUSH rule {0}".format(rule_id), entity,
+                     rule=rule_id)
+            ctx.write("-")
+            continue
+        rule = crushmap.rules[rule_id]
+        ctx.field("Rule", "{0}, failure domain {1}".format(
+            rule.name, rule.failure_domain), entity, rule=rule.name,
+            failure_domain=rule.failure_domain)
+        domains = crushmap.domain_weights(rule_id)
+        weights = [weight for _, weight in domains]
+        if domains:
+            mean = sum(weights) / len(weights)
+            heaviest = crushmap.name_of(domains[weights.index(
+                max(weights))][0])
+            ctx.field("Domains", "{0}, weighing {1:.3f} to {2:.3f}".format(
+                len(domains), min(weights), max(weights)), entity,
+                count=len(domains), min_weight=min(weights),
+                max_weight=max(weights))
+            if len(domains) < pool['size']:
+                ctx.warn("{0} {1} domain(s) for size {2}".format(
+                    len(domains), rule.failure_domain, pool['size']), entity,
+                    domains=len(domains), size=pool['size'])
+            elif max(weights) > sum(weights) / pool['size']:
+                ctx.warn("{0} holds more than 1/{1} of the weight, it "
+                         "cannot be used in full".format(
+                             heaviest, pool['size']), entity,
+                         domain=heaviest)
+            if mean and max(weights) > threshold * mean:
+                ctx.warn("{0} weighs {1:.2f}x the mean {2}".format(
+                    heaviest, max(weights) / mean, rule.failure_domain),
+                    entity, domain=heaviest, ratio=max(weights) / mean)
+        up = placed[pool['pool']]
+        counts = crush.pg_counts(up, len(reweight))
+        devices, share = crush.fair_share(crushmap, rule_id, (up >= 0).sum(),
+                                          reweight)
+        used = share > 0
+        if not used.any():
+            ctx.warn("no OSD to place PGs on", entity)
+            ctx.write("-")
+            continue
+        devices, share = devices[used], share[used]
+        held = counts[devices]
+        ctx.field("PGs per OSD", "{0} to {1}, {2:.1f} on average".format(
+            held.min(), held.max(), held.mean()), entity, min=int(held.min()),
+            max=int(held.max()), mean=float(held.mean()))
+        ratio = held / share
+        worst = ratio.argmax()
+        ctx.field("Most loaded", "osd.{0}, {1:+.0%} over its share".format(
+            devices[worst], ratio[worst] - 1), entity,
+            osd=int(devices[worst]), over=float(ratio[worst] - 1))
+        unplaced = int((up < 0).sum())
+        if unplaced:
+            ctx.warn("{0} PG copies could not be placed".format(unplaced),
+                     entity, unplaced=unplaced)
+        ctx.write("-")
+
+
+@register('journal', sections=('osd_metadata',))
+def journal_fanout(ctx):
+    """Journal, DB and WAL devices shared by more OSDs than they should."""
+    ctx.write("\n\t- JOURNAL / DB DEVICES -\n")
+    devices = journals.shared_devices(ctx.snapshot.osd_metadata)
+    if not devices:
+        ctx.field("Shared devices", "none, on the data devices", count=0)
+        return
+    hosts = set(device.host for device in devices.values())
+    osds = set(osd for device in devices.values() for osd in device.osds)
+    ctx.field("Shared devices", "{0} on {1} hosts, backing {2} OSDs".format(
+        len(devices), len(hosts), len(osds)), count=len(devices),
+        hosts=len(hosts), osds=len(osds))
+    largest = max(devices.values(), key=lambda device: len(device.osds))
+    ctx.field("Largest fan-out", "{0} OSDs on {1}".format(
+        len(largest.osds), largest.name), largest.name,
+        osds=len(largest.osds))
+    limits = ctx.options.get('journal_limits')
+    over = journals.over_limit(devices, limits)
+    for device in over:
+        message = "{0} ({1}) backs {2} OSDs, {3:.1f}x the limit of {4}".format(
+            device.name, device.device_class or "unknown class",
+            len(device.osds),
+            len(device.osds) / float(device.limit(limits) or 1),
+            device.limit(limits))
+        ctx.warn(message, device.name, text=(
+            "WARNING          : {0}\n  Down together  : {1}".format(
+                message, ", ".join("osd.{0}".format(osd)
+                                   for osd in device.osds))),
+                 osds=device.osds, limit=device.limit(limits),
+                 device_class=device.device_class)
+    cc_logger.info("Journal devices over their limit : {0}".format(
+        [device.name for device in over]))
+
+
+@register('colocation',
+          sections=('monmap', 'osd_metadata', 'fsmap', 'servicemap'))
+def colocation_check(ctx):
+    """Hosts running more than one kind of Ceph daemon."""
+    ctx.write("\n\t- DAEMON COLOCATION -\n")
+    hosts = colocation.host_map(ctx.snapshot)
+    role_sets = hosts.role_sets()
+    ctx.field("Hosts", len(hosts.hosts), count=len(hosts.hosts))
+    for roles, names in role_sets.items():
+        ctx.emit("{0} hosts".format(len(names)), entity='cluster',
+                 text="  {0:<15}: {1}".format("+".join(roles), len(names)),
+                 roles=list(roles), count=len(names))
+    colocated = [host for roles, names in role_sets.items()
+                 if len(roles) > 1 for host in names]
+    for host in colocated:
+        daemons = hosts.hosts[host]
+        ctx.field("Colocated", "{0} : {1}".format(host, ", ".join(
+            "{0} OSD(s)".format(len(daemons[role])) if role == 'osd' else
+            ", ".join(daemons[role]) for role in hosts.roles(host))), host,
+            daemons=dict(daemons))
+        for pair, reason in sorted(colocation.WARN_PAIRS.items()):
+            if set(pair) <= set(daemons):
+                ctx.warn("{0} runs {1}, {2}".format(
+                    host, " and ".join(pair), reason), host, roles=list(pair))
+    cc_logger.info("Hosts with colocated daemons : {0}".format(colocated))
+
+
+@register('ssh', sections=('monmap', 'osd_metadata'), needs=('host_facts',))
+def check_passwordless_ssh(ctx):
+    """
+    Ceph package versions on the MON and OSD hosts, and their drift.
+
+    Password-less SSH to the nodes is one of the three primary conditions
+    for `ceph_check`, the hosts it does not reach are listed.
+    """
+    ctx.write("\n\t- HOST PACKAGES -\n")
+    results = ctx.data['host_facts']
+    reachable = [result for result in results if result.ok]
+    ctx.field("Hosts", "{0} ({1} reachable)".format(
+        len(results), len(reachable)), count=len(results),
+        reachable=len(reachable))
+    unreachable = [result for result in results if not result.ok]
+    for result in unreachable:
+        ctx.emit("{0} ({1})".format(result.host, result.error),
+                 findings.WARNING, result.host, "Unreachable",
+                 error=result.error)
+    if unreachable:
+        cc_logger.info("SSH failed to {0} hosts : {1}".format(
+            len(unreachable), ", ".join(result.host
+                                        for result in unreachable)))
+    versions = set(version for result in reachable
+                   for version in result.packages.values())
+    ctx.field("Ceph versions", ", ".join(sorted(versions)) or "none found",
+              versions=sorted(versions))
+    kernels = set(result.facts.get('kernel') for result in reachable)
+    kernels.discard(None)
+    if len(kernels) > 1:
+        ctx.field("Kernels", ", ".join(sorted(kernels)),
+                  kernels=sorted(kernels))
+    from ceph_check import hostfacts
+    drift = hostfacts.version_drift(reachable)
+    for name in sorted(drift):
+        lines = ["WARNING          : {0} differs across hosts".format(name)]
+        lines.extend("  {0:<30} : {1}".format(version, ", ".join(hosts))
+                     for version, hosts in sorted(drift[name].items()))
+        ctx.warn("{0} differs across hosts".format(name), 'cluster',
+                 text="\n".join(lines), package=name,
+                 versions=drift[name])
+        cc_logger.info("Version drift in {0} : {1}".format(name, drift[name]))
+
+
+def _capacity_severity(projection):
+    from ceph_check import trends
+    full, nearfull = projection.days_to_full, projection.days_to_nearfull
+    if full is not None and full <= trends.URGENT_DAYS:
+        return findings.ERROR
+    if nearfull is not None and nearfull <= trends.WARN_DAYS:
+        return findings.WARNING
+    return findings.INFO
+
+
+# The pgmap is only read to record the PG state counts, see `trends.usage`.
+@register('capacity', sections=('osdmap', 'osd_df', 'pool_stats',
+                                'crushmap', 'pgmap'), needs=('trends',))
+def capacity_trends(ctx):
+    """
+    Usage growth of the cluster, OSDs and pools, and the days until they
+    are nearfull and full at that rate.
+
+    Projected from the samples the past runs left in the trend store,
+    see `ceph_check.trends`.
+    """
+    ctx.write("\n\t- CAPACITY TRENDS -\n")
+    projections = ctx.data['trends']
+    if projections is None:
+        ctx.field("Trends", "not recorded, see --trends-db")
+        return
+    from ceph_check import trends
+    by_kind = {}
+    for projection in projections:
+        by_kind.setdefault(projection.kind, []).append(projection)
+    if not by_kind.get('cluster'):
+        ctx.field("Trends", "no usage recorded yet")
+        return
+    cluster = by_kind['cluster'][0]
+    ctx.field("History", "{0} samples over {1:.1f} days".format(
+        cluster.samples, cluster.span / float(trends.DAY)),
+        samples=cluster.samples, span=cluster.span)
+
+    def describe(projection):
+        growth = ("{0}{1}/day".format(
+            "+" if projection.slope >= 0 else "-",
+            trends.format_bytes(abs(projection.slope)))
+            if projection.slope is not None else "growth unknown")
+        used = projection.used_ratio
+        return growth, ("{0:.1f}%".format(100 * used)
+                        if used is not None else "-")
+
+    growth, used = describe(cluster)
+    ctx.emit("{0} of full, {1}, nearfull in {2}, full in {3}".format(
+        used, growth, trends.format_days(cluster.days_to_nearfull),
+        trends.format_days(cluster.days_to_full)),
+        _capacity_severity(cluster), 'cluster', "Cluster",
+        **cluster.to_dict())
+    for title, kind, prefix in (("OSD", 'osd', ""), ("Pool", 'pool', "pool.")):
+        ranked = trends.soonest(by_kind.get(kind, []))
+        if not ranked:
+            continue
+        ctx.write("-")
+        ctx.write("{0:<24} {1:>7} {2:>16} {3:>10} {4:>10}".format(
+            title, "Used", "Growth", "Nearfull", "Full"))
+        for projection in ranked:
+            growth, used = describe(projection)
+            nearfull = trends.format_days(projection.days_to_nearfull)
+            full = trends.format_days(projection.days_to_full)
+            ctx.emit("{0} of full, {1}, nearfull in {2}, full in {3}".format(
+                used, growth, nearfull, full),
+                _capacity_severity(projection), prefix + projection.name,
+                text="{0:<24} {1:>7} {2:>16} {3:>10} {4:>10}".format(
+                    projection.name, used, growth, nearfull, full),
+                **projection.to_dict())
+    soon = [projection.name for projection in projections
+            if _capacity_severity(projection) != findings.INFO]
+    cc_logger.info("Filling up within {0} days : {1}".format(
+        trends.WARN_DAYS, soon))
@@ -2,15 +2,236 @@
 
 """Console script for ceph_check."""
 
+import sys
+
 import click
 
+from ceph_check import backends
+from ceph_check import cache
+from ceph_check import checks
+from ceph_check import fetch
+from ceph_check import findings
+from ceph_check import journals
+from ceph_check import logs
+from ceph_check import metrics
+from ceph_check import monitors
+from ceph_check import scheduler
+from ceph_check.ceph_check import (ADMIN_KEYRING, CEPH_BIN, CONF_FILE,
+                                   CephCheck, run)
+
+
+def split_checks(ctx, param, value):
+    if value is None:
+        return None
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    try:
+        checks.select(names)
+    except KeyError as err:
+        raise click.BadParameter("{0}, choose from {1}".format(
+            err.args[0], ", ".join(checks.CHECKS)))
+    return names
+
+
+def parse_limits(ctx, param, value):
+    """`CLASS=N` pairs into a dict, e.g. `ssd=4`."""
+    limits = {}
+    for pair in value:
+        device_class, _, limit = pair.partition("=")
+        device_class = device_class.strip().lower()
+        if not device_class or not limit.strip().isdigit() or not int(limit):
+            raise click.BadParameter("expected CLASS=N, got {0}".format(pair))
+        limits[device_class] = int(limit)
+    return limits
+
+
+def check_sinks(ctx, param, value):
+    """The log sinks, opened once here to report unusable ones early."""
+    for spec in value:
+        try:
+            logs.open_sink(spec).close()
+        except ValueError as err:
+            raise click.BadParameter(str(err))
+    return list(value) if value else None
+
+
+def make_backend(kind, conf, keyring, timeout, replay=None, record=None,
+                 hedge=backends.DEFAULT_HEDGE):
+    """The backend asked for on the command line."""
+    if replay:
+        backend = backends.RadosBackend(
+            cluster=backends.ReplayCluster.from_directory(replay))
+    elif kind == 'rados':
+        backend = backends.RadosBackend(conf, keyring,
+                                        connect_timeout=timeout)
+    else:
+        backend = backends.HedgedBackend(
+            CEPH_BIN, monitors.conf_addresses(conf), hedge=hedge)
+    if record:
+        backend = backends.RecordingBackend(backend, record)
+    return backend
+
+
+def open_trends(path):
+    """The trend store at `path`, or None when it cannot be opened."""
+    from ceph_check import trends
+    try:
+        return trends.TrendStore(path)
+    except trends.TrendError as err:
+        click.echo("Not recording trends : {0}".format(err), err=True)
+        return None
+
 
 @click.command()
-def main(args=None):
-    """Console script for ceph_check."""
-    click.echo("Replace this message by putting your code into "
-               "ceph_check.cli.main")
-    click.echo("See click documentation at http://click.pocoo.org/")
+@click.option('--conf', default=CONF_FILE, show_default=True,
+              help="Ceph configuration file.")
+@click.option('--keyring', default=ADMIN_KEYRING, show_default=True,
+              help="Admin keyring used when ceph.conf names none.")
+@click.option('--save-report', type=click.Path(dir_okay=False),
+              help="Also write the raw `ceph report` to this file.")
+@click.option('--archive', 'archive_path', type=click.Path(dir_okay=False),
+              help="Append the `ceph report` to this archive (.ccr), which "
+              "--offline reads its latest report from.")
+@click.option('--checks', 'check_names', callback=split_checks,
+              help="Comma separated checks to run, all by default.")
+@click.option('--workers', default=scheduler.DEFAULT_WORKERS,
+              show_default=True, help="Checks run at the same time.")
+@click.option('--full-report', is_flag=True,
+              help="Parse one full `ceph report` instead of fetching "
+              "each section with its own command.")
+@click.option('--concurrency', default=fetch.DEFAULT_CONCURRENCY,
+              show_default=True, help="Cluster commands run at the same time.")
+@click.option('--timeout', default=fetch.DEFAULT_TIMEOUT, show_default=True,
+              help="Seconds to wait for each cluster command.")
+@click.option('--backend', 'backend_kind',
+              type=click.Choice(['cli', 'rados']),
+              help="Run commands through the `ceph` CLI, or over one "
+              "librados connection. Defaults to cli, or rados with --daemon.")
+@click.option('--hedge', default=backends.DEFAULT_HEDGE, show_default=True,
+              type=click.IntRange(min=1),
+              help="Monitors each CLI command is sent to at once, the "
+              "first answer is used.")
+@click.option('--deadline', default=monitors.DEFAULT_DEADLINE,
+              show_default=True, type=click.FloatRange(min=1),
+              help="Seconds within which failed commands are retried.")
+@click.option('--replay', type=click.Path(file_okay=False, exists=True),
+              help="Answer commands from responses saved with --record.")
+@click.option('--record', type=click.Path(file_okay=False),
+              help="Save every command response to this directory.")
+@click.option('--no-cache', is_flag=True,
+              help="Fetch every section, even when its map is unchanged.")
+@click.option('--cache-dir', type=click.Path(file_okay=False),
+              default=cache.default_path(), show_default=True,
+              help="Where report sections are cached between runs.")
+@click.option('--trends-db', type=click.Path(dir_okay=False),
+              help="SQLite database the usage of each run is recorded in, "
+              "for the capacity check's projections. Defaults to "
+              "$XDG_DATA_HOME/ceph_check/trends.db.")
+@click.option('--no-trends', is_flag=True,
+              help="Do not record usage in --trends-db.")
+@click.option('--interval', type=click.FloatRange(min=1),
+              help="Keep checking every INTERVAL seconds, re-running only "
+              "the checks whose maps changed.")
+@click.option('--ssh-user', help="User to SSH to the cluster nodes as.")
+@click.option('--ssh-concurrency', type=click.IntRange(min=1),
+              help="Hosts reached over SSH at once, 32 by default.")
+@click.option('--ssh-timeout', type=click.IntRange(min=1),
+              help="Seconds to wait for each host, 20 by default.")
+@click.option('--journal-limit', 'journal_limits', multiple=True,
+              metavar='CLASS=N', callback=parse_limits,
+              help="Most OSDs a journal or DB device of the class (hdd, "
+              "ssd, nvme) should back. Can be repeated. Defaults to {0}."
+              .format(", ".join("{0}={1}".format(name, limit) for name, limit
+                                in sorted(journals.DEFAULT_LIMITS.items()))))
+@click.option('--offline', multiple=True, metavar='PATH',
+              help="Check saved reports instead of a live cluster, from a "
+              "directory or glob of .json, .json.gz, .json.zst or .ccr "
+              "files. Can be repeated.")
+@click.option('--processes', type=click.IntRange(min=1),
+              help="Reports checked at once with --offline, one per core "
+              "by default.")
+@click.option('--daemon', 'daemon_mode', is_flag=True,
+              help="Keep polling and serve the latest results over HTTP, "
+              "every --interval seconds while unhealthy, backing off to "
+              "--max-interval while HEALTH_OK.")
+@click.option('--listen', metavar='[HOST:]PORT',
+              help="Where --daemon serves the results, 127.0.0.1:9750 by "
+              "default.")
+@click.option('--max-interval', type=click.FloatRange(min=1),
+              help="Longest wait between --daemon rounds, 300 seconds by "
+              "default.")
+@click.option('--metrics-json', type=click.Path(dir_okay=False),
+              help="Write the time and memory taken by each fetch, parse "
+              "and check to this JSON file.")
+@click.option('--metrics-prom', type=click.Path(dir_okay=False),
+              help="Write the same as Prometheus metrics, for the "
+              "node_exporter textfile collector.")
+@click.option('--trace-memory', is_flag=True,
+              help="Also trace the peak Python allocations of each step "
+              "for the metrics, slows the run down.")
+@click.option('--format', 'output_format', type=click.Choice(findings.FORMATS),
+              default='text', show_default=True,
+              help="Print the results as text, one JSON document, or a "
+              "JSON object per finding (ndjson) as the checks make them.")
+@click.option('--log', 'log_sinks', multiple=True, callback=check_sinks,
+              metavar='SINK',
+              help="Where to log: syslog, file:PATH (text lines) or "
+              "json:PATH (JSON lines). Can be repeated. Defaults to syslog "
+              "when /dev/log exists.")
+@click.option('--log-level', type=click.Choice(logs.LEVELS), default='info',
+              show_default=True, help="Least severe records logged.")
+def main(conf, keyring, save_report, archive_path, check_names, workers,
+         full_report, concurrency, timeout, backend_kind, hedge, deadline,
+         replay, record, no_cache, cache_dir, trends_db, no_trends, interval,
+         ssh_user, ssh_concurrency, ssh_timeout, journal_limits, offline,
+         processes, daemon_mode, listen, max_interval, metrics_json,
+         metrics_prom, trace_memory, output_format, log_sinks, log_level):
+    """Check the sanity of a Ceph cluster."""
+    logs.configure(log_sinks, log_level)
+    options = {'journal_limits': journal_limits}
+    if offline:
+        from ceph_check import batch
+        sys.exit(batch.run(offline, check_names, processes, options,
+                           output_format))
+    if daemon_mode:
+        from ceph_check import daemon
+        address = daemon.DEFAULT_ADDRESS
+        try:
+            if listen:
+                address = daemon.parse_address(listen)
+        except ValueError:
+            raise click.BadParameter("expected [HOST:]PORT",
+                                     param_hint="--listen")
+    if backend_kind is None:
+        # The daemon keeps its monitor connection between rounds.
+        backend_kind = 'rados' if daemon_mode else 'cli'
+    backend = make_backend(backend_kind, conf, keyring, timeout,
+                           replay=replay, record=record, hedge=hedge)
+    report_cache = None if no_cache else cache.ReportCache(cache_dir)
+    trend_store = None if no_trends else open_trends(trends_db)
+    from ceph_check import hostfacts
+    ssh = hostfacts.SSHCollector(
+        user=ssh_user,
+        concurrency=ssh_concurrency or hostfacts.DEFAULT_CONCURRENCY,
+        timeout=ssh_timeout or hostfacts.DEFAULT_TIMEOUT)
+    recorder = None
+    if metrics_json or metrics_prom:
+        recorder = metrics.Recorder(trace_memory=trace_memory)
+    checker = CephCheck(conf, keyring, save_report=save_report,
+                        archive=archive_path,
+                        checks=check_names, workers=workers,
+                        full_report=full_report, concurrency=concurrency,
+                        timeout=timeout, backend=backend, cache=report_cache,
+                        interval=None if daemon_mode else interval, ssh=ssh,
+                        recorder=recorder, metrics_json=metrics_json,
+                        metrics_prom=metrics_prom,
+                        backoff=monitors.Backoff(deadline=deadline),
+                        options=options, output_format=output_format,
+                        trends=trend_store)
+    if daemon_mode:
+        run(daemon.Daemon(checker, address,
+                          interval or daemon.DEFAULT_INTERVAL,
+                          max_interval or daemon.DEFAULT_MAX_INTERVAL))
+    run(checker)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+"""
+Which Ceph daemons share a host.
+
+The OSD metadata gives the host name and public address of every OSD.
+Both go into dicts, and every MON (from the monmap), MDS (from the
+fsmap) and RGW (from the servicemap) is looked up there by address, then
+by name, so the join is linear in the number of daemons. Daemons found
+in neither are on a host of their own, named after them the way the
+deployment tools name MON hosts.
+"""
+
+from collections import OrderedDict
+
+# Roles in the order they are listed.
+ROLES = ('mon', 'mds', 'rgw', 'osd')
+# Role pairs worth a warning when they share a host.
+WARN_PAIRS = {
+    ('mon', 'osd'): "OSD recovery competes with the monitor store",
+}
+# Prefixes of the addresses in an address vector.
+ADDR_TYPES = ('v2:', 'v1:', 'any:')
+
+
+def address_ip(address):
+    """
+    The IP of a `host:port/nonce` address, also for `[v6]:port` and the
+    `[v2:host:port/nonce,v1:host:port/nonce]` vectors of Nautilus on.
+    """
+    if not address:
+        return None
+    address = str(address)
+    if address.startswith('[') and address[1:].startswith(ADDR_TYPES):
+        # The addresses of a vector share their IP.
+        address = address[1:-1].split(',')[0]
+    for prefix in ADDR_TYPES:
+        if address.startswith(prefix):
+            address = address[len(prefix):]
+            break
+    address = address.split('/')[0]
+    if address.startswith('['):
+        return address[1:].split(']')[0]
+    if address.count(':') == 1:
+        return address.split(':')[0]
+    return address
+
+
+def short_name(host):
+    """Host names compare without their domain."""
+    return str(host).split('.')[0].lower()
+
+
+def daemon_address(daemon):
+    """The first address of a map entry, from `addr` or its `addrs`."""
+    if daemon.get('addr'):
+        return daemon['addr']
+    vector = (daemon.get('public_addrs') or daemon.get('addrs') or {}).get(
+        'addrvec', [])
+    return vector[0]['addr'] if vector else None
+
+
+def mds_daemons(fsmap):
+    """(name, address) of every MDS in the `fsmap`, active or standby."""
+    daemons = []
+    for filesystem in fsmap.get('filesystems', []):
+        for info in filesystem.get('mdsmap', {}).get('info', {}).values():
+            daemons.append((info.get('name'), daemon_address(info)))
+    for info in fsmap.get('standbys', []):
+        daemons.append((info.get('name'), daemon_address(info)))
+    return daemons
+
+
+def service_daemons(servicemap, service):
+    """(host name, address) of every `service` daemon in the servicemap."""
+    daemons = servicemap.get('services', {}).get(service, {}).get(
+        'daemons', {})
+    return [(daemon.get('metadata', {}).get('hostname', name),
+             daemon_address(daemon))
+            for name, daemon in daemons.items()
+            if isinstance(daemon, dict)]
+
+
+class HostMap(object):
+    """
+    The daemons of every host.
+
+    `add()` puts a daemon on the host known by its address or name, and
+    otherwise on a new host named after it.
+    """
+
+    def __init__(self):
+        # Host name -> role -> daemon names.
+        self.hosts = OrderedDict()
+        self._by_ip = {}
+        self._by_name = {}
+
+    def host(self, name, address=None):
+        """The known host with `address` or `name`, None if there is none."""
+        ip = address_ip(address)
+        if ip is not None and ip in self._by_ip:
+            return self._by_ip[ip]
+        return self._by_name.get(short_name(name)) if name else None
+
+    def add(self, role, daemon, host_name=None, address=None):
+        """Record `daemon` of `role`, returns the host it is on."""
+        host = self.host(host_name or daemon, address)
+        if host is None:
+            host = str(host_name or daemon)
+            self._by_name[short_name(host)] = host
+        ip = address_ip(address)
+        if ip is not None:
+            self._by_ip.setdefault(ip, host)
+        self.hosts.setdefault(host, OrderedDict()).setdefault(
+            role, []).append(daemon)
+        return host
+
+    def roles(self, host):
+        """The roles of `host`, in `ROLES` order."""
+        return tuple(role for role in ROLES if role in self.hosts[host])
+
+    def role_sets(self):
+        """Hosts by their set of roles, e.g. `('mon', 'osd')`."""
+        found = OrderedDict()
+        for host in self.hosts:
+            found.setdefault(self.roles(host), []).append(host)
+        return found
+
+
+def host_map(snapshot):
+    """
+    The `HostMap` of the cluster, from the sections the snapshot has.
+
+    The OSDs come first, they give the host names and addresses the other
+    daemons are matched against.
+    """
+    hosts = HostMap()
+    if snapshot.has_section('osd_metadata'):
+        for osd in snapshot.osd_metadata:
+            hosts.add('osd', "osd.{0}".format(osd['id']),
+                      osd.get('hostname'), osd.get('front_addr'))
+    if snapshot.has_section('monmap'):
+        for mon in snapshot.monmap.get('mons', []):
+            hosts.add('mon', "mon.{0}".format(mon['name']), mon['name'],
+                      daemon_address(mon))
+    if snapshot.has_section('fsmap'):
+        for name, address in mds_daemons(snapshot.fsmap):
+            hosts.add('mds', "mds.{0}".format(name), name, address)
+    if snapshot.has_section('servicemap'):
+        for host, address in service_daemons(snapshot.servicemap, 'rgw'):
+            hosts.add('rgw', "rgw.{0}".format(host), host, address)
+    return hosts
@@ -0,0 +1,571 @@
+# -*- coding: utf-8 -*-
+
+"""
+Analyze the CRUSH map, and simulate where it places the PGs.
+
+`CrushMap` indexes the report's `crushmap`: the buckets by id and name,
+the items of each bucket as arrays, each item's parent and the device
+classes. On top of it are the sanity checks (empty buckets, bucket
+weights disagreeing with their items, zero weight devices) and the
+weight of each failure domain under a rule.
+
+`CrushMap.map_pgs()` runs a rule for many PGs at once. It follows the
+straw2 bucket choice of CRUSH with the rjenkins1 hash computed on NumPy
+arrays, a whole batch of PGs per bucket, and retries collisions and out
+OSDs the way the `firstn` and `indep` steps do. It takes two shortcuts:
+the fixed point `crush_ln()` is replaced by a table of floating point
+logs, and when the map leaves out the per-class shadow buckets, they
+take the ids of the buckets they shadow. Placements are therefore
+not those of the cluster PG for PG, but follow the same distribution,
+which is what the per-OSD PG counts are about.
+"""
+
+import numpy as np
+
+# Fixed point weights in the crushmap are 16.16.
+WEIGHT_ONE = 0x10000
+# Attempts at placing a replica, the `choose_total_tries` tunable.
+DEFAULT_TRIES = 50
+# A failure domain weighing this much more than the average is flagged.
+IMBALANCE_THRESHOLD = 1.2
+# Hash cells per batch, small enough for the arrays to stay in cache.
+BATCH_CELLS = 1 << 15
+
+# No item: bucket ids are negative, and -1 is one of them.
+_NONE = np.iinfo(np.int64).min
+
+_SEED = np.uint32(1315423911)
+_X = np.uint32(231232)
+_Y = np.uint32(1232)
+# The shift of each of the nine rounds of a mix.
+_ROUNDS = tuple((shift, np.uint32(bits)) for shift, bits in (
+    (np.right_shift, 13), (np.left_shift, 8), (np.right_shift, 13),
+    (np.right_shift, 12), (np.left_shift, 16), (np.right_shift, 5),
+    (np.right_shift, 3), (np.left_shift, 10), (np.right_shift, 15)))
+# log2((u + 1) / 2**16) for each 16 bit hash u, what crush_ln() computes
+# in fixed point.
+_LN = np.log2(np.arange(1, WEIGHT_ONE + 1) / float(WEIGHT_ONE))
+
+
+def _mix(a, b, c, scratch):
+    """Robert Jenkins' 96 bit mix, in place on uint32 arrays."""
+    for shift, bits in _ROUNDS:
+        np.subtract(a, b, out=a)
+        np.subtract(a, c, out=a)
+        shift(c, bits, out=scratch)
+        np.bitwise_xor(a, scratch, out=a)
+        a, b, c = b, c, a
+
+
+def _lanes(shape, *values):
+    """uint32 arrays of `shape` from broadcastable int arrays."""
+    lanes = []
+    for value in values:
+        lane = np.empty(shape, dtype=np.uint32)
+        value = np.asarray(value)
+        if value.dtype != np.uint32:
+            value = value.astype(np.int64).astype(np.uint32)
+        lane[...] = value
+        lanes.append(lane)
+    return lanes
+
+
+def hash32_2(a, b):
+    """`crush_hash32_rjenkins1_2()` of two broadcastable int arrays."""
+    shape = np.broadcast(np.asarray(a), np.asarray(b)).shape
+    a, b, x, y, scratch = _lanes(shape, a, b, _X, _Y, 0)
+    h = a ^ b
+    h ^= _SEED
+    _mix(a, b, h, scratch)
+    _mix(x, a, h, scratch)
+    _mix(b, y, h, scratch)
+    return h
+
+
+def hash32_3(a, b, c):
+    """`crush_hash32_rjenkins1_3()` of three broadcastable int arrays."""
+    shape = np.broadcast(np.asarray(a), np.asarray(b), np.asarray(c)).shape
+    a, b, c, x, y, scratch = _lanes(shape, a, b, c, _X, _Y, 0)
+    h = a ^ b
+    h ^= c
+    h ^= _SEED
+    _mix(a, b, h, scratch)
+    _mix(c, x, h, scratch)
+    _mix(y, a, h, scratch)
+    _mix(b, x, h, scratch)
+    _mix(y, c, h, scratch)
+    return h
+
+
+def straw2(x, r, ids, weights):
+    """
+    The straw2 choice among `ids` for each input `x` and replica `r`.
+
+    `x` and `r` are per-row arrays, `ids` and `weights` (floats) the
+    bucket's items. Returns the chosen id per row, `_NONE` when every
+    item weighs nothing.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float64)
+    chosen = np.full(len(x), _NONE, dtype=np.int64)
+    # Weightless items never win, they need no draw.
+    keep = weights > 0
+    ids, weights = ids[keep], weights[keep]
+    if not len(ids):
+        return chosen
+    if len(ids) == 1:
+        chosen[:] = ids[0]
+        return chosen
+    # With equal weights the largest hash wins, as the log is monotonic.
+    even = (weights == weights[0]).all()
+    scale = 1.0 / weights
+    step = max(1, BATCH_CELLS // len(ids))
+    for start in range(0, len(x), step):
+        end = start + step
+        u = hash32_3(x[start:end, None], ids[None, :], r[start:end, None])
+        u &= np.uint32(0xffff)
+        if even:
+            chosen[start:end] = ids[u.argmax(axis=1)]
+        else:
+            draw = _LN[u]
+            draw *= scale
+            chosen[start:end] = ids[draw.argmax(axis=1)]
+    return chosen
+
+
+def pg_inputs(pool):
+    """
+    The CRUSH input of each PG of `pool`, an osdmap pool dict.
+
+    That is the placement seed of each PG, `ceph_stable_mod()` of its
+    number by `pgp_num`, hashed with the pool id for `hashpspool` pools.
+    """
+    pg_num = pool['pg_num']
+    pgp_num = pool.get('pg_placement_num', pg_num) or pg_num
+    mask = (1 << int(pgp_num - 1).bit_length()) - 1
+    ps = np.arange(pg_num, dtype=np.int64)
+    seed = np.where((ps & mask) < pgp_num, ps & mask, ps & (mask >> 1))
+    if 'hashpspool' in pool.get('flags_names', '').split(','):
+        return hash32_2(seed, pool['pool'])
+    return (seed + pool['pool']).astype(np.uint32)
+
+
+class Rule(object):
+    """A CRUSH rule's steps, reduced to what placement needs."""
+
+    def __init__(self, rule):
+        self.id = rule.get('rule_id', rule.get('ruleset'))
+        self.name = rule.get('rule_name', str(self.id))
+        self.steps = rule.get('steps', [])
+
+    @property
+    def takes(self):
+        """The bucket name (or id) of each `take` step."""
+        return [step.get('item_name', step.get('item'))
+                for step in self.steps if step.get('op') == 'take']
+
+    @property
+    def failure_domain(self):
+        """The type of the last `chooseleaf` (or `choose`) step."""
+        domain = None
+        for step in self.steps:
+            if step.get('op', '').startswith('choose'):
+                domain = step.get('type')
+        return domain
+
+
+class CrushMap(object):
+    """The report's `crushmap`, indexed by bucket and item."""
+
+    def __init__(self, crushmap):
+        self.crushmap = crushmap
+        self.types = dict((t['type_id'], t['name'])
+                          for t in crushmap.get('types', []))
+        self.type_ids = dict((name, type_id)
+                             for type_id, name in self.types.items())
+        self.buckets = dict((bucket['id'], bucket)
+                            for bucket in crushmap.get('buckets', []))
+        self.names = dict((bucket['name'], bucket['id'])
+                          for bucket in self.buckets.values())
+        self.devices = dict((device['id'], device)
+                            for device in crushmap.get('devices', []))
+        self.names.update((device['name'], device_id)
+                          for device_id, device in self.devices.items())
+        self.rules = dict((rule.id, rule) for rule in (
+            Rule(rule) for rule in crushmap.get('rules', [])))
+        self.items = {}
+        self.weights = {}
+        self.parent = {}
+        self.device_weights = {}
+        # The type id of bucket -1 - i at index i.
+        self._bucket_types = np.full(
+            -min(list(self.buckets) + [-1]), -1, dtype=np.int64)
+        for bucket_id, bucket in self.buckets.items():
+            items = bucket.get('items', [])
+            self.items[bucket_id] = np.array(
+                [item['id'] for item in items], dtype=np.int64)
+            self.weights[bucket_id] = np.array(
+                [item['weight'] for item in items], dtype=np.int64)
+            for item in items:
+                self.parent[item['id']] = bucket_id
+                if item['id'] >= 0:
+                    self.device_weights[item['id']] = (
+                        item['weight'] / float(WEIGHT_ONE))
+            self._bucket_types[-1 - bucket_id] = bucket.get(
+                'type_id', self.type_ids.get(bucket.get('type_name'), -1))
+        self.tries = crushmap.get('tunables', {}).get(
+            'choose_total_tries', DEFAULT_TRIES)
+        self._views = {}
+
+    def type_of(self, item):
+        if item >= 0:
+            return self.types.get(0, 'osd')
+        return self.buckets[item].get('type_name')
+
+    def name_of(self, item):
+        if item >= 0:
+            return self.devices.get(item, {}).get(
+                'name', "osd.{0}".format(item))
+        return self.buckets[item]['name']
+
+    def device_class(self, item):
+        return self.devices.get(item, {}).get('class')
+
+    def roots(self):
+        """The buckets without a parent."""
+        return [bucket_id for bucket_id in sorted(self.buckets, reverse=True)
+                if bucket_id not in self.parent]
+
+    def resolve(self, item):
+        """A bucket or device id, from its id or name."""
+        if isinstance(item, int):
+            return item
+        return self.names[item]
+
+    def take(self, name):
+        """
+        The bucket a `take` step starts from, and the device class it is
+        limited to.
+
+        A `root~class` shadow bucket missing from the map is taken as its
+        root limited to the class.
+        """
+        if name in self.names or name in self.buckets:
+            return self.names.get(name, name), None
+        device_class = None
+        if '~' in str(name):
+            name, device_class = name.split('~', 1)
+        return self.names.get(name, _NONE), device_class
+
+    def devices_under(self, item, device_class=None):
+        """The device ids below `item`."""
+        found = []
+        stack = [self.resolve(item)]
+        while stack:
+            node = stack.pop()
+            if node >= 0:
+                if device_class in (None, self.device_class(node)):
+                    found.append(node)
+            else:
+                stack.extend(self.items.get(node, ()).tolist())
+        return sorted(found)
+
+    def view(self, device_class=None):
+        """
+        Each bucket's items and their weights (as floats), for placement.
+
+        With a `device_class`, only devices of that class are kept and
+        bucket weights are those of the devices kept, like the shadow
+        trees CRUSH builds for each class.
+        """
+        if device_class in self._views:
+            return self._views[device_class]
+        view = {}
+
+        def weigh(bucket_id):
+            if bucket_id not in view:
+                ids, weights = [], []
+                for item, weight in zip(self.items[bucket_id].tolist(),
+                                        self.weights[bucket_id].tolist()):
+                    weight /= float(WEIGHT_ONE)
+                    if item < 0:
+                        if item not in self.buckets:
+                            continue
+                        if device_class is not None:
+                            weight = weigh(item)
+                    elif device_class not in (None, self.device_class(item)):
+                        continue
+                    if device_class is None or weight > 0:
+                        ids.append(item)
+                        weights.append(weight)
+                view[bucket_id] = (np.array(ids, dtype=np.int64),
+                                   np.array(weights, dtype=np.float64))
+            return float(view[bucket_id][1].sum())
+
+        for bucket_id in self.buckets:
+            weigh(bucket_id)
+        self._views[device_class] = view
+        return view
+
+    def subtree_weight(self, item, device_class=None):
+        """The summed CRUSH weight of the devices below `item`."""
+        return sum(self.device_weights.get(device, 0.0)
+                   for device in self.devices_under(item, device_class))
+
+    def empty_buckets(self):
+        """Buckets without any item, or whose items all weigh nothing."""
+        return [bucket_id for bucket_id in sorted(self.buckets, reverse=True)
+                if not (self.weights[bucket_id] > 0).any()]
+
+    def misweighted(self):
+        """
+        Disagreeing weights, as (item, recorded, expected) tuples in
+        16.16 fixed point.
+
+        A bucket's own weight should be the sum of its items' weights,
+        and the weight a bucket is listed with in its parent should be
+        that bucket's own weight.
+        """
+        found = []
+        for bucket_id in sorted(self.buckets, reverse=True):
+            recorded = self.buckets[bucket_id].get('weight')
+            expected = int(self.weights[bucket_id].sum())
+            # Rounding differs by at most one unit per item.
+            if recorded is not None and abs(recorded - expected) > len(
+                    self.weights[bucket_id]):
+                found.append((bucket_id, recorded, expected))
+            parent = self.parent.get(bucket_id)
+            if parent is not None and recorded is not None:
+                listed = self.weights[parent][
+                    self.items[parent].tolist().index(bucket_id)]
+                if abs(int(listed) - recorded) > 1:
+                    found.append((bucket_id, int(listed), recorded))
+        return found
+
+    def zero_weight_devices(self):
+        """Devices in a bucket with a CRUSH weight of zero."""
+        return sorted(device for device, weight in
+                      self.device_weights.items() if not weight)
+
+    def domain_weights(self, rule_id):
+        """
+        The weight of each failure domain `rule_id` places replicas in.
+
+        Returns an ordered list of (bucket id, weight), for every `take`
+        of the rule, empty when the rule picks devices directly.
+        """
+        rule = self.rules[rule_id]
+        domain = rule.failure_domain
+        found = []
+        if domain in (None, self.types.get(0, 'osd')):
+            return found
+        for name in rule.takes:
+            root, device_class = self.take(name)
+            stack = [root]
+            while stack:
+                node = stack.pop()
+                if node not in self.buckets:
+                    continue
+                if self.type_of(node) == domain:
+                    weight = self.subtree_weight(node, device_class)
+                    if weight > 0 or device_class is None:
+                        found.append((node, weight))
+                    continue
+                stack.extend(item for item in reversed(
+                    self.items[node].tolist()) if item < 0)
+        return found
+
+    def rule_devices(self, rule_id):
+        """The devices below the `take`s of `rule_id`."""
+        found = set()
+        for name in self.rules[rule_id].takes:
+            root, device_class = self.take(name)
+            if root in self.buckets:
+                found.update(self.devices_under(root, device_class))
+        return sorted(found)
+
+    def _types_of(self, items):
+        """The type id of each item, -1 for unknown buckets and `_NONE`."""
+        types = np.zeros(len(items), dtype=np.int64)
+        buckets = items < 0
+        index = -1 - items[buckets]
+        known = index < len(self._bucket_types)
+        found = np.full(len(index), -1, dtype=np.int64)
+        found[known] = self._bucket_types[index[known]]
+        types[buckets] = found
+        return types
+
+    def _descend(self, view, x, r, start, target):
+        """
+        Walk down from the `start` buckets to an item of type id `target`,
+        choosing at each bucket with straw2, at least once.
+
+        Returns the items reached, `_NONE` where a bucket had nothing to
+        choose from.
+        """
+        current = start.copy()
+        active = (current < 0) & (current != _NONE)
+        while True:
+            rows = np.flatnonzero(active)
+            if not len(rows):
+                return current
+            order = rows[np.argsort(current[rows], kind='stable')]
+            buckets, starts = np.unique(current[order], return_index=True)
+            for bucket_id, begin, end in zip(
+                    buckets.tolist(), starts.tolist(),
+                    starts[1:].tolist() + [len(order)]):
+                chunk = order[begin:end]
+                if bucket_id not in view:
+                    current[chunk] = _NONE
+                    continue
+                ids, weights = view[bucket_id]
+                current[chunk] = straw2(x[chunk], r[chunk], ids, weights)
+            active = ((current < 0) & (current != _NONE) &
+                      (self._types_of(current) != target))
+
+    def _is_out(self, x, osds, reweight):
+        """Which of `osds` the osdmap `reweight`s reject for input `x`."""
+        known = osds < len(reweight)
+        weight = np.zeros(len(osds))
+        weight[known] = reweight[osds[known]]
+        out = weight <= 0
+        partial = (weight > 0) & (weight < 1)
+        if partial.any():
+            u = hash32_2(x[partial], osds[partial]) & np.uint32(0xffff)
+            out[partial] = u >= weight[partial] * WEIGHT_ONE
+        return out
+
+    def _choose(self, view, x, start, count, target, leaf, indep, reweight,
+                tries):
+        """One `choose` or `chooseleaf` step, from each of the `start`s."""
+        chosen = np.full((len(x), count), _NONE, dtype=np.int64)
+        leaves = chosen.copy()
+        for rep in range(count):
+            pending = start != _NONE
+            for ftotal in range(tries):
+                rows = np.flatnonzero(pending)
+                if not len(rows):
+                    break
+                r = np.full(len(rows), rep + (count if indep else 1) * ftotal,
+                            dtype=np.int64)
+                item = self._descend(view, x[rows], r, start[rows], target)
+                ok = item != _NONE
+                if rep:
+                    ok &= ~(chosen[rows, :rep] == item[:, None]).any(axis=1)
+                device = item.copy()
+                if leaf and target != 0:
+                    device[ok] = self._descend(view, x[rows[ok]], r[ok],
+                                               item[ok], 0)
+                    ok &= device != _NONE
+                devices = ok & (device >= 0)
+                if reweight is not None and devices.any():
+                    out = self._is_out(x[rows[devices]], device[devices],
+                                       reweight)
+                    ok[np.flatnonzero(devices)[out]] = False
+                chosen[rows[ok], rep] = item[ok]
+                leaves[rows[ok], rep] = device[ok]
+                pending[rows[ok]] = False
+        result = leaves if leaf else chosen
+        if not indep:
+            # firstn leaves out what it could not place.
+            order = np.argsort(result == _NONE, axis=1, kind='stable')
+            result = np.take_along_axis(result, order, axis=1)
+        return result
+
+    def map_pgs(self, rule_id, x, size, reweight=None, tries=None):
+        """
+        Run the rule `rule_id` for the inputs `x` (see `pg_inputs()`).
+
+        `reweight` is the osdmap weight of each OSD id, between 0 and 1,
+        None takes every OSD as fully in. `tries` defaults to the map's
+        `choose_total_tries`. Returns an array of `size` device ids per
+        input, -1 where no device could be placed.
+        """
+        tries = tries or self.tries
+        x = np.asarray(x, dtype=np.uint32)
+        if reweight is not None:
+            reweight = np.asarray(reweight, dtype=np.float64)
+        emitted = []
+        work = None
+        view = self.view()
+        for step in self.rules[rule_id].steps:
+            op = step.get('op', '')
+            if op == 'take':
+                root, device_class = self.take(
+                    step.get('item_name', step.get('item')))
+                view = self.view(device_class)
+                if root not in self.buckets:
+                    root = _NONE
+                work = np.full((len(x), 1), root, dtype=np.int64)
+            elif op.startswith('choose') and work is not None:
+                count = step.get('num', 0)
+                if count <= 0:
+                    count += size
+                # Unknown types never match, the walk goes down to devices.
+                target = self.type_ids.get(step.get('type'), -2)
+                work = np.concatenate([
+                    self._choose(view, x, column, count, target,
+                                 op.startswith('chooseleaf'), 'indep' in op,
+                                 reweight, tries)
+                    for column in work.T], axis=1)
+            elif op == 'emit' and work is not None:
+                emitted.append(work)
+                work = None
+        up = np.full((len(x), size), -1, dtype=np.int64)
+        if emitted:
+            placed = np.concatenate(emitted, axis=1)[:, :size]
+            up[:, :placed.shape[1]] = np.where(placed >= 0, placed, -1)
+        return up
+
+
+def reweights(osd_table):
+    """The osdmap weight of each OSD id, zero when out or missing."""
+    reweight = np.zeros(int(osd_table.id.max()) + 1 if len(osd_table.id)
+                        else 0)
+    reweight[osd_table.id] = np.where(osd_table.in_, osd_table.weight, 0)
+    return reweight
+
+
+def simulate(snapshot, pools=None, tries=None):
+    """
+    The predicted up set of every PG, by pool id.
+
+    Reads the crushmap and osdmap sections. `pools` limits the pools
+    simulated to those ids.
+    """
+    crush = CrushMap(snapshot.crushmap)
+    reweight = reweights(snapshot.osd_table)
+    placed = {}
+    for pool in snapshot.osdmap['pools']:
+        if pools is not None and pool['pool'] not in pools:
+            continue
+        rule = pool.get('crush_rule', pool.get('crush_ruleset'))
+        if rule not in crush.rules:
+            continue
+        placed[pool['pool']] = crush.map_pgs(
+            rule, pg_inputs(pool), pool['size'], reweight, tries)
+    return placed
+
+
+def pg_counts(up, osd_count):
+    """PG replicas per OSD id in the up sets `up`."""
+    return np.bincount(up[up >= 0], minlength=osd_count)
+
+
+def fair_share(crush, rule_id, replicas, reweight):
+    """
+    The PG replicas each device of `rule_id` would hold if placement
+    followed the weights exactly, as (device ids, shares).
+
+    A device's weight is its CRUSH weight times its osdmap `reweight`.
+    """
+    devices = np.array(crush.rule_devices(rule_id), dtype=np.int64)
+    weights = np.array([crush.device_weights.get(device, 0.0)
+                        for device in devices.tolist()])
+    known = devices < len(reweight)
+    weights[known] *= reweight[devices[known]]
+    weights[~known] = 0
+    total = weights.sum()
+    if not total:
+        return devices, np.zeros(len(devices))
+    return devices, replicas * weights / total
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+
+"""
+Keep checking a cluster from one long-running process.
+
+Rather than a fresh interpreter, a fresh `ceph` client and a full fetch
+every few minutes from cron, the daemon keeps its backend (and with it
+the monitor connection, see `ceph_check.backends`), its cache and the
+state of the incremental checks between rounds. It polls often while
+the cluster is unhealthy and backs off to `max_interval` while it is
+`HEALTH_OK`.
+
+The results of the last round are kept in memory and served over HTTP,
+`/` as JSON and `/metrics` in the Prometheus text format. Serving them
+never queries the cluster, scrapes only read what the last round left.
+"""
+
+from __future__ import print_function
+import json
+import logging
+import threading
+import time
+
+from ceph_check import findings
+from ceph_check import incremental
+from ceph_check import metrics
+
+cc_logger = logging.getLogger("ceph_check")
+
+DEFAULT_ADDRESS = ('127.0.0.1', 9750)
+DEFAULT_INTERVAL = 30
+DEFAULT_MAX_INTERVAL = 300
+
+HEALTH_VALUES = {'HEALTH_OK': 0, 'HEALTH_WARN': 1, 'HEALTH_ERR': 2}
+
+
+def parse_address(value):
+    """Split `[HOST:]PORT` into a (host, port) tuple."""
+    host, _, port = value.rpartition(':')
+    return (host.strip('[]') or DEFAULT_ADDRESS[0], int(port))
+
+
+def health_status(snapshot):
+    """The cluster's `HEALTH_*` status in `snapshot`, None if unknown."""
+    if snapshot is None or not snapshot.has_section('health'):
+        return None
+    health = snapshot.health
+    return health.get('status', health.get('overall_status'))
+
+
+class RoundResult(object):
+    """What one polling round found, as served until the next one."""
+
+    def __init__(self, number, started, results=(), health=None, error=None,
+                 summary=None):
+        self.number = number
+        self.started = started
+        self.finished = time.time()
+        self.results = list(results)
+        self.health = health
+        self.error = error
+        # The `ceph_check.metrics` summary of the round.
+        self.summary = summary
+
+    @property
+    def ok(self):
+        return self.error is None and all(
+            result.ok for result in self.results)
+
+    @property
+    def healthy(self):
+        if self.health is not None:
+            return self.health == 'HEALTH_OK'
+        return self.ok
+
+    def as_dict(self):
+        return {
+            'round': self.number,
+            'started': self.started,
+            'finished': self.finished,
+            'health': self.health,
+            'ok': self.ok,
+            'error': self.error,
+            'checks': [{'name': result.name, 'ok': result.ok,
+                        'elapsed': result.elapsed, 'output': result.output,
+                        'error': result.error,
+                        'findings': [finding.as_dict()
+                                     for finding in result.findings]}
+                       for result in self.results],
+        }
+
+
+def _server(address, daemon):
+    """The HTTP server for `daemon`, imported once the daemon serves."""
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            path = self.path.split('?')[0]
+            if path in ('/', '/status'):
+                body = json.dumps(daemon.status(), indent=2,
+                                  default=findings.json_default)
+                kind = 'application/json'
+            elif path == '/metrics':
+                body = daemon.prometheus()
+                kind = 'text/plain; version=0.0.4'
+            else:
+                self.send_error(404)
+                return
+            body = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', kind)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            cc_logger.debug("HTTP %s", format % args)
+
+    return Server(address, Handler)
+
+
+class Daemon(object):
+    """
+    Polls the cluster through `checker`, a `ceph_check.CephCheck`.
+
+    Rounds run every `interval` seconds while the cluster is unhealthy or
+    cannot be reached, the interval then doubles each healthy round up to
+    `max_interval`. The results are served on `address`, None serves
+    nothing, and written out in `output_format` when one is given.
+
+    `CephCheck.watch()` is a daemon which serves nothing, writes every
+    round out and keeps to one interval.
+    """
+
+    def __init__(self, checker, address=DEFAULT_ADDRESS,
+                 interval=DEFAULT_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL,
+                 output_format=None):
+        self.checker = checker
+        self.address = address
+        self.interval = interval
+        self.max_interval = max(interval, max_interval)
+        self.current_interval = interval
+        self.output_format = output_format
+        if (address is not None and
+                isinstance(checker.recorder, metrics.NullRecorder)):
+            # Served with the round.
+            checker.recorder = metrics.Recorder()
+        self.runner = incremental.IncrementalRunner(
+            checker.checks, checker.providers, checker.options,
+            max_workers=checker.workers,
+            recorder=checker.recorder)
+        self.last = None
+        self.rounds = 0
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.server = None
+
+    def next_interval(self, healthy):
+        """Seconds until the next round, after a round that was `healthy`."""
+        if healthy:
+            self.current_interval = min(self.max_interval,
+                                        self.current_interval * 2)
+        else:
+            self.current_interval = self.interval
+        return self.current_interval
+
+    def poll(self):
+        """Run one round and keep its results, returns the `RoundResult`."""
+        started = time.time()
+        recorder = self.checker.recorder
+        recorder.reset()
+        results = ()
+        error = None
+        snapshot = None
+        try:
+            snapshot = self.checker.fetch_snapshot()
+            if snapshot is None:
+                error = "Cannot fetch the cluster maps"
+            elif self.output_format is None:
+                results = self.runner.update(snapshot)
+            else:
+                results = self.write_round(snapshot)
+        except Exception as err:
+            cc_logger.exception(err)
+            error = str(err)
+        if error is not None:
+            # Start from a fresh connection next round.
+            self.checker.backend.close()
+        summary = None
+        if not isinstance(recorder, metrics.NullRecorder):
+            summary = recorder.summary()
+        result = RoundResult(self.rounds + 1, started, results,
+                             health_status(snapshot), error, summary)
+        with self._lock:
+            self.rounds += 1
+            self.last = result
+        self.checker.export_metrics()
+        cc_logger.info("Round {0} : {1}, re-ran {2}".format(
+            result.number, result.health or error, self.runner.rerun))
+        return result
+
+    def write_round(self, snapshot):
+        """Run the round's checks, writing them out in `output_format`."""
+        text = self.output_format == 'text'
+        renderer = findings.make_renderer(
+            self.output_format,
+            extra=None if text else {'round': self.rounds + 1})
+        results = self.runner.update(snapshot, renderer.result,
+                                     renderer.finding)
+        if text:
+            print("\n=== {0} , re-ran : {1} ===".format(
+                time.strftime("%Y-%m-%d %H:%M:%S"),
+                ", ".join(self.runner.rerun) or "none"))
+        renderer.finish(results)
+        return results
+
+    def status(self):
+        """The last round as a JSON-able dict, from memory."""
+        with self._lock:
+            last = self.last
+        status = {'uptime': time.time() - self.started,
+                  'rounds': self.rounds,
+                  'interval': self.current_interval}
+        status['last'] = last.as_dict() if last is not None else None
+        return status
+
+    def prometheus(self):
+        """The last round in the Prometheus text format, from memory."""
+        with self._lock:
+            last = self.last
+        lines = [
+            "# HELP ceph_check_up Whether the last round reached the "
+            "cluster.",
+            "# TYPE ceph_check_up gauge",
+            "ceph_check_up {0}".format(
+                int(last is not None and last.error is None)),
+            "# HELP ceph_check_rounds_total Polling rounds run.",
+            "# TYPE ceph_check_rounds_total counter",
+            "ceph_check_rounds_total {0}".format(self.rounds),
+            "# HELP ceph_check_interval_seconds Seconds between rounds.",
+            "# TYPE ceph_check_interval_seconds gauge",
+            "ceph_check_interval_seconds {0}".format(self.current_interval),
+        ]
+        if last is None:
+            return "\n".join(lines) + "\n"
+        lines.extend([
+            "# HELP ceph_check_health_status Cluster health, 0 OK, 1 WARN, "
+            "2 ERR.",
+            "# TYPE ceph_check_health_status gauge",
+        ])
+        if last.health in HEALTH_VALUES:
+            lines.append("ceph_check_health_status {0}".format(
+                HEALTH_VALUES[last.health]))
+        lines.extend([
+            "# HELP ceph_check_check_ok Whether each check passed.",
+            "# TYPE ceph_check_check_ok gauge",
+        ])
+        lines.extend('ceph_check_check_ok{{check="{0}"}} {1}'.format(
+            result.name, int(result.ok)) for result in last.results)
+        lines.extend([
+            "# HELP ceph_check_last_round_timestamp_seconds When the last "
+            "round finished.",
+            "# TYPE ceph_check_last_round_timestamp_seconds gauge",
+            "ceph_check_last_round_timestamp_seconds {0}".format(
+                last.finished),
+        ])
+        text = "\n".join(lines) + "\n"
+        if last.summary is not None:
+            text += metrics.prometheus_text(last.summary)
+        return text
+
+    def start_server(self):
+        """Serve the results from a background thread."""
+        self.server = _server(self.address, self)
+        self.address = self.server.server_address[:2]
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  name="ceph_check-http")
+        thread.daemon = True
+        thread.start()
+        cc_logger.info("Serving the results on http://{0}:{1}/".format(
+            *self.address))
+
+    def stop(self):
+        """Have `run()` return after the current round."""
+        self._stop.set()
+
+    def wait(self, seconds):
+        """Sleep until the next round, or until stopped."""
+        self._stop.wait(seconds)
+
+    def run(self, rounds=None):
+        """
+        Check the conditions, then `loop()`.
+
+        Returns the status of the last round, like `CephCheck.run()`.
+        """
+        if not self.checker.cc_condition():
+            cc_logger.info("Exiting!")
+            print("\nExiting!\n")
+            return -1
+        return self.loop(rounds)
+
+    def loop(self, rounds=None):
+        """
+        Poll until stopped or interrupted, or for `rounds` rounds.
+
+        Returns the status of the last round.
+        """
+        if self.address is not None and self.server is None:
+            self.start_server()
+        status = -1
+        try:
+            while not self._stop.is_set():
+                result = self.poll()
+                status = -1 if result.error else (0 if result.ok else 1)
+                if rounds is not None and self.rounds >= rounds:
+                    break
+                elapsed = time.time() - result.started
+                self.wait(max(0, self.next_interval(result.healthy) -
+                              elapsed))
+        except KeyboardInterrupt:
+            cc_logger.info("Interrupted, stopping")
+        finally:
+            if self.server is not None:
+                self.server.shutdown()
+                self.server.server_close()
+                self.server = None
+            self.checker.backend.close()
+            self.checker.recorder.close()
+        return status
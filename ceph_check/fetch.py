@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+"""
+Fetch report sections with narrow monitor commands, in parallel.
+
+`ceph report` always carries the whole pgmap. When the selected checks
+only need a few maps, asking the monitors for just those is much cheaper,
+and the commands run side by side with a bound on how many are in flight
+and a timeout on each.
+
+Section names are the ones checks declare. Most are top-level `ceph
+report` sections, `pool_stats` and `osd_df` are carried inside the
+report's pgmap and have narrow commands of their own.
+"""
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from ceph_check import metrics
+
+cc_logger = logging.getLogger("ceph_check")
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 30
+
+# The monitor command answering each section, in `mon_command` form.
+SECTION_COMMANDS = {
+    'health': {'prefix': 'health', 'detail': 'detail'},
+    'monmap': {'prefix': 'mon dump'},
+    'osdmap': {'prefix': 'osd dump'},
+    'crushmap': {'prefix': 'osd crush dump'},
+    'pgmap': {'prefix': 'pg dump', 'dumpcontents': ['pgs_brief']},
+    # With the `last_active` and `last_clean` stamps pgs_brief leaves out.
+    'pg_dump': {'prefix': 'pg dump', 'dumpcontents': ['pgs']},
+    'pool_stats': {'prefix': 'pg dump', 'dumpcontents': ['pools']},
+    'osd_df': {'prefix': 'osd df'},
+    'osd_metadata': {'prefix': 'osd metadata'},
+    'fsmap': {'prefix': 'fs dump'},
+    'servicemap': {'prefix': 'service dump'},
+}
+
+# Sections not at the top level of `ceph report`, and where they live.
+REPORT_SECTIONS = {
+    'pool_stats': 'pgmap',
+    'osd_df': 'pgmap',
+    'pg_dump': 'pgmap',
+}
+
+# Sections whose command output holds all of another's, which is then
+# not fetched when both are wanted.
+SUPERSEDED_BY = {
+    'pgmap': 'pg_dump',
+}
+
+
+class FetchError(Exception):
+    """Raised when a section cannot be fetched from the cluster."""
+
+
+def report_sections(sections):
+    """The top-level `ceph report` sections holding `sections`."""
+    found = []
+    for section in sections:
+        section = REPORT_SECTIONS.get(section, section)
+        if section not in found:
+            found.append(section)
+    return tuple(found)
+
+
+def command_argv(command):
+    """Turn a `mon_command` dict into `ceph` CLI arguments."""
+    argv = command['prefix'].split()
+    for key, value in sorted(command.items()):
+        if key in ('prefix', 'format'):
+            continue
+        argv.extend(value if isinstance(value, list) else [value])
+    return argv + ['-f', 'json']
+
+
+def _normalize(section, value):
+    """Shape narrow command output like the matching report content."""
+    if section in ('pgmap', 'pg_dump') and isinstance(value, list):
+        # `pg dump pgs_brief` and `pgs` are bare lists before Nautilus.
+        return {'pg_stats': value}
+    if section == 'pool_stats' and isinstance(value, dict):
+        return value.get('pool_stats', [])
+    return value
+
+
+def fetch_sections(sections, runner, concurrency=DEFAULT_CONCURRENCY,
+                   timeout=DEFAULT_TIMEOUT, recorder=None):
+    """
+    Fetch `sections` at the same time and return them by name.
+
+    `runner(command, timeout)` runs one `mon_command` style dict and
+    returns its JSON output, e.g. the `command` method of a backend from
+    `ceph_check.backends`. At most `concurrency` commands run at once.
+    Each command and the decoding of its output are timed as `fetch` and
+    `parse` spans of `recorder`.
+    """
+    recorder = recorder or metrics.NullRecorder()
+    unknown = [s for s in sections if s not in SECTION_COMMANDS]
+    if unknown:
+        raise FetchError("No command fetches {0}".format(", ".join(unknown)))
+
+    def fetch(section):
+        command = dict(SECTION_COMMANDS[section], format='json')
+        cc_logger.debug("Fetching {0} with '{1}'".format(
+            section, command['prefix']))
+        with recorder.span('fetch', section):
+            output = runner(command, timeout)
+        try:
+            with recorder.span('parse', section):
+                return _normalize(section, json.loads(output))
+        except ValueError as err:
+            raise FetchError("'{0}' returned invalid JSON: {1}".format(
+                command['prefix'], err))
+
+    superseded = dict((section, SUPERSEDED_BY[section]) for section in sections
+                      if SUPERSEDED_BY.get(section) in sections)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [(section, pool.submit(fetch, section))
+                   for section in sections if section not in superseded]
+        fetched = dict((section, future.result())
+                       for section, future in futures)
+    for section, by in superseded.items():
+        fetched[section] = fetched[by]
+    return fetched
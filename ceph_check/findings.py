@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+"""
+What the checks found, and how it is written out.
+
+A check reports `Finding`s through its `CheckContext`: a severity, the
+check, the entity it is about (`cluster`, `osd.3`, `pool.rbd`, a host)
+and a message, with the numbers behind it in `data`. Each finding also
+has the lines it takes in the human readable output, which the check
+lays out with its headers and separators.
+
+The renderers write the results of a run in one of `FORMATS`:
+
+    text    the checks' output, in check order
+    json    one document with every check and its findings
+    ndjson  one JSON object per finding, as the checks make them
+
+The text and JSON renderers build their output in memory and write it
+at once when the run is done. The NDJSON one writes each finding as soon
+as it is made, and flushes when a check finishes, so a consumer sees the
+findings of the fast checks while the slow ones still run.
+"""
+
+import io
+import json
+import sys
+import threading
+import time
+
+INFO = 'info'
+WARNING = 'warning'
+ERROR = 'error'
+SEVERITIES = (INFO, WARNING, ERROR)
+# Severity of the `ceph health` statuses.
+HEALTH_SEVERITIES = {'HEALTH_OK': INFO, 'HEALTH_WARN': WARNING,
+                     'HEALTH_ERR': ERROR}
+FORMATS = ('text', 'json', 'ndjson')
+# Longest the NDJSON renderer keeps written findings in its buffer.
+FLUSH_INTERVAL = 0.5
+
+
+class Finding(object):
+    """One thing a check found."""
+
+    __slots__ = ('check', 'severity', 'entity', 'label', 'message', 'data',
+                 'text')
+
+    def __init__(self, check, message, severity=INFO, entity=None,
+                 label=None, data=None, text=None):
+        self.check = check
+        self.severity = severity
+        self.entity = entity
+        self.label = label
+        self.message = message
+        self.data = data or {}
+        # The lines in the text output, `label : message` by default.
+        if text is None:
+            text = message if label is None else "{0:<16} : {1}".format(
+                label, message)
+        self.text = text
+
+    def as_dict(self):
+        return {'check': self.check, 'severity': self.severity,
+                'entity': self.entity, 'label': self.label,
+                'message': self.message, 'data': self.data}
+
+    def __repr__(self):
+        return "<Finding {0} {1} {2}: {3}>".format(
+            self.check, self.severity, self.entity, self.message)
+
+
+def failure(result):
+    """The finding for a check which failed, with its traceback."""
+    return Finding(result.name, "Check failed", ERROR, entity=result.name,
+                   data={'error': result.error})
+
+
+def json_default(value):
+    """numpy numbers and arrays in `data` as plain JSON."""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError("{0!r} is not JSON serializable".format(value))
+
+
+def dumps(value):
+    return json.dumps(value, sort_keys=True, default=json_default)
+
+
+class Renderer(object):
+    """
+    Writes the results of a run to `out`, standard output by default.
+
+    `finding()` is called with each finding as soon as a check makes it
+    and `result()` when a check is done, both from the check's thread.
+    `finish()` gets all the results in check order, once they are in.
+    `extra` are fields added to the output, e.g. the report checked.
+    """
+
+    def __init__(self, out=None, extra=None):
+        self.out = out or sys.stdout
+        self.extra = extra or {}
+
+    def finding(self, finding):
+        pass
+
+    def result(self, result):
+        pass
+
+    def finish(self, results):
+        pass
+
+
+class TextRenderer(Renderer):
+    """The output of each check, in order, then any failure."""
+
+    def finish(self, results):
+        buf = io.StringIO()
+        for result in results:
+            buf.write(result.output)
+            if not result.ok:
+                buf.write(u"\nCheck '{0}' failed :\n{1}\n".format(
+                    result.name, result.error))
+        self.out.write(buf.getvalue())
+        self.out.flush()
+
+
+class JSONRenderer(Renderer):
+    """One JSON document with the checks, their status and findings."""
+
+    def finish(self, results):
+        document = dict(self.extra, checks=[{
+            'name': result.name,
+            'ok': result.ok,
+            'elapsed': round(result.elapsed, 6),
+            'error': result.error,
+            'findings': [finding.as_dict() for finding in result.findings],
+        } for result in results])
+        self.out.write(dumps(document) + "\n")
+        self.out.flush()
+
+
+class NDJSONRenderer(Renderer):
+    """A JSON object per finding, written as the checks make them."""
+
+    def __init__(self, out=None, extra=None, flush_interval=FLUSH_INTERVAL):
+        Renderer.__init__(self, out, extra)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flushed = time.time()
+        # Checks whose findings were written as they came.
+        self._streamed = set()
+
+    def _write(self, finding):
+        entry = finding.as_dict()
+        entry.update(self.extra)
+        self.out.write(dumps(entry) + "\n")
+
+    def _flush(self):
+        self.out.flush()
+        self._flushed = time.time()
+
+    def finding(self, finding):
+        with self._lock:
+            self._streamed.add(finding.check)
+            self._write(finding)
+            if time.time() - self._flushed > self.flush_interval:
+                self._flush()
+
+    def result(self, result):
+        with self._lock:
+            self._streamed.add(result.name)
+            if not result.ok:
+                self._write(failure(result))
+            self._flush()
+
+    def finish(self, results):
+        with self._lock:
+            # Results kept from an earlier round, see
+            # `ceph_check.incremental`.
+            for result in results:
+                if result.name in self._streamed:
+                    continue
+                for finding in result.findings:
+                    self._write(finding)
+                if not result.ok:
+                    self._write(failure(result))
+            self._flush()
+
+
+RENDERERS = {'text': TextRenderer, 'json': JSONRenderer,
+             'ndjson': NDJSONRenderer}
+
+
+def make_renderer(output_format='text', out=None, extra=None):
+    """The renderer for `output_format`, one of `FORMATS`."""
+    try:
+        renderer = RENDERERS[output_format]
+    except KeyError:
+        raise ValueError("Unknown output format '{0}', choose from "
+                         "{1}".format(output_format, ", ".join(FORMATS)))
+    return renderer(out, extra)
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+"""
+Collect package versions and other facts from the cluster hosts over SSH.
+
+Every MON and OSD host is reached with one `ssh` run, which prints all
+the facts in one go. The runs are driven from an asyncio event loop, at
+most `concurrency` at a time and each with its own timeout, so a few
+slow or dead hosts do not hold up the others. `ssh` is asked to keep a
+master connection open per host (ControlMaster), later runs, e.g. the
+next polling round, reuse it instead of handshaking again.
+"""
+
+import logging
+import os
+import tempfile
+import time
+from collections import OrderedDict
+
+cc_logger = logging.getLogger("ceph_check")
+
+DEFAULT_SSH = "ssh"
+DEFAULT_CONCURRENCY = 32
+DEFAULT_TIMEOUT = 20
+CONTROL_PERSIST = 300
+
+# Shell commands run on every host, by fact name.
+FACT_COMMANDS = OrderedDict([
+    ('packages', "rpm -qa 'ceph*' --qf '%{NAME} %{VERSION}-%{RELEASE}\\n'"),
+    ('kernel', "uname -r"),
+    ('os', "cat /etc/redhat-release 2>/dev/null || cat /etc/os-release"),
+])
+
+# Starts the output of each fact, followed by its name.
+MARKER = "@@ceph_check "
+
+
+def default_control_dir():
+    """Where the master connection sockets live, shared across runs."""
+    return os.path.join(tempfile.gettempdir(),
+                        "ceph_check-ssh-{0}".format(os.getuid()))
+
+
+def cluster_hosts(snapshot):
+    """
+    The MON and OSD hosts by name, with their roles.
+
+    MON hosts are named after the monitors, which is how the deployment
+    tools name them, OSD hosts come from the OSD metadata.
+    """
+    hosts = OrderedDict()
+    for mon in snapshot.monmap['mons']:
+        hosts.setdefault(str(mon['name']), set()).add('mon')
+    for osd in snapshot.osd_metadata:
+        if osd.get('hostname'):
+            hosts.setdefault(str(osd['hostname']), set()).add('osd')
+    return OrderedDict((host, sorted(roles)) for host, roles in hosts.items())
+
+
+def remote_script(facts):
+    """One shell script printing each fact after its marker."""
+    return "; ".join("echo '{0}{1}'; {2}".format(MARKER, name,
+                                                 FACT_COMMANDS[name])
+                     for name in facts)
+
+
+def parse_output(output):
+    """Split the script output into the raw text of each fact."""
+    facts = OrderedDict()
+    current = None
+    for line in output.splitlines():
+        if line.startswith(MARKER):
+            current = line[len(MARKER):].strip()
+            facts[current] = []
+        elif current is not None:
+            facts[current].append(line)
+    return dict((name, "\n".join(lines).strip())
+                for name, lines in facts.items())
+
+
+def parse_packages(text):
+    """
+    Map package names to versions, from `rpm --qf '%{NAME} %{VERSION}...'`.
+    """
+    packages = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) == 2:
+            packages[parts[0]] = parts[1]
+    return packages
+
+
+class HostFacts(object):
+    """What was collected from one host."""
+
+    def __init__(self, host, roles=(), facts=None, error=None, elapsed=0.0):
+        self.host = host
+        self.roles = list(roles)
+        self.facts = facts or {}
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def packages(self):
+        return parse_packages(self.facts.get('packages', ''))
+
+    def __repr__(self):
+        return "<HostFacts {0} {1}>".format(
+            self.host, "ok" if self.ok else self.error)
+
+
+def version_drift(results):
+    """
+    The packages not at the same version on every host holding them.
+
+    Maps each such package to `{version: [hosts]}`.
+    """
+    versions = {}
+    for result in results:
+        for name, version in result.packages.items():
+            versions.setdefault(name, {}).setdefault(version, []).append(
+                result.host)
+    return dict((name, found) for name, found in versions.items()
+                if len(found) > 1)
+
+
+class SSHCollector(object):
+    """
+    Runs the fact script on many hosts at once over `ssh`.
+
+    `ssh` is the client binary, `options` extra arguments for it. Master
+    connections are kept for CONTROL_PERSIST seconds, with their sockets
+    in `control_dir`.
+    """
+
+    def __init__(self, ssh=DEFAULT_SSH, user=None, options=(),
+                 concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT,
+                 control_dir=None, facts=tuple(FACT_COMMANDS)):
+        self.ssh = ssh
+        self.user = user
+        self.options = list(options)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.control_dir = control_dir or default_control_dir()
+        self.facts = list(facts)
+
+    def argv(self, host):
+        argv = [self.ssh,
+                # Fail instead of asking for a password.
+                "-o", "BatchMode=yes",
+                "-o", "ConnectTimeout={0}".format(max(1, int(self.timeout))),
+                "-o", "ControlMaster=auto",
+                "-o", "ControlPath={0}".format(
+                    os.path.join(self.control_dir, "%C")),
+                "-o", "ControlPersist={0}".format(CONTROL_PERSIST)]
+        if self.user:
+            argv.extend(["-l", self.user])
+        return argv + self.options + [host, remote_script(self.facts)]
+
+    def collect(self, hosts):
+        """
+        Collect the facts from `hosts`, a mapping of hosts to roles.
+
+        Returns a `HostFacts` per host, in the order of `hosts`.
+        """
+        if not os.path.isdir(self.control_dir):
+            os.makedirs(self.control_dir, 0o700)
+        import asyncio
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self._collect(hosts))
+        finally:
+            loop.close()
+
+    async def _collect(self, hosts):
+        import asyncio
+        semaphore = asyncio.Semaphore(self.concurrency)
+        cc_logger.info("Collecting host facts from {0} hosts".format(
+            len(hosts)))
+        return await asyncio.gather(*[
+            self._collect_host(semaphore, host, roles)
+            for host, roles in hosts.items()])
+
+    async def _collect_host(self, semaphore, host, roles):
+        import asyncio
+        async with semaphore:
+            start = time.time()
+            # The master connection ssh leaves behind keeps the stderr it
+            # was started with, a pipe would not see EOF until it exits.
+            with tempfile.TemporaryFile() as stderr:
+                try:
+                    proc = await asyncio.create_subprocess_exec(
+                        *self.argv(host), stdin=asyncio.subprocess.DEVNULL,
+                        stdout=asyncio.subprocess.PIPE, stderr=stderr)
+                except OSError as err:
+                    return HostFacts(host, roles, error=str(err))
+                try:
+                    out, _ = await asyncio.wait_for(proc.communicate(),
+                                                    self.timeout)
+                except asyncio.TimeoutError:
+                    proc.kill()
+                    await proc.wait()
+                    cc_logger.debug("{0} : timed out".format(host))
+                    return HostFacts(host, roles, error="timed out after {0} "
+                                     "seconds".format(self.timeout),
+                                     elapsed=time.time() - start)
+                elapsed = time.time() - start
+                if proc.returncode != 0:
+                    stderr.seek(0)
+                    error = stderr.read().decode('utf-8', 'replace').strip()
+                    error = error or "ssh exited with {0}".format(
+                        proc.returncode)
+                    cc_logger.debug("{0} : {1}".format(host, error))
+                    return HostFacts(host, roles, error=error,
+                                     elapsed=elapsed)
+            return HostFacts(host, roles,
+                             parse_output(out.decode('utf-8', 'replace')),
+                             elapsed=elapsed)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+"""
+Re-run only the checks whose input changed between two snapshots.
+
+When polling, most rounds only see a new pgmap. `IncrementalRunner`
+keeps the previous snapshot and the results of every check, works out
+which sections differ in the new snapshot and re-runs just the checks
+reading them, and those needing provider data. The others keep their
+previous result.
+
+Re-run checks get a `Delta` as `CheckContext.delta`. Its `osds` holds
+the ids of the OSDs whose row in the OSD table changed, so per-OSD
+checks can update the state they kept (`CheckContext.state`) for those
+OSDs only.
+"""
+
+import logging
+
+from ceph_check import fetch
+from ceph_check import scheduler
+
+cc_logger = logging.getLogger("ceph_check")
+
+
+class Delta(object):
+    """What changed from the `previous` snapshot to the current one."""
+
+    def __init__(self, previous, sections, osds=None):
+        self.previous = previous
+        self.sections = frozenset(sections)
+        self.osds = osds
+
+    def affects(self, check):
+        """
+        Whether `check` reads any of the changed sections.
+
+        Checks which need provider data, host facts or trends, are always
+        affected: what the providers return changes on its own.
+        """
+        # Checks without sections read nothing we can compare.
+        if not check.sections or check.needs:
+            return True
+        return any(section in self.sections or
+                   fetch.REPORT_SECTIONS.get(section) in self.sections
+                   for section in check.sections)
+
+    def __repr__(self):
+        return "<Delta {0}>".format(sorted(self.sections))
+
+
+def diff(previous, current):
+    """
+    The `Delta` from `previous` to `current`, two compacted snapshots.
+
+    Sections are compared as decoded, except for the OSD and PG lists
+    which only live on in the tables and are compared column by column.
+    """
+    changed = set()
+    old = previous.sections
+    for name, value in current.sections.items():
+        if name not in old or old[name] != value:
+            changed.add(name)
+    changed.update(name for name in old if name not in current.sections)
+
+    osds = None
+    if previous.has_section('osdmap') and current.has_section('osdmap'):
+        import numpy as np
+        before, after = previous.osd_table, current.osd_table
+        osds = after.changed_ids(before)
+        if len(osds):
+            changed.add('osdmap')
+            usage = 'osd_df' if current.has_section('osd_df') else 'pgmap'
+            if not (np.array_equal(after.kb, before.kb) and
+                    np.array_equal(after.kb_used, before.kb_used)):
+                changed.add(usage)
+    if (previous.has_section('pgmap') and current.has_section('pgmap') and
+            not current.pg_table.equals(previous.pg_table)):
+        changed.add('pgmap')
+    if previous.has_section('pg_dump') and current.has_section('pg_dump'):
+        before, after = previous.pg_table, current.pg_table
+        # The stamps move on while the states stay the same.
+        if not (after.equals(before) and after.same_stamps(before)):
+            changed.add('pg_dump')
+    return Delta(previous, changed, osds)
+
+
+class IncrementalRunner(object):
+    """
+    Runs `checks` on successive snapshots, re-running only what changed.
+
+    The arguments are those of `ceph_check.scheduler.run_checks`.
+    """
+
+    def __init__(self, checks, providers=None, options=None,
+                 max_workers=scheduler.DEFAULT_WORKERS, recorder=None):
+        self.checks = checks
+        self.providers = providers
+        self.options = options
+        self.max_workers = max_workers
+        self.recorder = recorder
+        self.snapshot = None
+        self.results = {}
+        self.states = {}
+        # Names of the checks re-run by the last `update()`.
+        self.rerun = []
+
+    def _passed(self, check):
+        result = self.results.get(check.name)
+        return result is not None and result.ok
+
+    def update(self, snapshot, on_result=None, on_finding=None):
+        """
+        Evaluate `snapshot` and return the results of all checks.
+
+        `on_result` and `on_finding` only see the checks re-run.
+        """
+        delta = None
+        checks = self.checks
+        if self.snapshot is not None:
+            delta = diff(self.snapshot, snapshot)
+            checks = [check for check in self.checks
+                      if delta.affects(check) or not self._passed(check)]
+            cc_logger.info("Changed sections : {0}, re-running {1}".format(
+                sorted(delta.sections), [check.name for check in checks]))
+        results = scheduler.run_checks(
+            checks, snapshot, self.providers, self.options, self.max_workers,
+            on_result, delta, self.states, self.recorder, on_finding)
+        for result in results:
+            self.results[result.name] = result
+            if not result.ok:
+                # Whatever it kept may be half updated.
+                self.states.pop(result.name, None)
+        self.snapshot = snapshot
+        self.rerun = [check.name for check in checks]
+        return [self.results[check.name] for check in self.checks]
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+"""
+Journal, DB and WAL devices shared by several OSDs.
+
+A FileStore journal or a BlueStore DB or WAL put on a faster device is
+usually shared by a few OSDs of the host, and all of them go down when
+that device fails. `shared_devices()` groups the OSDs by (host, device)
+in one pass over `osd_metadata`, and `over_limit()` picks the devices
+backing more OSDs than the limit for their device class.
+"""
+
+import re
+from collections import OrderedDict
+
+# OSDs a device of each class should back at most. One journal per HDD,
+# and the usual 6 per SSD, NVMe devices take a few more.
+DEFAULT_LIMITS = {'hdd': 1, 'ssd': 6, 'nvme': 12}
+# For devices of an unknown class.
+DEFAULT_LIMIT = 6
+
+# (role, device node key, partition key, type key, rotational key) of
+# every dedicated device an OSD may have.
+ROLES = (
+    ('journal', 'backend_filestore_journal_dev_node',
+     'backend_filestore_journal_partition_path', None, 'journal_rotational'),
+    ('db', 'bluefs_db_dev_node', 'bluefs_db_partition_path',
+     'bluefs_db_type', 'bluefs_db_rotational'),
+    ('wal', 'bluefs_wal_dev_node', 'bluefs_wal_partition_path',
+     'bluefs_wal_type', 'bluefs_wal_rotational'),
+)
+# The OSD's own data device, a journal or DB there is not dedicated.
+DATA_KEYS = ('bluestore_bdev_dev_node', 'backend_filestore_dev_node')
+# `bluefs_dedicated_db` and `bluefs_dedicated_wal`.
+DEDICATED_KEYS = {'db': 'bluefs_dedicated_db', 'wal': 'bluefs_dedicated_wal'}
+
+# /dev/sdb1 -> /dev/sdb, /dev/nvme0n1p2 -> /dev/nvme0n1
+_PARTITION = re.compile(r'^(/dev/(?:nvme\d+n\d+|mmcblk\d+))p\d+$'
+                        r'|^(/dev/(?!nvme|mmcblk)[a-z]+)\d+$')
+
+
+def whole_device(path):
+    """The device a partition `path` is on, `path` itself otherwise."""
+    match = _PARTITION.match(path)
+    if match is None:
+        return path
+    return match.group(1) or match.group(2)
+
+
+def device_class(node, device_type=None, rotational=None):
+    """The class of the device `node`: hdd, ssd, nvme or None if unknown."""
+    if device_type in DEFAULT_LIMITS:
+        return device_type
+    if 'nvme' in node:
+        return 'nvme'
+    if rotational is not None:
+        return 'hdd' if str(rotational) == '1' else 'ssd'
+    return None
+
+
+class SharedDevice(object):
+    """A journal, DB or WAL device, and the OSDs it backs."""
+
+    def __init__(self, host, device, device_class=None):
+        self.host = host
+        self.device = device
+        self.device_class = device_class
+        self.osds = []
+        self.roles = set()
+
+    @property
+    def name(self):
+        return "{0}:{1}".format(self.host, self.device)
+
+    def limit(self, limits=None):
+        """
+        The most OSDs this device should back, from `limits` by device
+        class or else `DEFAULT_LIMITS`.
+        """
+        default = DEFAULT_LIMITS.get(self.device_class, DEFAULT_LIMIT)
+        return (limits or {}).get(self.device_class, default)
+
+    def __repr__(self):
+        return "<SharedDevice {0} {1} OSDs>".format(self.name,
+                                                    len(self.osds))
+
+
+def dedicated_devices(osd):
+    """The (role, device node, class) of each dedicated device of `osd`."""
+    data = set(whole_device(osd[key]) for key in DATA_KEYS if osd.get(key))
+    found = []
+    for role, node_key, partition_key, type_key, rotational_key in ROLES:
+        if str(osd.get(DEDICATED_KEYS.get(role), '1')) == '0':
+            continue
+        nodes = osd.get(node_key) or osd.get(partition_key) or ''
+        # LVM volumes may span several devices.
+        for node in nodes.split(','):
+            node = node.strip()
+            if not node or node == 'unknown':
+                continue
+            node = whole_device(node)
+            if node not in data:
+                found.append((role, node, device_class(
+                    node, osd.get(type_key), osd.get(rotational_key))))
+    return found
+
+
+def shared_devices(metadata):
+    """
+    The dedicated devices of every OSD in `metadata`, by (host, device).
+
+    One pass over the OSD metadata, returns an ordered dict of
+    `SharedDevice`s. An OSD with its DB and WAL on the same device is
+    counted once.
+    """
+    devices = OrderedDict()
+    for osd in metadata:
+        host = osd.get('hostname')
+        if not host or 'id' not in osd:
+            continue
+        for role, node, kind in dedicated_devices(osd):
+            key = (host, node)
+            device = devices.get(key)
+            if device is None:
+                device = devices[key] = SharedDevice(host, node, kind)
+            if not device.osds or device.osds[-1] != osd['id']:
+                device.osds.append(osd['id'])
+            device.roles.add(role)
+    return devices
+
+
+def over_limit(devices, limits=None):
+    """The `devices` backing more OSDs than their class limit, worst first."""
+    found = [device for device in devices.values()
+             if len(device.osds) > device.limit(limits)]
+    return sorted(found, key=lambda device: (
+        -len(device.osds) / float(device.limit(limits) or 1), device.name))
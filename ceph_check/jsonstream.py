@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+
+"""
+Streaming, section-selective reader for `ceph report` output.
+
+A `ceph report` is one large JSON object whose top-level members are the
+cluster maps. Most checks only need a handful of them, while `pgmap`
+alone can hold hundreds of thousands of PG stat objects. `SectionScanner`
+is fed the report text chunk by chunk, decodes only the wanted top-level
+members and steps over everything else without building it in memory.
+"""
+
+import json
+import re
+from itertools import accumulate
+
+CHUNK_SIZE = 1 << 16
+
+_WS = re.compile(r'\s*')
+_KEY = re.compile(r'"([^"\\]*(?:\\.[^"\\]*)*)"\s*:')
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+_SCALAR = re.compile(r'[^,}\]\s]+(?=[,}\]\s])')
+_NON_BRACKET = re.compile(r'[^\[\]{}]+')
+_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}]')
+_DELTA = {'{': 1, '[': 1, '}': -1, ']': -1}
+
+
+class StreamError(ValueError):
+    """Raised when the streamed text is not a well-formed JSON object."""
+
+
+# Scanner states
+_START, _KEY_STATE, _VALUE, _CONTAINER, _NEXT, _DONE = range(6)
+
+
+def _last_open_quote(text):
+    """Index of the last unescaped double quote in `text`."""
+    i = text.rfind('"')
+    while i > 0:
+        j = i
+        while j > 0 and text[j - 1] == '\\':
+            j -= 1
+        if (i - j) % 2 == 0:
+            break
+        i = text.rfind('"', 0, i)
+    return i
+
+
+class SectionScanner(object):
+    """
+    Incremental scanner over the top-level members of a JSON object.
+
+    `wanted` is the set of member names to decode, `None` decodes all of
+    them. Decoded members are stored in `sections`, and `on_section` is
+    called as `on_section(name, value)` as soon as each one is complete.
+    Members that are not wanted are only scanned for their end, their
+    text is dropped as it goes by. `on_text`, when given, is called as
+    `on_text(name, text)` with the text of every member's value, wanted
+    or not, piece by piece as it is scanned.
+    """
+
+    def __init__(self, wanted=None, on_section=None, on_text=None):
+        self.wanted = None if wanted is None else frozenset(wanted)
+        self.sections = {}
+        self._on_section = on_section
+        self._on_text = on_text
+        self._buf = ''
+        self._state = _START
+        self._key = None
+        self._depth = 0
+        self._pieces = None
+
+    @property
+    def complete(self):
+        """True once every wanted section has been decoded."""
+        if self._state == _DONE:
+            return True
+        if self.wanted is None:
+            return False
+        return self.wanted.issubset(self.sections)
+
+    def wants(self, name):
+        return self.wanted is None or name in self.wanted
+
+    def feed(self, text):
+        """Scan the next chunk of report text."""
+        buf = self._buf + text if self._buf else text
+        self._buf = buf[self._process(buf):]
+
+    def close(self):
+        """Signal end of input, the report must be a complete object."""
+        if self._buf.strip() or self._state != _DONE:
+            raise StreamError("Report is truncated or malformed")
+        return self.sections
+
+    def _process(self, buf):
+        pos = 0
+        end = len(buf)
+        while pos < end:
+            if self._state == _CONTAINER:
+                pos = self._scan_container(buf, pos)
+                if self._state == _CONTAINER:
+                    return pos
+                continue
+            pos = _WS.match(buf, pos).end()
+            if pos == end:
+                break
+            char = buf[pos]
+            if self._state == _START:
+                if char != '{':
+                    raise StreamError("Report is not a JSON object")
+                self._state = _KEY_STATE
+                pos += 1
+            elif self._state == _KEY_STATE:
+                if char == '}':
+                    self._state = _DONE
+                    pos += 1
+                    continue
+                if char != '"':
+                    raise StreamError(
+                        "Expected a key at report offset {0}".format(pos))
+                match = _KEY.match(buf, pos)
+                if match is None:
+                    return pos
+                self._key = json.loads('"{0}"'.format(match.group(1)))
+                self._state = _VALUE
+                pos = match.end()
+            elif self._state == _VALUE:
+                if char in '{[':
+                    self._depth = 1
+                    self._pieces = [char] if self.wants(self._key) else None
+                    self._state = _CONTAINER
+                    if self._on_text is not None:
+                        self._on_text(self._key, char)
+                    pos += 1
+                    continue
+                match = (_STRING if char == '"' else _SCALAR).match(buf, pos)
+                if match is None:
+                    return pos
+                if self._on_text is not None:
+                    self._on_text(self._key, match.group())
+                if self.wants(self._key):
+                    self._finish(match.group())
+                self._state = _NEXT
+                pos = match.end()
+            elif self._state == _NEXT:
+                if char == ',':
+                    self._state = _KEY_STATE
+                elif char == '}':
+                    self._state = _DONE
+                else:
+                    raise StreamError(
+                        "Unexpected '{0}' after section '{1}'".format(
+                            char, self._key))
+                pos += 1
+            else:
+                raise StreamError("Trailing data after the report object")
+        return pos
+
+    def _scan_container(self, buf, pos):
+        """
+        Step over container text, returning the position reached.
+
+        Strings are stripped before brackets are counted, so a whole chunk
+        is usually accounted for with a few C-level passes. Only the chunk
+        that closes the container is walked token by token.
+        """
+        text = buf[pos:] if pos else buf
+        cut = len(text)
+        if '\\' not in text:
+            # Without escapes, every other piece between quotes is a string.
+            pieces = text.split('"')
+            stripped = ''.join(pieces[0::2])
+            if len(pieces) % 2 == 0:
+                # An unterminated string, keep it for the next chunk.
+                cut = text.rfind('"')
+        else:
+            stripped = _STRING.sub('', text)
+            quote = stripped.find('"')
+            if quote >= 0:
+                stripped = stripped[:quote]
+                cut = _last_open_quote(text)
+        brackets = _NON_BRACKET.sub('', stripped)
+        opens = brackets.count('{') + brackets.count('[')
+        closes = len(brackets) - opens
+        depth = self._depth
+        if closes < depth or min(
+                accumulate(map(_DELTA.__getitem__, brackets))) + depth > 0:
+            self._depth = depth + opens - closes
+            if self._pieces is not None:
+                self._pieces.append(text[:cut])
+            if self._on_text is not None:
+                self._on_text(self._key, text[:cut])
+            return pos + cut
+        for match in _TOKEN.finditer(text, 0, cut):
+            token = match.group()
+            if token[0] == '"':
+                continue
+            depth += _DELTA[token]
+            if depth == 0:
+                break
+        stop = match.end()
+        if self._on_text is not None:
+            self._on_text(self._key, text[:stop])
+        if self._pieces is not None:
+            self._pieces.append(text[:stop])
+            self._finish(''.join(self._pieces))
+        self._pieces = None
+        self._depth = 0
+        self._state = _NEXT
+        return pos + stop
+
+    def _finish(self, raw):
+        try:
+            value = json.loads(raw)
+        except ValueError as err:
+            raise StreamError(
+                "Cannot decode section '{0}': {1}".format(self._key, err))
+        self.sections[self._key] = value
+        if self._on_section is not None:
+            self._on_section(self._key, value)
+
+
+def scan_file(fileobj, wanted=None, chunk_size=CHUNK_SIZE):
+    """
+    Read the wanted top-level sections from a report file object.
+
+    Reading stops as soon as every wanted section has been found.
+    """
+    scanner = SectionScanner(wanted)
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            return scanner.close()
+        scanner.feed(chunk)
+        if scanner.complete:
+            return scanner.sections
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+
+"""
+Where the `ceph_check` logger writes to.
+
+Nothing is set up at import time, `configure()` is called once at
+startup. It puts a `QueueHandler` on the logger, so logging a record only
+formats it and puts it on a bounded queue; the main thread never waits on
+a socket or a disk. A writer thread takes the records off the queue in
+batches and hands them to the sinks:
+
+    syslog          /dev/log, as ceph_check always did
+    file:PATH       text lines, in the syslog format
+    json:PATH       one JSON object per line
+
+The file sinks write a whole batch at once and flush it once. When the
+queue is full, records are dropped and counted rather than blocking the
+caller; `shutdown()` (also run at exit) writes out what is left.
+"""
+
+from __future__ import print_function
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+SYSLOG_ADDRESS = '/dev/log'
+LOG_FORMAT = '%(name)s: %(levelname)-2s: %(message)s'
+FILE_FORMAT = '%(asctime)s ' + LOG_FORMAT
+LEVELS = ('debug', 'info', 'warning', 'error')
+# Records written to the sinks at once.
+BATCH_SIZE = 256
+# Seconds the writer waits for a batch to fill up.
+FLUSH_INTERVAL = 0.2
+# Records waiting to be written, those past it are dropped.
+QUEUE_SIZE = 10000
+
+_STOP = object()
+_TRACEBACKS = logging.Formatter()
+_pipeline = None
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, on a line of its own."""
+
+    def format(self, record):
+        entry = {
+            'time': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, sort_keys=True)
+
+
+class _SinkMixin(object):
+    """Batch writes, and a single report of a failing sink."""
+
+    errors = 0
+
+    def emit_batch(self, records):
+        for record in records:
+            self.handle(record)
+
+    def handleError(self, record):
+        self.errors += 1
+        if self.errors == 1:
+            logging.Handler.handleError(self, record)
+
+
+class FileSink(_SinkMixin, logging.handlers.WatchedFileHandler):
+    """
+    Log lines appended to a file, reopened when logrotate moves it.
+
+    A batch is one write and one flush.
+    """
+
+    def emit_batch(self, records):
+        lines = []
+        for record in records:
+            if record.levelno < self.level:
+                continue
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        self.acquire()
+        try:
+            self.reopenIfNeeded()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
+        except Exception:
+            self.handleError(records[-1])
+        finally:
+            self.release()
+
+
+class SyslogSink(_SinkMixin, logging.handlers.SysLogHandler):
+    """Records sent to the local syslog socket, one datagram each."""
+
+
+def open_sink(spec):
+    """
+    The handler for a sink given as `syslog`, `file:PATH` or `json:PATH`.
+
+    Raises ValueError for an unknown or unusable sink.
+    """
+    kind, _, path = spec.partition(':')
+    if kind == 'syslog':
+        address = path or SYSLOG_ADDRESS
+        if not os.path.exists(address):
+            raise ValueError("No syslog socket at {0}".format(address))
+        sink = SyslogSink(address=address)
+        sink.setFormatter(logging.Formatter(LOG_FORMAT))
+    elif kind in ('file', 'json') and path:
+        try:
+            sink = FileSink(os.path.expanduser(path), delay=True)
+        except (IOError, OSError) as err:
+            raise ValueError("Cannot log to {0} : {1}".format(path, err))
+        sink.setFormatter(JSONFormatter() if kind == 'json'
+                          else logging.Formatter(FILE_FORMAT))
+    else:
+        raise ValueError("Unknown log sink '{0}', expected syslog, "
+                         "file:PATH or json:PATH".format(spec))
+    return sink
+
+
+def default_sinks():
+    """Syslog when there is a syslog socket, nothing otherwise."""
+    return ['syslog'] if os.path.exists(SYSLOG_ADDRESS) else []
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """A `QueueHandler` counting the records it drops on a full queue."""
+
+    dropped = 0
+
+    def prepare(self, record):
+        """
+        A copy of `record` with its message merged, as the stdlib does,
+        but with the traceback kept apart in `exc_text`, so the JSON sink
+        writes it to its `exception` field.
+        """
+        record = copy.copy(record)
+        message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = _TRACEBACKS.formatException(record.exc_info)
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline(object):
+    """
+    The queue between the `ceph_check` logger and its sinks, and the
+    thread writing the records to the sinks in batches.
+    """
+
+    def __init__(self, sinks, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, queue_size=QUEUE_SIZE):
+        self.sinks = list(sinks)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(queue_size)
+        self.handler = _DroppingQueueHandler(self.queue)
+        self.batches = 0
+        self.written = 0
+        self._thread = None
+
+    @property
+    def dropped(self):
+        return self.handler.dropped
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run,
+                                        name="ceph_check-log")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Write out the queued records, then stop the thread."""
+        # In a forked process, the thread is the parent's.
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = None
+            return
+        self.queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        for sink in self.sinks:
+            sink.close()
+
+    def _batch(self):
+        """The next records, waiting a little for the batch to fill up."""
+        batch = [self.queue.get()]
+        deadline = time.time() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not _STOP:
+            remaining = deadline - time.time()
+            try:
+                if remaining > 0:
+                    batch.append(self.queue.get(timeout=remaining))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._batch()
+            stop = batch[-1] is _STOP
+            if stop:
+                batch.pop()
+            if batch:
+                self.write(batch)
+            if stop:
+                return
+
+    def write(self, records):
+        """Hand `records` to every sink."""
+        for sink in self.sinks:
+            sink.emit_batch(records)
+        self.batches += 1
+        self.written += len(records)
+
+
+def configure(sinks=None, level='info', logger_name="ceph_check",
+              **kwargs):
+    """
+    Send the records of `logger_name` at `level` and up to `sinks`, a list
+    of sink specs as taken by `open_sink()`, or `default_sinks()`.
+
+    Replaces the pipeline of an earlier call. Returns the `LogPipeline`.
+    """
+    global _pipeline
+    shutdown()
+    if sinks is None:
+        sinks = default_sinks()
+    handlers = [open_sink(spec) for spec in sinks]
+    logger = logging.getLogger(logger_name)
+    logger.setLevel(getattr(logging, str(level).upper()))
+    # Without a sink the records go nowhere, not to `logging.lastResort`.
+    logger.propagate = False
+    _pipeline = LogPipeline(handlers, **kwargs)
+    _pipeline.logger = logger
+    _pipeline.settings = (list(sinks), level)
+    logger.addHandler(_pipeline.handler)
+    _pipeline.start()
+    return _pipeline
+
+
+def settings():
+    """The (sinks, level) `configure()` was called with, None before."""
+    return _pipeline.settings if _pipeline is not None else None
+
+
+def configure_worker(sinks, level):
+    """
+    `configure()` for a worker process of a `multiprocessing` pool, which
+    exits without running the `atexit` functions.
+    """
+    import multiprocessing.util
+    configure(sinks, level)
+    multiprocessing.util.Finalize(None, shutdown, exitpriority=10)
+
+
+def shutdown():
+    """Flush and remove the pipeline set up by `configure()`, if any."""
+    global _pipeline
+    pipeline, _pipeline = _pipeline, None
+    if pipeline is None:
+        return
+    pipeline.logger.removeHandler(pipeline.handler)
+    pipeline.stop()
+    if pipeline.dropped:
+        print("ceph_check: dropped {0} log records".format(pipeline.dropped),
+              file=sys.stderr)
+
+
+atexit.register(shutdown)
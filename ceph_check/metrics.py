@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+
+"""
+Time what a run spends fetching, parsing, checking and storing.
+
+A `Recorder` collects spans, one per fetched section, parsed report and
+check, each with its wall time, the CPU time of the thread it ran in and
+the memory it took. The spans of a run are written as a JSON summary, or
+as a Prometheus textfile for the node_exporter textfile collector, to
+follow ceph_check's own cost across clusters.
+
+Memory is the growth of the process' peak RSS during the span, which is
+free to measure but only moves when a new high is reached. With
+`trace_memory` the peak of the Python allocations is traced as well,
+at the price of slowing everything down. Spans running at the same time
+(the checks share a thread pool) share that peak.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import resource
+import tempfile
+import threading
+import time
+import tracemalloc
+
+cc_logger = logging.getLogger("ceph_check")
+
+# The stages spans belong to.
+STAGES = ('fetch', 'parse', 'check', 'store')
+
+# Prefix of the exported Prometheus metric names.
+PROM_PREFIX = 'ceph_check'
+
+_thread_time = getattr(time, 'thread_time', time.process_time)
+
+
+def max_rss_kib():
+    """The process' peak resident set size so far, in KiB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Span(object):
+    """One timed piece of a run."""
+
+    def __init__(self, stage, name, start, wall=0.0, cpu=0.0, rss_kib=0,
+                 peak_kib=None, ok=True):
+        self.stage = stage
+        self.name = name
+        # Seconds since the recorder started.
+        self.start = start
+        self.wall = wall
+        self.cpu = cpu
+        # Growth of the peak RSS while the span ran.
+        self.rss_kib = rss_kib
+        # Peak of the traced Python allocations, None when not traced.
+        self.peak_kib = peak_kib
+        self.ok = ok
+
+    def as_dict(self):
+        return {'stage': self.stage, 'name': self.name,
+                'start': round(self.start, 6), 'wall_seconds':
+                round(self.wall, 6), 'cpu_seconds': round(self.cpu, 6),
+                'rss_kib': self.rss_kib, 'peak_kib': self.peak_kib,
+                'ok': self.ok}
+
+    def __repr__(self):
+        return "<Span {0}/{1} {2:.3f}s>".format(self.stage, self.name,
+                                                self.wall)
+
+
+class Recorder(object):
+    """
+    Collects the spans of a run, from any thread.
+
+    With `trace_memory`, `tracemalloc` runs from the first span until
+    `close()`.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.spans = []
+        self._lock = threading.Lock()
+        self._active = 0
+        self.reset()
+
+    def reset(self):
+        """Forget the spans so far and start timing a new run."""
+        with self._lock:
+            self.spans = []
+            self._started = time.time()
+            self._cpu_started = time.process_time()
+
+    def close(self):
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _enter(self):
+        with self._lock:
+            if self.trace_memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                if not self._active:
+                    tracemalloc.reset_peak()
+            self._active += 1
+            if self.trace_memory:
+                return tracemalloc.get_traced_memory()[0]
+            return None
+
+    def _leave(self, base):
+        with self._lock:
+            self._active -= 1
+            if base is None or not tracemalloc.is_tracing():
+                return None
+            return max(0, tracemalloc.get_traced_memory()[1] - base) // 1024
+
+    @contextlib.contextmanager
+    def span(self, stage, name):
+        """Time the body as the span `name` of `stage`."""
+        base = self._enter()
+        rss = max_rss_kib()
+        start = time.time()
+        cpu = _thread_time()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.add(Span(stage, name, start - self._started,
+                          time.time() - start, _thread_time() - cpu,
+                          max_rss_kib() - rss, self._leave(base), ok))
+
+    def add(self, span):
+        cc_logger.debug("{0} {1} took {2:.3f}s ({3:.3f}s CPU){4}".format(
+            span.stage, span.name, span.wall, span.cpu,
+            "" if span.ok else ", failed"))
+        with self._lock:
+            self.spans.append(span)
+
+    def split(self, name, iterable, wait='fetch', work='parse'):
+        """
+        Yield from `iterable`, timing the waits for its items apart.
+
+        When a fetch is consumed while it arrives, this tells the time
+        spent waiting on the cluster, recorded as a `wait` span, from the
+        time spent on each item by the caller, recorded as a `work` span.
+        Both are recorded once `iterable` is done with.
+        """
+        started = time.time() - self._started
+        spans = [Span(wait, name, started), Span(work, name, started)]
+        iterator = iter(iterable)
+        try:
+            while True:
+                span = spans[0]
+                start = time.time()
+                cpu = _thread_time()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    span.wall += time.time() - start
+                    span.cpu += _thread_time() - cpu
+                span = spans[1]
+                start = time.time()
+                cpu = _thread_time()
+                yield item
+                span.wall += time.time() - start
+                span.cpu += _thread_time() - cpu
+        except Exception:
+            span.ok = False
+            raise
+        finally:
+            for span in spans:
+                self.add(span)
+
+    def totals(self):
+        """Wall and CPU seconds per stage, summed over its spans."""
+        totals = dict((stage, {'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                               'spans': 0}) for stage in STAGES)
+        for span in list(self.spans):
+            total = totals.setdefault(span.stage, {
+                'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'spans': 0})
+            total['wall_seconds'] += span.wall
+            total['cpu_seconds'] += span.cpu
+            total['spans'] += 1
+        return totals
+
+    def summary(self):
+        """The run so far, as a JSON-able dict."""
+        return {
+            'started': self._started,
+            'wall_seconds': time.time() - self._started,
+            'cpu_seconds': time.process_time() - self._cpu_started,
+            'max_rss_kib': max_rss_kib(),
+            'totals': self.totals(),
+            'spans': [span.as_dict() for span in list(self.spans)],
+        }
+
+
+class NullRecorder(object):
+    """Stands in for a `Recorder` when nothing is measured."""
+
+    spans = ()
+
+    @contextlib.contextmanager
+    def span(self, stage, name):
+        yield
+
+    def split(self, name, iterable, wait='fetch', work='parse'):
+        return iterable
+
+    def reset(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _label(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace(
+        '\n', r'\n')
+
+
+def prometheus_text(summary):
+    """The `summary` of a run in the Prometheus text format."""
+    # Repeated spans, e.g. retried fetches, add up.
+    series = {}
+    for span in summary['spans']:
+        key = (span['stage'], span['name'])
+        entry = series.setdefault(key, {'wall': 0.0, 'cpu': 0.0,
+                                        'peak': None, 'ok': 1})
+        entry['wall'] += span['wall_seconds']
+        entry['cpu'] += span['cpu_seconds']
+        if span['peak_kib'] is not None:
+            entry['peak'] = max(entry['peak'] or 0, span['peak_kib'])
+        if not span['ok']:
+            entry['ok'] = 0
+
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        name = "{0}_{1}".format(PROM_PREFIX, name)
+        lines.append("# HELP {0} {1}".format(name, help_text))
+        lines.append("# TYPE {0} {1}".format(name, kind))
+        for labels, value in samples:
+            labels = ",".join('{0}="{1}"'.format(key, _label(val))
+                              for key, val in labels)
+            lines.append("{0}{1} {2}".format(
+                name, "{" + labels + "}" if labels else "", value))
+
+    def per_span(field, scale=1):
+        return [((('stage', stage), ('name', name)), entry[field] * scale)
+                for (stage, name), entry in sorted(series.items())
+                if entry[field] is not None]
+
+    metric('span_wall_seconds', 'gauge',
+           "Wall time of each fetch, parse and check.", per_span('wall'))
+    metric('span_cpu_seconds', 'gauge',
+           "CPU time of each fetch, parse and check.", per_span('cpu'))
+    peaks = per_span('peak', 1024)
+    if peaks:
+        metric('span_peak_bytes', 'gauge',
+               "Peak Python allocations of each fetch, parse and check.",
+               peaks)
+    metric('span_ok', 'gauge',
+           "Whether each fetch, parse and check succeeded.", per_span('ok'))
+    metric('stage_wall_seconds', 'gauge',
+           "Wall time summed over the spans of each stage.",
+           [((('stage', stage),), total['wall_seconds'])
+            for stage, total in sorted(summary['totals'].items())])
+    metric('run_wall_seconds', 'gauge', "Wall time of the run.",
+           [((), summary['wall_seconds'])])
+    metric('run_cpu_seconds', 'gauge', "CPU time of the run.",
+           [((), summary['cpu_seconds'])])
+    metric('max_rss_bytes', 'gauge', "Peak resident set size of the run.",
+           [((), summary['max_rss_kib'] * 1024)])
+    metric('last_run_timestamp_seconds', 'gauge',
+           "When the run started.", [((), summary['started'])])
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path, text):
+    # The textfile collector must never read a half written file.
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp = tempfile.mkstemp(dir=directory, prefix=".ceph_check-")
+    try:
+        with os.fdopen(fd, 'w') as obj:
+            obj.write(text)
+        os.chmod(temp, 0o644)
+        os.rename(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+
+def export(recorder, json_path=None, prom_path=None):
+    """Write the `recorder`'s run to `json_path` and `prom_path`."""
+    if not (json_path or prom_path):
+        return
+    summary = recorder.summary()
+    try:
+        if json_path:
+            _write_atomic(json_path, json.dumps(summary, indent=2,
+                                                sort_keys=True) + "\n")
+        if prom_path:
+            _write_atomic(prom_path, prometheus_text(summary))
+    except (IOError, OSError) as err:
+        cc_logger.info("Cannot write the metrics : {0}".format(err))
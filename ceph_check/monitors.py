@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+"""
+Find the monitors, and retry commands they fail to answer.
+
+The monitor addresses come from `mon_host` in `ceph.conf` (or the `mon
+addr` of `[mon.X]` sections) and, once fetched, from the monmap. They
+let `ceph_check.backends.HedgedBackend` send a command to several
+monitors at once instead of waiting on whichever one the client picked.
+
+Failed commands are retried after exponentially growing, jittered
+delays, within an overall deadline, see `Backoff`.
+"""
+
+import logging
+import random
+import re
+import time
+
+from ceph_check.fetch import FetchError
+
+try:
+    import configparser
+except ImportError:
+    import ConfigParser as configparser
+
+cc_logger = logging.getLogger("ceph_check")
+
+# Spellings of the option in `[global]`.
+MON_HOST_OPTIONS = ('mon_host', 'mon host', 'mon-host')
+MON_ADDR_OPTIONS = ('mon_addr', 'mon addr', 'mon-addr')
+
+# One address, or a bracketed `[v2:...,v1:...]` vector of them.
+_ADDRESS = re.compile(r'\[[^\]]*\]|[^,;\s]+')
+
+DEFAULT_BASE = 1.0
+DEFAULT_CAP = 15.0
+DEFAULT_ATTEMPTS = 4
+DEFAULT_DEADLINE = 60.0
+
+
+def split_addresses(value):
+    """The monitor addresses in a `mon_host` value."""
+    return _ADDRESS.findall(value or "")
+
+
+def _get(config, section, options):
+    for option in options:
+        try:
+            return config.get(section, option)
+        except (configparser.NoSectionError, configparser.NoOptionError):
+            continue
+    return None
+
+
+def conf_addresses(conffile):
+    """The monitor addresses listed in the `conffile`, if readable."""
+    config = configparser.ConfigParser()
+    try:
+        config.read(conffile)
+    except configparser.Error as err:
+        cc_logger.info("Cannot parse {0} : {1}".format(conffile, err))
+        return []
+    addresses = split_addresses(_get(config, 'global', MON_HOST_OPTIONS))
+    for section in config.sections():
+        if section.startswith('mon.'):
+            addresses.extend(split_addresses(
+                _get(config, section, MON_ADDR_OPTIONS)))
+    return unique(addresses)
+
+
+def monmap_addresses(monmap):
+    """The v1 `host:port` address of every monitor in the `monmap`."""
+    addresses = []
+    for mon in monmap.get('mons', []):
+        vector = mon.get('public_addrs', {}).get('addrvec', [])
+        legacy = [entry['addr'] for entry in vector
+                  if entry.get('type') == 'v1']
+        address = mon.get('addr') or (legacy or [None])[0]
+        if address:
+            # Drop the `/nonce`.
+            addresses.append(address.split('/')[0])
+    return unique(addresses)
+
+
+def unique(addresses):
+    found = []
+    for address in addresses:
+        if address not in found:
+            found.append(address)
+    return found
+
+
+class Backoff(object):
+    """
+    When to retry: up to `attempts` tries in all, within `deadline`
+    seconds of the first.
+
+    The n-th retry waits between half and all of `base * 2 ** n` seconds,
+    at most `cap`, so clients failing together do not retry together.
+    """
+
+    def __init__(self, base=DEFAULT_BASE, cap=DEFAULT_CAP,
+                 attempts=DEFAULT_ATTEMPTS, deadline=DEFAULT_DEADLINE,
+                 rng=None):
+        self.base = base
+        self.cap = cap
+        self.attempts = attempts
+        self.deadline = deadline
+        self.rng = rng or random.Random()
+
+    def delays(self):
+        """
+        The waits before each retry, from now.
+
+        Stops early when the deadline is reached, a wait never goes past
+        it.
+        """
+        return self._delays(time.time() + self.deadline)
+
+    def _delays(self, deadline):
+        for retry in range(self.attempts - 1):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            delay = min(self.cap, self.base * 2 ** retry)
+            yield min(remaining, self.rng.uniform(delay / 2.0, delay))
+
+
+def retrying(runner, backoff):
+    """
+    Wrap `runner(command, timeout)` to retry it as `backoff` allows.
+
+    Only `FetchError`s, timeouts included, are retried. The last one is
+    raised when the retries run out. No attempt is given more `timeout`
+    than is left before the deadline.
+    """
+    def run(command, timeout):
+        deadline = time.time() + backoff.deadline
+        delays = backoff._delays(deadline)
+        while True:
+            try:
+                return runner(command, min(timeout, deadline - time.time()))
+            except FetchError as err:
+                delay = next(delays, None)
+                if delay is None or deadline - time.time() <= 0:
+                    raise
+                cc_logger.info("{0}, retrying in {1:.1f} seconds".format(
+                    err, delay))
+                time.sleep(delay)
+    return run
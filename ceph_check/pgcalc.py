@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+"""
+Placement group sizing for every pool in one vectorized pass.
+
+Follows the upstream PG calculator: each pool gets its share of a target
+number of PGs per OSD, over the OSDs its CRUSH rule can place data on,
+divided by the pool size, and rounded to a power of two.
+"""
+
+import numpy as np
+
+# PGs per OSD the recommendations aim for.
+TARGET_PGS_PER_OSD = 100
+# A value more than this fraction above a power of two is rounded up.
+ROUND_UP_THRESHOLD = 0.25
+
+
+def round_pow2(values):
+    """Round each value to a power of two, the way the PG calculator does."""
+    values = np.maximum(np.asarray(values, dtype=np.float64), 1.0)
+    lower = np.exp2(np.floor(np.log2(values)))
+    return np.where(values > lower * (1 + ROUND_UP_THRESHOLD),
+                    lower * 2, lower).astype(np.int64)
+
+
+def target_pg_num(size, osd_count, share, target_per_osd=TARGET_PGS_PER_OSD):
+    """
+    Recommended `pg_num` for pools, all arguments are per-pool arrays.
+
+    `size` is the replica count (k+m for erasure coded pools), `osd_count`
+    the OSDs the pool's rule can use and `share` the fraction of the data
+    under that rule the pool holds.
+    """
+    size = np.maximum(np.asarray(size, dtype=np.float64), 1.0)
+    osd_count = np.asarray(osd_count, dtype=np.float64)
+    raw = target_per_osd * osd_count * np.asarray(share) / size
+    # Never fewer PGs than OSDs over replicas, so every OSD gets some.
+    return round_pow2(np.maximum(raw, osd_count / size))
+
+
+def rule_osds(crushmap, in_osds=None):
+    """
+    Map each CRUSH rule id to the set of OSDs it can select.
+
+    Only the `take` steps are followed, `item_name`s of the form
+    `root~class` are limited to devices of that class. `in_osds`,
+    when given, drops OSDs that are out.
+    """
+    children = dict((bucket['id'], [item['id'] for item in bucket['items']])
+                    for bucket in crushmap.get('buckets', []))
+    names = dict((bucket['name'], bucket['id'])
+                 for bucket in crushmap.get('buckets', []))
+    classes = dict((device['id'], device.get('class'))
+                   for device in crushmap.get('devices', []))
+    under = {}
+
+    def devices_under(item):
+        if item not in under:
+            found = set()
+            stack = [item]
+            while stack:
+                node = stack.pop()
+                if node >= 0:
+                    found.add(node)
+                else:
+                    stack.extend(children.get(node, ()))
+            under[item] = found
+        return under[item]
+
+    result = {}
+    for rule in crushmap.get('rules', []):
+        osds = set()
+        for step in rule.get('steps', []):
+            if step.get('op') != 'take':
+                continue
+            item = step.get('item')
+            device_class = None
+            item_name = step.get('item_name', '')
+            if '~' in item_name:
+                root, device_class = item_name.split('~', 1)
+                item = names.get(root, item)
+            found = devices_under(item)
+            if device_class is not None:
+                found = set(osd for osd in found
+                            if classes.get(osd) == device_class)
+            osds |= found
+        if in_osds is not None:
+            osds &= in_osds
+        result[rule.get('rule_id', rule.get('ruleset'))] = osds
+    return result
+
+
+def pool_sizing(snapshot, target_per_osd=TARGET_PGS_PER_OSD):
+    """
+    Current and recommended `pg_num` for every pool in the snapshot.
+
+    Reads the osdmap, crushmap and pool stats sections.
+
+    Returns a dict of per-pool arrays: `pool`, `name`, `size`, `min_size`,
+    `osds`, `share`, `pg_num` and `target`. `degraded` flags the pools
+    whose rule has fewer in OSDs than `size`, so PGs cannot hold every
+    copy, and `inactive` those with fewer than `min_size`, which stop I/O.
+    """
+    pools = snapshot.osdmap['pools']
+    count = len(pools)
+    osd_table = snapshot.osd_table
+    in_osds = set(osd_table.id[osd_table.in_].tolist())
+    by_rule = rule_osds(snapshot.crushmap, in_osds)
+
+    rule = [pool.get('crush_rule', pool.get('crush_ruleset'))
+            for pool in pools]
+    # Pools whose rules select the same OSDs share those OSDs' PG budget.
+    groups = {}
+    rule_group = dict((r, groups.setdefault(frozenset(osds), len(groups)))
+                      for r, osds in by_rule.items())
+    unknown = groups.setdefault(frozenset(), len(groups))
+    group = np.fromiter((rule_group.get(r, unknown) for r in rule),
+                        dtype=np.int64, count=count)
+    osds = np.fromiter((len(by_rule.get(r, ())) for r in rule),
+                       dtype=np.int64, count=count)
+    pool_ids = np.fromiter((pool['pool'] for pool in pools),
+                           dtype=np.int64, count=count)
+    size = np.fromiter((pool['size'] for pool in pools),
+                       dtype=np.int64, count=count)
+    min_size = np.fromiter((pool['min_size'] for pool in pools),
+                           dtype=np.int64, count=count)
+    pg_num = np.fromiter((pool['pg_num'] for pool in pools),
+                         dtype=np.int64, count=count)
+
+    stored = dict((stat['poolid'], stat['stat_sum']['num_bytes'])
+                  for stat in snapshot.pool_stats)
+    used = np.fromiter((stored.get(pool_id, 0) for pool_id in pool_ids),
+                       dtype=np.float64, count=count)
+    group_used = np.bincount(group, weights=used, minlength=len(groups))
+    group_pools = np.bincount(group, minlength=len(groups))
+    # Without usage data the pools under a rule split it evenly.
+    share = np.where(group_used[group] > 0,
+                     used / np.maximum(group_used[group], 1.0),
+                     1.0 / np.maximum(group_pools[group], 1))
+
+    target = target_pg_num(size, osds, share, target_per_osd)
+    target[osds == 0] = 0
+    return {
+        'pool': pool_ids,
+        'name': [pool['pool_name'] for pool in pools],
+        'size': size,
+        'min_size': min_size,
+        'osds': osds,
+        'share': share,
+        'pg_num': pg_num,
+        'target': target,
+        'degraded': osds < size,
+        'inactive': osds < min_size,
+    }
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+"""
+PG problems grouped by pool, primary OSD and host, and how long PGs have
+been stuck, in one vectorized pass over the PG table.
+
+Each distinct state string is turned into a bitmask of `PROBLEMS` once,
+the rows then only look their state code up. A single `bincount` over
+`key * COMBINATIONS + flags` gives the PG count of every pool (or OSD)
+and combination of problems, which a small matrix product turns into
+per-problem counts. Hosts are summed from their OSDs.
+
+The stuck time of a PG is measured the way `ceph pg dump_stuck` does: an
+inactive PG from `last_active`, any other problem from `last_clean`. The
+stats of a stale PG stopped coming in, so its `last_clean` stands in for
+`last_unstale`, which the PG table does not keep.
+"""
+
+import numpy as np
+
+# What can be wrong with a PG, the bits of its flags in that order.
+PROBLEMS = ('inactive', 'stale', 'degraded', 'undersized', 'unclean')
+# The extra bit of the PGs stuck longer than the threshold.
+COLUMNS = PROBLEMS + ('stuck',)
+COMBINATIONS = 1 << len(COLUMNS)
+# The default `mon_pg_stuck_threshold`, in seconds.
+STUCK_THRESHOLD = 60
+# Upper bounds of the stuck time histogram, in seconds.
+AGE_BUCKETS = (300, 3600, 86400)
+AGE_LABELS = ("< 5m", "5m-1h", "1h-1d", "> 1d")
+# Pools, OSDs and hosts listed.
+TOP = 10
+
+_INACTIVE, _STALE, _DEGRADED, _UNDERSIZED, _UNCLEAN, _STUCK = (
+    1 << bit for bit in range(len(COLUMNS)))
+# (COMBINATIONS, len(COLUMNS)), whether a combination has each bit.
+_BITS = (np.arange(COMBINATIONS)[:, None] >>
+         np.arange(len(COLUMNS))) & 1
+
+
+def problem_flags(states):
+    """The `PROBLEMS` bitmask of each state string in `states`."""
+    flags = np.zeros(len(states), dtype=np.uint8)
+    for code, state in enumerate(states):
+        parts = set(state.split('+'))
+        flags[code] = (
+            (_INACTIVE if 'active' not in parts else 0) |
+            (_STALE if 'stale' in parts else 0) |
+            (_DEGRADED if 'degraded' in parts else 0) |
+            (_UNDERSIZED if 'undersized' in parts else 0) |
+            (_UNCLEAN if 'clean' not in parts else 0))
+    return flags
+
+
+def format_age(seconds):
+    """`seconds` as `45s`, `12m 5s`, `3h 20m` or `2d 4h`."""
+    seconds = int(seconds)
+    for unit, size, smaller, small in (('d', 86400, 'h', 3600),
+                                       ('h', 3600, 'm', 60),
+                                       ('m', 60, 's', 1)):
+        if seconds >= size:
+            return "{0}{1} {2}{3}".format(seconds // size, unit,
+                                          seconds % size // small, smaller)
+    return "{0}s".format(seconds)
+
+
+class Stuck(object):
+    """The PGs with one problem whose stuck time is known."""
+
+    def __init__(self, problem, rows, ages):
+        self.problem = problem
+        self.rows = rows
+        self.ages = ages
+
+    def count(self, threshold=STUCK_THRESHOLD):
+        return int(np.count_nonzero(self.ages > threshold))
+
+    def histogram(self):
+        """PG counts in each of `AGE_LABELS`."""
+        return np.bincount(np.searchsorted(AGE_BUCKETS, self.ages,
+                                           side='right'),
+                           minlength=len(AGE_LABELS))
+
+    def oldest(self):
+        """(row, age) of the PG stuck the longest, None without any."""
+        if not len(self.ages):
+            return None
+        index = int(np.argmax(self.ages))
+        return int(self.rows[index]), float(self.ages[index])
+
+
+class Groups(object):
+    """PG counts of each of `COLUMNS` for some pools, OSDs or hosts."""
+
+    def __init__(self, names, counts, totals):
+        self.names = names
+        self.counts = counts
+        self.totals = totals
+
+    @classmethod
+    def from_grid(cls, names, grid):
+        """From the (group, combination) counts, dropping empty groups."""
+        totals = grid.sum(axis=1)
+        keep = totals > 0
+        return cls([name for name, flag in zip(names, keep) if flag],
+                   grid[keep].dot(_BITS), totals[keep])
+
+    def __len__(self):
+        return len(self.names)
+
+    def column(self, name):
+        return self.counts[:, COLUMNS.index(name)]
+
+    def ranked(self, limit=TOP):
+        """
+        The rows of the groups with problems, most involved first: by
+        inactive, then stuck, then degraded PGs, then PGs with any problem.
+        """
+        problems = self.counts[:, :len(PROBLEMS)].sum(axis=1)
+        order = np.lexsort((problems, self.column('degraded'),
+                            self.column('stuck'),
+                            self.column('inactive')))[::-1]
+        return [int(row) for row in order if problems[row]][:limit]
+
+    def row(self, index):
+        """{column: count} of the group at `index`."""
+        return dict((name, int(count))
+                    for name, count in zip(COLUMNS, self.counts[index]))
+
+
+class PGStates(object):
+    """
+    The problems of the PGs in `table`, a `ceph_check.tables.PGTable`.
+
+    `hosts` maps OSD ids to host names, `now` is the time the stats
+    were taken in seconds since the epoch, see
+    `ReportSnapshot.stats_stamp`. Without it, for saved reports with no
+    stamp, the newest stamp in the table stands in. PGs are grouped by
+    their acting primary, the OSD which peers them and reports their
+    stats.
+    """
+
+    def __init__(self, table, hosts=None, now=None,
+                 threshold=STUCK_THRESHOLD, pool_names=None):
+        self.table = table
+        self.threshold = threshold
+        flags = problem_flags(table.state.values)[table.state.codes]
+        self.timed = table.last_active is not None
+        if now is None and self.timed:
+            now = np.nanmax(np.concatenate([table.last_active,
+                                            table.last_clean]))
+        self.now = now
+        self.stuck = {}
+        if self.timed:
+            flags = flags | self._stuck(flags)
+        self.flags = flags
+        self.total = len(table)
+        self.states = table.state.counts()
+        self.pools = self._pools(pool_names or {})
+        self.osds, osd_grid, osd_ids = self._osds()
+        self.hosts = self._hosts(hosts or {}, osd_grid, osd_ids)
+
+    def _stuck(self, flags):
+        """The `_STUCK` bit of each row, filling in `self.stuck`."""
+        stuck = np.zeros(len(flags), dtype=np.uint8)
+        for bit, problem in enumerate(PROBLEMS):
+            rows = np.flatnonzero(flags & (1 << bit))
+            since = (self.table.last_active if problem == 'inactive'
+                     else self.table.last_clean)[rows]
+            known = np.isfinite(since)
+            rows, ages = rows[known], self.now - since[known]
+            self.stuck[problem] = Stuck(problem, rows, ages)
+            stuck[rows[ages > self.threshold]] = _STUCK
+        return stuck
+
+    def _grid(self, keys, size):
+        return np.bincount(keys.astype(np.int64) * COMBINATIONS + self.flags,
+                           minlength=size * COMBINATIONS).reshape(
+                               size, COMBINATIONS)
+
+    def _pools(self, pool_names):
+        pool = self.table.pool
+        size = int(pool.max()) + 1 if len(pool) else 0
+        names = [pool_names.get(number, str(number)) for number in range(size)]
+        return Groups.from_grid(names, self._grid(pool, size))
+
+    def _osds(self):
+        # Row 0 holds the PGs without a primary.
+        keys = self.table.acting_primary.astype(np.int64) + 1
+        size = int(keys.max()) + 1 if len(keys) else 1
+        grid = self._grid(keys, size)
+        ids = np.arange(-1, size - 1)
+        names = ["osd.{0}".format(osd) if osd >= 0 else "none"
+                 for osd in ids]
+        return Groups.from_grid(names, grid), grid, ids
+
+    def _hosts(self, hosts, osd_grid, osd_ids):
+        names = sorted(set(hosts.values())) + ["unknown"]
+        index = dict((name, number) for number, name in enumerate(names))
+        host_of = np.array([index[hosts[osd]] if osd in hosts
+                            else len(names) - 1 for osd in osd_ids.tolist()],
+                           dtype=np.int64)
+        grid = np.zeros((len(names), COMBINATIONS), dtype=osd_grid.dtype)
+        np.add.at(grid, host_of, osd_grid)
+        return Groups.from_grid(names, grid)
+
+    def count(self, column):
+        """PGs with `column`, one of `COLUMNS`."""
+        bit = 1 << COLUMNS.index(column)
+        return int(np.count_nonzero(self.flags & bit))
+
+    @property
+    def problems(self):
+        """PGs with any of `PROBLEMS`."""
+        return int(np.count_nonzero(self.flags & (_STUCK - 1)))
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+
+"""In-memory snapshot of a `ceph report`."""
+
+import codecs
+import gzip
+import io
+import math
+
+from ceph_check import archive
+from ceph_check import jsonstream
+
+
+class ReportError(Exception):
+    """Raised when a report is unreadable or lacks a required section."""
+
+
+def open_report(path):
+    """
+    Open a saved report as text, uncompressing `.gz` and `.zst` files.
+
+    Reading zstd needs the `zstandard` package.
+    """
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path, 'rb'), encoding='utf-8')
+    if path.endswith(('.zst', '.zstd')):
+        try:
+            import zstandard
+        except ImportError:
+            raise ReportError("Reading {0} needs the zstandard package".format(
+                path))
+        raw = open(path, 'rb')
+        return io.TextIOWrapper(
+            zstandard.ZstdDecompressor().stream_reader(raw, closefd=True),
+            encoding='utf-8')
+    return io.open(path, encoding='utf-8')
+
+
+class ReportSnapshot(object):
+    """
+    A `ceph report` decoded once and shared by every check.
+
+    The report is decoded a single time when the snapshot is created,
+    each check then reads its sections through the accessors below
+    instead of re-opening and re-parsing the report file. Only the
+    sections asked for are decoded, see `ceph_check.jsonstream`.
+    """
+
+    def __init__(self, sections):
+        self._sections = sections
+        self._osd_table = None
+        self._pg_table = None
+        # When a live snapshot was fetched, None for saved reports.
+        self.fetched = None
+
+    @classmethod
+    def from_file(cls, path, sections=None):
+        """
+        Decode the report at `path` into a snapshot.
+
+        `sections` limits decoding to those top-level sections, the
+        default decodes the whole report. Compressed reports are read
+        as described in `open_report`, from an archive (see
+        `ceph_check.archive`) the latest report is.
+        """
+        if path.endswith(archive.SUFFIX):
+            return cls.from_archive(path, sections)
+        with open_report(path) as obj:
+            try:
+                decoded = jsonstream.scan_file(obj, sections)
+            except ValueError as err:
+                raise ReportError(
+                    "Cannot decode report {0}: {1}".format(path, err))
+        return cls(decoded)
+
+    @classmethod
+    def from_archive(cls, path, sections=None, number=-1):
+        """
+        Decode report `number` of the archive at `path`, the latest by
+        default. Only the blocks of `sections` are read.
+        """
+        try:
+            with archive.ReportArchive(path) as reports:
+                return cls(reports[number].sections(sections))
+        except (archive.ArchiveError, EnvironmentError) as err:
+            raise ReportError("Cannot read archive {0}: {1}".format(path, err))
+        except ValueError as err:
+            raise ReportError("Cannot decode report in {0}: {1}".format(
+                path, err))
+
+    @classmethod
+    def from_stream(cls, chunks, sections=None, save_path=None,
+                    archive_path=None):
+        """
+        Decode a report from an iterable of byte chunks as they arrive.
+
+        With `save_path` every chunk is also written to that file, with
+        `archive_path` the report is appended to that archive section by
+        section, see `ceph_check.archive`. Otherwise reading stops once
+        the wanted sections are decoded.
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        try:
+            writer = (archive.ArchiveWriter(archive_path) if archive_path
+                      else None)
+        except (archive.ArchiveError, EnvironmentError) as err:
+            raise ReportError("Cannot archive the report: {0}".format(err))
+        scanner = jsonstream.SectionScanner(
+            sections, on_text=writer.write if writer is not None else None)
+        save = open(save_path, 'wb') if save_path else None
+        done = False
+        try:
+            for chunk in chunks:
+                if save is not None:
+                    save.write(chunk)
+                if not scanner.complete or writer is not None:
+                    scanner.feed(decoder.decode(chunk))
+                elif save is None:
+                    break
+            if not scanner.complete or writer is not None:
+                scanner.feed(decoder.decode(b'', True))
+                scanner.close()
+            done = True
+        except ValueError as err:
+            raise ReportError("Cannot decode report: {0}".format(err))
+        finally:
+            if save is not None:
+                save.close()
+            if writer is not None:
+                # Only a whole report is archived.
+                if done:
+                    writer.close()
+                else:
+                    writer.abort()
+        return cls(scanner.sections)
+
+    def section(self, name, kind=dict):
+        """Return the top-level section `name`, checking its type."""
+        try:
+            value = self._sections[name]
+        except KeyError:
+            raise ReportError("Report has no '{0}' section".format(name))
+        if not isinstance(value, kind):
+            raise ReportError(
+                "Report section '{0}' is a {1}, expected {2}".format(
+                    name, type(value).__name__, kind.__name__))
+        return value
+
+    def has_section(self, name):
+        return name in self._sections
+
+    @property
+    def sections(self):
+        """The decoded sections by name."""
+        return self._sections
+
+    @property
+    def monmap(self):
+        return self.section('monmap')
+
+    @property
+    def osdmap(self):
+        return self.section('osdmap')
+
+    @property
+    def pgmap(self):
+        return self.section('pgmap')
+
+    @property
+    def health(self):
+        return self.section('health')
+
+    @property
+    def crushmap(self):
+        return self.section('crushmap')
+
+    @property
+    def osd_metadata(self):
+        """Per-OSD host name, addresses, devices and versions."""
+        return self.section('osd_metadata', list)
+
+    @property
+    def fsmap(self):
+        """The file systems and their MDS daemons."""
+        return self.section('fsmap')
+
+    @property
+    def servicemap(self):
+        """The daemons registered with the manager, e.g. RGW."""
+        return self.section('servicemap')
+
+    @property
+    def pool_stats(self):
+        """Per-pool usage, from `pg dump pools` or the report pgmap."""
+        if self.has_section('pool_stats'):
+            return self.section('pool_stats', list)
+        if self.has_section('pgmap'):
+            return self.pgmap.get('pool_stats', [])
+        return []
+
+    @property
+    def osd_stats(self):
+        """Per-OSD `osd`, `kb` and `kb_used`, from `osd df` or the pgmap."""
+        if self.has_section('osd_df'):
+            return [{'osd': node['id'], 'kb': node['kb'],
+                     'kb_used': node['kb_used']}
+                    for node in self.section('osd_df')['nodes']]
+        if self.has_section('pgmap'):
+            return self.pgmap.get('osd_stats', [])
+        return []
+
+    @property
+    def osd_table(self):
+        """Columnar view of the osdmap OSDs, see `ceph_check.tables`."""
+        if self._osd_table is None:
+            # Imports numpy, only once a check needs the table.
+            from ceph_check.tables import OSDTable
+            self._osd_table = OSDTable.from_maps(self.osdmap, self.osd_stats)
+        return self._osd_table
+
+    @property
+    def pg_table(self):
+        """
+        Columnar view of the PG stats, see `ceph_check.tables`.
+
+        Built from `pg dump pgs` when fetched, whose stats have the
+        timestamps missing from the pgmap of `pg dump pgs_brief`.
+        """
+        if self._pg_table is None:
+            from ceph_check.tables import PGTable
+            pgmap = (self.section('pg_dump') if self.has_section('pg_dump')
+                     else self.pgmap)
+            self._pg_table = PGTable.from_pgmap(pgmap)
+        return self._pg_table
+
+    def stats_stamp(self):
+        """
+        When the PG stats were taken, in seconds since the epoch.
+
+        The `stamp` of the `pg dump` or pgmap section, else the time a live
+        snapshot was fetched. None for reports without either.
+        """
+        for name in ('pg_dump', 'pgmap'):
+            if self.has_section(name) and self.section(name).get('stamp'):
+                from ceph_check.tables import parse_stamps
+                stamp = parse_stamps([self.section(name)['stamp']])[0]
+                if not math.isnan(stamp):
+                    return float(stamp)
+        return self.fetched
+
+    def compact(self):
+        """
+        Build the tables and drop the per-OSD and per-PG dicts behind them.
+
+        Afterwards the osdmap `osds` and the pgmap `osd_stats` and
+        `pg_stats` lists are only reachable through the tables.
+        """
+        if self.has_section('osdmap'):
+            self.osd_table
+            self.osdmap.pop('osds', None)
+        if self.has_section('pgmap') or self.has_section('pg_dump'):
+            self.pg_table
+        for name in ('pgmap', 'pg_dump'):
+            if self.has_section(name):
+                self.section(name).pop('pg_stats', None)
+                self.section(name).pop('osd_stats', None)
+        return self
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+"""
+Run registered checks concurrently and collect their results.
+
+Checks only share the read-only report snapshot, so they run side by
+side in a thread pool. External data a check `needs` (host facts over
+SSH and the like) comes from a provider, started once per run and shared
+by every check that needs it. A check is only submitted once its
+providers are done, so checks waiting on a slow provider never hold a
+worker, and the report-only checks go ahead meanwhile.
+"""
+
+import io
+import logging
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from ceph_check import findings
+from ceph_check import metrics
+
+cc_logger = logging.getLogger("ceph_check")
+
+DEFAULT_WORKERS = 4
+
+
+class CheckContext(object):
+    """
+    What a check gets to work with.
+
+    When checks are re-run on a newer snapshot (see
+    `ceph_check.incremental`), `delta` tells what changed since the
+    previous one and `state` is what the check kept from its last run,
+    so it can update only what changed. Otherwise `delta` is None and
+    `state` starts out empty.
+
+    A check reports what it found with `emit()`, `field()` and `warn()`,
+    see `ceph_check.findings`, and lays out the text output around it
+    with `write()`. `on_finding` is called with each finding as it is
+    made.
+    """
+
+    def __init__(self, snapshot, options=None, data=None, delta=None,
+                 state=None, name=None, on_finding=None):
+        self.snapshot = snapshot
+        self.options = options or {}
+        self.data = data or {}
+        self.delta = delta
+        self.state = {} if state is None else state
+        self.name = name
+        self.on_finding = on_finding
+        self.findings = []
+        self.out = io.StringIO()
+
+    def write(self, line=""):
+        self.out.write(u"{0}\n".format(line))
+
+    def emit(self, message, severity=findings.INFO, entity=None, label=None,
+             text=None, **data):
+        """
+        Report a finding, and write its `text` (`label : message` by
+        default) to the output. Returns the `Finding`.
+        """
+        finding = findings.Finding(self.name, message, severity, entity,
+                                   label, data, text)
+        self.findings.append(finding)
+        self.write(finding.text)
+        if self.on_finding is not None:
+            self.on_finding(finding)
+        return finding
+
+    def field(self, label, value, entity='cluster', **data):
+        """An informational `label : value` line."""
+        return self.emit(u"{0}".format(value), findings.INFO, entity, label,
+                         **data)
+
+    def warn(self, message, entity=None, text=None, **data):
+        """A `WARNING : message` line."""
+        return self.emit(message, findings.WARNING, entity, "WARNING", text,
+                         **data)
+
+
+class CheckResult(object):
+    """Outcome of one check."""
+
+    def __init__(self, name, output, error=None, elapsed=0.0, findings=()):
+        self.name = name
+        self.output = output
+        self.error = error
+        self.elapsed = elapsed
+        self.findings = list(findings)
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return "<CheckResult {0} {1}>".format(
+            self.name, "ok" if self.ok else "failed")
+
+
+def run_check(check, snapshot, options=None, data=None, delta=None,
+              state=None, recorder=None, on_finding=None):
+    """
+    Run a single check, capturing its output, findings and any exception.
+
+    The run is timed as a `check` span of `recorder`, see
+    `ceph_check.metrics`.
+    """
+    ctx = CheckContext(snapshot, options, data, delta, state, check.name,
+                       on_finding)
+    recorder = recorder or metrics.NullRecorder()
+    start = time.time()
+    error = None
+    try:
+        with recorder.span('check', check.name):
+            check.func(ctx)
+    except Exception as err:
+        cc_logger.exception(err)
+        error = traceback.format_exc()
+    return CheckResult(check.name, ctx.out.getvalue(), error,
+                       time.time() - start, ctx.findings)
+
+
+def run_checks(checks, snapshot, providers=None, options=None,
+               max_workers=DEFAULT_WORKERS, on_result=None, delta=None,
+               states=None, recorder=None, on_finding=None):
+    """
+    Run `checks` against `snapshot` and return their results in order.
+
+    `providers` maps the names checks list in `needs` to callables taking
+    the snapshot, each is run at most once. `on_result` is called with
+    each result as soon as its check finishes, `on_finding` with each
+    finding as soon as a check makes it. `delta` and `states`, the
+    per-check state by check name, are handed to the checks as
+    `CheckContext.delta` and `CheckContext.state`. Each check, and each
+    provider as a `fetch`, is timed as a span of `recorder`.
+
+    The first exception raised by `on_result`, e.g. a closed pipe, is
+    raised once every check finished.
+    """
+    providers = providers or {}
+    recorder = recorder or metrics.NullRecorder()
+    states = {} if states is None else states
+    results = {}
+    data = {}
+    lock = threading.Lock()
+    done = threading.Event()
+    remaining = [len(checks)]
+    callback_errors = []
+
+    if not checks:
+        return []
+
+    def finished(result):
+        with lock:
+            results[result.name] = result
+            remaining[0] -= 1
+            last = not remaining[0]
+        try:
+            if on_result is not None:
+                on_result(result)
+        except Exception as err:
+            cc_logger.exception(err)
+            callback_errors.append(err)
+        finally:
+            if last:
+                done.set()
+
+    def submit(check):
+        future = pool.submit(run_check, check, snapshot, options, data,
+                             delta, states.setdefault(check.name, {}),
+                             recorder, on_finding)
+        future.add_done_callback(lambda f: finished(f.result()))
+
+    def provide(name):
+        try:
+            with recorder.span('fetch', name):
+                return providers[name](snapshot)
+        except Exception as err:
+            cc_logger.exception(err)
+            raise
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        provided = {}
+        for need in set(n for check in checks for n in check.needs):
+            if need not in providers:
+                raise KeyError("No provider for '{0}'".format(need))
+            provided[need] = pool.submit(provide, need)
+
+        def when_ready(check):
+            pending = [len(check.needs)]
+
+            def ready(future):
+                with lock:
+                    pending[0] -= 1
+                    go = not pending[0]
+                if not go:
+                    return
+                failed = [need for need in check.needs
+                          if provided[need].exception() is not None]
+                if failed:
+                    error = "{0} unavailable: {1}".format(
+                        ", ".join(failed), provided[failed[0]].exception())
+                    finished(CheckResult(check.name, u"", error))
+                    return
+                for need in check.needs:
+                    data[need] = provided[need].result()
+                submit(check)
+
+            if not check.needs:
+                submit(check)
+            for need in check.needs:
+                provided[need].add_done_callback(ready)
+
+        for check in checks:
+            when_ready(check)
+        done.wait()
+    if callback_errors:
+        raise callback_errors[0]
+    return [results[check.name] for check in checks]
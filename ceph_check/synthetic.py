@@ -0,0 +1,497 @@
+# -*- coding: utf-8 -*-
+
+"""
+Realistic synthetic `ceph report` output, for tests and benchmarks.
+
+`SyntheticCluster` lays out MONs, hosts, OSDs, a CRUSH hierarchy of a
+given depth, pools and their PGs the way a Luminous cluster reports
+them, from a seed so the same arguments always give the same report.
+PG stats are generated lazily and `write()` streams them out, so
+reports for tens of thousands of OSDs do not have to fit in memory as
+dicts first.
+
+    python -m ceph_check.synthetic --osds 1000 report.json
+"""
+
+import argparse
+import datetime
+import gzip
+import json
+import math
+import random
+import sys
+import uuid
+
+OSDS_PER_HOST = 12
+# Hosts per rack, racks per room and so on up the CRUSH tree.
+FANOUT = 4
+# CRUSH bucket types above the hosts, in order.
+UPPER_TYPES = ['rack', 'room', 'datacenter', 'region']
+# HDD OSDs sharing one NVMe device for their RocksDB.
+DB_PER_DEVICE = 6
+TIB_KB = 1 << 30
+STAMP = datetime.datetime(2017, 11, 27, 10, 0, 0)
+# Not clean states, for the PGs asked to be unclean.
+UNCLEAN_STATES = [
+    'active+undersized+degraded',
+    'active+remapped+backfilling',
+    'active+recovering+degraded',
+    'peering',
+    'stale+active+clean',
+]
+# Top-level sections in the order `ceph report` writes them.
+SECTION_ORDER = [
+    'cluster_fingerprint', 'version', 'health', 'monmap', 'fsmap',
+    'crushmap', 'osdmap', 'osd_metadata', 'servicemap', 'pgmap',
+]
+
+
+_STAMPS = {}
+
+
+def _stamp(seconds_ago=0):
+    if seconds_ago not in _STAMPS:
+        _STAMPS[seconds_ago] = (
+            STAMP - datetime.timedelta(seconds=seconds_ago)).strftime(
+                "%Y-%m-%d %H:%M:%S.%f")
+    return _STAMPS[seconds_ago]
+
+
+def _pow2(value):
+    return 1 << max(3, int(round(math.log(max(value, 1), 2))))
+
+
+class SyntheticCluster(object):
+    """
+    A made-up cluster and its report.
+
+    `hosts` defaults to enough hosts for OSDS_PER_HOST OSDs each, at least
+    three. `crush_depth` is the number of bucket levels above the OSDs,
+    1 puts the OSDs right under the root, 2 adds hosts, 3 racks and so on.
+    `pgs` sets the total PG count, by default it follows from
+    `pgs_per_osd` PG copies per OSD, with power of two `pg_num`s. The
+    first `down` OSDs are down, the next `out` ones out, and an `unclean`
+    fraction of the PGs is in a not clean state. `mds` and `rgw` daemons
+    run on the MON hosts.
+    """
+
+    def __init__(self, osds=30, mons=3, hosts=None, pools=4, pgs=None,
+                 pgs_per_osd=100, pool_size=3, crush_depth=2, down=0, out=0,
+                 unclean=0.0, mds=0, rgw=0, seed=0, version='12.2.1'):
+        self.osd_count = osds
+        self.mon_count = mons
+        self.host_count = min(osds, hosts or max(
+            3, (osds + OSDS_PER_HOST - 1) // OSDS_PER_HOST)) or 1
+        self.pool_count = pools
+        self.pool_size = pool_size
+        self.crush_depth = max(1, min(crush_depth, len(UPPER_TYPES) + 2))
+        self.down = down
+        self.out = out
+        self.unclean = unclean
+        self.mds_count = mds
+        self.rgw_count = rgw
+        self.seed = seed
+        self.version = version
+        rng = random.Random(seed)
+        self.fsid = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        # OSD `i` lives on host `i % host_count`, every fourth host is SSD.
+        self.host_osds = [list(range(h, osds, self.host_count))
+                          for h in range(self.host_count)]
+        self.osd_class = ['ssd' if (i % self.host_count) % 4 == 3 else 'hdd'
+                          for i in range(osds)]
+        if pgs is None:
+            total = osds * pgs_per_osd // max(pool_size, 1)
+            shares = self._shares()
+            self.pg_nums = [_pow2(total * share) for share in shares]
+        else:
+            self.pg_nums = [pgs // pools + (1 if p < pgs % pools else 0)
+                            for p in range(pools)]
+
+    def _shares(self):
+        # The first pool holds half the data, the others split the rest.
+        if self.pool_count == 1:
+            return [1.0]
+        rest = 0.5 / (self.pool_count - 1)
+        return [0.5] + [rest] * (self.pool_count - 1)
+
+    def host_name(self, host):
+        return "node-{0:04d}".format(host)
+
+    def host_addr(self, host):
+        return "10.0.{0}.{1}".format(host // 250, host % 250 + 1)
+
+    def mon_name(self, rank):
+        return "mon-{0}".format(rank)
+
+    def mon_addr(self, rank):
+        return "10.1.0.{0}".format(rank + 1)
+
+    def health(self):
+        checks = {}
+        if self.down:
+            checks['OSD_DOWN'] = {'severity': 'HEALTH_WARN', 'summary': {
+                'message': "{0} osds down".format(self.down)}}
+        if self.unclean:
+            checks['PG_DEGRADED'] = {'severity': 'HEALTH_WARN', 'summary': {
+                'message': "Degraded data redundancy"}}
+        return {'checks': checks,
+                'status': 'HEALTH_WARN' if checks else 'HEALTH_OK'}
+
+    def monmap(self):
+        return {
+            'epoch': self.mon_count, 'fsid': self.fsid,
+            'modified': _stamp(86400), 'created': _stamp(864000),
+            'features': {'persistent': ['kraken', 'luminous'],
+                         'optional': []},
+            'mons': [{'rank': rank, 'name': self.mon_name(rank),
+                      'addr': "{0}:6789/0".format(self.mon_addr(rank)),
+                      'public_addr': "{0}:6789/0".format(
+                          self.mon_addr(rank))}
+                     for rank in range(self.mon_count)],
+            'quorum': list(range(self.mon_count)),
+        }
+
+    def fsmap(self):
+        if not self.mds_count:
+            return {'epoch': 1, 'filesystems': [], 'standbys': []}
+
+        def daemon(number, rank, state):
+            rank_host = number % self.mon_count
+            return {'gid': 4100 + number, 'name': self.mon_name(rank_host),
+                    'rank': rank, 'state': state,
+                    'addr': "{0}:6800/{1}".format(
+                        self.mon_addr(rank_host), 1000 + number)}
+        active = daemon(0, 0, 'up:active')
+        return {
+            'epoch': 10,
+            'filesystems': [{'id': 1, 'mdsmap': {
+                'fs_name': 'cephfs', 'epoch': 10,
+                'info': {'gid_{0}'.format(active['gid']): active}}}],
+            'standbys': [daemon(number, -1, 'up:standby')
+                         for number in range(1, self.mds_count)],
+        }
+
+    def servicemap(self):
+        daemons = {'summary': ''}
+        for number in range(self.rgw_count):
+            rank_host = number % self.mon_count
+            daemons[self.mon_name(rank_host)] = {
+                'start_epoch': 2, 'gid': 5100 + number,
+                'addr': "{0}:0/{1}".format(self.mon_addr(rank_host),
+                                           2000 + number),
+                'metadata': {'hostname': self.mon_name(rank_host),
+                             'frontend_config#0': 'civetweb port=7480'}}
+        services = {'rgw': {'daemons': daemons}} if self.rgw_count else {}
+        return {'epoch': 2, 'modified': _stamp(3600), 'services': services}
+
+    def _osd_weight(self, osd):
+        return 1.0 if self.osd_class[osd] == 'ssd' else 4.0
+
+    def crushmap(self):
+        types = [{'type_id': 0, 'name': 'osd'}]
+        levels = []
+        if self.crush_depth >= 2:
+            types.append({'type_id': 1, 'name': 'host'})
+            levels.append('host')
+        for number, name in enumerate(
+                UPPER_TYPES[:max(0, self.crush_depth - 2)]):
+            types.append({'type_id': 3 + number, 'name': name})
+            levels.append(name)
+        types.append({'type_id': 10, 'name': 'root'})
+        buckets = []
+        next_id = [-2]
+
+        def bucket(name, type_name, items):
+            bucket_id = next_id[0]
+            next_id[0] -= 1
+            weight = sum(item['weight'] for item in items)
+            buckets.append({
+                'id': bucket_id, 'name': name, 'type_name': type_name,
+                'type_id': [t['type_id'] for t in types
+                            if t['name'] == type_name][0],
+                'weight': weight, 'alg': 'straw2', 'hash': 'rjenkins1',
+                'items': [dict(item, pos=pos)
+                          for pos, item in enumerate(items)]})
+            return {'id': bucket_id, 'weight': weight}
+
+        # Start from the OSDs, grouped by host, then FANOUT at a time.
+        if levels:
+            children = [
+                bucket(self.host_name(host), 'host',
+                       [{'id': osd, 'weight': int(
+                           self._osd_weight(osd) * 0x10000)}
+                        for osd in osds])
+                for host, osds in enumerate(self.host_osds)]
+        else:
+            children = [{'id': osd, 'weight': int(
+                self._osd_weight(osd) * 0x10000)}
+                for osd in range(self.osd_count)]
+        for type_name in levels[1:]:
+            children = [bucket("{0}-{1}".format(type_name, number // FANOUT),
+                               type_name, children[number:number + FANOUT])
+                        for number in range(0, len(children), FANOUT)]
+        root = {'id': -1, 'name': 'default', 'type_name': 'root',
+                'type_id': 10, 'alg': 'straw2', 'hash': 'rjenkins1',
+                'weight': sum(child['weight'] for child in children),
+                'items': [dict(child, pos=pos)
+                          for pos, child in enumerate(children)]}
+        leaf = 'host' if levels else 'osd'
+        rules = [{'rule_id': rule, 'rule_name': name, 'ruleset': rule,
+                  'type': 1, 'min_size': 1, 'max_size': 10,
+                  'steps': [{'op': 'take', 'item': -1, 'item_name': item},
+                            {'op': 'chooseleaf_firstn', 'num': 0,
+                             'type': leaf},
+                            {'op': 'emit'}]}
+                 for rule, name, item in [
+                     (0, 'replicated_rule', 'default'),
+                     (1, 'replicated_hdd', 'default~hdd'),
+                     (2, 'replicated_ssd', 'default~ssd')]]
+        return {
+            'devices': [{'id': osd, 'name': "osd.{0}".format(osd),
+                         'class': self.osd_class[osd]}
+                        for osd in range(self.osd_count)],
+            'types': types,
+            'buckets': [root] + buckets,
+            'rules': rules,
+            'tunables': {'profile': 'jewel', 'choose_total_tries': 50},
+        }
+
+    def pool_rule(self, pool):
+        # Every third pool is pinned to the SSDs, when there are any.
+        if pool % 3 == 2 and 'ssd' in self.osd_class:
+            return 2
+        return pool % 2
+
+    def osdmap(self):
+        osds = []
+        for osd in range(self.osd_count):
+            host = osd % self.host_count
+            down = osd < self.down
+            out = down or osd < self.down + self.out
+            osds.append({
+                'osd': osd,
+                'uuid': str(uuid.UUID(int=(self.seed << 32) + osd,
+                                      version=4)),
+                'up': 0 if down else 1, 'in': 0 if out else 1,
+                'weight': 0.0 if out else 1.0, 'primary_affinity': 1.0,
+                'last_clean_begin': 0, 'last_clean_end': 0,
+                'up_from': 10, 'up_thru': 40, 'down_at': 0,
+                'lost_at': 0,
+                'public_addr': "{0}:{1}/{2}".format(
+                    self.host_addr(host), 6800 + osd % 100, 1000 + osd),
+                'cluster_addr': "{0}:{1}/{2}".format(
+                    self.host_addr(host), 6900 + osd % 100, 1000 + osd),
+                'state': ['exists', 'up'] if not down else ['exists'],
+            })
+        pools = [{
+            'pool': pool + 1, 'pool_name': "pool-{0}".format(pool),
+            'type': 1, 'size': self.pool_size,
+            'min_size': max(1, self.pool_size - 1),
+            'crush_rule': self.pool_rule(pool),
+            'pg_num': self.pg_nums[pool], 'pg_placement_num':
+            self.pg_nums[pool], 'flags_names': 'hashpspool',
+            'application_metadata': {'rbd': {}},
+        } for pool in range(self.pool_count)]
+        return {'epoch': 40 + self.down + self.out, 'fsid': self.fsid,
+                'created': _stamp(864000), 'modified': _stamp(600),
+                'flags': 'sortbitwise,recovery_deletes,purged_snapdirs',
+                'osds': osds, 'pools': pools}
+
+    def osd_metadata(self):
+        metadata = []
+        for osd in range(self.osd_count):
+            host = osd % self.host_count
+            position = self.host_osds[host].index(osd)
+            hdd = self.osd_class[osd] == 'hdd'
+            entry = {
+                'id': osd, 'hostname': self.host_name(host),
+                'front_addr': "{0}:{1}/{2}".format(
+                    self.host_addr(host), 6800 + osd % 100, 1000 + osd),
+                'back_addr': "{0}:{1}/{2}".format(
+                    self.host_addr(host), 6900 + osd % 100, 1000 + osd),
+                'ceph_version': "ceph version {0} (luminous stable)".format(
+                    self.version),
+                'osd_objectstore': 'bluestore', 'arch': 'x86_64',
+                'distro': 'rhel', 'distro_version': '7.4',
+                'kernel_version': '3.10.0-693.el7.x86_64',
+                'rotational': '1' if hdd else '0',
+                'bluestore_bdev_type': 'hdd' if hdd else 'ssd',
+                'bluestore_bdev_dev_node': "/dev/sd{0}".format(
+                    chr(ord('b') + position % 24)),
+                'bluefs_dedicated_db': '1' if hdd else '0',
+            }
+            if hdd:
+                entry['bluefs_db_dev_node'] = "/dev/nvme{0}n1".format(
+                    position // DB_PER_DEVICE)
+                entry['bluefs_db_type'] = 'nvme'
+            metadata.append(entry)
+        return metadata
+
+    def _rule_domains(self):
+        """The OSD groups each rule picks from, one group per host."""
+        domains = {}
+        for rule, device_class in ((0, None), (1, 'hdd'), (2, 'ssd')):
+            if self.crush_depth >= 2:
+                groups = [[osd for osd in osds
+                           if device_class in (None, self.osd_class[osd])]
+                          for osds in self.host_osds]
+            else:
+                groups = [[osd] for osd in range(self.osd_count)
+                          if device_class in (None, self.osd_class[osd])]
+            domains[rule] = [group for group in groups if group]
+        return domains
+
+    def pg_stats(self):
+        """Generate the pgmap `pg_stats` entries one at a time."""
+        rng = random.Random(self.seed + 1)
+        domains = self._rule_domains()
+        down = set(range(self.down))
+        for pool in range(self.pool_count):
+            groups = domains[self.pool_rule(pool)]
+            size = min(self.pool_size, len(groups))
+            for seq in range(self.pg_nums[pool]):
+                up = [rng.choice(group)
+                      for group in rng.sample(groups, size)]
+                state = 'active+clean'
+                stuck = 0
+                if down.intersection(up):
+                    state = 'active+undersized+degraded'
+                    stuck = rng.randint(60, 3600)
+                elif self.unclean and rng.random() < self.unclean:
+                    state = rng.choice(UNCLEAN_STATES)
+                    stuck = rng.randint(60, 7200)
+                objects = rng.randint(0, 4000)
+                acting = [osd for osd in up if osd not in down]
+                yield {
+                    'pgid': "{0}.{1:x}".format(pool + 1, seq),
+                    'version': "40'{0}".format(objects),
+                    'reported_seq': str(objects * 3),
+                    'reported_epoch': '40', 'state': state,
+                    'last_fresh': _stamp(),
+                    'last_change': _stamp(stuck),
+                    'last_active': _stamp(
+                        stuck if state.startswith(('peering', 'stale'))
+                        else 0),
+                    'last_peered': _stamp(),
+                    'last_clean': _stamp(stuck),
+                    'last_became_active': _stamp(86400),
+                    'last_unstale': _stamp(
+                        stuck if state.startswith('stale') else 0),
+                    'last_undegraded': _stamp(
+                        stuck if 'degraded' in state else 0),
+                    'last_fullsized': _stamp(
+                        stuck if 'undersized' in state else 0),
+                    'stat_sum': {
+                        'num_bytes': objects * 4194304,
+                        'num_objects': objects,
+                        'num_object_copies': objects * size,
+                        'num_objects_degraded':
+                            objects if 'degraded' in state else 0,
+                        'num_objects_misplaced':
+                            objects if 'remapped' in state else 0,
+                    },
+                    'up': up, 'acting': acting,
+                    'up_primary': up[0] if up else -1,
+                    'acting_primary': acting[0] if acting else -1,
+                }
+
+    def pool_stats(self):
+        rng = random.Random(self.seed + 2)
+        stats = []
+        for pool in range(self.pool_count):
+            objects = self.pg_nums[pool] * rng.randint(500, 3500)
+            stats.append({'poolid': pool + 1,
+                          'num_pg': self.pg_nums[pool],
+                          'stat_sum': {'num_bytes': objects * 4194304,
+                                       'num_objects': objects}})
+        return stats
+
+    def osd_stats(self):
+        rng = random.Random(self.seed + 3)
+        stats = []
+        for osd in range(self.osd_count):
+            kb = int(self._osd_weight(osd) * TIB_KB)
+            used = int(kb * rng.uniform(0.3, 0.8))
+            stats.append({'osd': osd, 'kb': kb, 'kb_used': used,
+                          'kb_avail': kb - used,
+                          'hb_peers': [], 'snap_trim_queue_len': 0})
+        return stats
+
+    def section(self, name):
+        """The top-level report section `name`, with every PG in it."""
+        if name == 'cluster_fingerprint':
+            return self.fsid
+        if name == 'version':
+            return self.version
+        return getattr(self, name)()
+
+    def pgmap(self, with_pgs=True):
+        """The pgmap, `with_pgs` False leaves `pg_stats` empty."""
+        return {'version': 1200, 'stamp': _stamp(),
+                'last_osdmap_epoch': 40, 'last_pg_scan': 40,
+                'pg_stats': list(self.pg_stats()) if with_pgs else [],
+                'pool_stats': self.pool_stats(),
+                'osd_stats': self.osd_stats()}
+
+    def report(self, sections=SECTION_ORDER):
+        """The whole report as a dict."""
+        return dict((name, self.section(name)) for name in sections)
+
+    def write(self, fileobj, sections=SECTION_ORDER):
+        """
+        Write the report as JSON to the text file `fileobj`.
+
+        The PG stats are encoded as they are generated. `sections` sets
+        the order of the top-level sections.
+        """
+        fileobj.write("{")
+        for number, name in enumerate(sections):
+            fileobj.write('{0}"{1}": '.format(", " if number else "", name))
+            if name != 'pgmap':
+                json.dump(self.section(name), fileobj)
+                continue
+            head = json.dumps(self.pgmap(with_pgs=False))
+            split = head.index('"pg_stats": [') + len('"pg_stats": [')
+            fileobj.write(head[:split])
+            for index, stat in enumerate(self.pg_stats()):
+                if index:
+                    fileobj.write(", ")
+                fileobj.write(json.dumps(stat))
+            fileobj.write(head[split:])
+        fileobj.write("}")
+
+
+def write_report(path, cluster, sections=SECTION_ORDER):
+    """Write `cluster`'s report to `path`, gzipped if it ends in `.gz`."""
+    if path.endswith('.gz'):
+        obj = gzip.open(path, 'wt')
+    else:
+        obj = open(path, 'w')
+    with obj:
+        cluster.write(obj, sections)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split(
+        "\n")[0])
+    parser.add_argument('path', help="report file, .gz to compress")
+    parser.add_argument('--osds', type=int, default=30)
+    parser.add_argument('--mons', type=int, default=3)
+    parser.add_argument('--hosts', type=int)
+    parser.add_argument('--pools', type=int, default=4)
+    parser.add_argument('--pgs', type=int, help="total PGs")
+    parser.add_argument('--crush-depth', type=int, default=2)
+    parser.add_argument('--down', type=int, default=0)
+    parser.add_argument('--unclean', type=float, default=0.0)
+    parser.add_argument('--mds', type=int, default=0)
+    parser.add_argument('--rgw', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    write_report(args.path, SyntheticCluster(
+        osds=args.osds, mons=args.mons, hosts=args.hosts, pools=args.pools,
+        pgs=args.pgs, crush_depth=args.crush_depth, down=args.down,
+        unclean=args.unclean, mds=args.mds, rgw=args.rgw, seed=args.seed))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
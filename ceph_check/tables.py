@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+
+"""
+Columnar OSD and PG tables built from the report maps.
+
+The osdmap `osds` list and the pgmap `pg_stats` list are lists of dicts,
+each costing hundreds of bytes per entry. The tables below keep one NumPy
+array per field instead, with repeated strings (PG states) interned into
+integer codes, so checks work on whole columns at once.
+"""
+
+import re
+from itertools import repeat
+
+import numpy as np
+
+# The zone of `2020-06-01T10:00:00.123456+0000`, Octopus and later.
+_ZONE = re.compile(r'(Z|([+-])(\d\d):?(\d\d))$')
+
+
+def _zone_offset(match):
+    """Seconds the zone `match` of `_ZONE` is ahead of UTC."""
+    if match.group(2) is None:
+        return 0
+    offset = int(match.group(3)) * 3600 + int(match.group(4)) * 60
+    return -offset if match.group(2) == '-' else offset
+
+
+def _parse_each(values):
+    """`parse_stamps` a stamp at a time, for columns numpy cannot take."""
+    seconds = np.full(len(values), np.nan)
+    for row, value in enumerate(values):
+        zone = _ZONE.search(value)
+        try:
+            stamp = np.datetime64(value[:zone.start()] if zone else value,
+                                  'us')
+        except ValueError:
+            continue
+        if not np.isnat(stamp):
+            seconds[row] = stamp.astype(np.int64) / 1e6 - (
+                _zone_offset(zone) if zone else 0)
+    return seconds
+
+
+def parse_stamps(values):
+    """
+    Seconds since the epoch of the Ceph timestamps `values`, NaN where
+    missing, zero or unreadable.
+
+    Ceph prints `2017-09-20 12:00:00.123456`, later releases add a zone,
+    which is taken off to get UTC. A PG which never was active or clean
+    has `0.000000` for the time it last was. numpy parses the column at
+    once, a column it cannot take is parsed a stamp at a time.
+    """
+    # No year starts with 0, `0.000000` does.
+    values = [value if value and value[0] != '0' else 'NaT'
+              for value in values]
+    sample = next((value for value in values if value != 'NaT'), None)
+    offsets = None
+    stripped = values
+    if sample and _ZONE.search(sample):
+        zones = [_ZONE.search(value) for value in values]
+        offsets = np.array([_zone_offset(zone) if zone else 0
+                            for zone in zones], dtype=np.float64)
+        stripped = [value[:zone.start()] if zone else value
+                    for value, zone in zip(values, zones)]
+    try:
+        stamps = np.array(stripped, dtype='datetime64[us]')
+    except ValueError:
+        return _parse_each(values)
+    seconds = stamps.astype(np.int64) / 1e6
+    if offsets is not None:
+        seconds -= offsets
+    seconds[np.isnat(stamps)] = np.nan
+    return seconds
+
+
+class StringColumn(object):
+    """A string column stored as integer codes into its unique values."""
+
+    def __init__(self, codes, values):
+        self.codes = codes
+        self.values = values
+
+    @classmethod
+    def from_strings(cls, strings, count=-1):
+        index = {}
+        codes = np.fromiter(
+            (index.setdefault(value, len(index)) for value in strings),
+            dtype=np.int32, count=count)
+        values = [None] * len(index)
+        for value, code in index.items():
+            values[code] = value
+        return cls(codes, values)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, row):
+        return self.values[self.codes[row]]
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes
+
+    def mask(self, predicate):
+        """
+        Boolean row mask of the values matching `predicate`.
+
+        The predicate is evaluated once per distinct value.
+        """
+        matches = np.array([bool(predicate(value)) for value in self.values],
+                           dtype=bool)
+        if not len(matches):
+            return np.zeros(len(self.codes), dtype=bool)
+        return matches[self.codes]
+
+    def counts(self):
+        """Map each distinct value to the number of rows holding it."""
+        totals = np.bincount(self.codes, minlength=len(self.values))
+        return dict(zip(self.values, totals.tolist()))
+
+
+class OSDTable(object):
+    """
+    One row per OSD in the osdmap.
+
+    `kb` and `kb_used` come from the OSD usage stats, and are zero for
+    OSDs without stats.
+    """
+
+    def __init__(self, osd_id, up, in_, weight, kb, kb_used):
+        self.id = osd_id
+        self.up = up
+        self.in_ = in_
+        self.weight = weight
+        self.kb = kb
+        self.kb_used = kb_used
+
+    @classmethod
+    def from_maps(cls, osdmap, osd_stats=None):
+        osds = osdmap['osds']
+        count = len(osds)
+        osd_id = np.fromiter((osd['osd'] for osd in osds),
+                             dtype=np.int32, count=count)
+        up = np.fromiter((osd['up'] for osd in osds), dtype=bool, count=count)
+        in_ = np.fromiter((osd['in'] for osd in osds), dtype=bool, count=count)
+        weight = np.fromiter((osd['weight'] for osd in osds),
+                             dtype=np.float32, count=count)
+        table = cls(osd_id, up, in_, weight,
+                    np.zeros(count, dtype=np.int64),
+                    np.zeros(count, dtype=np.int64))
+        if osd_stats:
+            count = len(osd_stats)
+            rows = table.rows(np.fromiter(
+                (stat['osd'] for stat in osd_stats), dtype=np.int32,
+                count=count))
+            known = rows >= 0
+            table.kb[rows[known]] = np.fromiter(
+                (stat['kb'] for stat in osd_stats), dtype=np.int64,
+                count=count)[known]
+            table.kb_used[rows[known]] = np.fromiter(
+                (stat['kb_used'] for stat in osd_stats), dtype=np.int64,
+                count=count)[known]
+        return table
+
+    def __len__(self):
+        return len(self.id)
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in (
+            self.id, self.up, self.in_, self.weight, self.kb, self.kb_used))
+
+    def rows(self, osd_ids):
+        """Row numbers of `osd_ids`, -1 for ids not in the table."""
+        osd_ids = np.asarray(osd_ids, dtype=np.int64)
+        if not len(self.id):
+            return np.full(len(osd_ids), -1, dtype=np.int64)
+        lookup = np.full(int(self.id.max()) + 1, -1, dtype=np.int64)
+        lookup[self.id] = np.arange(len(self.id))
+        valid = (osd_ids >= 0) & (osd_ids < len(lookup))
+        rows = np.full(len(osd_ids), -1, dtype=np.int64)
+        rows[valid] = lookup[osd_ids[valid]]
+        return rows
+
+    def changed_ids(self, previous):
+        """
+        Ids of the OSDs that differ from the `previous` table.
+
+        OSDs added or removed since count as changed.
+        """
+        added = np.setdiff1d(self.id, previous.id)
+        removed = np.setdiff1d(previous.id, self.id)
+        common = np.intersect1d(self.id, previous.id)
+        rows, old = self.rows(common), previous.rows(common)
+        differs = np.zeros(len(common), dtype=bool)
+        for name in ('up', 'in_', 'weight', 'kb', 'kb_used'):
+            differs |= getattr(self, name)[rows] != getattr(
+                previous, name)[old]
+        return np.union1d(np.union1d(added, removed), common[differs])
+
+    def utilization(self):
+        """Fraction of each OSD's capacity in use, zero where unknown."""
+        used = np.zeros(len(self.id), dtype=np.float64)
+        known = self.kb > 0
+        used[known] = self.kb_used[known] / self.kb[known].astype(np.float64)
+        return used
+
+
+class PGTable(object):
+    """
+    One row per placement group in the pgmap `pg_stats`.
+
+    `last_active` and `last_clean` are seconds since the epoch, NaN for a
+    PG without them, or None when no PG has them, as from
+    `pg dump pgs_brief`.
+    """
+
+    def __init__(self, pool, seq, state, up_primary, acting_primary,
+                 last_active=None, last_clean=None):
+        self.pool = pool
+        self.seq = seq
+        self.state = state
+        self.up_primary = up_primary
+        self.acting_primary = acting_primary
+        self.last_active = last_active
+        self.last_clean = last_clean
+
+    @classmethod
+    def from_pgmap(cls, pgmap):
+        stats = pgmap['pg_stats']
+        count = len(stats)
+        # `pool seq pool seq ...`, split at once rather than PG by PG.
+        pgids = " ".join(stat['pgid'] for stat in stats).replace(
+            '.', ' ').split(' ') if stats else []
+        pool = np.fromiter(map(int, pgids[0::2]), dtype=np.int32, count=count)
+        seq = np.fromiter(map(int, pgids[1::2], repeat(16)), dtype=np.uint32,
+                          count=count)
+        state = StringColumn.from_strings(
+            (stat['state'] for stat in stats), count=count)
+        up_primary = np.fromiter(
+            (stat.get('up_primary', -1) for stat in stats),
+            dtype=np.int32, count=count)
+        acting_primary = np.fromiter(
+            (stat.get('acting_primary', -1) for stat in stats),
+            dtype=np.int32, count=count)
+        last_active = last_clean = None
+        if stats and 'last_active' in stats[0]:
+            last_active = parse_stamps([stat.get('last_active')
+                                        for stat in stats])
+            last_clean = parse_stamps([stat.get('last_clean')
+                                       for stat in stats])
+        return cls(pool, seq, state, up_primary, acting_primary, last_active,
+                   last_clean)
+
+    def __len__(self):
+        return len(self.pool)
+
+    @property
+    def nbytes(self):
+        return (self.pool.nbytes + self.seq.nbytes + self.state.nbytes +
+                self.up_primary.nbytes + self.acting_primary.nbytes +
+                sum(stamps.nbytes for stamps in (self.last_active,
+                                                 self.last_clean)
+                    if stamps is not None))
+
+    def equals(self, other):
+        """Whether `other` holds the same PGs in the same states."""
+        if len(self) != len(other):
+            return False
+        return (np.array_equal(self.pool, other.pool) and
+                np.array_equal(self.seq, other.seq) and
+                np.array_equal(self.up_primary, other.up_primary) and
+                np.array_equal(self.acting_primary, other.acting_primary) and
+                self.state.values == other.state.values and
+                np.array_equal(self.state.codes, other.state.codes))
+
+    def same_stamps(self, other):
+        """Whether `other` has the same `last_active` and `last_clean`."""
+        if self.last_active is None or other.last_active is None:
+            return self.last_active is other.last_active
+        return (np.array_equal(self.last_active, other.last_active,
+                               equal_nan=True) and
+                np.array_equal(self.last_clean, other.last_clean,
+                               equal_nan=True))
+
+    def pgid(self, row):
+        return "{0}.{1:x}".format(self.pool[row], self.seq[row])
+
+    def has_state(self, flag):
+        """Rows whose state includes `flag`, e.g. 'degraded'."""
+        return self.state.mask(lambda state: flag in state.split('+'))
@@ -0,0 +1,506 @@
+# -*- coding: utf-8 -*-
+
+"""
+Usage history of the clusters checked, and when their OSDs and pools
+fill up at the rate they grow.
+
+Each live run records one sample per series into a local SQLite
+database: the bytes used by the cluster, every OSD and every pool, with
+the nearfull and full limits they had, and the number of PGs in each
+state. A sample goes into three levels at once, raw and the hourly and
+daily means, which are updated in place as the samples of their hour or
+day come in. Each level is kept for as long as `LEVELS` says, so years
+of history stay small while the last weeks keep every sample.
+
+    series(id, fsid, kind, name, time, value, nearfull, full)
+    samples(level, series, time, value, nearfull, full, count)
+
+`samples` is a table without rowids keyed on (level, series, time): the
+samples of a series at one level are stored together, in time order,
+and reading them is a single range scan of the primary key. A series
+row keeps its latest sample.
+
+`TrendStore.projections` fits a least squares line through the samples
+of every series over a window, with SQL aggregates over those ranges,
+and extends it to the nearfull and full limits of the series.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+cc_logger = logging.getLogger("ceph_check")
+
+HOUR = 3600
+DAY = 24 * HOUR
+# Bucket width and retention of each level in seconds, raw samples first.
+LEVELS = ((0, 35 * DAY), (HOUR, 400 * DAY), (DAY, 5 * 365 * DAY))
+RAW, HOURLY, DAILY = range(len(LEVELS))
+# How often the samples past their retention are deleted.
+PRUNE_INTERVAL = HOUR
+# The ratios Ceph uses when the osdmap has none, before Luminous.
+NEARFULL_RATIO = 0.85
+FULL_RATIO = 0.95
+# Samples fitted by default, in seconds.
+WINDOW = 7 * DAY
+# Points of the window a projection is fitted through, at least: the
+# coarsest level which still gives that many is read.
+POINTS = 48
+# Fewer samples, or samples spanning less time, project nothing.
+MIN_SAMPLES = 3
+MIN_SPAN = HOUR
+# Days to nearfull which warn, and days to full which are an error.
+WARN_DAYS = 30
+URGENT_DAYS = 7
+# OSDs and pools listed.
+TOP = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    fsid TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    time INTEGER,
+    value REAL,
+    nearfull REAL,
+    full REAL,
+    UNIQUE (fsid, kind, name)
+);
+CREATE TABLE IF NOT EXISTS samples (
+    level INTEGER NOT NULL,
+    series INTEGER NOT NULL,
+    time INTEGER NOT NULL,
+    value REAL NOT NULL,
+    nearfull REAL,
+    full REAL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (level, series, time)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+"""
+
+# A new sample, or the running mean of its bucket.
+_UPSERT = """
+INSERT INTO samples (level, series, time, value, nearfull, full, count)
+VALUES (?, ?, ?, ?, ?, ?, 1)
+ON CONFLICT (level, series, time) DO UPDATE SET
+    value = value + (excluded.value - value) / (count + 1),
+    nearfull = excluded.nearfull,
+    full = excluded.full,
+    count = count + 1
+"""
+
+# SQLite before 3.24 has no upsert: the running means of the buckets
+# already there are updated, then the new buckets inserted.
+UPSERT = sqlite3.sqlite_version_info >= (3, 24, 0)
+_UPDATE = """
+UPDATE samples SET value = value + (? - value) / (count + 1),
+    nearfull = ?, full = ?, count = count + 1
+WHERE level = ? AND series = ? AND time = ?
+"""
+_INSERT = """
+INSERT OR IGNORE INTO samples (level, series, time, value, nearfull, full,
+                               count)
+VALUES (?, ?, ?, ?, ?, ?, 1)
+"""
+
+# Sums of the least squares fit of each series, with the time `x` in
+# days before `now` and the values `y` relative to the latest one, which
+# keeps the sums small next to the bytes of a whole cluster.
+_FIT = """
+SELECT kind, name, latest, nearfull, full, COUNT(*), MIN(time),
+       SUM(x), SUM(y), SUM(x * x), SUM(x * y)
+FROM (
+    SELECT series.id AS id, series.kind AS kind, series.name AS name,
+           series.value AS latest, series.nearfull AS nearfull,
+           series.full AS full, samples.time AS time,
+           (samples.time - :now) / 86400.0 AS x,
+           samples.value - series.value AS y
+    FROM series JOIN samples ON samples.level = :level
+        AND samples.series = series.id AND samples.time >= :start
+    WHERE series.fsid = :fsid AND series.time >= :start
+        AND series.kind IN ({kinds})
+)
+GROUP BY id
+"""
+
+
+class TrendError(Exception):
+    """Raised when the trend store cannot be read or written."""
+
+
+def default_path():
+    """`$XDG_DATA_HOME/ceph_check/trends.db`, or under `~/.local/share`."""
+    base = os.environ.get('XDG_DATA_HOME') or os.path.join(
+        os.path.expanduser('~'), '.local', 'share')
+    return os.path.join(base, 'ceph_check', 'trends.db')
+
+
+def level_for(window):
+    """The coarsest level with `POINTS` buckets in `window` seconds."""
+    levels = [level for level, (width, retention) in enumerate(LEVELS)
+              if width * POINTS <= window and window <= retention]
+    return levels[-1] if levels else RAW
+
+
+def snapshot_fsid(snapshot):
+    """The cluster fsid, from the osdmap or the monmap, or None."""
+    for name in ('osdmap', 'monmap'):
+        if snapshot.has_section(name) and snapshot.section(name).get('fsid'):
+            return snapshot.section(name)['fsid']
+    return None
+
+
+def _data_fraction(pool, profiles):
+    """The share of a pool's raw usage its data takes, 1/size or k/(k+m)."""
+    profile = profiles.get(pool.get('erasure_code_profile'), {})
+    if pool.get('type') == 3 and 'k' in profile and 'm' in profile:
+        k, m = int(profile['k']), int(profile['m'])
+        return float(k) / (k + m)
+    return 1.0 / max(pool['size'], 1)
+
+
+def _max_avail(osds, kb, kb_used, ratio):
+    """
+    The KiB writable to the OSDs `osds` before the first one reaches
+    `ratio`, with the data spread in proportion to their sizes. The same
+    as `MAX AVAIL` in `ceph df`, with the OSD sizes for CRUSH weights.
+    """
+    total = sum(kb[osd] for osd in osds)
+    if not total:
+        return 0.0
+    return min(max(ratio * kb[osd] - kb_used[osd], 0.0) * total / kb[osd]
+               for osd in osds if kb[osd])
+
+
+def usage(snapshot):
+    """
+    The samples in `snapshot`, as (kind, name, value, nearfull, full).
+
+    OSDs and the cluster need the osdmap with OSD stats, pools the pool
+    stats and the crushmap as well, PG states the PG table. Whatever the
+    snapshot lacks is left out. Limits are in bytes like the values, PG
+    state counts have none.
+    """
+    samples = []
+    if snapshot.has_section('osdmap'):
+        osdmap = snapshot.osdmap
+        nearfull = osdmap.get('nearfull_ratio') or NEARFULL_RATIO
+        full = osdmap.get('full_ratio') or FULL_RATIO
+        table = snapshot.osd_table
+        ids = table.id.tolist()
+        kb = dict(zip(ids, table.kb.tolist()))
+        kb_used = dict(zip(ids, table.kb_used.tolist()))
+        if any(kb.values()):
+            total = sum(kb.values())
+            samples.append(('cluster', 'usage', 1024.0 * sum(
+                kb_used.values()), 1024.0 * nearfull * total,
+                1024.0 * full * total))
+            samples.extend(('osd', "osd.{0}".format(osd),
+                            1024.0 * kb_used[osd], 1024.0 * nearfull * kb[osd],
+                            1024.0 * full * kb[osd])
+                           for osd in ids if kb[osd])
+        stored = dict((stat['poolid'], stat['stat_sum']['num_bytes'])
+                      for stat in snapshot.pool_stats)
+        if stored:
+            samples.extend(_pool_usage(snapshot, stored, kb, kb_used,
+                                       nearfull, full))
+    if snapshot.has_section('pgmap') or snapshot.has_section('pg_dump'):
+        samples.extend(('pg_state', state, float(count), None, None)
+                       for state, count in
+                       snapshot.pg_table.state.counts().items())
+    return samples
+
+
+def _pool_usage(snapshot, stored, kb, kb_used, nearfull, full):
+    """The pool samples of `usage`, limited by the OSDs of their rules."""
+    by_rule = {}
+    if snapshot.has_section('crushmap') and any(kb.values()):
+        from ceph_check import pgcalc
+        table = snapshot.osd_table
+        by_rule = pgcalc.rule_osds(snapshot.crushmap,
+                                   set(table.id[table.in_].tolist()))
+    profiles = snapshot.osdmap.get('erasure_code_profiles', {})
+    avail = {}
+    samples = []
+    for pool in snapshot.osdmap.get('pools', []):
+        if pool['pool'] not in stored:
+            continue
+        used = float(stored[pool['pool']])
+        limits = (None, None)
+        osds = [osd for osd in by_rule.get(
+            pool.get('crush_rule', pool.get('crush_ruleset')), ())
+            if kb.get(osd)]
+        if osds:
+            key = frozenset(osds)
+            if key not in avail:
+                avail[key] = [_max_avail(osds, kb, kb_used, ratio)
+                              for ratio in (nearfull, full)]
+            fraction = _data_fraction(pool, profiles)
+            limits = tuple(used + 1024.0 * raw * fraction
+                           for raw in avail[key])
+        samples.append(('pool', pool['pool_name'], used) + limits)
+    return samples
+
+
+def format_bytes(value):
+    """`value` bytes as `512 B`, `1.5 KiB`, ... `2.0 PiB`."""
+    for unit in ('B', 'KiB', 'MiB', 'GiB', 'TiB'):
+        if abs(value) < 1024:
+            break
+        value /= 1024.0
+    else:
+        unit = 'PiB'
+    if unit == 'B':
+        return "{0:.0f} B".format(value)
+    return "{0:.1f} {1}".format(value, unit)
+
+
+def format_days(days):
+    """`days` as `now`, `5.4 days` or `145 days`, `-` for None."""
+    if days is None:
+        return "-"
+    if days <= 0:
+        return "now"
+    return "{0:.{1}f} days".format(days, 1 if days < 10 else 0)
+
+
+def soonest(projections, limit=TOP):
+    """
+    The `limit` projections reaching nearfull first, then the fullest of
+    those never reaching it.
+    """
+    def key(projection):
+        days = projection.days_to_nearfull
+        return (days is None, days or 0.0, -(projection.used_ratio or 0.0))
+    return sorted(projections, key=key)[:limit]
+
+
+class Projection(object):
+    """
+    The growth of one series and when it reaches its limits.
+
+    `slope` is in units per day, None without enough samples to tell.
+    `value`, `nearfull` and `full` are those of the latest sample,
+    `samples` were fitted over the last `span` seconds.
+    """
+
+    def __init__(self, kind, name, value, nearfull, full, samples, span,
+                 slope):
+        self.kind = kind
+        self.name = name
+        self.value = value
+        self.nearfull = nearfull
+        self.full = full
+        self.samples = samples
+        self.span = span
+        self.slope = slope
+
+    def __repr__(self):
+        return "<Projection {0} {1} {2}/day>".format(self.kind, self.name,
+                                                     self.slope)
+
+    def days_to(self, limit):
+        """Days until `limit` is reached, None if it never is."""
+        if limit is None:
+            return None
+        if self.value >= limit:
+            return 0.0
+        if not self.slope or self.slope <= 0:
+            return None
+        return (limit - self.value) / self.slope
+
+    @property
+    def days_to_nearfull(self):
+        return self.days_to(self.nearfull)
+
+    @property
+    def days_to_full(self):
+        return self.days_to(self.full)
+
+    @property
+    def used_ratio(self):
+        """`value` as a fraction of `full`, None without limits."""
+        if not self.full:
+            return None
+        return self.value / self.full
+
+    def to_dict(self):
+        return {'kind': self.kind, 'name': self.name, 'value': self.value,
+                'nearfull': self.nearfull, 'full': self.full,
+                'samples': self.samples, 'span': self.span,
+                'slope_per_day': self.slope,
+                'days_to_nearfull': self.days_to_nearfull,
+                'days_to_full': self.days_to_full}
+
+
+class TrendStore(object):
+    """
+    The samples of every run, in the SQLite database at `path`.
+
+    The database is created if missing and opened in WAL mode, so a
+    daemon recording samples does not block readers. One store can be
+    shared by threads.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_path()
+        directory = os.path.dirname(self.path)
+        try:
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._db = sqlite3.connect(self.path, timeout=30,
+                                       check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            with self._db:
+                self._db.executescript(SCHEMA)
+        except (OSError, sqlite3.Error) as err:
+            raise TrendError("Cannot open the trend store {0} : {1}".format(
+                self.path, err))
+        self._lock = threading.Lock()
+        # Series ids by (fsid, kind, name), filled as they are used.
+        self._ids = {}
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, fsid, samples, now=None):
+        """
+        Add `samples`, as returned by `usage()`, taken at `now`.
+
+        Returns the number of series written.
+        """
+        now = int(time.time() if now is None else now)
+        try:
+            with self._lock, self._db:
+                ids = self._series_ids(fsid, [sample[:2]
+                                              for sample in samples])
+                rows = [(ids[kind, name], value, nearfull, full)
+                        for kind, name, value, nearfull, full in samples]
+                self._db.executemany(
+                    "UPDATE series SET time = ?, value = ?, nearfull = ?, "
+                    "full = ? WHERE id = ?",
+                    [(now, value, nearfull, full, series)
+                     for series, value, nearfull, full in rows])
+                for level, (width, _) in enumerate(LEVELS):
+                    bucket = now - now % width if width else now
+                    self._add_samples(level, bucket, rows)
+                self._prune(now)
+        except sqlite3.Error as err:
+            raise TrendError("Cannot record in {0} : {1}".format(
+                self.path, err))
+        return len(rows)
+
+    def _add_samples(self, level, bucket, rows):
+        """Add `rows` to the `bucket` of `level`, see `UPSERT`."""
+        if UPSERT:
+            self._db.executemany(_UPSERT, [
+                (level, series, bucket, value, nearfull, full)
+                for series, value, nearfull, full in rows])
+            return
+        self._db.executemany(_UPDATE, [
+            (value, nearfull, full, level, series, bucket)
+            for series, value, nearfull, full in rows])
+        self._db.executemany(_INSERT, [
+            (level, series, bucket, value, nearfull, full)
+            for series, value, nearfull, full in rows])
+
+    def record_snapshot(self, snapshot, now=None):
+        """Record the `usage()` of `snapshot`, see `record()`."""
+        return self.record(snapshot_fsid(snapshot) or 'unknown',
+                           usage(snapshot), now)
+
+    def _series_ids(self, fsid, keys):
+        """Ids of the series `keys`, (kind, name) pairs, added if new."""
+        missing = [key for key in keys if (fsid,) + key not in self._ids]
+        if missing:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO series (fsid, kind, name) "
+                "VALUES (?, ?, ?)", [(fsid,) + key for key in missing])
+            for series, kind, name in self._db.execute(
+                    "SELECT id, kind, name FROM series WHERE fsid = ?",
+                    (fsid,)):
+                self._ids[fsid, kind, name] = series
+        return dict((key, self._ids[(fsid,) + key]) for key in keys)
+
+    def _prune(self, now):
+        """Drop the samples past their retention, every PRUNE_INTERVAL."""
+        row = self._db.execute(
+            "SELECT value FROM meta WHERE key = 'pruned'").fetchone()
+        if row is not None and now - row[0] < PRUNE_INTERVAL:
+            return
+        series = [row[0] for row in self._db.execute(
+            "SELECT id FROM series")]
+        deleted = 0
+        for level, (_, retention) in enumerate(LEVELS):
+            # One range of the primary key per series.
+            deleted += self._db.executemany(
+                "DELETE FROM samples WHERE level = ? AND series = ? "
+                "AND time < ?",
+                [(level, ident, now - retention) for ident in series]
+            ).rowcount
+        gone = self._db.execute(
+            "DELETE FROM series WHERE NOT EXISTS (SELECT 1 FROM samples "
+            "WHERE level = ? AND series = series.id)", (DAILY,)).rowcount
+        if gone:
+            self._ids.clear()
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) "
+                         "VALUES ('pruned', ?)", (now,))
+        cc_logger.info("Trend store pruned : {0} samples, {1} series".format(
+            deleted, gone))
+
+    def history(self, fsid, kind, name, start=0, end=None, level=RAW):
+        """(time, value) of the samples of a series, oldest first."""
+        end = int(time.time() if end is None else end)
+        with self._lock:
+            return self._db.execute(
+                "SELECT samples.time, samples.value FROM series "
+                "JOIN samples ON samples.level = ? AND "
+                "samples.series = series.id AND samples.time BETWEEN ? AND ? "
+                "WHERE series.fsid = ? AND series.kind = ? "
+                "AND series.name = ? ORDER BY samples.time",
+                (level, start, end, fsid, kind, name)).fetchall()
+
+    def projections(self, fsid, kinds=('cluster', 'osd', 'pool'),
+                    window=WINDOW, now=None):
+        """
+        A `Projection` of each series of `kinds` sampled in the last
+        `window` seconds, fitted through the samples of that window at
+        the level `level_for()` picks.
+        """
+        now = int(time.time() if now is None else now)
+        params = {'now': now, 'level': level_for(window),
+                  'start': now - window, 'fsid': fsid}
+        params.update(("kind{0}".format(number), kind)
+                      for number, kind in enumerate(kinds))
+        query = _FIT.format(kinds=", ".join(
+            ":kind{0}".format(number) for number in range(len(kinds))))
+        try:
+            with self._lock:
+                rows = self._db.execute(query, params).fetchall()
+        except sqlite3.Error as err:
+            raise TrendError("Cannot read {0} : {1}".format(self.path, err))
+        projections = []
+        for (kind, name, value, nearfull, full, count, since,
+             sx, sy, sxx, sxy) in rows:
+            slope = None
+            spread = count * sxx - sx * sx
+            if (count >= MIN_SAMPLES and now - since >= MIN_SPAN and
+                    spread > 0):
+                slope = (count * sxy - sx * sy) / spread
+            projections.append(Projection(kind, name, value, nearfull, full,
+                                          count, now - since, slope))
+        return projections
@@ -13,6 +13,7 @@ with open('HISTORY.rst') as history_file:
 
 requirements = [
     'Click>=6.0',
+    'numpy',
     # TODO: put package requirements here
 ]
 
@@ -42,6 +43,10 @@ setup(
     },
     include_package_data=True,
     install_requires=requirements,
+    extras_require={
+        # Reading zstd compressed reports with --offline.
+        'zstd': ['zstandard'],
+    },
     license="MIT license",
     zip_safe=False,
     keywords='ceph_check',
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+"""Shared fixtures for the `ceph_check` tests."""
+
+import json
+import os
+import sys
+
+import pytest
+
+FAKE_CEPH = os.path.join(os.path.dirname(__file__), "fake_ceph.py")
+FAKE_SSH = os.path.join(os.path.dirname(__file__), "fake_ssh.py")
+
+
+def make_report():
+    """A small but complete `ceph report`, two MONs and three OSDs."""
+    return {
+        "cluster_fingerprint": "0f1a53a2-1111-4d0b-9d2e-000000000000",
+        "version": "12.2.1",
+        "health": {
+            "overall_status": "HEALTH_WARN",
+            "summary": [{"severity": "HEALTH_WARN",
+                         "summary": "1 osds down"}],
+        },
+        "monmap": {
+            "epoch": 2,
+            "fsid": "0f1a53a2-1111-4d0b-9d2e-000000000000",
+            "mons": [
+                {"rank": 0, "name": "mon-a", "addr": "10.0.0.1:6789/0"},
+                {"rank": 1, "name": "mon-b", "addr": "10.0.0.2:6789/0"},
+            ],
+        },
+        "osdmap": {
+            "epoch": 40,
+            "fsid": "0f1a53a2-1111-4d0b-9d2e-000000000000",
+            "osds": [
+                {"osd": 0, "up": 1, "in": 1, "weight": 1.0},
+                {"osd": 1, "up": 1, "in": 1, "weight": 1.0},
+                {"osd": 2, "up": 0, "in": 1, "weight": 1.0},
+            ],
+            "pools": [
+                {"pool": 1, "pool_name": "rbd", "size": 3, "min_size": 2,
+                 "crush_rule": 0, "pg_num": 64},
+                {"pool": 2, "pool_name": "backup", "size": 2, "min_size": 1,
+                 "crush_rule": 1, "pg_num": 8},
+            ],
+        },
+        "pgmap": {
+            "version": 1200,
+            "stamp": "2017-09-20 12:00:00.000000",
+            "pg_stats": [
+                {"pgid": "1.0", "state": "active+clean",
+                 "acting_primary": 0, "up_primary": 0,
+                 "last_active": "2017-09-20 11:59:58.000000",
+                 "last_clean": "2017-09-20 11:59:58.000000"},
+                {"pgid": "1.1", "state": "active+undersized+degraded",
+                 "acting_primary": 1, "up_primary": 1,
+                 "last_active": "2017-09-20 11:59:58.000000",
+                 "last_clean": "2017-09-20 10:00:00.000000"},
+            ],
+            "pool_stats": [
+                {"poolid": 1, "stat_sum": {"num_bytes": 3000}},
+                {"poolid": 2, "stat_sum": {"num_bytes": 1000}},
+            ],
+            "osd_stats": [
+                {"osd": 0, "kb": 1000, "kb_used": 100},
+                {"osd": 1, "kb": 1000, "kb_used": 200},
+                {"osd": 2, "kb": 1000, "kb_used": 300},
+            ],
+        },
+        "osd_metadata": [
+            {"id": 0, "hostname": "node-a", "front_addr": "10.0.0.1:6800/1",
+             "ceph_version": "ceph version 12.2.1"},
+            {"id": 1, "hostname": "node-a", "front_addr": "10.0.0.1:6804/2",
+             "ceph_version": "ceph version 12.2.1"},
+            {"id": 2, "hostname": "node-b", "front_addr": "10.0.0.3:6800/1",
+             "ceph_version": "ceph version 12.2.1"},
+        ],
+        "fsmap": {
+            "epoch": 5,
+            "filesystems": [{"id": 1, "mdsmap": {
+                "fs_name": "cephfs",
+                "info": {"gid_4100": {"gid": 4100, "name": "node-b",
+                                      "rank": 0, "state": "up:active",
+                                      "addr": "10.0.0.3:6810/100"}}}}],
+            "standbys": [],
+        },
+        "servicemap": {
+            "epoch": 3,
+            "services": {"rgw": {"daemons": {
+                "summary": "",
+                "rgw-b": {"gid": 5100, "addr": "10.0.0.2:0/200",
+                          "metadata": {"hostname": "mon-b"}}}}},
+        },
+        "crushmap": {
+            "devices": [{"id": 0, "name": "osd.0", "class": "hdd"},
+                        {"id": 1, "name": "osd.1", "class": "hdd"},
+                        {"id": 2, "name": "osd.2", "class": "ssd"}],
+            "types": [{"type_id": 0, "name": "osd"},
+                      {"type_id": 1, "name": "host"},
+                      {"type_id": 10, "name": "root"}],
+            "buckets": [
+                {"id": -1, "name": "default", "type_name": "root",
+                 "weight": 196608, "alg": "straw2", "hash": "rjenkins1",
+                 "items": [{"id": -2, "weight": 131072, "pos": 0},
+                           {"id": -3, "weight": 65536, "pos": 1}]},
+                {"id": -2, "name": "node-a", "type_name": "host",
+                 "weight": 131072, "alg": "straw2", "hash": "rjenkins1",
+                 "items": [{"id": 0, "weight": 65536, "pos": 0},
+                           {"id": 1, "weight": 65536, "pos": 1}]},
+                {"id": -3, "name": "node-b", "type_name": "host",
+                 "weight": 65536, "alg": "straw2", "hash": "rjenkins1",
+                 "items": [{"id": 2, "weight": 65536, "pos": 0}]},
+            ],
+            "rules": [
+                {"rule_id": 0, "rule_name": "replicated_rule", "type": 1,
+                 "steps": [{"op": "take", "item": -1, "item_name": "default"},
+                           {"op": "chooseleaf_firstn", "num": 0,
+                            "type": "host"},
+                           {"op": "emit"}]},
+                {"rule_id": 1, "rule_name": "hdd_rule", "type": 1,
+                 "steps": [{"op": "take", "item": -4,
+                            "item_name": "default~hdd"},
+                           {"op": "chooseleaf_firstn", "num": 0,
+                            "type": "host"},
+                           {"op": "emit"}]},
+            ],
+        },
+    }
+
+
+@pytest.fixture
+def report():
+    return make_report()
+
+
+@pytest.fixture
+def report_file(tmp_path, report):
+    path = tmp_path / "report.json"
+    path.write_text(json.dumps(report, indent=4))
+    return str(path)
+
+
+@pytest.fixture
+def fake_ceph(tmp_path, report_file, monkeypatch):
+    """
+    Path to a fake `ceph` binary answering from `report_file`.
+
+    Returns a function taking the FAKE_CEPH_* settings of
+    `tests/fake_ceph.py`, e.g. `fake_ceph(delay=0.1)`.
+    """
+    def make(**settings):
+        monkeypatch.setenv("FAKE_CEPH_REPORT", report_file)
+        for name, value in settings.items():
+            if isinstance(value, dict):
+                value = json.dumps(value)
+            monkeypatch.setenv("FAKE_CEPH_" + name.upper(), str(value))
+        path = tmp_path / "ceph"
+        path.write_text('#!/bin/sh\nexec "{0}" "{1}" "$@"\n'.format(
+            sys.executable, FAKE_CEPH))
+        path.chmod(0o755)
+        return str(path)
+    return make
+
+
+@pytest.fixture
+def fake_ssh(tmp_path, monkeypatch):
+    """
+    Path to a fake `ssh` binary, see `tests/fake_ssh.py`.
+
+    Returns a function taking the host settings, and a log file for
+    the invocations if wanted.
+    """
+    def make(hosts, log=None):
+        hosts_file = tmp_path / "ssh_hosts.json"
+        hosts_file.write_text(json.dumps(hosts))
+        monkeypatch.setenv("FAKE_SSH_HOSTS", str(hosts_file))
+        if log is not None:
+            monkeypatch.setenv("FAKE_SSH_LOG", str(log))
+        path = tmp_path / "ssh"
+        path.write_text('#!/bin/sh\nexec "{0}" "{1}" "$@"\n'.format(
+            sys.executable, FAKE_SSH))
+        path.chmod(0o755)
+        return str(path)
+    return make
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""
+A stand-in for `/usr/bin/ceph`, answering from a saved `ceph report`.
+
+Configured through the environment:
+
+FAKE_CEPH_REPORT  the report to answer from
+FAKE_CEPH_DELAY   seconds to sleep before answering, `report` output is
+                  written in eight slices with this delay between them
+FAKE_CEPH_LOG     file each invocation's arguments are appended to
+FAKE_CEPH_FAIL    exit status to fail every command with
+FAKE_CEPH_MONS    JSON object of per-monitor settings by the `-m` address,
+                  `delay` and `fail` as above, `dead` hangs for a minute
+                  without any output
+"""
+
+import json
+import os
+import sys
+import time
+
+
+def narrow(report, command):
+    pgmap = report['pgmap']
+    if command == 'mon dump':
+        return report['monmap']
+    if command == 'osd dump':
+        return report['osdmap']
+    if command == 'pg dump pgs_brief':
+        keys = ('pgid', 'state', 'up', 'acting', 'up_primary',
+                'acting_primary')
+        return [dict((key, stat[key]) for key in keys if key in stat)
+                for stat in pgmap['pg_stats']]
+    if command == 'pg dump pgs':
+        return pgmap['pg_stats']
+    if command == 'pg dump pools':
+        return pgmap['pool_stats']
+    if command == 'osd df':
+        return {'nodes': [{'id': stat['osd'], 'kb': stat['kb'],
+                           'kb_used': stat['kb_used']}
+                          for stat in pgmap['osd_stats']],
+                'summary': {}}
+    if command == 'health detail':
+        return report['health']
+    if command == 'osd crush dump':
+        return report['crushmap']
+    if command == 'osd metadata':
+        return report['osd_metadata']
+    if command == 'fs dump':
+        return report['fsmap']
+    if command == 'service dump':
+        return report['servicemap']
+    if command == 'status':
+        return {'fsid': report['monmap']['fsid'],
+                'health': report['health'],
+                'monmap': {'epoch': report['monmap']['epoch']},
+                'osdmap': {'osdmap': {'epoch': report['osdmap']['epoch']}},
+                'pgmap': {'version': pgmap['version']},
+                'fsmap': {'epoch': report.get('fsmap', {}).get('epoch', 1)},
+                'servicemap': {
+                    'epoch': report.get('servicemap', {}).get('epoch', 1)}}
+    return None
+
+
+def main(argv):
+    positional = []
+    mon = None
+    args = iter(argv)
+    for arg in args:
+        if arg == '-m':
+            mon = next(args, None)
+        elif arg in ('-f', '--format', '-c', '--conf', '-k', '--keyring',
+                     '--connect-timeout'):
+            next(args, None)
+        else:
+            positional.append(arg)
+    command = ' '.join(positional)
+    if os.environ.get('FAKE_CEPH_LOG'):
+        with open(os.environ['FAKE_CEPH_LOG'], 'a') as log:
+            log.write(' '.join(argv) + '\n')
+    settings = dict((name[len('FAKE_CEPH_'):].lower(), value)
+                    for name, value in os.environ.items()
+                    if name.startswith('FAKE_CEPH_'))
+    if mon is not None:
+        settings.update(json.loads(settings.get('mons', '{}')).get(mon, {}))
+    if settings.get('dead'):
+        time.sleep(60)
+        return 1
+    if settings.get('fail'):
+        sys.stderr.write("Error connecting to cluster: TimedOut\n")
+        return int(settings['fail'])
+    delay = float(settings.get('delay', 0))
+    with open(os.environ['FAKE_CEPH_REPORT'], 'rb') as obj:
+        raw = obj.read()
+
+    if command == 'report':
+        step = len(raw) // 8 + 1
+        for start in range(0, len(raw), step):
+            sys.stdout.buffer.write(raw[start:start + step])
+            sys.stdout.flush()
+            time.sleep(delay)
+        sys.stderr.write("report 12345\n")
+        return 0
+
+    answer = narrow(json.loads(raw.decode('utf-8')), command)
+    if answer is None:
+        sys.stderr.write("no valid command found\n")
+        return 22
+    time.sleep(delay)
+    sys.stdout.write(json.dumps(answer))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+"""
+A stand-in for `ssh`, answering the `ceph_check.hostfacts` script.
+
+Configured through the environment:
+
+FAKE_SSH_HOSTS  JSON file mapping host names to their settings,
+                `packages` ({name: version}), `kernel`, `delay` (seconds
+                to sleep before answering) and `fail` (exit status).
+                Unknown hosts fail like unreachable ones.
+FAKE_SSH_LOG    file each invocation's arguments are appended to
+"""
+
+import json
+import os
+import sys
+import time
+
+MARKER = "@@ceph_check "
+
+
+def main(argv):
+    args = iter(argv)
+    positional = []
+    for arg in args:
+        if arg in ('-o', '-l', '-p', '-i', '-F'):
+            next(args, None)
+        elif not arg.startswith('-'):
+            positional.append(arg)
+    host, script = positional[0], " ".join(positional[1:])
+    if os.environ.get('FAKE_SSH_LOG'):
+        with open(os.environ['FAKE_SSH_LOG'], 'a') as log:
+            log.write(json.dumps(argv) + '\n')
+    with open(os.environ['FAKE_SSH_HOSTS']) as obj:
+        settings = json.load(obj).get(host)
+    if settings is None:
+        sys.stderr.write("ssh: Could not resolve hostname {0}\n".format(host))
+        return 255
+    time.sleep(settings.get('delay', 0))
+    if settings.get('fail'):
+        sys.stderr.write("Permission denied (publickey,password).\n")
+        return settings['fail']
+    for part in script.split("echo '" + MARKER)[1:]:
+        fact = part.split("'", 1)[0]
+        sys.stdout.write(MARKER + fact + "\n")
+        if fact == 'packages':
+            for name, version in sorted(settings.get('packages', {}).items()):
+                sys.stdout.write("{0} {1}\n".format(name, version))
+        elif fact in settings:
+            sys.stdout.write(settings[fact] + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.archive`."""
+
+import json
+
+import pytest
+
+from ceph_check import archive
+from ceph_check import batch
+from ceph_check import ceph_check
+from ceph_check import synthetic
+from ceph_check.report import ReportError, ReportSnapshot
+
+
+def chunks(report, size=4096):
+    raw = json.dumps(report, indent=1).encode('utf-8')
+    return [raw[start:start + size] for start in range(0, len(raw), size)]
+
+
+def archive_report(path, report, sections=None, **kwargs):
+    return ReportSnapshot.from_stream(chunks(report, **kwargs), sections,
+                                      archive_path=str(path))
+
+
+def test_round_trip(tmp_path, report):
+    path = tmp_path / "reports.ccr"
+    snapshot = archive_report(path, report, ['monmap'])
+    # Only the wanted sections are decoded, all of them are archived.
+    assert list(snapshot.sections) == ['monmap']
+    with archive.ReportArchive(str(path)) as reports:
+        assert len(reports) == 1
+        latest = reports[-1]
+        assert sorted(latest.section_names) == sorted(report)
+        assert latest.sections() == report
+        assert latest.text('version') == '"12.2.1"'
+
+
+def test_appends_reports(tmp_path, report):
+    path = tmp_path / "reports.ccr"
+    for epoch in (2, 3, 4):
+        report['monmap']['epoch'] = epoch
+        archive_report(path, report)
+    with archive.ReportArchive(str(path)) as reports:
+        assert [entry.section('monmap')['epoch']
+                for entry in reports.reports] == [2, 3, 4]
+        assert reports[0].time <= reports[2].time
+        with pytest.raises(archive.ArchiveError):
+            reports[3]
+
+
+def test_reads_only_the_asked_blocks(tmp_path):
+    path = str(tmp_path / "reports.ccr")
+    report = synthetic.SyntheticCluster(osds=100, pgs=4000).report()
+    writer = archive.ArchiveWriter(path, block_size=1 << 14)
+    for name, value in report.items():
+        writer.write(name, json.dumps(value))
+    writer.close(source="test")
+    with archive.ReportArchive(path) as reports:
+        blocks = reports[-1].blocks
+        meta = reports[-1].meta
+    assert meta == {'source': "test"}
+    assert len(blocks['pgmap']) > 10
+    # Damage every pgmap block, the other sections still read back.
+    with open(path, 'r+b') as obj:
+        for offset, size, _ in blocks['pgmap']:
+            obj.seek(offset)
+            obj.write(b"\0" * size)
+    with archive.ReportArchive(path) as reports:
+        assert reports[-1].section('osdmap') == report['osdmap']
+        with pytest.raises(archive.ArchiveError):
+            reports[-1].section('pgmap')
+
+
+def test_failed_stream_is_not_archived(tmp_path, report):
+    path = tmp_path / "reports.ccr"
+    archive_report(path, report)
+    size = path.stat().st_size
+    with pytest.raises(ReportError):
+        ReportSnapshot.from_stream(chunks(report)[:-1],
+                                   archive_path=str(path))
+    assert path.stat().st_size == size
+
+
+def test_unfinished_report_is_dropped(tmp_path, report):
+    path = str(tmp_path / "reports.ccr")
+    archive_report(path, report)
+    # A writer which died halfway through a report.
+    writer = archive.ArchiveWriter(path, block_size=16)
+    writer.write('monmap', json.dumps(report['monmap']))
+    writer._release()
+    with archive.ReportArchive(path) as reports:
+        assert len(reports) == 1
+    report['monmap']['epoch'] = 9
+    archive_report(path, report)
+    with archive.ReportArchive(path) as reports:
+        assert [entry.section('monmap')['epoch']
+                for entry in reports.reports] == [2, 9]
+
+
+def test_not_an_archive(tmp_path):
+    path = tmp_path / "report.ccr"
+    path.write_text('{"monmap": {}}')
+    with pytest.raises(archive.ArchiveError):
+        archive.ReportArchive(str(path))
+    with pytest.raises(ReportError):
+        archive_report(path, {"monmap": {}})
+    with pytest.raises(ReportError):
+        ReportSnapshot.from_file(str(path))
+
+
+def test_offline_reads_latest_report(tmp_path, report):
+    path = tmp_path / "reports.ccr"
+    archive_report(path, report)
+    report['osdmap']['epoch'] = 41
+    archive_report(path, report)
+    snapshot = ReportSnapshot.from_file(str(path), ['osdmap'])
+    assert list(snapshot.sections) == ['osdmap']
+    assert snapshot.osdmap['epoch'] == 41
+    assert batch.find_reports([str(tmp_path)]) == [str(path)]
+    assert batch.audit_report(str(path)).ok
+
+
+def test_live_report_archived(fake_ceph, report, tmp_path):
+    path = str(tmp_path / "reports.ccr")
+    checker = ceph_check.CephCheck("/nonexistent", "/nonexistent",
+                                   archive=path, checks=["mon"],
+                                   ceph_bin=fake_ceph(delay=0.05))
+    assert checker.full_report
+    assert list(checker.ceph_report().sections) == ['monmap']
+    with archive.ReportArchive(path) as reports:
+        assert reports[-1].sections() == report
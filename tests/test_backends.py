@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.backends`."""
+
+import json
+
+import pytest
+
+from ceph_check import backends
+from ceph_check import ceph_check
+from ceph_check import fetch
+
+
+def test_command_key():
+    assert backends.command_key(fetch.SECTION_COMMANDS['pgmap']) == (
+        'pg_dump_pgs_brief')
+    assert backends.command_key({'prefix': 'report'}) == 'report'
+
+
+def test_subprocess_stream(fake_ceph, report):
+    backend = backends.SubprocessBackend(fake_ceph())
+    chunks = list(backend.stream({'prefix': 'report'}))
+    assert len(chunks) > 1
+    assert json.loads(b"".join(chunks)) == report
+
+
+def test_subprocess_stream_failure(fake_ceph):
+    backend = backends.SubprocessBackend(fake_ceph(fail=1))
+    with pytest.raises(fetch.FetchError):
+        list(backend.stream({'prefix': 'report'}))
+
+
+def test_record_and_replay(fake_ceph, tmp_path):
+    recorded = str(tmp_path / "recorded")
+    live = ceph_check.CephCheck(
+        "/nonexistent", "/nonexistent",
+        backend=backends.RecordingBackend(
+            backends.SubprocessBackend(fake_ceph()), recorded))
+    expected = live.fetch_snapshot()
+
+    cluster = backends.ReplayCluster.from_directory(recorded)
+    replayed = ceph_check.CephCheck(
+        "/nonexistent", "/nonexistent",
+        backend=backends.RadosBackend(cluster=cluster))
+    snapshot = replayed.fetch_snapshot()
+    assert snapshot.monmap == expected.monmap
+    assert snapshot.osd_table.kb_used.tolist() == [100, 200, 300]
+    assert len(snapshot.pg_table) == len(expected.pg_table)
+    # `pg dump pgs_brief` is left out for `pg dump pgs`.
+    assert sorted(cluster.commands) == sorted(
+        backends.command_key(command)
+        for section, command in fetch.SECTION_COMMANDS.items()
+        if section not in fetch.SUPERSEDED_BY)
+
+
+def test_one_connection_for_all_commands():
+    connects = []
+
+    class Cluster(backends.ReplayCluster):
+        def connect(self, timeout=0):
+            connects.append(timeout)
+
+    backend = backends.RadosBackend(
+        connect_timeout=7, cluster=Cluster({'mon_dump': b'{"epoch": 2}'}))
+    for _ in range(5):
+        assert backend.command({'prefix': 'mon dump'}) == b'{"epoch": 2}'
+    assert connects == [7]
+    backend.close()
+    backend.command({'prefix': 'mon dump'})
+    assert connects == [7, 7]
+
+
+def test_replay_missing_response():
+    backend = backends.RadosBackend(cluster=backends.ReplayCluster({}))
+    with pytest.raises(fetch.FetchError) as err:
+        backend.command({'prefix': 'osd dump'})
+    assert "osd_dump" in str(err.value)
+
+
+def test_rados_timeout():
+    class Cluster(backends.ReplayCluster):
+        def mon_command(self, cmd, inbuf, timeout=0, target=None):
+            return -backends.errno.ETIMEDOUT, b'', 'timed out'
+
+    backend = backends.RadosBackend(cluster=Cluster({}))
+    with pytest.raises(backends.CommandTimeout):
+        backend.command({'prefix': 'osd dump'}, timeout=1)
+
+
+def test_full_report_over_replay(report):
+    cluster = backends.ReplayCluster(
+        {'report': json.dumps(report).encode('utf-8')})
+    checker = ceph_check.CephCheck(
+        "/nonexistent", "/nonexistent", full_report=True,
+        backend=backends.RadosBackend(cluster=cluster))
+    snapshot = checker.fetch_snapshot()
+    assert snapshot.health['overall_status'] == 'HEALTH_WARN'
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.batch`."""
+
+import gzip
+import json
+import os
+import sys
+
+import pytest
+
+from click.testing import CliRunner
+
+from ceph_check import batch
+from ceph_check import cli
+from ceph_check.report import ReportError, ReportSnapshot
+
+
+@pytest.fixture
+def reports(tmp_path, report):
+    """Three saved reports, plain, gzipped and broken, in a directory."""
+    directory = tmp_path / "reports"
+    directory.mkdir()
+    (directory / "a.json").write_text(json.dumps(report))
+    report['osdmap']['pools'][0]['min_size'] = 3
+    with gzip.open(str(directory / "b.json.gz"), 'wt') as obj:
+        json.dump(report, obj)
+    (directory / "c.json").write_text('{"monmap": [')
+    (directory / "notes.txt").write_text("not a report")
+    return directory
+
+
+def test_find_reports(reports):
+    names = [os.path.basename(path)
+             for path in batch.find_reports([str(reports)])]
+    assert names == ["a.json", "b.json.gz", "c.json"]
+    globbed = batch.find_reports([str(reports / "*.gz"),
+                                  str(reports / "b*")])
+    assert [os.path.basename(path) for path in globbed] == ["b.json.gz"]
+
+
+def test_gzip_report(reports):
+    snapshot = ReportSnapshot.from_file(str(reports / "b.json.gz"),
+                                        ["osdmap"])
+    assert snapshot.osdmap['pools'][0]['min_size'] == 3
+
+
+def test_zstd_report(tmp_path, report):
+    zstandard = pytest.importorskip("zstandard")
+    path = tmp_path / "report.json.zst"
+    path.write_bytes(zstandard.ZstdCompressor().compress(
+        json.dumps(report).encode('utf-8')))
+    assert ReportSnapshot.from_file(str(path)).monmap['epoch'] == 2
+
+
+def test_zstd_needs_zstandard(tmp_path, monkeypatch):
+    path = tmp_path / "report.json.zst"
+    path.write_bytes(b"")
+    monkeypatch.setitem(sys.modules, 'zstandard', None)
+    with pytest.raises(ReportError):
+        ReportSnapshot.from_file(str(path))
+
+
+def test_offline_checks_skip_external_data():
+    names = [check.name for check in batch.offline_checks()]
+    assert 'ssh' not in names
+    assert 'capacity' not in names
+    assert 'pg' in names
+
+
+def test_audit_reports(reports):
+    audits = dict((os.path.basename(audit.path), audit)
+                  for audit in batch.audit_reports(
+                      batch.find_reports([str(reports)]), processes=2))
+    assert sorted(audits) == ["a.json", "b.json.gz", "c.json"]
+    assert audits["a.json"].ok
+    assert [result.name for result in audits["a.json"].results] == [
+        "health", "mon", "osd", "pool", "pg", "stuck", "crush", "journal",
+        "colocation"]
+    pool = [result for result in audits["b.json.gz"].results
+            if result.name == "pool"][0]
+    assert "min_size equals size" in pool.output
+    assert not audits["c.json"].ok
+    assert audits["c.json"].error
+
+
+def test_offline_cli(reports):
+    result = CliRunner().invoke(cli.main, [
+        '--offline', str(reports / "*.json*"), '--checks', 'mon,pool',
+        '--processes', '2'])
+    assert result.exit_code == 1
+    assert result.output.count("=====") == 6
+    assert "Unreadable report" in result.output
+    assert result.output.count("MONITOR STATUS") == 2
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.cache`."""
+
+import json
+import os
+
+import pytest
+
+from click.testing import CliRunner
+
+from ceph_check import cache
+from ceph_check import ceph_check
+from ceph_check import cli
+from ceph_check import monitors
+
+EPOCHS = {'fsid': 'abc', 'monmap': 2, 'osdmap': 40, 'pgmap': 1200,
+          'fsmap': None, 'servicemap': None}
+
+
+@pytest.fixture
+def report_cache(tmp_path):
+    return cache.ReportCache(str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def checker(fake_ceph, report_cache, tmp_path):
+    """Build a cached `CephCheck` over the fake `ceph`, logging its calls."""
+    log = tmp_path / "calls"
+
+    def make(**kwargs):
+        if log.exists():
+            log.unlink()
+        return ceph_check.CephCheck(
+            "/nonexistent", "/nonexistent", ceph_bin=fake_ceph(log=log),
+            cache=report_cache, **kwargs)
+
+    def calls():
+        return sorted(line.split(' -f')[0]
+                      for line in log.read_text().splitlines())
+    make.calls = calls
+    return make
+
+
+def test_epochs_from_status():
+    luminous = {'fsid': 'abc', 'monmap': {'epoch': 2},
+                'osdmap': {'osdmap': {'epoch': 40}},
+                'pgmap': {'version': 1200}, 'fsmap': {'epoch': 1},
+                'servicemap': {'epoch': 3}}
+    assert cache.epochs_from_status(luminous) == dict(EPOCHS, fsmap=1,
+                                                      servicemap=3)
+    nautilus = {'fsid': 'abc', 'monmap': {'epoch': 2},
+                'osdmap': {'epoch': 40}, 'pgmap': {'num_pgs': 8}}
+    assert cache.epochs_from_status(nautilus) == dict(EPOCHS, pgmap=None)
+
+
+def test_put_and_get(report_cache):
+    assert report_cache.get('osdmap', EPOCHS) is None
+    report_cache.put('osdmap', EPOCHS, {'epoch': 40})
+    assert report_cache.get('osdmap', EPOCHS) == {'epoch': 40}
+    # crushmap follows the osdmap epoch.
+    assert report_cache.get('crushmap', EPOCHS) is None
+    assert report_cache.get('osdmap', dict(EPOCHS, osdmap=41)) is None
+    assert report_cache.get('osdmap', dict(EPOCHS, fsid='other')) is None
+
+
+def test_put_replaces_older_epochs(report_cache):
+    report_cache.put('osdmap', EPOCHS, {'epoch': 40})
+    report_cache.put('osdmap', dict(EPOCHS, osdmap=41), {'epoch': 41})
+    assert os.listdir(os.path.join(report_cache.path, 'abc')) == [
+        'osdmap.osdmap-41.json']
+
+
+def test_uncacheable_sections(report_cache):
+    assert not report_cache.cacheable('health', EPOCHS)
+    assert not report_cache.cacheable('pgmap', dict(EPOCHS, pgmap=None))
+    report_cache.put('health', EPOCHS, {'status': 'HEALTH_OK'})
+    assert not os.path.exists(report_cache.path)
+
+
+def test_evict_by_age_and_size(tmp_path):
+    report_cache = cache.ReportCache(str(tmp_path), max_bytes=100,
+                                     max_age=200)
+    for number, section in enumerate(['monmap', 'osdmap', 'pgmap']):
+        report_cache.put(section, EPOCHS, "x" * 40)
+        path = report_cache._entry(section, EPOCHS)
+        os.utime(path, (1000 + number * 100, 1000 + number * 100))
+    # All are recent enough, the oldest goes to fit in 100 bytes.
+    assert report_cache.evict(now=1150) == [
+        report_cache._entry('monmap', EPOCHS)]
+    assert report_cache.evict(now=1150) == []
+    # Now the osdmap entry is too old.
+    assert report_cache.evict(now=1350) == [
+        report_cache._entry('osdmap', EPOCHS)]
+    assert report_cache.get('pgmap', EPOCHS) == "x" * 40
+
+
+def test_unreadable_entry_is_dropped(report_cache):
+    report_cache.put('osdmap', EPOCHS, {'epoch': 40})
+    path = report_cache._entry('osdmap', EPOCHS)
+    with open(path, 'w') as obj:
+        obj.write('{"epo')
+    assert report_cache.get('osdmap', EPOCHS) is None
+    assert not os.path.exists(path)
+
+
+def test_cache_hit(checker):
+    first = checker(checks=['mon', 'osd', 'health'])
+    assert first.fetch_snapshot().monmap['epoch'] == 2
+    assert checker.calls() == ['health detail', 'mon dump', 'osd df',
+                               'osd dump', 'status']
+    second = checker(checks=['mon', 'osd', 'health'])
+    snapshot = second.fetch_snapshot()
+    # Health has no epoch and is always fetched.
+    assert checker.calls() == ['health detail', 'status']
+    assert snapshot.monmap['epoch'] == 2
+    assert snapshot.osd_table.kb_used.tolist() == [100, 200, 300]
+
+
+def test_changed_epoch_is_fetched_again(checker, report, report_file):
+    checker(checks=['mon', 'pool']).fetch_snapshot()
+    report['osdmap']['epoch'] = 41
+    report['osdmap']['pools'][0]['size'] = 2
+    with open(report_file, 'w') as obj:
+        json.dump(report, obj)
+    snapshot = checker(checks=['mon', 'pool']).fetch_snapshot()
+    assert checker.calls() == ['osd dump', 'status']
+    assert snapshot.osdmap['pools'][0]['size'] == 2
+
+
+def test_full_report_cached(checker):
+    checker(full_report=True).fetch_snapshot()
+    assert 'report' in checker.calls()
+    snapshot = checker(full_report=True).fetch_snapshot()
+    assert checker.calls() == ['health detail', 'status']
+    assert snapshot.pg_table.has_state('degraded').sum() == 1
+    assert snapshot.crushmap['rules'][1]['rule_name'] == 'hdd_rule'
+
+
+def test_failed_probe_fetches_everything(fake_ceph, report_cache):
+    checker = ceph_check.CephCheck("/nonexistent", "/nonexistent",
+                                   ceph_bin=fake_ceph(fail=1),
+                                   cache=report_cache, checks=['mon'],
+                                   backoff=monitors.Backoff(attempts=1))
+    assert checker.fetch_snapshot() is None
+    assert not os.path.exists(report_cache.path)
+
+
+def test_no_cache_option():
+    result = CliRunner().invoke(cli.main, ['--help'])
+    assert '--no-cache' in result.output
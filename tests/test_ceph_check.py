@@ -3,12 +3,26 @@
 
 """Tests for `ceph_check` package."""
 
+import random
+import subprocess
+import sys
+import tempfile
+
 import pytest
 
 from click.testing import CliRunner
 
 from ceph_check import ceph_check
 from ceph_check import cli
+from ceph_check import daemon
+from ceph_check import hostfacts
+from ceph_check import monitors
+from ceph_check.report import ReportSnapshot
+
+# Not imported by `ceph_check.cli` until a run needs them.
+DEFERRED = ('numpy', 'asyncio', 'http.server', 'multiprocessing', 'sqlite3',
+            'ceph_check.batch', 'ceph_check.daemon', 'ceph_check.hostfacts',
+            'ceph_check.trends')
 
 
 @pytest.fixture
@@ -30,9 +44,82 @@ def test_content(response):
 def test_command_line_interface():
     """Test the CLI."""
     runner = CliRunner()
-    result = runner.invoke(cli.main)
-    assert result.exit_code == 0
-    assert 'ceph_check.cli.main' in result.output
     help_result = runner.invoke(cli.main, ['--help'])
     assert help_result.exit_code == 0
-    assert '--help  Show this message and exit.' in help_result.output
+    assert '--help' in help_result.output
+    assert '--save-report' in help_result.output
+    # The defaults of modules imported later are spelled out.
+    help_text = " ".join(help_result.output.split())
+    assert "{0}:{1} by default".format(*daemon.DEFAULT_ADDRESS) in help_text
+    assert "{0} seconds by default".format(
+        daemon.DEFAULT_MAX_INTERVAL) in help_text
+    assert "{0} by default".format(hostfacts.DEFAULT_CONCURRENCY) in help_text
+    assert "{0} by default".format(hostfacts.DEFAULT_TIMEOUT) in help_text
+    bad_check = runner.invoke(cli.main, ['--checks', 'mon,nope'])
+    assert bad_check.exit_code == 2
+    assert 'nope' in bad_check.output
+
+
+def test_run_checks_output_order(report, capsys):
+    checker = ceph_check.CephCheck("/nonexistent", "/nonexistent",
+                                   checks=["osd", "health", "mon"])
+    assert checker.report_sections == ('health', 'monmap', 'osdmap', 'pgmap')
+    results = checker.run_checks(ReportSnapshot(report))
+    assert [result.name for result in results] == ["health", "mon", "osd"]
+    out = capsys.readouterr().out
+    assert out.index("CLUSTER STATUS") < out.index("MONITOR") < out.index(
+        "OSD STATUS")
+
+
+def test_report_streamed_without_temp_file(fake_ceph, monkeypatch):
+    monkeypatch.setattr(tempfile, "mkdtemp", None)
+    checker = ceph_check.CephCheck("/nonexistent", "/nonexistent",
+                                   ceph_bin=fake_ceph(delay=0.05))
+    snapshot = checker.ceph_report()
+    assert snapshot.monmap['epoch'] == 2
+    assert not snapshot.has_section('version')
+    assert snapshot.pg_table.has_state('degraded').sum() == 1
+
+
+def test_save_report(fake_ceph, report_file, tmp_path):
+    saved = str(tmp_path / "saved.json")
+    checker = ceph_check.CephCheck("/nonexistent", "/nonexistent",
+                                   save_report=saved,
+                                   ceph_bin=fake_ceph(delay=0.05))
+    assert checker.ceph_report().osdmap['epoch'] == 40
+    with open(saved) as copy, open(report_file) as original:
+        assert copy.read() == original.read()
+
+
+def test_report_failure_retries(fake_ceph, monkeypatch, capsys):
+    sleeps = []
+    monkeypatch.setattr(ceph_check.time, "sleep", sleeps.append)
+    checker = ceph_check.CephCheck(
+        "/nonexistent", "/nonexistent", ceph_bin=fake_ceph(fail=1),
+        backoff=monitors.Backoff(base=2, cap=5, attempts=4,
+                                 rng=random.Random(1)))
+    assert checker.ceph_report() is None
+    assert len(sleeps) == 3
+    assert 1 <= sleeps[0] <= 2 and 2 <= sleeps[1] <= 4
+    assert 2.5 <= sleeps[2] <= 5
+    assert "Failing" in capsys.readouterr().out
+
+
+def test_startup_imports():
+    """The heavy modules are only imported once a run needs them."""
+    code = ("import sys, ceph_check.cli; print(' '.join(name for name in "
+            "{0!r} if name in sys.modules))".format(DEFERRED))
+    out = subprocess.check_output([sys.executable, "-c", code])
+    assert out.strip() == b""
+
+
+def test_check_ansible(monkeypatch, capsys):
+    checker = ceph_check.CephCheck("/nonexistent", "/nonexistent")
+    found = []
+    monkeypatch.setattr(ceph_check, "find_spec",
+                        lambda name: found.append(name) or None)
+    assert checker.check_ansible() is False
+    assert found == ["ansible"]
+    assert "Ansible not installed" in capsys.readouterr().out
+    monkeypatch.setattr(ceph_check, "find_spec", lambda name: object())
+    assert checker.check_ansible() is True
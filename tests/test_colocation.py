@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.colocation` and the `colocation` check."""
+
+import time
+
+from ceph_check import checks
+from ceph_check import colocation
+from ceph_check import scheduler
+from ceph_check import synthetic
+from ceph_check.report import ReportSnapshot
+
+
+def test_address_ip():
+    assert colocation.address_ip("10.0.0.1:6789/0") == "10.0.0.1"
+    assert colocation.address_ip("[fd00::1]:6789/0") == "fd00::1"
+    assert colocation.address_ip("10.0.0.1") == "10.0.0.1"
+    assert colocation.address_ip(None) is None
+
+
+def test_address_ip_of_vectors():
+    assert colocation.address_ip(
+        "[v2:10.0.0.1:6800/123,v1:10.0.0.1:6801/123]") == "10.0.0.1"
+    assert colocation.address_ip(
+        "[v2:[fd00::1]:6800/123,v1:[fd00::1]:6801/123]") == "fd00::1"
+    assert colocation.address_ip("v2:10.0.0.1:3300/0") == "10.0.0.1"
+    assert colocation.address_ip("[v1:10.0.0.2:6789/0]") == "10.0.0.2"
+
+
+def test_host_map_of_vectors():
+    """Nautilus OSD metadata gives address vectors."""
+    snapshot = ReportSnapshot({
+        'osd_metadata': [{'id': 0, 'hostname': "node-a",
+                          'front_addr': "[v2:10.0.0.1:6800/7,"
+                                        "v1:10.0.0.1:6801/7]"}],
+        'monmap': {'mons': [{'name': "mon-x", 'public_addrs': {'addrvec': [
+            {'type': 'v2', 'addr': "10.0.0.1:3300", 'nonce': 0},
+            {'type': 'v1', 'addr': "10.0.0.1:6789", 'nonce': 0}]}}]},
+    })
+    hosts = colocation.host_map(snapshot)
+    assert list(hosts.hosts) == ["node-a"]
+    assert hosts.roles("node-a") == ('mon', 'osd')
+
+
+def test_host_map(report):
+    hosts = colocation.host_map(ReportSnapshot(report))
+    assert list(hosts.hosts) == ["node-a", "node-b", "mon-b"]
+    # mon-a shares its address with the OSDs of node-a.
+    assert hosts.hosts["node-a"] == {'osd': ["osd.0", "osd.1"],
+                                     'mon': ["mon.mon-a"]}
+    assert hosts.roles("node-b") == ('mds', 'osd')
+    assert hosts.roles("mon-b") == ('mon', 'rgw')
+    assert list(hosts.role_sets()) == [('mon', 'osd'), ('mds', 'osd'),
+                                       ('mon', 'rgw')]
+
+
+def test_host_map_by_name():
+    """A MON on another network still matches its host by name."""
+    snapshot = ReportSnapshot({
+        'osd_metadata': [{'id': 0, 'hostname': "store1.example.com",
+                          'front_addr': "10.0.0.1:6800/1"}],
+        'monmap': {'mons': [{'name': "store1", 'public_addrs': {'addrvec': [
+            {'type': 'v2', 'addr': "192.168.0.1:3300", 'nonce': 0}]}}]},
+    })
+    hosts = colocation.host_map(snapshot)
+    assert list(hosts.hosts) == ["store1.example.com"]
+    assert hosts.roles("store1.example.com") == ('mon', 'osd')
+
+
+def test_synthetic_cluster():
+    cluster = synthetic.SyntheticCluster(osds=10000, mons=3, mds=2, rgw=3)
+    snapshot = ReportSnapshot(cluster.report(
+        ['monmap', 'osd_metadata', 'fsmap', 'servicemap']))
+    start = time.time()
+    hosts = colocation.host_map(snapshot)
+    assert time.time() - start < 2
+    role_sets = hosts.role_sets()
+    assert len(role_sets[('osd',)]) == cluster.host_count
+    # Two MDS and three RGW, on the three MON hosts.
+    assert role_sets[('mon', 'mds', 'rgw')] == ["mon-0", "mon-1"]
+    assert role_sets[('mon', 'rgw')] == ["mon-2"]
+
+
+def test_colocation_check(report):
+    result = scheduler.run_check(checks.CHECKS['colocation'],
+                                 ReportSnapshot(report))
+    assert result.ok
+    assert "Colocated        : node-a : mon.mon-a, 2 OSD(s)" in result.output
+    assert "WARNING          : node-a runs mon and osd" in result.output
+    assert "Colocated        : mon-b : mon.mon-b, rgw.mon-b" in result.output
+    assert result.output.count("WARNING") == 1
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.crush`."""
+
+import copy
+import random
+
+import numpy as np
+
+from ceph_check import checks
+from ceph_check import crush
+from ceph_check import scheduler
+from ceph_check import synthetic
+from ceph_check.report import ReportSnapshot
+
+MASK = 0xffffffff
+
+
+def _mix(a, b, c):
+    # Positive shifts are to the left.
+    for shift in (-13, 8, -13, -12, 16, -5, -3, 10, -15):
+        a = (a - b - c) & MASK
+        a ^= (c << shift) & MASK if shift > 0 else c >> -shift
+        a, b, c = b, c, a
+    return a, b, c
+
+
+def scalar_hash3(a, b, c):
+    """`crush_hash32_rjenkins1_3()`, one value at a time."""
+    a, b, c = a & MASK, b & MASK, c & MASK
+    h = 1315423911 ^ a ^ b ^ c
+    x, y = 231232, 1232
+    a, b, h = _mix(a, b, h)
+    c, x, h = _mix(c, x, h)
+    y, a, h = _mix(y, a, h)
+    b, x, h = _mix(b, x, h)
+    y, c, h = _mix(y, c, h)
+    return h
+
+
+def scalar_hash2(a, b):
+    a, b = a & MASK, b & MASK
+    h = 1315423911 ^ a ^ b
+    x, y = 231232, 1232
+    a, b, h = _mix(a, b, h)
+    x, a, h = _mix(x, a, h)
+    b, y, h = _mix(b, y, h)
+    return h
+
+
+def test_hashes_match_scalar():
+    rng = random.Random(0)
+    values = [(rng.getrandbits(32), rng.randint(-100, 100), rng.randint(0, 9))
+              for _ in range(200)]
+    a, b, c = (np.array(column, dtype=np.int64) for column in zip(*values))
+    assert crush.hash32_3(a, b, c).tolist() == [
+        scalar_hash3(*value) for value in values]
+    assert crush.hash32_2(a, b).tolist() == [
+        scalar_hash2(x, y) for x, y, _ in values]
+
+
+def test_index(report):
+    crushmap = crush.CrushMap(report['crushmap'])
+    assert crushmap.roots() == [-1]
+    assert crushmap.take('default~hdd') == (-1, 'hdd')
+    assert crushmap.devices_under('default', 'hdd') == [0, 1]
+    assert crushmap.subtree_weight(-2) == 2.0
+    assert crushmap.rule_devices(0) == [0, 1, 2]
+    assert crushmap.domain_weights(0) == [(-2, 2.0), (-3, 1.0)]
+    assert crushmap.domain_weights(1) == [(-2, 2.0)]
+    assert crushmap.rules[1].failure_domain == 'host'
+    assert not crushmap.empty_buckets()
+    assert not crushmap.misweighted()
+    assert not crushmap.zero_weight_devices()
+
+
+def test_flags(report):
+    crushmap = copy.deepcopy(report['crushmap'])
+    buckets = dict((bucket['name'], bucket)
+                   for bucket in crushmap['buckets'])
+    buckets['node-b']['items'][0]['weight'] = 0
+    buckets['node-a']['weight'] = 65536
+    crushmap['buckets'].append({'id': -5, 'name': 'node-c',
+                                'type_name': 'host', 'weight': 0,
+                                'items': []})
+    buckets['default']['items'].append({'id': -5, 'weight': 0})
+    flagged = crush.CrushMap(crushmap)
+    assert flagged.zero_weight_devices() == [2]
+    assert flagged.empty_buckets() == [-3, -5]
+    # node-b's items sum to nothing, node-a is listed at twice its weight.
+    assert flagged.misweighted() == [(-2, 65536, 131072), (-2, 131072, 65536),
+                                     (-3, 65536, 0)]
+
+
+def test_pg_inputs():
+    pool = {'pool': 3, 'pg_num': 12, 'pg_placement_num': 12,
+            'flags_names': ''}
+    assert crush.pg_inputs(pool).tolist() == [
+        3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14]
+    pool['pg_placement_num'] = 6
+    # ceph_stable_mod(ps, 6, 7) folds 6 and 7 onto 2 and 3.
+    assert crush.pg_inputs(pool).tolist()[4:10] == [7, 8, 5, 6, 3, 4]
+    pool['flags_names'] = 'hashpspool'
+    assert crush.pg_inputs(pool).tolist()[0] == scalar_hash2(0, 3)
+
+
+def test_placement_follows_weights():
+    cluster = synthetic.SyntheticCluster(osds=60, hosts=12)
+    crushmap = crush.CrushMap(cluster.crushmap())
+    x = crush.hash32_2(np.arange(20000), 1)
+    up = crushmap.map_pgs(0, x, 3, np.ones(60))
+    assert (up >= 0).all()
+    hosts = np.arange(60) % 12
+    assert (np.sort(hosts[up], axis=1)[:, 1:] !=
+            np.sort(hosts[up], axis=1)[:, :-1]).all()
+    devices, share = crush.fair_share(crushmap, 0, up.size, np.ones(60))
+    ratio = crush.pg_counts(up, 60)[devices] / share
+    assert 0.8 < ratio.min() and ratio.max() < 1.2
+
+    ssd = crushmap.map_pgs(2, x, 3)
+    assert set(ssd.ravel().tolist()) == set(
+        osd for osd in range(60) if cluster.osd_class[osd] == 'ssd')
+
+
+def test_placement_skips_out_osds():
+    crushmap = crush.CrushMap(
+        synthetic.SyntheticCluster(osds=30, hosts=6).crushmap())
+    x = crush.hash32_2(np.arange(6000), 2)
+    reweight = np.ones(30)
+    reweight[0] = 0
+    reweight[1] = 0.5
+    up = crushmap.map_pgs(0, x, 3, reweight)
+    counts = crush.pg_counts(up, 30)
+    assert counts[0] == 0
+    assert 0.3 < counts[1] / counts[2:].mean() < 0.7
+    # The other OSDs of osd.0's host take its share.
+    assert (up >= 0).all()
+
+
+def test_indep():
+    crushmap = copy.deepcopy(
+        synthetic.SyntheticCluster(osds=30, hosts=6).crushmap())
+    crushmap['rules'].append({'rule_id': 5, 'rule_name': 'ec', 'steps': [
+        {'op': 'take', 'item': -1, 'item_name': 'default'},
+        {'op': 'chooseleaf_indep', 'num': 0, 'type': 'host'},
+        {'op': 'emit'}]})
+    crushmap = crush.CrushMap(crushmap)
+    reweight = np.ones(30)
+    up = crushmap.map_pgs(5, np.arange(1000), 8, reweight)
+    # Only 6 hosts for 8 shards, the missing ones keep their position.
+    assert ((up >= 0).sum(axis=1) == 6).all()
+
+
+def test_crush_check(report):
+    result = scheduler.run_check(checks.CHECKS['crush'],
+                                 ReportSnapshot(report))
+    assert result.ok
+    assert "Buckets          : 1 root, 2 host" in result.output
+    assert "2 host domain(s) for size 3" in result.output
+    assert "Most loaded      : osd.2" in result.output
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.daemon`."""
+
+import json
+from urllib.request import urlopen
+
+import pytest
+
+from click.testing import CliRunner
+
+from ceph_check import ceph_check
+from ceph_check import cli
+from ceph_check import daemon
+from ceph_check import monitors
+
+
+@pytest.fixture
+def make_daemon(fake_ceph, tmp_path, monkeypatch):
+    """Build a `Daemon` over the fake `ceph`, logging its calls."""
+    log = tmp_path / "calls"
+
+    def make(**kwargs):
+        checker = ceph_check.CephCheck(
+            "/nonexistent", "/nonexistent", ceph_bin=fake_ceph(log=log),
+            checks=['health', 'mon', 'osd'])
+        monkeypatch.setattr(checker, 'cc_condition', lambda: True)
+        return daemon.Daemon(checker, **kwargs)
+
+    def calls():
+        return len(log.read_text().splitlines()) if log.exists() else 0
+    make.calls = calls
+    return make
+
+
+def test_parse_address():
+    assert daemon.parse_address("9000") == ("127.0.0.1", 9000)
+    assert daemon.parse_address("0.0.0.0:80") == ("0.0.0.0", 80)
+    assert daemon.parse_address("[::1]:80") == ("::1", 80)
+    with pytest.raises(ValueError):
+        daemon.parse_address("host:port")
+    result = CliRunner().invoke(cli.main, ['--daemon', '--listen', 'x:y'])
+    assert result.exit_code == 2
+    assert "--listen" in result.output
+
+
+def test_adaptive_interval(make_daemon):
+    poller = make_daemon(interval=10, max_interval=60)
+    assert [poller.next_interval(True) for _ in range(4)] == [20, 40, 60, 60]
+    assert poller.next_interval(False) == 10
+    assert poller.next_interval(True) == 20
+
+
+def test_scrapes_do_not_query_the_cluster(make_daemon):
+    poller = make_daemon(address=('127.0.0.1', 0))
+    poller.start_server()
+    try:
+        url = "http://{0}:{1}".format(*poller.address)
+        status = json.loads(urlopen(url + "/").read().decode('utf-8'))
+        assert status['last'] is None
+        assert "ceph_check_up 0" in urlopen(url + "/metrics").read().decode(
+            'utf-8')
+
+        poller.poll()
+        calls = make_daemon.calls()
+        assert calls
+        for _ in range(3):
+            status = json.loads(urlopen(url + "/").read().decode('utf-8'))
+            text = urlopen(url + "/metrics").read().decode('utf-8')
+        assert make_daemon.calls() == calls
+    finally:
+        poller.server.shutdown()
+        poller.server.server_close()
+
+    last = status['last']
+    assert last['health'] == 'HEALTH_WARN'
+    assert [check['name'] for check in last['checks']] == [
+        'health', 'mon', 'osd']
+    assert "MONITOR" in last['checks'][1]['output']
+    assert "ceph_check_up 1" in text
+    assert "ceph_check_health_status 1" in text
+    assert 'ceph_check_check_ok{check="osd"} 1' in text
+    assert 'ceph_check_span_wall_seconds{stage="check",name="mon"}' in text
+
+
+def test_run_rounds(make_daemon, monkeypatch):
+    poller = make_daemon(address=None, interval=5, max_interval=60)
+    waits = []
+    monkeypatch.setattr(poller._stop, 'wait', waits.append)
+    assert poller.run(rounds=3) == 0
+    assert poller.rounds == 3
+    # The fake cluster is HEALTH_WARN, no backing off.
+    assert len(waits) == 2 and all(0 < wait <= 5 for wait in waits)
+    assert poller.runner.rerun == []
+
+
+def test_unreachable_cluster(make_daemon, fake_ceph, monkeypatch):
+    poller = make_daemon(address=None)
+    poller.checker.backoff = monitors.Backoff(attempts=1)
+    fake_ceph(fail=1)
+    result = poller.poll()
+    assert result.error
+    assert not result.healthy
+    assert "ceph_check_up 0" in poller.prometheus()
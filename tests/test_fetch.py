@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.fetch`."""
+
+import time
+
+import numpy as np
+import pytest
+
+from ceph_check import backends
+from ceph_check import ceph_check
+from ceph_check import fetch
+from ceph_check import monitors
+
+
+def test_command_argv():
+    assert fetch.command_argv({'prefix': 'mon dump', 'format': 'json'}) == [
+        'mon', 'dump', '-f', 'json']
+    assert fetch.command_argv(fetch.SECTION_COMMANDS['pgmap']) == [
+        'pg', 'dump', 'pgs_brief', '-f', 'json']
+
+
+def test_report_sections():
+    assert fetch.report_sections(['osd_df', 'osdmap', 'pool_stats']) == (
+        'pgmap', 'osdmap')
+
+
+def test_only_needed_commands_run(fake_ceph, tmp_path):
+    log = tmp_path / "calls"
+    checker = ceph_check.CephCheck("/nonexistent", "/nonexistent",
+                                   ceph_bin=fake_ceph(log=log),
+                                   checks=["mon", "pool"])
+    snapshot = checker.fetch_snapshot()
+    assert snapshot.monmap['epoch'] == 2
+    assert [pool['pool_name'] for pool in snapshot.osdmap['pools']] == [
+        'rbd', 'backup']
+    calls = sorted(log.read_text().splitlines())
+    assert calls == ['mon dump -f json', 'osd dump -f json']
+
+
+def test_narrow_sections_feed_the_tables(fake_ceph):
+    checker = ceph_check.CephCheck("/nonexistent", "/nonexistent",
+                                   ceph_bin=fake_ceph())
+    snapshot = checker.fetch_snapshot()
+    assert snapshot.osd_table.kb_used.tolist() == [100, 200, 300]
+    assert snapshot.pg_table.has_state('degraded').sum() == 1
+    assert snapshot.pool_stats[0]['poolid'] == 1
+
+
+def test_pg_dump_supersedes_pgs_brief(fake_ceph, tmp_path):
+    log = tmp_path / "calls"
+    checker = ceph_check.CephCheck("/nonexistent", "/nonexistent",
+                                   ceph_bin=fake_ceph(log=log),
+                                   checks=["pg", "stuck"])
+    snapshot = checker.fetch_snapshot()
+    calls = log.read_text().splitlines()
+    assert 'pg dump pgs -f json' in calls
+    assert 'pg dump pgs_brief -f json' not in calls
+    assert snapshot.has_section('pgmap')
+    assert np.isfinite(snapshot.pg_table.last_clean).all()
+
+
+def test_commands_run_concurrently(fake_ceph):
+    sections = ['monmap', 'osdmap', 'health', 'crushmap']
+    backend = backends.SubprocessBackend(fake_ceph(delay=0.5))
+    start = time.time()
+    found = fetch.fetch_sections(sections, backend.command, concurrency=4)
+    assert sorted(found) == sorted(sections)
+    assert time.time() - start < 1.5
+
+
+def test_command_timeout(fake_ceph):
+    backend = backends.SubprocessBackend(fake_ceph(delay=5))
+    start = time.time()
+    with pytest.raises(backends.CommandTimeout) as err:
+        backend.command({'prefix': 'mon dump'}, timeout=0.5)
+    assert "timed out" in str(err.value)
+    assert time.time() - start < 3
+
+
+def test_command_failure(fake_ceph, capsys):
+    checker = ceph_check.CephCheck("/nonexistent", "/nonexistent",
+                                   ceph_bin=fake_ceph(fail=1),
+                                   backoff=monitors.Backoff(attempts=1))
+    assert checker.fetch_snapshot() is None
+    assert "TimedOut" in capsys.readouterr().out
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.findings` and the findings of the checks."""
+
+import io
+import json
+
+from click.testing import CliRunner
+
+from ceph_check import checks
+from ceph_check import cli
+from ceph_check import findings
+from ceph_check import scheduler
+from ceph_check import synthetic
+from ceph_check.report import ReportSnapshot
+
+
+def run(report, names=None, **kwargs):
+    """The results of the report-only checks, or of `names`, on `report`."""
+    names = names or [check.name for check in checks.CHECKS.values()
+                      if not check.needs]
+    return scheduler.run_checks(checks.select(names), ReportSnapshot(report),
+                                max_workers=1, **kwargs)
+
+
+def test_finding_text():
+    field = findings.Finding('osd', "12", entity='cluster',
+                             label="Total OSDs")
+    assert field.text == "Total OSDs       : 12"
+    assert field.as_dict() == {
+        'check': 'osd', 'severity': 'info', 'entity': 'cluster',
+        'label': "Total OSDs", 'message': "12", 'data': {}}
+    assert findings.Finding('health', "HEALTH_OK").text == "HEALTH_OK"
+
+
+def test_context_findings():
+    ctx = scheduler.CheckContext(None, name='pool')
+    ctx.write("\n\t- POOL STATUS -\n")
+    ctx.field("Pools", 2, count=2)
+    ctx.warn("min_size 1 accepts writes with a single copy", 'pool.rbd',
+             min_size=1)
+    assert ctx.out.getvalue().endswith(
+        "Pools            : 2\n"
+        "WARNING          : min_size 1 accepts writes with a single copy\n")
+    pools, warning = ctx.findings
+    assert (pools.check, pools.entity, pools.data) == (
+        'pool', 'cluster', {'count': 2})
+    assert (warning.severity, warning.entity) == ('warning', 'pool.rbd')
+
+
+def test_check_findings(report):
+    results = dict((result.name, result) for result in run(report))
+    health = results['health'].findings
+    assert health[0].message == "HEALTH_WARN"
+    assert health[0].severity == 'warning'
+    mons = [finding for finding in results['mon'].findings
+            if finding.entity.startswith('mon.')]
+    assert [(mon.entity, mon.data['role']) for mon in mons] == [
+        ('mon.mon-a', 'leader'), ('mon.mon-b', 'peon')]
+    down = [finding for finding in results['osd'].findings
+            if finding.label == "OSDs down"][0]
+    assert down.severity == 'warning'
+    assert down.data['osds'] == [2]
+
+
+def test_findings_are_json(report):
+    cluster = synthetic.SyntheticCluster(osds=60, down=3, unclean=0.1,
+                                         mds=2, rgw=2)
+    for data in (report, cluster.report()):
+        for result in run(data):
+            assert result.ok, result.error
+            for finding in result.findings:
+                json.loads(findings.dumps(finding.as_dict()))
+
+
+def test_text_renderer(report):
+    results = run(report, ['health', 'mon'])
+    out = io.StringIO()
+    findings.TextRenderer(out).finish(results)
+    assert out.getvalue() == results[0].output + results[1].output
+
+
+def test_json_renderer(report):
+    out = io.StringIO()
+    findings.make_renderer('json', out, {'report': 'a.json'}).finish(
+        run(report, ['mon', 'pool']))
+    document = json.loads(out.getvalue())
+    assert document['report'] == 'a.json'
+    assert [check['name'] for check in document['checks']] == ['mon', 'pool']
+    assert document['checks'][1]['findings'][0]['entity'] == 'pool.rbd'
+
+
+def test_ndjson_streams_findings(report):
+    out = io.StringIO()
+    renderer = findings.NDJSONRenderer(out, flush_interval=0)
+    written = []
+
+    def slow(ctx):
+        ctx.field("First", 1)
+        # Written out before the check is done.
+        written.append(out.getvalue())
+        raise ValueError("broken")
+
+    result = scheduler.run_check(checks.Check('slow', slow), None,
+                                 on_finding=renderer.finding)
+    renderer.result(result)
+    kept = run(report, ['mon'])[0]
+    renderer.finish([result, kept])
+    assert json.loads(written[0])['message'] == "1"
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [(line['check'], line['severity']) for line in lines[:2]] == [
+        ('slow', 'info'), ('slow', 'error')]
+    assert "ValueError" in lines[1]['data']['error']
+    # Results kept from an earlier round are written at the end.
+    assert len(lines) == 2 + len(kept.findings)
+
+
+def test_offline_ndjson(tmp_path, report):
+    path = tmp_path / "a.json"
+    path.write_text(json.dumps(report))
+    result = CliRunner().invoke(cli.main, [
+        '--offline', str(path), '--checks', 'osd', '--format', 'ndjson'])
+    lines = [json.loads(line) for line in result.output.splitlines()]
+    assert set(line['report'] for line in lines) == set([str(path)])
+    assert "OSDs down" in [line['label'] for line in lines]
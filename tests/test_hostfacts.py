@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.hostfacts` and the `ssh` check."""
+
+import json
+import time
+from collections import OrderedDict
+
+from ceph_check import ceph_check
+from ceph_check import checks
+from ceph_check import hostfacts
+from ceph_check.report import ReportSnapshot
+from ceph_check.scheduler import run_checks
+
+PACKAGES = {"ceph-common": "12.2.1-40.el7cp", "ceph-osd": "12.2.1-40.el7cp"}
+
+
+def hosts_of(*names):
+    return OrderedDict((name, ['osd']) for name in names)
+
+
+def test_cluster_hosts(report):
+    hosts = hostfacts.cluster_hosts(ReportSnapshot(report))
+    assert hosts == OrderedDict([('mon-a', ['mon']), ('mon-b', ['mon']),
+                                 ('node-a', ['osd']), ('node-b', ['osd'])])
+
+
+def test_parse_output():
+    output = ("@@ceph_check packages\nceph-osd 12.2.1-40\nceph-mon 12.2.1-40"
+              "\n@@ceph_check kernel\n3.10.0-693.el7.x86_64\n")
+    facts = hostfacts.parse_output(output)
+    assert facts['kernel'] == "3.10.0-693.el7.x86_64"
+    assert hostfacts.parse_packages(facts['packages']) == {
+        "ceph-osd": "12.2.1-40", "ceph-mon": "12.2.1-40"}
+
+
+def test_collect(fake_ssh, tmp_path):
+    log = tmp_path / "ssh.log"
+    ssh = fake_ssh({"node-a": {"packages": PACKAGES, "kernel": "3.10.0"}},
+                   log=log)
+    collector = hostfacts.SSHCollector(ssh, control_dir=str(tmp_path / "cm"))
+    result, = collector.collect(hosts_of("node-a"))
+    assert result.ok
+    assert result.packages == PACKAGES
+    assert result.facts['kernel'] == "3.10.0"
+    argv = json.loads(log.read_text())
+    assert "BatchMode=yes" in argv
+    assert "ControlMaster=auto" in argv
+    assert "ControlPath={0}/%C".format(tmp_path / "cm") in argv
+
+
+def test_bounded_concurrency(fake_ssh, tmp_path):
+    names = ["node-{0}".format(i) for i in range(6)]
+    ssh = fake_ssh(dict((name, {"delay": 0.4}) for name in names))
+    collector = hostfacts.SSHCollector(ssh, concurrency=3,
+                                       control_dir=str(tmp_path))
+    start = time.time()
+    results = collector.collect(hosts_of(*names))
+    elapsed = time.time() - start
+    assert [result.host for result in results] == names
+    assert all(result.ok for result in results)
+    # Two waves of three, not six in a row nor all at once.
+    assert 0.8 <= elapsed < 2.0
+
+
+def test_slow_and_failing_hosts(fake_ssh, tmp_path):
+    ssh = fake_ssh({"fast": {"packages": PACKAGES},
+                    "slow": {"delay": 10},
+                    "locked": {"fail": 255}})
+    collector = hostfacts.SSHCollector(ssh, timeout=0.5,
+                                       control_dir=str(tmp_path))
+    start = time.time()
+    fast, slow, locked, missing = collector.collect(
+        hosts_of("fast", "slow", "locked", "missing"))
+    assert time.time() - start < 3
+    assert fast.ok
+    assert "timed out" in slow.error
+    assert "Permission denied" in locked.error
+    assert "Could not resolve" in missing.error
+
+
+def test_version_drift():
+    results = [
+        hostfacts.HostFacts("a", facts={"packages": "ceph-osd 12.2.1\n"
+                                        "ceph-common 12.2.1"}),
+        hostfacts.HostFacts("b", facts={"packages": "ceph-osd 12.2.0\n"
+                                        "ceph-common 12.2.1"}),
+    ]
+    assert hostfacts.version_drift(results) == {
+        "ceph-osd": {"12.2.1": ["a"], "12.2.0": ["b"]}}
+
+
+def test_ssh_check(report, fake_ssh, tmp_path):
+    old = dict(PACKAGES, **{"ceph-osd": "12.2.0-1.el7cp"})
+    ssh = fake_ssh({"mon-a": {"packages": PACKAGES},
+                    "node-a": {"packages": PACKAGES},
+                    "node-b": {"packages": old}})
+    checker = ceph_check.CephCheck(
+        "/nonexistent", "/nonexistent", checks=["ssh"],
+        ssh=hostfacts.SSHCollector(ssh, control_dir=str(tmp_path)))
+    result, = run_checks(checks.select(["ssh"]), ReportSnapshot(report),
+                         checker.providers)
+    assert result.ok, result.error
+    assert "Hosts            : 4 (3 reachable)" in result.output
+    assert "Unreachable      : mon-b" in result.output
+    assert "ceph-osd differs across hosts" in result.output
+    assert "12.2.0-1.el7cp                 : node-b" in result.output
+    assert "ceph-common" not in result.output
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.incremental`."""
+
+import copy
+import json
+
+from ceph_check import ceph_check
+from ceph_check import checks
+from ceph_check import daemon
+from ceph_check.incremental import IncrementalRunner, diff
+from ceph_check.report import ReportSnapshot
+
+
+def snapshot_of(report):
+    return ReportSnapshot(copy.deepcopy(report)).compact()
+
+
+def test_diff_unchanged(report):
+    delta = diff(snapshot_of(report), snapshot_of(report))
+    assert delta.sections == frozenset()
+    assert delta.osds.tolist() == []
+
+
+def test_diff_pg_state(report):
+    before = snapshot_of(report)
+    report['pgmap']['pg_stats'][1]['state'] = 'active+clean'
+    delta = diff(before, snapshot_of(report))
+    assert delta.sections == frozenset(['pgmap'])
+    assert delta.affects(checks.CHECKS['pg'])
+    assert delta.affects(checks.CHECKS['osd'])
+    assert not delta.affects(checks.CHECKS['mon'])
+    assert not delta.affects(checks.CHECKS['pool'])
+
+
+def test_diff_pg_stamps(report):
+    report['pg_dump'] = {'pg_stats': report['pgmap'].pop('pg_stats')}
+    before = snapshot_of(report)
+    report['pg_dump']['pg_stats'][1]['last_active'] = (
+        "2017-09-20 12:00:03.000000")
+    delta = diff(before, snapshot_of(report))
+    assert delta.sections == frozenset(['pg_dump'])
+    assert delta.affects(checks.CHECKS['stuck'])
+    assert not delta.affects(checks.CHECKS['pg'])
+
+
+def test_diff_osd_rows(report):
+    before = snapshot_of(report)
+    report['osdmap']['osds'][2]['up'] = 1
+    report['osdmap']['osds'].append(
+        {"osd": 3, "up": 1, "in": 0, "weight": 0.0})
+    delta = diff(before, snapshot_of(report))
+    assert 'osdmap' in delta.sections
+    assert delta.osds.tolist() == [2, 3]
+
+
+def test_only_affected_checks_rerun(report):
+    calls = []
+    runner = IncrementalRunner(checks.select(['mon', 'pool', 'pg']))
+    runner.update(snapshot_of(report), on_result=calls.append)
+    assert sorted(result.name for result in calls) == ['mon', 'pg', 'pool']
+    first = runner.results['mon']
+
+    del calls[:]
+    report['pgmap']['pg_stats'][1]['state'] = 'active+clean'
+    results = runner.update(snapshot_of(report), on_result=calls.append)
+    assert runner.rerun == ['pg']
+    assert [result.name for result in calls] == ['pg']
+    assert [result.name for result in results] == ['mon', 'pool', 'pg']
+    assert results[0] is first
+    assert 'degraded' not in results[2].output
+
+
+def test_osd_check_updates_changed_rows(report):
+    runner = IncrementalRunner(checks.select(['osd']))
+    first = runner.update(snapshot_of(report))[0]
+    assert "OSDs down        : osd.2" in first.output
+    assert runner.states['osd']['down'] == set([2])
+
+    report['osdmap']['osds'][2]['up'] = 1
+    report['osdmap']['osds'][0]['in'] = 0
+    result = runner.update(snapshot_of(report))[0]
+    assert "OSDs down" not in result.output
+    assert "OSDs out         : osd.0" in result.output
+    assert runner.states['osd'] == {'down': set(), 'out': set([0])}
+
+
+def test_failed_check_is_retried(report):
+    fail = [True]
+
+    def flaky(ctx):
+        if fail[0]:
+            raise RuntimeError("boom")
+        ctx.write("fine")
+    flaky_check = checks.Check('flaky', flaky, sections=('monmap',))
+    runner = IncrementalRunner([flaky_check])
+    assert not runner.update(snapshot_of(report))[0].ok
+    fail[0] = False
+    assert runner.update(snapshot_of(report))[0].output == "fine\n"
+
+
+def test_checks_with_needs_always_rerun(report):
+    versions = iter(["14.2.0", "14.2.22"])
+
+    def packages(ctx):
+        ctx.write(ctx.data['host_facts'])
+    ssh = checks.Check('ssh', packages, sections=('monmap', 'osd_metadata'),
+                       needs=('host_facts',))
+    runner = IncrementalRunner(
+        checks.select(['mon']) + [ssh],
+        providers={'host_facts': lambda snapshot: next(versions)})
+    runner.update(snapshot_of(report))
+    results = runner.update(snapshot_of(report))
+    assert runner.rerun == ['ssh']
+    assert results[1].output == "14.2.22\n"
+
+
+def test_watch_rounds(fake_ceph, report, report_file, monkeypatch, capsys):
+    checker = ceph_check.CephCheck("/nonexistent", "/nonexistent",
+                                   ceph_bin=fake_ceph(),
+                                   checks=['mon', 'pg'], interval=1)
+    sleeps = []
+
+    def change_report(poller, seconds):
+        sleeps.append(seconds)
+        report['pgmap']['pg_stats'][1]['state'] = 'active+clean'
+        with open(report_file, 'w') as obj:
+            json.dump(report, obj)
+    monkeypatch.setattr(daemon.Daemon, 'wait', change_report)
+    assert checker.watch(rounds=2) == 0
+    out = capsys.readouterr().out
+    assert "re-ran : mon, pg" in out
+    assert "re-ran : pg" in out
+    assert 0 < max(sleeps) <= 1
+
+
+def test_watch_json_rounds(fake_ceph, monkeypatch, capsys):
+    checker = ceph_check.CephCheck("/nonexistent", "/nonexistent",
+                                   ceph_bin=fake_ceph(), checks=['mon'],
+                                   interval=1, output_format='json')
+    monkeypatch.setattr(daemon.Daemon, 'wait', lambda poller, seconds: None)
+    assert checker.watch(rounds=2) == 0
+    rounds = [json.loads(line)['round']
+              for line in capsys.readouterr().out.splitlines()
+              if line.startswith('{')]
+    assert rounds[0] == 1 and rounds[-1] == 2
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.journals` and the `journal` check."""
+
+from click.testing import CliRunner
+
+from ceph_check import checks
+from ceph_check import cli
+from ceph_check import journals
+from ceph_check import scheduler
+from ceph_check import synthetic
+from ceph_check.report import ReportSnapshot
+
+
+def bluestore(osd, host, db=None, wal=None, data="/dev/sdb", **extra):
+    entry = {'id': osd, 'hostname': host, 'osd_objectstore': 'bluestore',
+             'bluestore_bdev_dev_node': data,
+             'bluefs_dedicated_db': '1' if db else '0',
+             'bluefs_dedicated_wal': '1' if wal else '0'}
+    if db:
+        entry['bluefs_db_dev_node'] = db
+    if wal:
+        entry['bluefs_wal_dev_node'] = wal
+    entry.update(extra)
+    return entry
+
+
+def test_whole_device():
+    assert journals.whole_device("/dev/sdc2") == "/dev/sdc"
+    assert journals.whole_device("/dev/nvme1n1p3") == "/dev/nvme1n1"
+    assert journals.whole_device("/dev/nvme1n1") == "/dev/nvme1n1"
+    assert journals.whole_device("/dev/dm-4") == "/dev/dm-4"
+
+
+def test_shared_devices():
+    metadata = [
+        # DB and WAL on the same NVMe count once.
+        bluestore(0, "a", db="/dev/nvme0n1", wal="/dev/nvme0n1"),
+        bluestore(1, "a", db="/dev/nvme0n1", data="/dev/sdc"),
+        # The same device name on another host is another device.
+        bluestore(2, "b", db="/dev/nvme0n1", bluefs_db_type='nvme'),
+        # No dedicated DB.
+        bluestore(3, "b", data="/dev/sdc"),
+        {'id': 4, 'hostname': "b", 'osd_objectstore': 'filestore',
+         'backend_filestore_dev_node': "/dev/sdd",
+         'backend_filestore_journal_dev_node': "/dev/sde",
+         'backend_filestore_journal_partition_path': "/dev/sde1",
+         'journal_rotational': '0'},
+        # A journal partition on the data disk is not dedicated.
+        {'id': 5, 'hostname': "b", 'osd_objectstore': 'filestore',
+         'backend_filestore_dev_node': "/dev/sdf",
+         'backend_filestore_journal_partition_path': "/dev/sdf2"},
+        {'id': 6},
+    ]
+    devices = journals.shared_devices(metadata)
+    assert list(devices) == [("a", "/dev/nvme0n1"), ("b", "/dev/nvme0n1"),
+                             ("b", "/dev/sde")]
+    assert devices[("a", "/dev/nvme0n1")].osds == [0, 1]
+    assert devices[("a", "/dev/nvme0n1")].roles == {'db', 'wal'}
+    assert devices[("a", "/dev/nvme0n1")].device_class == 'nvme'
+    assert devices[("b", "/dev/sde")].device_class == 'ssd'
+    assert devices[("b", "/dev/sde")].roles == {'journal'}
+
+
+def test_over_limit():
+    metadata = [bluestore(osd, "a", db="/dev/sdz", bluefs_db_rotational='0')
+                for osd in range(8)]
+    metadata += [bluestore(osd, "b", db="/dev/sdy", bluefs_db_rotational='1')
+                 for osd in range(8, 10)]
+    devices = journals.shared_devices(metadata)
+    assert [device.name for device in journals.over_limit(devices)] == [
+        "b:/dev/sdy", "a:/dev/sdz"]
+    assert [device.name for device in journals.over_limit(
+        devices, {'ssd': 8, 'hdd': 2})] == []
+    assert devices[("a", "/dev/sdz")].limit({'hdd': 2}) == 6
+
+
+def test_journal_check():
+    cluster = synthetic.SyntheticCluster(osds=120, hosts=4)
+    snapshot = ReportSnapshot({'osd_metadata': cluster.osd_metadata()})
+    check = checks.CHECKS['journal']
+    result = scheduler.run_check(check, snapshot)
+    assert result.ok
+    assert "Largest fan-out  : 6 OSDs" in result.output
+    assert "WARNING" not in result.output
+    result = scheduler.run_check(check, snapshot,
+                                 options={'journal_limits': {'nvme': 4}})
+    assert "backs 6 OSDs, 1.5x the limit of 4" in result.output
+    assert "Down together  : osd.0, osd.4, osd.8" in result.output
+
+
+def test_journal_check_without_dedicated_devices(report):
+    result = scheduler.run_check(checks.CHECKS['journal'],
+                                 ReportSnapshot(report))
+    assert "Shared devices   : none" in result.output
+
+
+def test_journal_limit_option():
+    assert cli.parse_limits(None, None, ("SSD=4", "nvme=10")) == {
+        'ssd': 4, 'nvme': 10}
+    result = CliRunner().invoke(cli.main, ['--journal-limit', 'ssd'])
+    assert result.exit_code == 2
+    assert "CLASS=N" in result.output
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.jsonstream`."""
+
+import io
+import json
+
+import pytest
+
+from ceph_check.jsonstream import SectionScanner, StreamError, scan_file
+
+
+def feed_in_chunks(text, size, wanted=None):
+    scanner = SectionScanner(wanted)
+    for start in range(0, len(text), size):
+        scanner.feed(text[start:start + size])
+    return scanner.close()
+
+
+TRICKY = {
+    "plain": 1,
+    "quoted": 'a "}]{[\\" b',
+    "skipped": {"list": [{"s": "}}}", "n": [1, 2, [3]]}] * 20},
+    "nested": {"a": [True, False, None, -1.5e3, "x\\\\"], "b": {}},
+    "empty": [],
+    "last": "end",
+}
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 100000])
+@pytest.mark.parametrize("indent", [None, 4])
+def test_all_sections_any_chunking(size, indent):
+    text = json.dumps(TRICKY, indent=indent)
+    assert feed_in_chunks(text, size) == TRICKY
+
+
+@pytest.mark.parametrize("size", [1, 5, 64])
+def test_selected_sections(size):
+    text = json.dumps(TRICKY)
+    sections = feed_in_chunks(text, size, ["quoted", "nested", "last"])
+    assert sections == {k: TRICKY[k] for k in ("quoted", "nested", "last")}
+
+
+def test_on_section_events():
+    seen = []
+    scanner = SectionScanner(["nested", "plain"],
+                             on_section=lambda k, v: seen.append(k))
+    scanner.feed(json.dumps(TRICKY))
+    scanner.close()
+    assert seen == ["plain", "nested"]
+
+
+@pytest.mark.parametrize("size", [1, 3, 64])
+def test_on_text_has_every_member(size):
+    pieces = {}
+    scanner = SectionScanner(
+        ["plain"], on_text=lambda k, text: pieces.setdefault(k, []).append(
+            text))
+    text = json.dumps(TRICKY, indent=2)
+    for start in range(0, len(text), size):
+        scanner.feed(text[start:start + size])
+    scanner.close()
+    assert dict((key, json.loads("".join(value)))
+                for key, value in pieces.items()) == TRICKY
+
+
+def test_scan_file_stops_early():
+    fileobj = io.StringIO(json.dumps(TRICKY) + "garbage")
+    assert scan_file(fileobj, ["plain"], chunk_size=8) == {"plain": 1}
+
+
+@pytest.mark.parametrize("text", ['[1, 2]', '{"a": 1', '{"a": 1} x',
+                                  '{"a" 1}', '{"a": [1, 2}'])
+def test_malformed(text):
+    with pytest.raises(StreamError):
+        feed_in_chunks(text, 4)
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.logs`."""
+
+import json
+import logging
+import subprocess
+import sys
+
+import pytest
+
+from ceph_check import batch
+from ceph_check import logs
+from ceph_check import scheduler
+from ceph_check import synthetic
+from ceph_check.report import ReportSnapshot
+
+
+@pytest.fixture
+def pipeline():
+    """Tear down what `configure()` set up in a test."""
+    yield
+    logs.shutdown()
+    logging.getLogger("ceph_check").propagate = True
+
+
+class Collector(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_import_sets_nothing_up():
+    code = ("import logging, ceph_check.ceph_check, ceph_check.cli; "
+            "print(len(logging.getLogger('ceph_check').handlers))")
+    out = subprocess.check_output([sys.executable, "-c", code])
+    assert out.strip() == b"0"
+
+
+def test_open_sink(tmp_path):
+    with pytest.raises(ValueError):
+        logs.open_sink("syslog:{0}".format(tmp_path / "missing"))
+    with pytest.raises(ValueError):
+        logs.open_sink("kafka:broker")
+    with pytest.raises(ValueError):
+        logs.open_sink("json:")
+    sink = logs.open_sink("json:{0}".format(tmp_path / "log.json"))
+    assert isinstance(sink.formatter, logs.JSONFormatter)
+    sink.close()
+
+
+def test_sinks(tmp_path, pipeline):
+    text, lines = tmp_path / "ceph_check.log", tmp_path / "ceph_check.json"
+    logs.configure(["file:{0}".format(text), "json:{0}".format(lines)],
+                   level='info')
+    logger = logging.getLogger("ceph_check")
+    logger.debug("not logged")
+    logger.info("OSDs down : %s", [3, 7])
+    try:
+        1 / 0
+    except ZeroDivisionError as err:
+        logger.exception(err)
+    logs.shutdown()
+    assert text.read_text().splitlines()[0].endswith(
+        "ceph_check: INFO: OSDs down : [3, 7]")
+    entries = [json.loads(line) for line in lines.read_text().splitlines()]
+    assert [entry['level'] for entry in entries] == ['INFO', 'ERROR']
+    assert entries[0]['message'] == "OSDs down : [3, 7]"
+    assert entries[1]['message'] == "division by zero"
+    assert entries[1]['exception'].endswith(
+        "ZeroDivisionError: division by zero")
+    assert "Traceback" in text.read_text()
+
+
+def test_json_exception_field(tmp_path, pipeline):
+    path = tmp_path / "ceph_check.json"
+    logs.configure(["json:{0}".format(path)])
+    try:
+        {}['osdmap']
+    except KeyError:
+        logging.getLogger("ceph_check").error("No %s section", "osdmap",
+                                              exc_info=True)
+    logs.shutdown()
+    entry, = [json.loads(line) for line in path.read_text().splitlines()]
+    assert entry['message'] == "No osdmap section"
+    assert entry['exception'].startswith("Traceback")
+    assert "KeyError: 'osdmap'" in entry['exception']
+
+
+def test_batching(tmp_path, pipeline):
+    path = tmp_path / "ceph_check.json"
+    pipe = logs.configure(["json:{0}".format(path)], batch_size=100,
+                          flush_interval=1)
+    logger = logging.getLogger("ceph_check")
+    for number in range(1000):
+        logger.info("record %d", number)
+    logs.shutdown()
+    lines = path.read_text().splitlines()
+    assert [json.loads(line)['message'] for line in lines] == [
+        "record {0}".format(number) for number in range(1000)]
+    assert pipe.written == 1000
+    assert pipe.batches <= 20
+
+
+def test_full_queue_drops():
+    pipe = logs.LogPipeline([], queue_size=2)
+    logger = logging.getLogger("ceph_check.test_full_queue")
+    logger.propagate = False
+    logger.addHandler(pipe.handler)
+    for number in range(5):
+        logger.warning("record %d", number)
+    assert pipe.dropped == 3
+    assert pipe.queue.qsize() == 2
+
+
+def count_records(cluster):
+    """The `ceph_check` records of the offline checks on `cluster`."""
+    collector = Collector()
+    logger = logging.getLogger("ceph_check")
+    level = logger.level
+    logger.addHandler(collector)
+    logger.setLevel(logging.INFO)
+    try:
+        scheduler.run_checks(batch.offline_checks(),
+                             ReportSnapshot(cluster.report()), max_workers=1)
+    finally:
+        logger.removeHandler(collector)
+        logger.setLevel(level)
+    return len(collector.records)
+
+
+def test_log_volume_independent_of_cluster_size():
+    small = count_records(synthetic.SyntheticCluster(osds=12, mons=3,
+                                                     down=2))
+    large = count_records(synthetic.SyntheticCluster(osds=600, mons=9,
+                                                     down=40))
+    assert large == small
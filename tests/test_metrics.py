@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.metrics`."""
+
+import json
+import time
+
+import pytest
+
+from ceph_check import ceph_check
+from ceph_check import metrics
+
+
+def spans_by(recorder):
+    return dict(((span.stage, span.name), span) for span in recorder.spans)
+
+
+def test_span():
+    recorder = metrics.Recorder()
+    with recorder.span('check', 'busy'):
+        sum(range(200000))
+    with pytest.raises(ZeroDivisionError):
+        with recorder.span('check', 'broken'):
+            1 / 0
+    busy, broken = recorder.spans
+    assert busy.ok and not broken.ok
+    assert 0 < busy.cpu <= busy.wall + 0.01
+    assert busy.peak_kib is None
+    assert recorder.totals()['check']['spans'] == 2
+
+
+def test_trace_memory():
+    recorder = metrics.Recorder(trace_memory=True)
+    with recorder.span('parse', 'big'):
+        blob = [0] * 1000000
+    del blob
+    with recorder.span('parse', 'small'):
+        pass
+    recorder.close()
+    spans = spans_by(recorder)
+    assert spans['parse', 'big'].peak_kib >= 7000
+    assert spans['parse', 'small'].peak_kib < 100
+
+
+def test_split():
+    def chunks():
+        for chunk in "abc":
+            time.sleep(0.05)
+            yield chunk
+
+    recorder = metrics.Recorder()
+    for chunk in recorder.split('report', chunks()):
+        time.sleep(0.02)
+    spans = spans_by(recorder)
+    assert 0.15 <= spans['fetch', 'report'].wall < 0.3
+    assert 0.06 <= spans['parse', 'report'].wall < 0.15
+    assert spans['fetch', 'report'].cpu < 0.05
+
+
+def test_prometheus_text():
+    recorder = metrics.Recorder()
+    for _ in range(2):
+        with recorder.span('fetch', 'osd"map'):
+            pass
+    text = metrics.prometheus_text(recorder.summary())
+    assert '# TYPE ceph_check_span_wall_seconds gauge' in text
+    assert text.count('ceph_check_span_wall_seconds{stage="fetch",'
+                      'name="osd\\"map"}') == 1
+    assert 'ceph_check_span_ok{stage="fetch",name="osd\\"map"} 1' in text
+    assert 'span_peak_bytes' not in text
+    assert 'ceph_check_max_rss_bytes ' in text
+
+
+def test_run_exports(fake_ceph, tmp_path, monkeypatch):
+    json_path = tmp_path / "metrics.json"
+    prom_path = tmp_path / "ceph_check.prom"
+    checker = ceph_check.CephCheck(
+        "/nonexistent", "/nonexistent", ceph_bin=fake_ceph(),
+        checks=['mon', 'pg'], metrics_json=str(json_path),
+        metrics_prom=str(prom_path))
+    monkeypatch.setattr(checker, 'cc_condition', lambda: True)
+    assert checker.run() == 0
+    summary = json.loads(json_path.read_text())
+    names = set((span['stage'], span['name']) for span in summary['spans'])
+    assert names == set(
+        [('check', 'mon'), ('check', 'pg'), ('parse', 'tables')] +
+        [(stage, section) for section in checker.sections
+         for stage in ('fetch', 'parse')])
+    assert summary['totals']['fetch']['spans'] == len(checker.sections)
+    assert summary['max_rss_kib'] > 0
+    assert 'ceph_check_span_cpu_seconds{stage="check",name="pg"}' in (
+        prom_path.read_text())
+
+
+def test_full_report_spans(fake_ceph):
+    checker = ceph_check.CephCheck(
+        "/nonexistent", "/nonexistent", ceph_bin=fake_ceph(delay=0.05),
+        full_report=True, recorder=metrics.Recorder())
+    assert checker.fetch_snapshot() is not None
+    spans = spans_by(checker.recorder)
+    assert sorted(spans) == [('fetch', 'report'), ('parse', 'report'),
+                             ('parse', 'tables')]
+    assert spans['fetch', 'report'].wall >= 0.05
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.monitors` and `HedgedBackend`."""
+
+import json
+import random
+import time
+
+import pytest
+
+from ceph_check import backends
+from ceph_check import ceph_check
+from ceph_check import fetch
+from ceph_check import monitors
+
+MONS = ["10.0.0.1:6789", "10.0.0.2:6789", "10.0.0.3:6789"]
+
+
+def test_conf_addresses(tmp_path):
+    conf = tmp_path / "ceph.conf"
+    conf.write_text(
+        "[global]\n"
+        "fsid = 0f1a53a2-1111-4d0b-9d2e-000000000000\n"
+        "mon host = [v2:10.0.0.1:3300,v1:10.0.0.1:6789] mon-b;10.0.0.3\n"
+        "[mon.d]\n"
+        "mon addr = 10.0.0.4:6789\n")
+    assert monitors.conf_addresses(str(conf)) == [
+        "[v2:10.0.0.1:3300,v1:10.0.0.1:6789]", "mon-b", "10.0.0.3",
+        "10.0.0.4:6789"]
+    assert monitors.conf_addresses(str(tmp_path / "missing")) == []
+
+
+def test_monmap_addresses(report):
+    assert monitors.monmap_addresses(report['monmap']) == [
+        "10.0.0.1:6789", "10.0.0.2:6789"]
+    nautilus = {'mons': [{'name': 'a', 'public_addrs': {'addrvec': [
+        {'type': 'v2', 'addr': '10.0.0.9:3300', 'nonce': 0},
+        {'type': 'v1', 'addr': '10.0.0.9:6789', 'nonce': 0}]}}]}
+    assert monitors.monmap_addresses(nautilus) == ["10.0.0.9:6789"]
+
+
+def test_backoff_delays():
+    backoff = monitors.Backoff(base=1, cap=5, attempts=6,
+                               rng=random.Random(3))
+    delays = list(backoff.delays())
+    assert len(delays) == 5
+    for retry, delay in enumerate(delays):
+        longest = min(5, 2 ** retry)
+        assert longest / 2.0 <= delay <= longest
+
+
+def test_backoff_deadline(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(monitors.time, 'time', lambda: now[0])
+    delays = monitors.Backoff(base=4, cap=4, attempts=10,
+                              deadline=10).delays()
+    first = next(delays)
+    now[0] += 9
+    assert next(delays) <= 1
+    now[0] += 1
+    assert next(delays, None) is None
+    assert 2 <= first <= 4
+
+
+def test_retrying(monkeypatch):
+    monkeypatch.setattr(monitors.time, 'sleep', lambda seconds: None)
+    calls = []
+
+    def flaky(command, timeout):
+        calls.append(command)
+        if len(calls) < 3:
+            raise backends.CommandTimeout("timed out")
+        return b"{}"
+
+    backoff = monitors.Backoff(attempts=3)
+    assert monitors.retrying(flaky, backoff)({'prefix': 'x'}, 1) == b"{}"
+    del calls[:]
+    with pytest.raises(backends.CommandTimeout):
+        monitors.retrying(flaky, monitors.Backoff(attempts=2))(
+            {'prefix': 'x'}, 1)
+
+
+def test_retrying_within_deadline():
+    timeouts = []
+
+    def slow(command, timeout):
+        timeouts.append(timeout)
+        time.sleep(min(timeout, 0.2))
+        raise backends.CommandTimeout("timed out")
+
+    backoff = monitors.Backoff(base=0.01, cap=0.01, attempts=10,
+                               deadline=0.5)
+    start = time.time()
+    with pytest.raises(backends.CommandTimeout):
+        monitors.retrying(slow, backoff)({'prefix': 'x'}, 10)
+    assert time.time() - start < 1
+    assert all(timeout <= 0.5 for timeout in timeouts)
+    assert timeouts[-1] < timeouts[0]
+
+
+def test_hedged_command_skips_dead_monitor(fake_ceph, tmp_path, report):
+    log = tmp_path / "calls"
+    backend = backends.HedgedBackend(
+        fake_ceph(log=log, mons={MONS[0]: {'dead': 1}}), MONS, hedge=2)
+    start = time.time()
+    out = backend.command({'prefix': 'mon dump'}, timeout=10)
+    assert time.time() - start < 5
+    assert json.loads(out) == report['monmap']
+    assert len(log.read_text().splitlines()) == 2
+    # The monitor which answered is asked first from now on.
+    assert backend.monitors()[0] == MONS[1]
+
+
+def test_hedged_command_fails_over(fake_ceph):
+    backend = backends.HedgedBackend(
+        fake_ceph(mons={MONS[0]: {'fail': 1}, MONS[1]: {'dead': 1}}), MONS,
+        hedge=1, hedge_delay=0.2)
+    start = time.time()
+    assert json.loads(backend.command({'prefix': 'osd dump'}, 10))
+    assert time.time() - start < 5
+    assert backend.monitors()[-1] == MONS[0]
+
+
+def test_hedged_command_all_dead(fake_ceph):
+    backend = backends.HedgedBackend(
+        fake_ceph(mons=dict((mon, {'dead': 1}) for mon in MONS)), MONS,
+        hedge_delay=0.1)
+    start = time.time()
+    with pytest.raises(backends.CommandTimeout):
+        backend.command({'prefix': 'mon dump'}, timeout=1)
+    assert time.time() - start < 3
+    failing = backends.HedgedBackend(fake_ceph(mons={}, fail=1), MONS)
+    with pytest.raises(fetch.FetchError) as err:
+        failing.command({'prefix': 'mon dump'}, timeout=5)
+    assert "TimedOut" in str(err.value)
+
+
+def test_hedged_stream(fake_ceph, report):
+    backend = backends.HedgedBackend(
+        fake_ceph(delay=0.02, mons={MONS[0]: {'dead': 1},
+                                    MONS[1]: {'fail': 1}}), MONS)
+    start = time.time()
+    chunks = list(backend.stream({'prefix': 'report'}, timeout=10))
+    assert time.time() - start < 5
+    assert json.loads(b"".join(chunks)) == report
+    assert backend.monitors()[0] == MONS[2]
+
+
+def test_report_through_dead_monitor(fake_ceph, report_file):
+    """Learning the monitors from the monmap avoids the dead one."""
+    ceph = fake_ceph(mons={"10.0.0.1:6789": {'dead': 1}})
+    checker = ceph_check.CephCheck(
+        "/nonexistent", "/nonexistent", checks=['mon'],
+        backend=backends.HedgedBackend(ceph, hedge=1, hedge_delay=0.2))
+    assert checker.fetch_snapshot() is not None
+    assert checker.backend.monitors() == ["10.0.0.1:6789", "10.0.0.2:6789"]
+    start = time.time()
+    assert checker.fetch_snapshot() is not None
+    assert time.time() - start < 5
+    assert checker.backend.monitors()[0] == "10.0.0.2:6789"
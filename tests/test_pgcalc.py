@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.pgcalc`."""
+
+from ceph_check import checks
+from ceph_check import pgcalc
+from ceph_check import scheduler
+from ceph_check.report import ReportSnapshot
+
+
+def test_round_pow2():
+    assert pgcalc.round_pow2([0, 1, 100, 128, 160, 161, 1000]).tolist() == [
+        1, 1, 128, 128, 128, 256, 1024]
+
+
+def test_target_pg_num():
+    # 100 OSDs, 3 replicas, the only pool: 100 * 100 / 3 = 3333 -> 4096
+    assert pgcalc.target_pg_num([3], [100], [1.0]).tolist() == [4096]
+    # A tiny share still gets OSDs / size PGs: 100 / 3 -> 32
+    assert pgcalc.target_pg_num([3], [100], [0.0001]).tolist() == [32]
+
+
+def test_rule_osds(report):
+    by_rule = pgcalc.rule_osds(report['crushmap'])
+    assert by_rule == {0: {0, 1, 2}, 1: {0, 1}}
+    assert pgcalc.rule_osds(report['crushmap'], {0, 2}) == {0: {0, 2}, 1: {0}}
+
+
+def test_pool_sizing(report):
+    sizing = pgcalc.pool_sizing(ReportSnapshot(report))
+    assert sizing['name'] == ['rbd', 'backup']
+    assert sizing['osds'].tolist() == [3, 2]
+    # Different OSD sets, so each pool owns its rule's whole budget.
+    assert sizing['share'].tolist() == [1.0, 1.0]
+    assert sizing['target'].tolist() == [128, 128]
+    assert sizing['pg_num'].tolist() == [64, 8]
+    assert not sizing['degraded'].any()
+
+
+def test_pools_short_of_osds(report):
+    # Only osd.0 and osd.2 are in: backup's rule keeps a single OSD.
+    for osd in report['osdmap']['osds']:
+        osd['in'] = int(osd['osd'] != 1)
+    sizing = pgcalc.pool_sizing(ReportSnapshot(report))
+    assert sizing['osds'].tolist() == [2, 1]
+    assert sizing['degraded'].tolist() == [True, True]
+    assert sizing['inactive'].tolist() == [False, False]
+    report['osdmap']['pools'][1]['min_size'] = 2
+    sizing = pgcalc.pool_sizing(ReportSnapshot(report))
+    assert sizing['inactive'].tolist() == [False, True]
+    result, = scheduler.run_checks(checks.select(['pg']),
+                                   ReportSnapshot(report), max_workers=1)
+    assert result.ok, result.error
+    warnings = dict((finding.entity, finding.message)
+                    for finding in result.findings
+                    if finding.severity == 'warning')
+    assert "PGs stay degraded" in warnings['pool.rbd']
+    assert "cannot go active" in warnings['pool.backup']
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.pgstates` and the `stuck` check."""
+
+from collections import Counter
+
+import numpy as np
+
+from ceph_check import checks
+from ceph_check import pgstates
+from ceph_check import scheduler
+from ceph_check import synthetic
+from ceph_check.report import ReportSnapshot
+from ceph_check.tables import PGTable, parse_stamps
+
+HOSTS = {0: "node-a", 1: "node-a", 2: "node-b"}
+
+
+def run_stuck(report):
+    return scheduler.run_checks(checks.select(['stuck']),
+                                ReportSnapshot(report), max_workers=1)[0]
+
+
+def test_problem_flags():
+    flags = pgstates.problem_flags([
+        "active+clean", "peering", "stale+active+clean",
+        "active+undersized+degraded"])
+    names = [[problem for bit, problem in enumerate(pgstates.PROBLEMS)
+              if flag & (1 << bit)] for flag in flags.tolist()]
+    assert names == [[], ["inactive", "unclean"], ["stale"],
+                     ["degraded", "undersized", "unclean"]]
+
+
+def test_format_age():
+    assert pgstates.format_age(45) == "45s"
+    assert pgstates.format_age(725) == "12m 5s"
+    assert pgstates.format_age(7200) == "2h 0m"
+    assert pgstates.format_age(187200) == "2d 4h"
+
+
+def test_pg_states(report):
+    now = parse_stamps([report['pgmap']['stamp']])[0]
+    states = pgstates.PGStates(PGTable.from_pgmap(report['pgmap']), HOSTS,
+                               now)
+    assert (states.total, states.problems) == (2, 1)
+    assert states.count('degraded') == states.count('stuck') == 1
+    assert states.count('inactive') == 0
+    stuck = states.stuck['unclean']
+    assert stuck.oldest() == (1, 7200.0)
+    assert stuck.histogram().tolist() == [0, 0, 1, 0]
+    assert states.osds.names == ["osd.0", "osd.1"]
+    assert [states.osds.names[row] for row in states.osds.ranked()] == [
+        "osd.1"]
+    assert states.hosts.names == ["node-a"]
+    assert states.hosts.row(0)['degraded'] == 1
+    assert states.pools.totals.tolist() == [2]
+
+
+def test_creating_pgs_keep_stuck_times():
+    # A creating PG never was active or clean, Ceph gives 0.000000.
+    pgmap = {"pg_stats": [
+        {"pgid": "1.0", "state": "creating", "acting_primary": 0,
+         "last_active": "0.000000", "last_clean": "0.000000"},
+        {"pgid": "1.1", "state": "peering", "acting_primary": 1,
+         "last_active": "2020-06-01 10:00:00.000000",
+         "last_clean": "2020-06-01 10:00:00.000000"},
+        {"pgid": "1.2", "state": "active+undersized+degraded",
+         "acting_primary": 1,
+         "last_active": "2020-06-01 11:59:59.000000",
+         "last_clean": "2020-06-01 11:00:00.000000"},
+    ]}
+    now = parse_stamps(["2020-06-01 12:00:00"])[0]
+    states = pgstates.PGStates(PGTable.from_pgmap(pgmap), HOSTS, now)
+    assert states.count('inactive') == 2
+    assert states.count('stuck') == 2
+    assert states.stuck['inactive'].oldest() == (1, 7200.0)
+    assert states.stuck['degraded'].oldest() == (2, 3600.0)
+
+
+def test_default_now_is_newest_stamp(report):
+    states = pgstates.PGStates(PGTable.from_pgmap(report['pgmap']))
+    assert states.stuck['unclean'].oldest() == (1, 7198.0)
+    # Without a host map, every primary counts as on an unknown host.
+    assert states.hosts.names == ["unknown"]
+
+
+def test_without_stamps(report):
+    stats = [dict((key, stat[key]) for key in ('pgid', 'state'))
+             for stat in report['pgmap']['pg_stats']]
+    states = pgstates.PGStates(PGTable.from_pgmap({'pg_stats': stats}))
+    assert not states.timed
+    assert states.count('degraded') == 1
+    assert states.count('stuck') == 0
+    # No acting primary in the brief stats.
+    assert states.osds.names == ["none"]
+
+
+def test_matches_pg_by_pg_counts():
+    cluster = synthetic.SyntheticCluster(osds=40, hosts=5, pgs=3000,
+                                         unclean=0.2, down=2)
+    pgmap = cluster.pgmap()
+    hosts = dict((meta['id'], meta['hostname'])
+                 for meta in cluster.osd_metadata())
+    now = parse_stamps([pgmap['stamp']])[0]
+    states = pgstates.PGStates(PGTable.from_pgmap(pgmap), hosts, now)
+    expected = Counter()
+    for stat in pgmap['pg_stats']:
+        parts = stat['state'].split('+')
+        active, clean = parse_stamps([stat['last_active'],
+                                      stat['last_clean']])
+        if (('active' not in parts and
+             now - active > pgstates.STUCK_THRESHOLD) or
+                (('clean' not in parts or 'stale' in parts) and
+                 now - clean > pgstates.STUCK_THRESHOLD)):
+            expected[hosts.get(stat['acting_primary'], "unknown")] += 1
+    found = dict((name, states.hosts.row(index)['stuck'])
+                 for index, name in enumerate(states.hosts.names))
+    assert dict((host, found[host]) for host in expected) == dict(expected)
+    assert sum(found.values()) == sum(expected.values())
+    assert states.count('inactive') == sum(
+        'active' not in stat['state'].split('+')
+        for stat in pgmap['pg_stats'])
+
+
+def test_ranked_order():
+    groups = pgstates.Groups(
+        ["a", "b", "c", "d"],
+        np.array([[0, 0, 3, 0, 3, 3], [1, 0, 0, 0, 1, 1],
+                  [0, 0, 0, 0, 0, 0], [0, 0, 3, 0, 3, 0]]),
+        np.array([10, 10, 10, 10]))
+    assert [groups.names[row] for row in groups.ranked()] == ["b", "a", "d"]
+    assert groups.ranked(limit=1) == [1]
+
+
+def test_stuck_check(report):
+    result = run_stuck(report)
+    assert result.ok, result.error
+    assert "PGs with issues  : 1 of 2" in result.output
+    assert "longest 2h 0m (1.1)" in result.output
+    by_label = dict((finding.label, finding) for finding in result.findings)
+    assert by_label["degraded"].severity == 'warning'
+    assert by_label["Stuck > 60s"].data['count'] == 1
+    hosts = [finding for finding in result.findings
+             if finding.entity == "node-a"]
+    assert hosts[0].data['degraded'] == 1
+
+
+def test_stuck_check_inactive_is_an_error(report):
+    report['pgmap']['pg_stats'][1]['state'] = 'peering'
+    result = run_stuck(report)
+    by_label = dict((finding.label, finding) for finding in result.findings)
+    assert by_label["inactive"].severity == 'error'
+    assert "  inactive       : 0 stuck, longest 2s (1.1)" in result.output
+
+
+def test_stuck_check_without_stats_stamp(report):
+    # `pg dump pgs` has no stamp: a live snapshot is timed when fetched.
+    report['pg_dump'] = {'pg_stats': report['pgmap'].pop('pg_stats')}
+    del report['pgmap']
+    for stat in report['pg_dump']['pg_stats']:
+        stat['state'] = 'peering'
+        stat['last_active'] = "2017-09-20 10:00:00.000000"
+    snapshot = ReportSnapshot(report)
+    snapshot.fetched = parse_stamps(["2017-09-20 12:00:00"])[0]
+    result = scheduler.run_checks(checks.select(['stuck']), snapshot,
+                                  max_workers=1)[0]
+    assert "inactive       : 2 stuck, longest 2h 0m" in result.output
+    report['pg_dump']['stamp'] = "2017-09-20 11:00:00.000000"
+    assert ReportSnapshot(report).stats_stamp() == snapshot.fetched - 3600
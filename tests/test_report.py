@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.report`."""
+
+import pytest
+
+from ceph_check import ceph_check
+from ceph_check import jsonstream
+from ceph_check.report import ReportError, ReportSnapshot
+
+
+def test_accessors(report_file):
+    snapshot = ReportSnapshot.from_file(report_file)
+    assert snapshot.monmap['epoch'] == 2
+    assert snapshot.osdmap['epoch'] == 40
+    assert snapshot.pgmap['version'] == 1200
+    assert snapshot.health['overall_status'] == "HEALTH_WARN"
+    assert len(snapshot.crushmap['rules']) == 2
+
+
+def test_missing_section(report_file):
+    snapshot = ReportSnapshot({"monmap": []})
+    with pytest.raises(ReportError):
+        snapshot.osdmap
+    with pytest.raises(ReportError):
+        snapshot.monmap
+
+
+def test_selected_sections(report_file):
+    snapshot = ReportSnapshot.from_file(report_file, ['monmap', 'health'])
+    assert snapshot.has_section('monmap')
+    assert not snapshot.has_section('pgmap')
+
+
+def test_report_decoded_once(report_file, monkeypatch, capsys):
+    decoded = []
+    real_finish = jsonstream.SectionScanner._finish
+
+    def counting_finish(scanner, raw):
+        decoded.append(scanner._key)
+        return real_finish(scanner, raw)
+
+    monkeypatch.setattr(jsonstream.SectionScanner, "_finish", counting_finish)
+    checker = ceph_check.CephCheck("/nonexistent", "/nonexistent")
+    snapshot = ReportSnapshot.from_file(
+        report_file, checker.report_sections)
+    checker.run_checks(snapshot)
+    assert sorted(decoded) == sorted(checker.report_sections)
+    out = capsys.readouterr().out
+    assert "HEALTH_WARN" in out
+    assert "mon-b" in out
+    assert "osd.2" in out
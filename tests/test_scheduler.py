@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.scheduler`."""
+
+import threading
+import time
+
+from ceph_check.checks import Check
+from ceph_check.scheduler import run_checks
+
+
+def make_check(name, needs=(), body=None):
+    def func(ctx):
+        if body is not None:
+            body(ctx)
+        ctx.write(name)
+    return Check(name, func, needs=needs)
+
+
+def test_results_in_check_order():
+    checks = [make_check("b", body=lambda ctx: time.sleep(0.05)),
+              make_check("a")]
+    results = run_checks(checks, snapshot=None)
+    assert [result.name for result in results] == ["b", "a"]
+    assert [result.output for result in results] == ["b\n", "a\n"]
+
+
+def test_slow_provider_does_not_block_fast_checks():
+    release = threading.Event()
+    finished = []
+
+    def slow_provider(snapshot):
+        release.wait(5)
+        return {"node-a": "12.2.1"}
+
+    def on_result(result):
+        finished.append(result.name)
+        if result.name == "fast":
+            release.set()
+
+    checks = [make_check("slow", needs=("ssh",), body=lambda ctx: ctx.write(
+                  ctx.data["ssh"]["node-a"])),
+              make_check("fast")]
+    results = run_checks(checks, None, providers={"ssh": slow_provider},
+                         max_workers=2, on_result=on_result)
+    assert finished == ["fast", "slow"]
+    assert results[0].output == "12.2.1\nslow\n"
+
+
+def test_provider_shared_and_run_once():
+    calls = []
+
+    def provider(snapshot):
+        calls.append(snapshot)
+        return 1
+
+    checks = [make_check(name, needs=("facts",)) for name in "abc"]
+    results = run_checks(checks, "snap", providers={"facts": provider})
+    assert calls == ["snap"]
+    assert all(result.ok for result in results)
+
+
+def test_failures_are_collected():
+    def boom(ctx):
+        raise ValueError("boom")
+
+    def broken(snapshot):
+        raise IOError("no route")
+
+    checks = [Check("bad", boom), make_check("needy", needs=("facts",)),
+              make_check("good")]
+    results = run_checks(checks, None, providers={"facts": broken})
+    assert "ValueError: boom" in results[0].error
+    assert "no route" in results[1].error
+    assert results[2].ok
+
+
+def test_failing_on_result_does_not_hang():
+    def closed_pipe(result):
+        raise IOError("Broken pipe")
+
+    raised = []
+
+    def run():
+        try:
+            run_checks([make_check("a"), make_check("b")], None,
+                       on_result=closed_pipe)
+        except IOError as err:
+            raised.append(err)
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert str(raised[0]) == "Broken pipe"
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.synthetic`."""
+
+import io
+import json
+
+from ceph_check import batch
+from ceph_check import synthetic
+from ceph_check.report import ReportSnapshot
+from ceph_check.scheduler import run_checks
+
+
+def test_deterministic():
+    first = synthetic.SyntheticCluster(osds=20, unclean=0.1, seed=4)
+    second = synthetic.SyntheticCluster(osds=20, unclean=0.1, seed=4)
+    other = synthetic.SyntheticCluster(osds=20, unclean=0.1, seed=5)
+    assert first.report() == second.report()
+    assert first.report() != other.report()
+
+
+def test_write_matches_report():
+    cluster = synthetic.SyntheticCluster(osds=24, pools=2, mds=2, rgw=1)
+    out = io.StringIO()
+    cluster.write(out)
+    assert json.loads(out.getvalue()) == cluster.report()
+
+
+def test_sizes():
+    cluster = synthetic.SyntheticCluster(osds=100, pools=2, pgs=1000)
+    report = cluster.report()
+    assert len(report['osdmap']['osds']) == 100
+    assert len(report['osd_metadata']) == 100
+    assert len(report['pgmap']['pg_stats']) == 1000
+    assert [pool['pg_num'] for pool in report['osdmap']['pools']] == [
+        500, 500]
+    hosts = set(meta['hostname'] for meta in report['osd_metadata'])
+    assert len(hosts) == cluster.host_count == 9
+
+
+def test_crush_depth():
+    flat = synthetic.SyntheticCluster(osds=12, crush_depth=1).crushmap()
+    assert [bucket['type_name'] for bucket in flat['buckets']] == ['root']
+    deep = synthetic.SyntheticCluster(osds=48, crush_depth=4).crushmap()
+    types = set(bucket['type_name'] for bucket in deep['buckets'])
+    assert types == set(['host', 'rack', 'room', 'root'])
+
+
+def test_down_and_unclean():
+    cluster = synthetic.SyntheticCluster(osds=30, down=2, unclean=0.2)
+    report = cluster.report()
+    assert [osd['up'] for osd in report['osdmap']['osds'][:3]] == [0, 0, 1]
+    states = [pg['state'] for pg in report['pgmap']['pg_stats']]
+    assert 'active+undersized+degraded' in states
+    assert 0.1 < states.count('active+clean') / float(len(states)) < 0.9
+
+
+def test_services():
+    cluster = synthetic.SyntheticCluster(mds=2, rgw=2)
+    assert len(cluster.fsmap()['standbys']) == 1
+    daemons = cluster.servicemap()['services']['rgw']['daemons']
+    assert sorted(daemons) == ['mon-0', 'mon-1', 'summary']
+
+
+def test_checks_pass(tmp_path):
+    path = str(tmp_path / "report.json.gz")
+    synthetic.write_report(path, synthetic.SyntheticCluster(osds=40))
+    snapshot = ReportSnapshot.from_file(path).compact()
+    results = run_checks(batch.offline_checks(), snapshot)
+    assert all(result.ok for result in results), [
+        result.error for result in results]
+
+
+def test_cli(tmp_path):
+    path = tmp_path / "report.json"
+    synthetic.main([str(path), '--osds', '6', '--pgs', '64'])
+    report = json.loads(path.read_text())
+    assert len(report['pgmap']['pg_stats']) == 64
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.tables`."""
+
+import tracemalloc
+
+import numpy as np
+
+from ceph_check.report import ReportSnapshot
+from ceph_check.tables import OSDTable, PGTable, StringColumn, parse_stamps
+
+
+def test_string_column_interning():
+    column = StringColumn.from_strings(["a", "b", "a", "a"])
+    assert column.values == ["a", "b"]
+    assert column.codes.tolist() == [0, 1, 0, 0]
+    assert column[1] == "b"
+    assert column.counts() == {"a": 3, "b": 1}
+    assert column.mask(lambda value: value == "a").tolist() == [
+        True, False, True, True]
+
+
+def test_osd_table(report):
+    osds = OSDTable.from_maps(report['osdmap'],
+                              report['pgmap']['osd_stats'])
+    assert osds.id.tolist() == [0, 1, 2]
+    assert osds.up.tolist() == [True, True, False]
+    assert osds.kb_used.tolist() == [100, 200, 300]
+    assert osds.rows([2, 7, -1]).tolist() == [2, -1, -1]
+    np.testing.assert_allclose(osds.utilization(), [0.1, 0.2, 0.3])
+
+
+def test_pg_table(report):
+    pgs = PGTable.from_pgmap(report['pgmap'])
+    assert pgs.pool.tolist() == [1, 1]
+    assert pgs.pgid(1) == "1.1"
+    assert pgs.has_state("degraded").tolist() == [False, True]
+    assert pgs.acting_primary.tolist() == [0, 1]
+
+
+def test_parse_stamps():
+    seconds = parse_stamps(["2017-09-20 12:00:00.500000", None, "",
+                            "2017-09-20 11:00:00.000000"])
+    assert seconds[0] == 1505908800.5
+    assert np.isnan(seconds[1]) and np.isnan(seconds[2])
+    assert seconds[0] - seconds[3] == 3600.5
+    assert parse_stamps(["2020-06-01T10:00:00.000000+0000"])[0] == (
+        parse_stamps(["2020-06-01 10:00:00.000000"])[0])
+    assert np.isnan(parse_stamps(["yesterday"])).all()
+    # Zones are taken off to get UTC, a bad stamp only loses its own row.
+    seconds = parse_stamps(["2020-06-01T12:00:00.000000+0200",
+                            "2020-06-01T05:30:00.000000-04:30", "0.000000",
+                            "yesterday"])
+    assert seconds[0] == seconds[1] == parse_stamps(
+        ["2020-06-01 10:00:00"])[0]
+    assert np.isnan(seconds[2:]).all()
+    assert parse_stamps(["2020-06-01 10:00:00", "yesterday"])[0] == (
+        seconds[0])
+
+
+def test_pg_table_stamps(report):
+    pgs = PGTable.from_pgmap(report['pgmap'])
+    assert (pgs.last_active[1] - pgs.last_clean[1]) == 7198
+    brief = PGTable.from_pgmap({"pg_stats": [
+        dict((key, stat[key]) for key in ('pgid', 'state'))
+        for stat in report['pgmap']['pg_stats']]})
+    assert brief.last_active is None and brief.last_clean is None
+    assert pgs.same_stamps(PGTable.from_pgmap(report['pgmap']))
+    assert not pgs.same_stamps(brief)
+
+
+def test_compact_drops_dicts(report):
+    snapshot = ReportSnapshot(report).compact()
+    assert 'pg_stats' not in snapshot.pgmap
+    assert 'osds' not in snapshot.osdmap
+    assert len(snapshot.pg_table) == 2
+    assert len(snapshot.osd_table) == 3
+
+
+def test_pg_table_memory():
+    def pg(seq):
+        return {"pgid": "3.{0:x}".format(seq), "up_primary": seq % 97,
+                "acting_primary": seq % 97,
+                "state": ("active+clean", "active+remapped")[seq % 2]}
+
+    tracemalloc.start()
+    stats = [pg(seq) for seq in range(20000)]
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    table = PGTable.from_pgmap({"pg_stats": stats})
+    assert table.nbytes * 10 < dict_bytes
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for `ceph_check.trends` and the capacity check."""
+
+import pytest
+
+from ceph_check import ceph_check
+from ceph_check import checks
+from ceph_check import scheduler
+from ceph_check import trends
+from ceph_check.report import ReportSnapshot
+
+# On the hour.
+NOW = 1500001200
+GIB = 1024.0 ** 3
+
+
+@pytest.fixture
+def store(tmp_path):
+    with trends.TrendStore(str(tmp_path / "trends.db")) as store:
+        yield store
+
+
+def grow(store, start, end, step, rate, fsid="fsid", value=100 * GIB):
+    """Cluster usage growing by `rate` bytes a day, one sample a `step`."""
+    for now in range(start, end + 1, step):
+        used = value + rate * (now - start) / trends.DAY
+        store.record(fsid, [('cluster', 'usage', used, 800 * GIB,
+                             900 * GIB)], now)
+
+
+def test_usage(report):
+    samples = dict(((kind, name), (value, nearfull, full))
+                   for kind, name, value, nearfull, full
+                   in trends.usage(ReportSnapshot(report).compact()))
+    assert samples['cluster', 'usage'] == (600 * 1024, 0.85 * 3000 * 1024,
+                                           0.95 * 3000 * 1024)
+    assert samples['osd', 'osd.2'] == (300 * 1024, 0.85 * 1000 * 1024,
+                                       0.95 * 1000 * 1024)
+    # rbd is on the three OSDs, osd.2 fills up first: 950 - 300 KiB
+    # before it is full, a third of what goes to the rule, in 3 copies.
+    value, nearfull, full = samples['pool', 'rbd']
+    assert value == 3000
+    assert nearfull == pytest.approx(3000 + 550 * 1024)
+    assert full == pytest.approx(3000 + 650 * 1024)
+    # backup is on the HDDs, osd.1 fills up first, in 2 copies.
+    assert samples['pool', 'backup'][2] == pytest.approx(1000 + 750 * 1024)
+    assert samples['pg_state', 'active+clean'] == (1, None, None)
+
+
+def test_usage_of_partial_snapshots(report):
+    del report['crushmap']
+    samples = trends.usage(ReportSnapshot(report).compact())
+    assert ('pool', 'rbd', 3000.0, None, None) in samples
+    assert trends.usage(ReportSnapshot({'health': {}})) == []
+
+
+def test_downsampling(store):
+    for offset, used in ((0, 10), (600, 20), (1200, 60)):
+        store.record("fsid", [('osd', 'osd.0', used, None, None)],
+                     NOW + offset)
+    raw = store.history("fsid", 'osd', 'osd.0', end=NOW + 3600)
+    assert raw == [(NOW, 10), (NOW + 600, 20), (NOW + 1200, 60)]
+    hourly = store.history("fsid", 'osd', 'osd.0', end=NOW + 3600,
+                           level=trends.HOURLY)
+    assert hourly == [(NOW - NOW % 3600, pytest.approx(30))]
+
+
+def test_downsampling_without_upsert(store, monkeypatch):
+    monkeypatch.setattr(trends, 'UPSERT', False)
+    test_downsampling(store)
+
+
+def test_retention(store):
+    grow(store, NOW, NOW + 40 * trends.DAY, trends.DAY, GIB)
+    raw = store.history("fsid", 'cluster', 'usage', end=NOW + 40 * trends.DAY)
+    daily = store.history("fsid", 'cluster', 'usage',
+                          end=NOW + 40 * trends.DAY, level=trends.DAILY)
+    # The last prune ran with the last sample.
+    assert raw[0][0] >= NOW + 5 * trends.DAY
+    assert len(daily) == 41
+
+
+def test_projections(store):
+    grow(store, NOW - 6 * trends.DAY, NOW, 300, 10 * GIB)
+    projection, = store.projections("fsid", now=NOW)
+    assert trends.level_for(trends.WINDOW) == trends.HOURLY
+    assert projection.slope == pytest.approx(10 * GIB, rel=0.01)
+    assert projection.value == pytest.approx(160 * GIB)
+    assert projection.days_to_nearfull == pytest.approx(64, rel=0.01)
+    assert projection.days_to_full == pytest.approx(74, rel=0.01)
+    # Other clusters, and series not sampled in the window, are left out.
+    assert store.projections("other", now=NOW) == []
+    assert store.projections("fsid", now=NOW + 8 * trends.DAY) == []
+
+
+def test_projection_needs_history(store):
+    grow(store, NOW, NOW + 600, 300, GIB)
+    projection, = store.projections("fsid", window=trends.DAY, now=NOW + 600)
+    assert projection.samples == 3
+    assert projection.slope is None
+    assert projection.days_to_full is None
+    shrinking = trends.Projection('osd', 'osd.1', 5.0, 8.0, 9.0, 10, 86400,
+                                  -1.0)
+    assert shrinking.days_to_nearfull is None
+    assert trends.Projection('osd', 'osd.1', 9.5, 8.0, 9.0, 10, 86400,
+                             -1.0).days_to_full == 0.0
+
+
+def run_capacity(report, projections):
+    check = checks.select(['capacity'])
+    return scheduler.run_checks(check, ReportSnapshot(report),
+                                {'trends': lambda snapshot: projections},
+                                max_workers=1)[0]
+
+
+def test_capacity_check(store, report):
+    grow(store, NOW - 6 * trends.DAY, NOW, 3600, 10 * GIB)
+    store.record("fsid", [('osd', 'osd.3', 95.0, 85.0, 95.0)], NOW)
+    result = run_capacity(report, store.projections("fsid", now=NOW))
+    assert result.ok, result.error
+    cluster = [finding for finding in result.findings
+               if finding.label == "Cluster"][0]
+    assert cluster.severity == 'info'
+    assert "+10.0 GiB/day" in cluster.message
+    assert "nearfull in 64 days" in cluster.message
+    osd, = [finding for finding in result.findings
+            if finding.entity == 'osd.3']
+    assert osd.severity == 'error'
+    assert osd.data['days_to_full'] == 0.0
+    assert "100.0%" in result.output
+
+
+def test_capacity_without_store(report):
+    result = run_capacity(report, None)
+    assert "not recorded" in result.output
+    assert "no usage recorded" in run_capacity(report, []).output
+
+
+def test_live_runs_recorded(fake_ceph, tmp_path, capsys):
+    store = trends.TrendStore(str(tmp_path / "trends.db"))
+    checker = ceph_check.CephCheck("/nonexistent", "/nonexistent",
+                                   checks=["capacity"], trends=store,
+                                   ceph_bin=fake_ceph())
+    snapshot = checker.fetch_snapshot()
+    fsid = trends.snapshot_fsid(snapshot)
+    assert fsid == "0f1a53a2-1111-4d0b-9d2e-000000000000"
+    assert [value for _, value in store.history(fsid, 'osd', 'osd.1')] == [
+        200 * 1024]
+    assert store.history(fsid, 'pg_state', 'active+clean')
+    result, = checker.run_checks(snapshot)
+    assert result.ok, result.error
+    assert "1 samples over 0.0 days" in capsys.readouterr().out
+
+
+def test_unusable_store(tmp_path):
+    (tmp_path / "trends.db").write_text("not a database" * 100)
+    with pytest.raises(trends.TrendError):
+        trends.TrendStore(str(tmp_path / "trends.db"))
+
+
+def test_unreadable_store_does_not_fail_runs(fake_ceph, tmp_path):
+    store = trends.TrendStore(str(tmp_path / "trends.db"))
+    checker = ceph_check.CephCheck("/nonexistent", "/nonexistent",
+                                   checks=["capacity"], trends=store,
+                                   ceph_bin=fake_ceph())
+    snapshot = checker.fetch_snapshot()
+    store.close()
+    checker.compact(snapshot)
+    result, = checker.run_checks(snapshot)
+    assert result.ok, result.error
+    assert "not recorded" in result.output